@@ -1,14 +1,35 @@
 import streamlit as st
 import asyncio
 import json
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 import time
+from micro_batcher import INTERACTIVE_LATENCY_BUDGET_MS, latency_budget
+from llm_runner import use_llm_runner
 from prompt_optimizer import (
     optimize_prompt_comprehensive, 
     revise_prompt_with_feedback,
     ChatMessage, 
     Role
 )
+from resilience import runner_from_env
+
+def run_async(coroutine_function, *args, **kwargs):
+    """버튼 클릭마다 새 이벤트 루프(asyncio.run)에서 코루틴을 실행합니다.
+
+    PROMPT_OPTIMIZER_LLM_BACKEND가 설정되어 있으면 모델 클라이언트도 이 루프 안에서 만들고 닫습니다
+    (닫힌 루프에 묶인 연결 풀을 다음 클릭에서 재사용하면 모든 호출이 연결 오류로 휴리스틱 대체됨).
+    """
+    async def run():
+        runner = runner_from_env()
+        if runner is None:
+            return await coroutine_function(*args, **kwargs)
+        try:
+            with use_llm_runner(runner):
+                return await coroutine_function(*args, **kwargs)
+        finally:
+            await runner.backend.aclose()
+
+    return asyncio.run(run())
 
 # 페이지 설정
 st.set_page_config(
@@ -58,7 +79,7 @@ def add_feedback_progress(message: str):
         'message': message
     })
 
-async def run_optimization(prompt: str, few_shot_messages: List[ChatMessage] = None):
+async def run_optimization(prompt: str, few_shot_messages: List[ChatMessage] = None, deadline_ms: Optional[float] = None):
     """비동기 최적화 실행"""
     st.session_state.progress_messages = []
     
@@ -67,11 +88,14 @@ async def run_optimization(prompt: str, few_shot_messages: List[ChatMessage] = N
         # Streamlit 상태 업데이트를 위한 rerun은 별도 처리
     
     try:
-        results = await optimize_prompt_comprehensive(
-            prompt=prompt,
-            few_shot_messages=few_shot_messages,
-            progress_callback=progress_callback
-        )
+        # 사용자가 화면에서 기다리는 호출이므로 마이크로 배치 대기 없이 실행
+        with latency_budget(INTERACTIVE_LATENCY_BUDGET_MS):
+            results = await optimize_prompt_comprehensive(
+                prompt=prompt,
+                few_shot_messages=few_shot_messages,
+                progress_callback=progress_callback,
+                deadline_ms=deadline_ms
+            )
         st.session_state.optimization_results = results
         add_progress_message("✅ 최적화 완료!")
         return results
@@ -87,11 +111,12 @@ async def run_feedback_revision(optimized_prompt: str, user_feedback: str):
         add_feedback_progress(message)
     
     try:
-        results = await revise_prompt_with_feedback(
-            optimized_prompt=optimized_prompt,
-            user_feedback=user_feedback,
-            progress_callback=feedback_progress_callback
-        )
+        with latency_budget(INTERACTIVE_LATENCY_BUDGET_MS):
+            results = await revise_prompt_with_feedback(
+                optimized_prompt=optimized_prompt,
+                user_feedback=user_feedback,
+                progress_callback=feedback_progress_callback
+            )
         st.session_state.revision_results = results
         add_feedback_progress("✅ 피드백 기반 개선 완료!")
         return results
@@ -176,6 +201,14 @@ You are a helpful assistant. Help me improve my writing skills.""",
             "도구 사용 최적화",
             help="함수 호출 및 도구 사용에 최적화합니다"
         )
+        
+        deadline_ms = st.number_input(
+            "응답 시간 제한 (ms, 0 = 제한 없음)",
+            min_value=0,
+            value=0,
+            step=500,
+            help="시간이 부족하면 few-shot 최적화나 LLM 심층 검사를 건너뛰거나 로컬 분석으로 대체합니다"
+        )
     
     st.subheader("Few-shot 예제 (선택사항)")
     st.markdown("프롬프트의 성능을 향상시키기 위한 예제를 추가할 수 있습니다.")
@@ -234,10 +267,12 @@ You are a helpful assistant. Help me improve my writing skills.""",
             
             # 비동기 최적화 실행
             with st.spinner("프롬프트 최적화 중..."):
-                results = asyncio.run(run_optimization(
+                results = run_async(
+                    run_optimization,
                     prompt=user_prompt,
-                    few_shot_messages=few_shot_chat_messages if few_shot_chat_messages else None
-                ))
+                    few_shot_messages=few_shot_chat_messages if few_shot_chat_messages else None,
+                    deadline_ms=deadline_ms or None
+                )
             
             if results:
                 st.success("✅ 최적화가 완료되었습니다! '분석 결과' 탭에서 확인하세요.")
@@ -306,6 +341,14 @@ with tab3:
     if st.session_state.optimization_results:
         results = st.session_state.optimization_results
         
+        if results.get('degraded'):
+            skipped = [
+                f"{stage['stage']} ({stage['status']})"
+                for stage in (results.get('deadline') or {}).get('stages', [])
+                if stage['status'] != 'run'
+            ]
+            st.warning(f"⏱️ 응답 시간 제한 때문에 일부 단계를 건너뛰거나 낮춘 부분 결과입니다: {', '.join(skipped)}")
+        
         # 요약 메트릭
         col1, col2, col3, col4 = st.columns(4)
         
@@ -547,10 +590,11 @@ with tab5:
         if st.button("🚀 피드백 기반 개선 시작", type="primary", use_container_width=True):
             if user_feedback.strip():
                 with st.spinner("피드백을 분석하고 프롬프트를 개선 중..."):
-                    results = asyncio.run(run_feedback_revision(
+                    results = run_async(
+                        run_feedback_revision,
                         optimized_prompt=current_prompt,
                         user_feedback=user_feedback
-                    ))
+                    )
                 
                 if results:
                     st.success("✅ 피드백 기반 개선이 완료되었습니다!")
@@ -0,0 +1,197 @@
+"""
+내용 해시 아티팩트 저장소 모듈
+
+MCP 서버는 최적화된 프롬프트, 분석 결과, 피드백 수정 체인을 내용 해시 URI의 MCP 리소스로 공개합니다.
+- prompt-optimizer://blob/sha256:<해시>          프롬프트 등 텍스트 본문
+- prompt-optimizer://optimization/sha256:<해시>  원본 프롬프트(해시)의 최근 최적화 결과 (JSON)
+- prompt-optimizer://analysis/sha256:<해시>      원본 프롬프트(해시)의 최근 분석 결과 (JSON)
+- prompt-optimizer://revision/sha256:<해시>      수정 단계(이전 단계, 피드백, 수정된 프롬프트의 해시)까지의 수정 체인 (JSON)
+도구는 본문 대신 해시 참조(prompt_ref 등)를 받을 수 있어 큰 프롬프트를 다시 보낼 필요가 없고,
+같은 서버에 연결된 클라이언트끼리 저장된 결과를 참조로 공유할 수 있습니다.
+저장소는 SQLite 파일이며 max_entries를 넘으면 가장 오래 사용하지 않은 아티팩트부터 지웁니다.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from structured_results import BLOB_REF_KEY, BLOB_REF_PREFIX, blob_ref
+
+ARTIFACT_URI_PREFIX = "prompt-optimizer://"
+
+# 아티팩트 종류
+BLOB = "blob"
+OPTIMIZATION = "optimization"
+ANALYSIS = "analysis"
+REVISION = "revision"
+ARTIFACT_KINDS = (BLOB, OPTIMIZATION, ANALYSIS, REVISION)
+
+TEXT_MIME_TYPE = "text/plain"
+JSON_MIME_TYPE = "application/json"
+
+def artifact_uri(kind: str, ref: str) -> str:
+    return f"{ARTIFACT_URI_PREFIX}{kind}/{ref}"
+
+def parse_artifact_uri(uri: str) -> Optional[Tuple[str, str]]:
+    """URI -> (종류, 참조). 이 서버의 아티팩트 URI가 아니면 None"""
+    if not uri.startswith(ARTIFACT_URI_PREFIX):
+        return None
+    kind, _, ref = uri[len(ARTIFACT_URI_PREFIX):].partition("/")
+    if kind not in ARTIFACT_KINDS or not ref.startswith(BLOB_REF_PREFIX):
+        return None
+    return kind, ref
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS artifacts (
+    uri TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    ref TEXT NOT NULL,
+    mime_type TEXT NOT NULL,
+    body TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS artifacts_accessed ON artifacts (accessed_at);
+CREATE TABLE IF NOT EXISTS revisions (
+    ref TEXT PRIMARY KEY,
+    parent_ref TEXT,
+    source_ref TEXT NOT NULL,
+    prompt_ref TEXT NOT NULL,
+    feedback TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS revisions_prompt ON revisions (prompt_ref, created_at);
+"""
+
+class ArtifactStore:
+    """내용 해시로 주소가 정해지는 아티팩트 저장소 (여러 스레드에서 사용 가능)"""
+
+    def __init__(self, path: str = ":memory:", max_entries: int = 10000):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        if path != ":memory:":
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _put(self, kind: str, ref: str, mime_type: str, body: str) -> str:
+        uri = artifact_uri(kind, ref)
+        now = time.time()
+        with self._lock:
+            # 같은 URI면 본문(최근 결과)과 사용 시각만 갱신
+            self._conn.execute(
+                "INSERT INTO artifacts (uri, kind, ref, mime_type, body, created_at, accessed_at) VALUES (?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(uri) DO UPDATE SET body = excluded.body, accessed_at = excluded.accessed_at",
+                (uri, kind, ref, mime_type, body, now, now)
+            )
+            self._prune()
+        return uri
+
+    def _prune(self) -> None:
+        count = self._conn.execute("SELECT COUNT(*) FROM artifacts").fetchone()[0]
+        if count <= self.max_entries:
+            return
+        self._conn.execute(
+            "DELETE FROM artifacts WHERE uri IN (SELECT uri FROM artifacts ORDER BY accessed_at LIMIT ?)",
+            (count - self.max_entries,)
+        )
+        self._conn.execute("DELETE FROM revisions WHERE prompt_ref NOT IN (SELECT ref FROM artifacts WHERE kind = ?)", (BLOB,))
+
+    def put_text(self, text: str) -> str:
+        """텍스트를 저장하고 참조(sha256:...)를 돌려줍니다"""
+        ref = blob_ref(text)
+        self._put(BLOB, ref, TEXT_MIME_TYPE, text)
+        return ref
+
+    def put_blobs(self, blobs: Dict[str, str]) -> None:
+        """구조화된 결과의 blobs를 저장합니다 (참조는 본문의 해시와 같아야 함)"""
+        for ref, text in blobs.items():
+            if blob_ref(text) == ref:
+                self._put(BLOB, ref, TEXT_MIME_TYPE, text)
+
+    def put_json(self, kind: str, source_ref: str, data: Any) -> str:
+        """source_ref(원본 프롬프트의 참조)에 대한 JSON 아티팩트를 저장하고 URI를 돌려줍니다"""
+        return self._put(kind, source_ref, JSON_MIME_TYPE, json.dumps(data, ensure_ascii=False, separators=(",", ":")))
+
+    def read(self, uri: str) -> Optional[Tuple[str, str]]:
+        """URI -> (MIME 형식, 본문). 없으면 None"""
+        parsed = parse_artifact_uri(uri)
+        if parsed is None:
+            return None
+        if parsed[0] == REVISION:
+            chain = self.revision_chain(parsed[1])
+            return (JSON_MIME_TYPE, json.dumps(chain, ensure_ascii=False, separators=(",", ":"))) if chain else None
+        with self._lock:
+            row = self._conn.execute("SELECT mime_type, body FROM artifacts WHERE uri = ?", (uri,)).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE artifacts SET accessed_at = ? WHERE uri = ?", (time.time(), uri))
+        return row["mime_type"], row["body"]
+
+    def get_text(self, ref: str) -> Optional[str]:
+        found = self.read(artifact_uri(BLOB, ref))
+        return found[1] if found is not None else None
+
+    def add_revision(self, parent_text: str, feedback: str, revised_text: str) -> str:
+        """피드백 수정 한 단계를 기록하고 단계 참조를 돌려줍니다.
+        단계는 parent_text를 결과로 낸 가장 최근 단계에 이어지며, 참조는 (이전 단계, 피드백, 수정된 프롬프트)의 해시입니다
+        (수정 결과가 같은 프롬프트여도 단계마다 다른 참조)."""
+        source_ref = self.put_text(parent_text)
+        prompt_ref = self.put_text(revised_text)
+        with self._lock:
+            parent = self._conn.execute(
+                "SELECT ref FROM revisions WHERE prompt_ref = ? ORDER BY created_at DESC LIMIT 1", (source_ref,)
+            ).fetchone()
+            parent_ref = parent["ref"] if parent is not None else None
+            ref = blob_ref(json.dumps([parent_ref or source_ref, feedback, prompt_ref], ensure_ascii=False))
+            self._conn.execute(
+                "INSERT OR IGNORE INTO revisions (ref, parent_ref, source_ref, prompt_ref, feedback, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (ref, parent_ref, source_ref, prompt_ref, feedback, time.time())
+            )
+        return ref
+
+    def revision_chain(self, ref: str) -> List[Dict[str, Any]]:
+        """처음 프롬프트부터 단계 ref까지의 수정 체인 [{"prompt": {"$ref": ...}, "feedback": ...}, ...]
+        (첫 항목은 수정 전 프롬프트이며 feedback은 None, 기록이 없으면 빈 목록)"""
+        chain: List[Dict[str, Any]] = []
+        seen = set()
+        with self._lock:
+            while ref is not None and ref not in seen:
+                seen.add(ref)
+                row = self._conn.execute(
+                    "SELECT parent_ref, source_ref, prompt_ref, feedback FROM revisions WHERE ref = ?", (ref,)
+                ).fetchone()
+                if row is None:
+                    break
+                chain.append({"prompt": {BLOB_REF_KEY: row["prompt_ref"]}, "feedback": row["feedback"]})
+                source_ref = row["source_ref"]
+                ref = row["parent_ref"]
+        if not chain:
+            return []
+        chain.append({"prompt": {BLOB_REF_KEY: source_ref}, "feedback": None})
+        return chain[::-1]
+
+    def entries(self, limit: int = 100) -> List[Dict[str, Any]]:
+        """최근 사용한 아티팩트 목록 (본문 제외)"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT uri, kind, ref, mime_type, LENGTH(body) AS size FROM artifacts ORDER BY accessed_at DESC LIMIT ?",
+                (limit,)
+            ).fetchall()
+            revisions = self._conn.execute(
+                "SELECT ref FROM revisions ORDER BY created_at DESC LIMIT ?", (limit,)
+            ).fetchall()
+        listed = [dict(row) for row in rows]
+        listed.extend(
+            {"uri": artifact_uri(REVISION, row["ref"]), "kind": REVISION, "ref": row["ref"], "mime_type": JSON_MIME_TYPE, "size": None}
+            for row in revisions
+        )
+        return listed
@@ -0,0 +1,379 @@
+"""
+오프라인 일괄 최적화 (배치 작업 파일) 모듈
+
+프롬프트 라이브러리 전체를 야간에 다시 최적화할 때는 실시간 요청 대신 공급자의 배치 작업을 사용합니다.
+BatchJobRunner를 LLM 실행기로 등록하면 optimize_prompt_parallel / optimize_prompt_comprehensive 파이프라인의
+모든 Agent 호출이 대기열에 모이고, 새 호출이 settle_ms 동안 들어오지 않으면(모든 파이프라인이 모델 응답을 기다리는 상태)
+대기 중인 호출 전체를 배치 작업 JSONL 파일 하나로 제출한 뒤 완료될 때까지 폴링하고 결과로 파이프라인을 이어서 진행합니다.
+파이프라인 DAG의 각 단계가 배치 작업 하나(웨이브)가 됩니다.
+
+체크포인트 파일에는 받은 응답(요청 본문 해시별), 제출했지만 아직 완료되지 않은 배치, 완료된 파이프라인 결과가 저장됩니다.
+중단 후 같은 체크포인트로 다시 실행하면 완료된 파이프라인은 건너뛰고, 나머지 파이프라인은 저장된 응답으로
+이미 끝난 단계를 즉시 재생한 뒤 진행 중이던 배치는 다시 제출하지 않고 폴링을 이어갑니다.
+실패/만료/취소된 배치는 체크포인트에서 지우고 그 요청을 새 배치로 다시 제출합니다 (최대 max_resubmits번).
+체크포인트는 웨이브마다(배치 제출 직후와 결과 반영 직후) 저장하고, 파이프라인 결과는 다음 저장 때 함께 기록됩니다.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from pydantic import BaseModel, Field
+
+from llm_runner import (
+    LLMRunner, ModelBackend, ModelRequest, ModelResponse, RunResult, get_default_llm_runner, request_from_body,
+    set_default_llm_runner
+)
+from micro_batcher import BATCH_ENDPOINT, BatchFileExecutor, write_batch_file
+
+# 더 이상 진행되지 않는 배치 상태 (결과 없이 끝남)
+TERMINAL_BATCH_STATUSES = ("failed", "expired", "cancelled")
+
+class BatchJobError(Exception):
+    """배치 작업이 실패했거나 요청 결과를 받지 못한 경우"""
+
+def completion_body(response: ModelResponse, model: str) -> Dict[str, Any]:
+    """모델 응답을 Chat Completions 응답 본문 형식으로 변환합니다 (로컬 배치 엔드포인트 출력에 사용)"""
+    return {
+        "object": "chat.completion",
+        "model": model,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": response.output_text}, "finish_reason": "stop"}],
+        "usage": {
+            "prompt_tokens": response.input_tokens,
+            "completion_tokens": response.output_tokens,
+            "total_tokens": response.input_tokens + response.output_tokens,
+            "prompt_tokens_details": {"cached_tokens": response.cached_tokens},
+        },
+    }
+
+def response_from_completion_body(body: Dict[str, Any]) -> ModelResponse:
+    usage = body.get("usage") or {}
+    return ModelResponse(
+        output_text=body["choices"][0]["message"]["content"] or "{}",
+        input_tokens=usage.get("prompt_tokens", 0),
+        output_tokens=usage.get("completion_tokens", 0),
+        cached_tokens=(usage.get("prompt_tokens_details") or {}).get("cached_tokens", 0)
+    )
+
+def parse_batch_output(lines: List[str]) -> Tuple[Dict[str, ModelResponse], Dict[str, str]]:
+    """배치 출력 JSONL을 (custom_id -> 응답, custom_id -> 오류 메시지)로 나눕니다"""
+    responses, errors = {}, {}
+    for line in lines:
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        response = record.get("response") or {}
+        if record.get("error") or response.get("status_code") != 200:
+            errors[record["custom_id"]] = json.dumps(record.get("error") or response.get("body"), ensure_ascii=False)
+        else:
+            responses[record["custom_id"]] = response_from_completion_body(response["body"])
+    return responses, errors
+
+class BatchEndpoint:
+    """배치 작업 엔드포인트 인터페이스"""
+
+    async def submit(self, input_path: str) -> str:
+        """배치 작업 JSONL 파일을 제출하고 배치 ID를 반환합니다"""
+        raise NotImplementedError
+
+    async def poll(self, batch_id: str) -> Optional[Tuple[Dict[str, ModelResponse], Dict[str, str]]]:
+        """완료되었으면 (응답, 오류)를, 아직 진행 중이면 None을 반환합니다 (결과 없이 끝났으면 BatchJobError)"""
+        raise NotImplementedError
+
+class OpenAIBatchEndpoint(BatchEndpoint):
+    """OpenAI Batch API 엔드포인트"""
+
+    def __init__(self, client: Any, completion_window: str = "24h"):
+        self.client = client
+        self.completion_window = completion_window
+
+    async def submit(self, input_path: str) -> str:
+        with open(input_path, "rb") as f:
+            input_file = await self.client.files.create(file=f, purpose="batch")
+        batch = await self.client.batches.create(
+            input_file_id=input_file.id, endpoint=BATCH_ENDPOINT, completion_window=self.completion_window
+        )
+        return batch.id
+
+    async def poll(self, batch_id: str) -> Optional[Tuple[Dict[str, ModelResponse], Dict[str, str]]]:
+        batch = await self.client.batches.retrieve(batch_id)
+        if batch.status in TERMINAL_BATCH_STATUSES:
+            raise BatchJobError(f"배치 작업 {batch_id} 상태: {batch.status}")
+        if batch.status != "completed":
+            return None
+        lines = []
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if file_id:
+                content = await self.client.files.content(file_id)
+                lines.extend(content.text.splitlines())
+        return parse_batch_output(lines)
+
+class LocalBatchEndpoint(BatchEndpoint):
+    """파일 기반 로컬 배치 엔드포인트 (테스트/벤치마크용 대역).
+
+    제출한 파일은 directory/<batch_id>/input.jsonl 로 복사되고, 제출 후 completion_delay_s가 지난 뒤의 첫 폴링에서
+    backend로 각 줄을 실행해 output.jsonl과 status.json을 기록합니다.
+    상태가 모두 파일에 있으므로 프로세스를 다시 시작해도 같은 배치를 계속 폴링할 수 있습니다.
+    status.json의 상태가 expired 등 TERMINAL_BATCH_STATUSES이면 OpenAI 배치처럼 BatchJobError를 냅니다.
+    """
+
+    def __init__(self, directory: str, backend: ModelBackend, completion_delay_s: float = 0.0):
+        self.directory = directory
+        self.backend = backend
+        self.completion_delay_s = completion_delay_s
+
+    def _status_path(self, batch_id: str) -> str:
+        return os.path.join(self.directory, batch_id, "status.json")
+
+    async def submit(self, input_path: str) -> str:
+        batch_id = f"batch_{uuid.uuid4().hex[:16]}"
+        os.makedirs(os.path.join(self.directory, batch_id))
+        shutil.copyfile(input_path, os.path.join(self.directory, batch_id, "input.jsonl"))
+        with open(self._status_path(batch_id), "w", encoding="utf-8") as f:
+            json.dump({"status": "in_progress", "created_at": time.time()}, f)
+        return batch_id
+
+    async def poll(self, batch_id: str) -> Optional[Tuple[Dict[str, ModelResponse], Dict[str, str]]]:
+        with open(self._status_path(batch_id), encoding="utf-8") as f:
+            status = json.load(f)
+        output_path = os.path.join(self.directory, batch_id, "output.jsonl")
+        if status["status"] in TERMINAL_BATCH_STATUSES:
+            raise BatchJobError(f"배치 작업 {batch_id} 상태: {status['status']}")
+        if status["status"] != "completed":
+            if time.time() - status["created_at"] < self.completion_delay_s:
+                return None
+            await self._process(batch_id, output_path)
+        with open(output_path, encoding="utf-8") as f:
+            return parse_batch_output(f.readlines())
+
+    async def _process(self, batch_id: str, output_path: str) -> None:
+        with open(os.path.join(self.directory, batch_id, "input.jsonl"), encoding="utf-8") as f:
+            lines = [json.loads(line) for line in f if line.strip()]
+        responses = await asyncio.gather(
+            *(self.backend.complete(request_from_body(line["body"])) for line in lines), return_exceptions=True
+        )
+        with open(output_path, "w", encoding="utf-8") as f:
+            for number, (line, response) in enumerate(zip(lines, responses)):
+                record = {"id": f"{batch_id}_req_{number}", "custom_id": line["custom_id"], "response": None, "error": None}
+                if isinstance(response, BaseException):
+                    record["error"] = {"code": "local_error", "message": str(response)}
+                else:
+                    record["response"] = {"status_code": 200, "body": completion_body(response, line["body"]["model"])}
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        with open(self._status_path(batch_id), "w", encoding="utf-8") as f:
+            json.dump({"status": "completed", "completed_at": time.time()}, f)
+
+async def wait_for_batch(
+    endpoint: BatchEndpoint, batch_id: str, poll_interval_s: float = 1.0
+) -> Tuple[Dict[str, ModelResponse], Dict[str, str]]:
+    """배치 작업이 완료될 때까지 폴링합니다"""
+    while True:
+        output = await endpoint.poll(batch_id)
+        if output is not None:
+            return output
+        await asyncio.sleep(poll_interval_s)
+
+def endpoint_file_executor(endpoint: BatchEndpoint, poll_interval_s: float = 1.0) -> BatchFileExecutor:
+    """MicroBatcher(batch_dir=...)가 배치 파일을 엔드포인트에 제출하고 폴링하도록 하는 실행기"""
+    async def execute(path: str) -> Dict[str, ModelResponse]:
+        responses, _ = await wait_for_batch(endpoint, await endpoint.submit(path), poll_interval_s)
+        return responses
+
+    return execute
+
+class CheckpointState(BaseModel):
+    """디스크에 저장되는 일괄 최적화 상태"""
+    responses: Dict[str, ModelResponse] = Field(default_factory=dict)  # 요청 해시 -> 받은 응답
+    batches: Dict[str, List[str]] = Field(default_factory=dict)  # 제출했지만 아직 반영하지 않은 배치 ID -> 요청 해시
+    results: Dict[str, Any] = Field(default_factory=dict)  # 완료된 파이프라인 ID -> 결과
+    errors: Dict[str, str] = Field(default_factory=dict)  # 실패한 파이프라인 ID -> 오류 메시지
+
+class BatchJobStats(BaseModel):
+    """일괄 최적화 통계"""
+    waves: int = 0  # 대기열을 비운 횟수 (파이프라인 단계 수)
+    submitted_batches: int = 0
+    submitted_requests: int = 0
+    resumed_batches: int = 0  # 체크포인트에서 이어서 폴링한 배치 수
+    replayed_responses: int = 0  # 체크포인트의 응답으로 즉시 처리한 호출 수
+    skipped_pipelines: int = 0  # 이미 완료되어 건너뛴 파이프라인 수
+    failed_batches: int = 0  # 결과 없이 끝나(실패/만료/취소) 체크포인트에서 지운 배치 수
+    resubmitted_requests: int = 0  # 결과 없이 끝난 배치에서 다시 제출한 요청 수
+
+class BatchJobRunner(LLMRunner):
+    """Agent 호출을 배치 작업으로 모아 실행하는 LLM 실행기 (체크포인트로 중단 후 재개 가능)"""
+
+    def __init__(
+        self,
+        endpoint: BatchEndpoint,
+        checkpoint_path: str,
+        work_dir: Optional[str] = None,
+        settle_ms: float = 50.0,
+        poll_interval_s: float = 1.0,
+        max_resubmits: int = 1
+    ):
+        super().__init__(backend=None)
+        self.endpoint = endpoint
+        self.checkpoint_path = checkpoint_path
+        self.work_dir = work_dir or os.path.join(os.path.dirname(os.path.abspath(checkpoint_path)), "batch_inputs")
+        self.settle_ms = settle_ms
+        self.poll_interval_s = poll_interval_s
+        self.max_resubmits = max_resubmits
+        self.state = self._load()
+        self.job_stats = BatchJobStats()
+        self._pending: Dict[str, Tuple[str, ModelRequest, "asyncio.Future[ModelResponse]"]] = {}
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._waves: set = set()
+
+    def _load(self) -> CheckpointState:
+        if os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path, encoding="utf-8") as f:
+                return CheckpointState.model_validate_json(f.read())
+        return CheckpointState()
+
+    def save(self) -> None:
+        """체크포인트를 원자적으로 저장합니다 (임시 파일에 쓴 뒤 교체)"""
+        directory = os.path.dirname(os.path.abspath(self.checkpoint_path))
+        os.makedirs(directory, exist_ok=True)
+        temp_path = f"{self.checkpoint_path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(self.state.model_dump_json())
+        os.replace(temp_path, self.checkpoint_path)
+
+    async def run(self, agent: Any, input_data: str) -> RunResult:
+        request = self.build_request(agent, input_data)
+        # 같은 요청 본문은 같은 custom_id - 재실행 시 체크포인트의 응답과 대응됨
+        custom_id = hashlib.sha256(self.catalog.body_json(request).encode("utf-8")).hexdigest()
+        response = self.state.responses.get(custom_id)
+        if response is not None:
+            self.job_stats.replayed_responses += 1
+            return RunResult(self.parse_output(agent, response.output_text), response)
+
+        pending = self._pending.get(custom_id)
+        if pending is None:
+            pending = self._pending[custom_id] = (agent.name, request, asyncio.get_running_loop().create_future())
+        self._schedule_wave()
+        response = await asyncio.shield(pending[2])
+        return RunResult(self.parse_output(agent, response.output_text), response)
+
+    def _schedule_wave(self) -> None:
+        # 새 호출이 settle_ms 동안 들어오지 않으면 대기열 전체를 한 배치로 제출
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = asyncio.get_running_loop().call_later(self.settle_ms / 1000, self._start_wave)
+
+    def _start_wave(self) -> None:
+        self._timer = None
+        pending, self._pending = self._pending, {}
+        if pending:
+            task = asyncio.get_running_loop().create_task(self._run_wave(pending))
+            self._waves.add(task)
+            task.add_done_callback(self._waves.discard)
+
+    async def _run_wave(self, pending: Dict[str, Tuple[str, ModelRequest, "asyncio.Future[ModelResponse]"]]) -> None:
+        self.job_stats.waves += 1
+        errors: Dict[str, str] = {}
+        try:
+            # 체크포인트에 남아 있는 진행 중 배치에 이미 포함된 요청은 다시 제출하지 않고 그 배치를 폴링
+            batch_ids = [batch_id for batch_id, ids in self.state.batches.items() if not pending.keys().isdisjoint(ids)]
+            self.job_stats.resumed_batches += len(batch_ids)
+            covered = {custom_id for batch_id in batch_ids for custom_id in self.state.batches[batch_id]}
+            new_ids = [custom_id for custom_id in pending if custom_id not in covered]
+            for attempt in range(self.max_resubmits + 1):
+                if new_ids:
+                    batch_ids.append(await self._submit(new_ids, pending))
+                    if attempt:
+                        self.job_stats.resubmitted_requests += len(new_ids)
+                dropped = await asyncio.gather(*(self._collect(batch_id, errors) for batch_id in batch_ids))
+                self.save()
+                # 결과 없이 끝난 배치의 요청 중 이번 웨이브가 기다리는 것만 새 배치로 다시 제출
+                # (나머지는 해당 파이프라인이 그 단계에 도달했을 때 새로 제출됨)
+                new_ids = [
+                    custom_id for ids in dropped for custom_id in ids
+                    if custom_id in pending and custom_id not in self.state.responses
+                ]
+                batch_ids = []
+                if not new_ids:
+                    break
+        except Exception as exc:
+            for _, _, future in pending.values():
+                if not future.done():
+                    future.set_exception(exc)
+            return
+
+        for custom_id, (agent_name, _, future) in pending.items():
+            if future.done():
+                continue
+            response = self.state.responses.get(custom_id)
+            if response is None:
+                future.set_exception(BatchJobError(errors.get(custom_id, f"배치 결과에 요청 {custom_id}가 없습니다")))
+            else:
+                self.record(agent_name, response)
+                future.set_result(response)
+
+    async def _submit(
+        self, custom_ids: List[str], pending: Dict[str, Tuple[str, ModelRequest, "asyncio.Future[ModelResponse]"]]
+    ) -> str:
+        input_path = write_batch_file(self.work_dir, "wave", [(custom_id, pending[custom_id][1]) for custom_id in custom_ids], self.catalog)
+        batch_id = await self.endpoint.submit(input_path)
+        self.state.batches[batch_id] = list(custom_ids)
+        self.save()
+        self.job_stats.submitted_batches += 1
+        self.job_stats.submitted_requests += len(custom_ids)
+        return batch_id
+
+    async def _collect(self, batch_id: str, errors: Dict[str, str]) -> List[str]:
+        """배치 결과를 상태에 반영하고, 결과 없이 끝난 배치면 체크포인트에서 지운 뒤 그 요청 해시를 돌려줍니다"""
+        try:
+            responses, batch_errors = await wait_for_batch(self.endpoint, batch_id, self.poll_interval_s)
+        except BatchJobError as exc:
+            self.job_stats.failed_batches += 1
+            custom_ids = self.state.batches.pop(batch_id, [])
+            errors.update({custom_id: str(exc) for custom_id in custom_ids})
+            return custom_ids
+        self.state.responses.update(responses)
+        errors.update(batch_errors)
+        del self.state.batches[batch_id]
+        return []
+
+def _jsonable(value: Any) -> Any:
+    return json.loads(json.dumps(value, ensure_ascii=False, default=lambda item: item.model_dump(mode="json") if hasattr(item, "model_dump") else str(item)))
+
+async def run_bulk_pipelines(
+    runner: BatchJobRunner,
+    pipelines: Dict[str, Callable[[], Awaitable[Dict[str, Any]]]],
+    progress_callback: Optional[Callable[[str], None]] = None
+) -> Dict[str, Any]:
+    """파이프라인들을 배치 작업 실행기로 동시에 실행합니다.
+
+    pipelines는 파이프라인 ID -> 인자 없는 코루틴 함수입니다
+    (예: lambda: optimize_prompt_parallel(dev_msg, messages) 또는 lambda: optimize_prompt_comprehensive(prompt, coalesce=False)).
+    완료된 결과는 체크포인트에 저장되고, 이미 완료된 파이프라인은 다시 실행하지 않습니다.
+    파이프라인마다 체크포인트 전체를 다시 쓰지 않도록 결과는 다음 웨이브의 저장과 마지막 저장에 함께 기록됩니다
+    (그 사이에 중단되면 해당 파이프라인은 저장된 응답만으로 모델 호출 없이 다시 재생됨).
+    """
+    async def run_one(pipeline_id: str, pipeline: Callable[[], Awaitable[Dict[str, Any]]]) -> None:
+        try:
+            result = await pipeline()
+        except Exception as exc:
+            runner.state.errors[pipeline_id] = f"{type(exc).__name__}: {exc}"
+        else:
+            runner.state.results[pipeline_id] = _jsonable(result)
+            runner.state.errors.pop(pipeline_id, None)
+        if progress_callback:
+            progress_callback(f"📦 파이프라인 '{pipeline_id}' 완료 ({len(runner.state.results)}/{len(pipelines)})")
+
+    remaining = {pipeline_id: pipeline for pipeline_id, pipeline in pipelines.items() if pipeline_id not in runner.state.results}
+    runner.job_stats.skipped_pipelines += len(pipelines) - len(remaining)
+    previous = get_default_llm_runner()
+    set_default_llm_runner(runner)
+    try:
+        await asyncio.gather(*(run_one(pipeline_id, pipeline) for pipeline_id, pipeline in remaining.items()))
+    finally:
+        set_default_llm_runner(previous)
+        runner.save()
+    return {pipeline_id: runner.state.results.get(pipeline_id) for pipeline_id in pipelines}
@@ -0,0 +1,892 @@
+#!/usr/bin/env python3
+"""
+프롬프트 최적화 실행 방식 벤치마크 스크립트
+
+실제 모델 대신 로컬 스텁 모델(llm_runner.StubModelBackend)을 사용해 네트워크 없이
+실행 방식별 지연 시간과 토큰 비용을 비교합니다. 스텁 모델의 응답 내용은 각 Agent의 로컬 시뮬레이션 결과입니다.
+"""
+
+import asyncio
+import contextlib
+import io
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import zlib
+from typing import Any, Dict, List, Optional
+
+from pydantic import TypeAdapter
+
+# main 모듈은 import 시 OpenAI 클라이언트를 만들므로 키가 없으면 더미 값을 사용 (스텁 모델은 네트워크를 쓰지 않음)
+os.environ.setdefault("OPENAI_API_KEY", "benchmark-local")
+
+import main
+import prompt_optimizer
+from batch_jobs import BatchJobRunner, LocalBatchEndpoint, run_bulk_pipelines
+from bulk_tools import ResultPager, run_bounded
+from job_queue import FINISHED_STATUSES, JobQueue, JobWorkerPool
+from llm_runner import LLMRunner, ModelRequest, StubModelBackend, set_default_llm_runner
+from micro_batcher import MicroBatcher, batch_responder, latency_budget
+from resilience import CircuitBreaker, FaultInjectingBackend, ResilientRunner
+from request_builder import canonical_json, chat_completion_body, output_schema_for, serialize_payload
+from schema_catalog import default_catalog, serialize_body
+
+def _agents_by_name(module: Any) -> Dict[str, Any]:
+    return {value.name: value for value in vars(module).values() if isinstance(value, module.Agent)}
+
+def stub_backend(module: Any, max_concurrency: Optional[int] = None, cache_min_tokens: Optional[int] = 1024) -> StubModelBackend:
+    """module의 로컬 시뮬레이션으로 응답하는 스텁 모델"""
+    agents = _agents_by_name(module)
+
+    async def respond(request: ModelRequest) -> Any:
+        result = await module.Runner.simulate(agents[request.agent], request.input)
+        return result.final_output
+
+    return StubModelBackend(batch_responder(respond), max_concurrency=max_concurrency, cache_min_tokens=cache_min_tokens)
+
+def benchmark_prompt() -> str:
+    rules = "\n".join(
+        f"- Always report metric_{i} in the summary table and explain any change larger than {i}%."
+        for i in range(60)
+    )
+    return (
+        "You are a reporting assistant for the analytics team. Your task is to summarize weekly dashboards.\n\n"
+        f"## Rules\n{rules}\n\n"
+        "## Output Format\nReturn a markdown table followed by a short paragraph."
+    )
+
+def benchmark_developer_message() -> str:
+    rules = "\n".join(f"- The field_{i} value must be copied verbatim from the page." for i in range(40))
+    return (
+        "You are a product parser. Extract product data from the given HTML page.\n"
+        "Output JSON with required fields: name, price, currency.\n"
+        f"{rules}\n"
+        "Return minified JSON only."
+    )
+
+def benchmark_messages(pairs: int = 6) -> List[main.ChatMessage]:
+    messages = []
+    for i in range(pairs):
+        messages.append(main.ChatMessage(role="user", content=f"<html><h1>Product {i}</h1><span>{i}.99 USD</span></html>"))
+        messages.append(main.ChatMessage(role="assistant", content=f'{{"name":"Product {i}","price":{i}.99,"currency":"USD"}}'))
+    return messages
+
+def _print_row(label: str, elapsed: float, usage: Dict[str, int]) -> None:
+    print(
+        f"   {label:<28} {elapsed * 1000:8.1f} ms | 검사 요청 {usage['calls']}회 | "
+        f"입력 토큰 {usage['input_tokens']:6d} | 출력 토큰 {usage['output_tokens']:5d}"
+    )
+
+async def _prompt_optimizer_checkers(prompt: str, fused: bool) -> None:
+    if fused:
+        result = await prompt_optimizer.Runner.run(prompt_optimizer.fused_prompt_checker, prompt)
+        prompt_optimizer.split_fused_issues(result.final_output, {section: prompt_optimizer.Issues for section in prompt_optimizer.FUSED_CHECKERS})
+    else:
+        await asyncio.gather(*(prompt_optimizer.Runner.run(checker, prompt) for checker in prompt_optimizer.FUSED_CHECKERS.values()))
+
+async def _main_checkers(developer_message: str, messages: List[main.ChatMessage], fused: bool) -> None:
+    if fused:
+        await main._run_fused_checker(
+            developer_message, messages, {main.CONTRADICTION: main.Issues, main.FORMAT: main.Issues, main.FEW_SHOT: main.FewShotIssues}
+        )
+        return
+    fs_input = {
+        "DEVELOPER_MESSAGE": developer_message,
+        "USER_EXAMPLES": [m.content for m in messages if m.role == "user"],
+        "ASSISTANT_EXAMPLES": [m.content for m in messages if m.role == "assistant"],
+    }
+    await asyncio.gather(
+        main.Runner.run(main.dev_contradiction_checker, developer_message),
+        main.Runner.run(main.format_checker, developer_message),
+        main.Runner.run(main.fewshot_consistency_checker, main.serialize_payload(fs_input)),
+    )
+
+async def benchmark_fused_checkers(repeats: int = 3) -> None:
+    """팬아웃 검사기와 융합 검사기의 검사 단계 지연 시간/토큰 비용 비교"""
+    print("\n🧩 융합 검사기 vs 팬아웃 검사기 - 검사 단계 (로컬 스텁 모델)")
+    print("-" * 60)
+    prompt = benchmark_prompt()
+    developer_message = benchmark_developer_message()
+    messages = benchmark_messages()
+    cases = [
+        ("comprehensive", prompt_optimizer, lambda fused: _prompt_optimizer_checkers(prompt, fused)),
+        ("parallel", main, lambda fused: _main_checkers(developer_message, messages, fused)),
+    ]
+
+    for max_concurrency in (None, 2):
+        limit = "무제한" if max_concurrency is None else f"{max_concurrency}"
+        print(f"\n📡 공급자 동시 요청 제한: {limit}")
+        for label, module, run_checkers in cases:
+            for fused in (False, True):
+                runner = LLMRunner(stub_backend(module, max_concurrency))
+                set_default_llm_runner(runner)
+                try:
+                    started = time.perf_counter()
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        for _ in range(repeats):
+                            await run_checkers(fused)
+                    elapsed = (time.perf_counter() - started) / repeats
+                finally:
+                    set_default_llm_runner(None)
+                usage = {key: value // repeats for key, value in runner.totals().model_dump(include={"calls", "input_tokens", "output_tokens"}).items()}
+                _print_row(f"{label} ({'융합' if fused else '팬아웃'})", elapsed, usage)
+
+def benchmark_developer_messages(count: int) -> List[str]:
+    return [
+        f"You are assistant #{i}. Output JSON with required fields: answer, source_{i}. Keep answers short."
+        for i in range(count)
+    ]
+
+async def benchmark_micro_batching(calls: int = 200, max_concurrency: int = 8) -> None:
+    """동시에 들어온 작은 format_checker 호출: 개별 요청 vs 마이크로 배칭 (다중 항목 요청 / 배치 파일)"""
+    print(f"\n📦 마이크로 배칭 - format_checker 호출 {calls}회 (공급자 동시 요청 제한 {max_concurrency})")
+    print("-" * 60)
+    inputs = benchmark_developer_messages(calls)
+    batch_dir = tempfile.mkdtemp(prefix="benchmark_batches_")
+    runners = [
+        ("개별 요청", LLMRunner(stub_backend(main, max_concurrency))),
+        ("마이크로 배칭", MicroBatcher(stub_backend(main, max_concurrency), max_wait_ms=20, max_items=50)),
+        ("배치 파일", MicroBatcher(stub_backend(main, max_concurrency), max_wait_ms=20, max_items=50, batch_dir=batch_dir)),
+    ]
+    for label, runner in runners:
+        set_default_llm_runner(runner)
+        try:
+            started = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                results = await asyncio.gather(*(main.Runner.run(main.format_checker, text) for text in inputs))
+            elapsed = time.perf_counter() - started
+        finally:
+            set_default_llm_runner(None)
+        totals = runner.totals()
+        requests = runner.backend.requests
+        flagged = sum(result.final_output.has_issues for result in results)
+        print(
+            f"   {label:<10} {elapsed * 1000:8.1f} ms | 모델 요청 {requests:3d}회 | 입력 토큰 {totals.input_tokens:7d} | "
+            f"출력 토큰 {totals.output_tokens:6d} | 문제 발견 {flagged}건"
+        )
+
+    shutil.rmtree(batch_dir, ignore_errors=True)
+
+    # 지연 예산이 대기 시간보다 짧은 대화형 호출은 배처를 우회
+    batcher = MicroBatcher(stub_backend(main), max_wait_ms=200)
+    set_default_llm_runner(batcher)
+    try:
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()), latency_budget(50):
+            await main.Runner.run(main.format_checker, inputs[0])
+        elapsed = time.perf_counter() - started
+    finally:
+        set_default_llm_runner(None)
+    print(f"   대화형 호출 (지연 예산 50ms, 대기 200ms): {elapsed * 1000:.1f} ms, 우회 {batcher.batcher_stats.bypassed}회")
+
+def _bulk_pipelines(library_size: int) -> Dict[str, Any]:
+    pipelines = {}
+    for i in range(library_size):
+        prompt = f"Maybe write something good about topic {i}. Always answer in English and use markdown tables."
+        pipelines[f"comprehensive-{i}"] = lambda prompt=prompt: prompt_optimizer.optimize_prompt_comprehensive(prompt, coalesce=False)
+        developer_message = benchmark_developer_messages(library_size)[i]
+        pipelines[f"parallel-{i}"] = lambda developer_message=developer_message: main.optimize_prompt_parallel(
+            developer_message, benchmark_messages()[:4]
+        )
+    return pipelines
+
+async def benchmark_batch_jobs(library_size: int = 20) -> None:
+    """프롬프트 라이브러리 일괄 최적화: 배치 작업 웨이브 수와 중단 후 재개"""
+    print(f"\n🌙 배치 작업 일괄 최적화 - 파이프라인 {library_size * 2}개 (로컬 파일 기반 배치 엔드포인트)")
+    print("-" * 60)
+    work_dir = tempfile.mkdtemp(prefix="benchmark_batch_jobs_")
+    checkpoint_path = os.path.join(work_dir, "checkpoint.json")
+
+    def new_runner() -> BatchJobRunner:
+        # 두 파이프라인 모듈의 Agent가 같은 배치에 섞이므로 Agent 이름으로 모듈을 골라 응답
+        backends = {name: stub_backend(module) for module in (main, prompt_optimizer) for name in _agents_by_name(module)}
+
+        class RoutingBackend:
+            async def complete(self, request: ModelRequest):
+                return await backends[request.agent].complete(request)
+
+        endpoint = LocalBatchEndpoint(os.path.join(work_dir, "endpoint"), RoutingBackend(), completion_delay_s=0.2)
+        return BatchJobRunner(endpoint, checkpoint_path, settle_ms=30, poll_interval_s=0.05)
+
+    # 1차 실행: 두 번째 배치를 제출한 직후 중단 (프로세스 종료를 흉내)
+    runner = new_runner()
+    with contextlib.redirect_stdout(io.StringIO()):
+        bulk = asyncio.create_task(run_bulk_pipelines(runner, _bulk_pipelines(library_size)))
+        while runner.job_stats.submitted_batches < 2 and not bulk.done():
+            await asyncio.sleep(0.01)
+        bulk.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await bulk
+    print(
+        f"   1차 실행 중단: 배치 {runner.job_stats.submitted_batches}개 제출 (요청 {runner.job_stats.submitted_requests}개), "
+        f"체크포인트 응답 {len(runner.state.responses)}개, 진행 중 배치 {len(runner.state.batches)}개"
+    )
+
+    # 2차 실행: 같은 체크포인트로 재개
+    runner = new_runner()
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        results = await run_bulk_pipelines(runner, _bulk_pipelines(library_size))
+    elapsed = time.perf_counter() - started
+    stats = runner.job_stats
+    print(
+        f"   2차 실행 재개: {elapsed * 1000:.1f} ms | 웨이브 {stats.waves}개 | 새 배치 {stats.submitted_batches}개 "
+        f"(요청 {stats.submitted_requests}개) | 이어서 폴링한 배치 {stats.resumed_batches}개 | 재생한 응답 {stats.replayed_responses}개"
+    )
+    completed = sum(result is not None for result in results.values())
+    print(f"   완료된 파이프라인: {completed}/{len(results)}, 오류 {len(runner.state.errors)}개")
+
+    # 3차 실행: 모두 완료된 상태에서는 아무것도 제출하지 않음
+    runner = new_runner()
+    await run_bulk_pipelines(runner, _bulk_pipelines(library_size))
+    print(f"   3차 실행: 건너뛴 파이프라인 {runner.job_stats.skipped_pipelines}개, 제출한 배치 {runner.job_stats.submitted_batches}개")
+    shutil.rmtree(work_dir, ignore_errors=True)
+
+async def benchmark_prompt_cache(cache_min_tokens: int = 256) -> None:
+    """prefix 안정 요청 구성의 공급자 프롬프트 캐시 적중률 (스텁 캐시 최소 prefix {cache_min_tokens} 토큰)"""
+    print(f"\n🧊 프롬프트 캐시 적중률 (스텁 캐시 최소 prefix {cache_min_tokens} 토큰, 128 토큰 블록)")
+    print("-" * 60)
+    runner = LLMRunner(stub_backend(main, cache_min_tokens=cache_min_tokens))
+    set_default_llm_runner(runner)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            for developer_message in benchmark_developer_messages(5):
+                await main.optimize_prompt_parallel(developer_message, benchmark_messages()[:4])
+    finally:
+        set_default_llm_runner(None)
+    for name, stats in runner.metrics()["agents"].items():
+        print(f"   {name:<28} 호출 {stats['calls']:2d}회 | 입력 토큰 {stats['input_tokens']:6d} | 캐시 적중률 {stats['cache_hit_ratio']:.1%}")
+
+    # 같은 개발자 메시지로 예제 묶음을 나눠 검사할 때: 반복 키를 앞에 두는 직렬화 vs 키 정렬 직렬화
+    developer_message = benchmark_developer_message()
+    messages = benchmark_messages(18)
+    chunks = [messages[i:i + 2] for i in range(0, len(messages), 2)]
+    for label, serialize in (("반복 키 우선 (serialize_payload)", serialize_payload), ("키 정렬 (sort_keys)", canonical_json)):
+        runner = LLMRunner(stub_backend(main, cache_min_tokens=cache_min_tokens))
+        set_default_llm_runner(runner)
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                for chunk in chunks:
+                    fs_input = {
+                        "DEVELOPER_MESSAGE": developer_message,
+                        "USER_EXAMPLES": [m.content for m in chunk if m.role == "user"],
+                        "ASSISTANT_EXAMPLES": [m.content for m in chunk if m.role == "assistant"],
+                    }
+                    await main.Runner.run(main.fewshot_consistency_checker, serialize(fs_input))
+        finally:
+            set_default_llm_runner(None)
+        total = runner.metrics()["total"]
+        print(f"   few-shot 검사 {len(chunks)}회, {label:<32} 캐시 적중률 {total['cache_hit_ratio']:.1%} | 평균 지연 {total['average_latency_ms']:.1f} ms")
+
+def _sample_outputs() -> Dict[Any, str]:
+    """출력 타입별 응답 예시 (검증기 벤치마크용)"""
+    issues = {"has_issues": True, "issues": ["JSON 스키마 정의가 명확하지 않습니다"]}
+    return {
+        main.Issues: main.json.dumps(issues),
+        main.FewShotIssues: main.json.dumps({**issues, "rewrite_suggestions": ["예제 1을 수정"]}),
+        main.FusedIssues: main.json.dumps({"format": issues, "contradiction": {"has_issues": False, "issues": []}}),
+        main.DevRewriteOutput: main.json.dumps({"new_developer_message": benchmark_developer_message()}),
+        main.MessagesOutput: main.json.dumps({"messages": [m.model_dump() for m in benchmark_messages()]}),
+        prompt_optimizer.Issues: main.json.dumps({**issues, "severity": "high", "category": "clarity"}),
+        prompt_optimizer.OptimizedPrompt: prompt_optimizer.OptimizedPrompt(
+            original_prompt="Write a blog post about AI.", optimized_prompt=benchmark_prompt(),
+            changes_made=["역할 정의 추가"], improvement_explanation="명확성 개선", estimated_improvement=30.0
+        ).model_dump_json(),
+        prompt_optimizer.FeedbackAnalysis: prompt_optimizer.FeedbackAnalysis(
+            understood_feedback="더 짧게", feedback_category="format", required_changes=["길이 제한"],
+            revision_strategy="응답 길이 제한 추가", estimated_impact=6.0
+        ).model_dump_json(),
+        prompt_optimizer.RevisedPrompt: prompt_optimizer.RevisedPrompt(
+            original_optimized_prompt=benchmark_prompt(), user_feedback="더 짧게", revised_prompt=benchmark_prompt(),
+            changes_made=["길이 제한"], feedback_addressed=["더 짧게"], improvement_explanation="피드백 반영"
+        ).model_dump_json(),
+        dict: main.json.dumps({"messages": [m.model_dump() for m in benchmark_messages()]}),
+    }
+
+def benchmark_schema_catalog(repeats: int = 200) -> None:
+    """호출마다 스키마/본문/파서를 만드는 경우와 시작 시점 카탈로그를 쓰는 경우의 호출당 오버헤드"""
+    print(f"\n📚 구조화 출력 스키마 카탈로그 - 호출당 요청 구성 + 응답 검증 오버헤드 (Agent별 {repeats}회)")
+    print("-" * 60)
+    agents = list(_agents_by_name(main).values()) + list(_agents_by_name(prompt_optimizer).values())
+    samples = _sample_outputs()
+    input_data = serialize_payload({"DEVELOPER_MESSAGE": benchmark_developer_message(), "USER_EXAMPLES": ["예시 입력"]})
+
+    def per_call(agent: Any) -> Any:
+        schema = output_schema_for(agent.output_type)
+        request = ModelRequest(agent=agent.name, model=agent.model, instructions=agent.instructions, input=input_data, output_schema=schema)
+        body = serialize_body(chat_completion_body(request))
+        parsed = TypeAdapter(agent.output_type if agent.output_type is not dict else Dict[str, Any]).validate_json(samples[agent.output_type])
+        return body, parsed
+
+    def cataloged(agent: Any) -> Any:
+        spec = default_catalog.compile(agent)
+        spec.build_request(input_data)
+        return spec.body_json(input_data), spec.parse(samples[agent.output_type])
+
+    for agent in agents:
+        assert per_call(agent)[0] == cataloged(agent)[0], agent.name
+    for label, build in (("호출마다 생성", per_call), ("시작 시점 카탈로그", cataloged)):
+        started = time.perf_counter()
+        for _ in range(repeats):
+            for agent in agents:
+                build(agent)
+        elapsed_us = (time.perf_counter() - started) / (repeats * len(agents)) * 1_000_000
+        print(f"   {label:<12} 호출당 {elapsed_us:8.1f} µs (Agent {len(agents)}개, 요청 본문 동일)")
+
+def cascade_prompts(count: int) -> List[str]:
+    """확신도가 높은 프롬프트와 경계에 걸린 프롬프트가 섞인 배치"""
+    templates = [
+        "You are a support agent #{i}. Answer billing questions using the provided FAQ. Format: short bullet list. "
+        "Plan your answer step by step and keep going until the customer issue is resolved. Do not guess; use available tools.",
+        "Help me with my code #{i}.",
+        "You are a travel planner #{i}. Maybe suggest some places? What budget? What dates? Which city? Use the tool to search flights.",
+        "Your task #{i} is to summarize the article in three sentences. Return the summary in a markdown format with a title. Continue until done.",
+    ]
+    return [templates[i % len(templates)].format(i=i) for i in range(count)]
+
+async def benchmark_cascade(count: int = 40, max_concurrency: int = 8) -> None:
+    """모든 섹션을 LLM 검사기로 검사 vs 캐스케이드 (로컬 휴리스틱 우선, 불확실한 섹션만 LLM)"""
+    print(f"\n🪜 캐스케이드 분석 - 프롬프트 {count}개 (공급자 동시 요청 제한 {max_concurrency})")
+    print("-" * 60)
+    prompts = cascade_prompts(count)
+
+    runner = LLMRunner(stub_backend(prompt_optimizer, max_concurrency))
+    set_default_llm_runner(runner)
+    try:
+        started = time.perf_counter()
+        await asyncio.gather(*(_prompt_optimizer_checkers(prompt, False) for prompt in prompts))
+        elapsed = time.perf_counter() - started
+    finally:
+        set_default_llm_runner(None)
+    print(f"   {'LLM 검사기만':<12} {elapsed * 1000:8.1f} ms | 모델 요청 {runner.backend.requests:3d}회")
+
+    runner = LLMRunner(stub_backend(prompt_optimizer, max_concurrency))
+    set_default_llm_runner(runner)
+    try:
+        started = time.perf_counter()
+        batch = await prompt_optimizer.analyze_prompts_cascade(prompts)
+        elapsed = time.perf_counter() - started
+    finally:
+        set_default_llm_runner(None)
+    report = batch["report"]
+    print(
+        f"   {'캐스케이드':<12} {elapsed * 1000:8.1f} ms | 모델 요청 {runner.backend.requests:3d}회 | "
+        f"에스컬레이션 {report['escalated_sections']}/{report['sections']} ({report['escalation_rate']:.0%}) | "
+        f"사유 {report['reasons']}"
+    )
+    print(
+        f"   배치 보고: 휴리스틱 {report['heuristic_ms']:.1f} ms, LLM {report['llm_ms']:.1f} ms, "
+        f"절감한 LLM 호출 {report['llm_calls_saved']}회 (예상 {report['estimated_saved_ms']:.1f} ms)"
+    )
+
+async def benchmark_deadline(deadlines_ms: tuple = (None, 400.0, 150.0, 20.0)) -> None:
+    """마감 시간별 종합 최적화: 건너뛰거나 낮춘 단계와 실제 소요 시간 (단계 비용은 직전 실행들로 학습)"""
+    print("\n⏱️ 마감 시간 기반 종합 최적화 (LLM 모드, 로컬 스텁 모델)")
+    print("-" * 60)
+    prompt = cascade_prompts(1)[0]
+    messages = [
+        prompt_optimizer.ChatMessage(role=msg.role.value, content=msg.content) for msg in benchmark_messages(3)
+    ]
+    set_default_llm_runner(LLMRunner(stub_backend(prompt_optimizer)))
+    try:
+        # 단계 비용 모델을 최근 실행 시간으로 학습
+        for _ in range(3):
+            await prompt_optimizer.optimize_prompt_comprehensive(prompt, messages, coalesce=False)
+        for deadline_ms in deadlines_ms:
+            started = time.perf_counter()
+            result = await prompt_optimizer.optimize_prompt_comprehensive(prompt, messages, coalesce=False, deadline_ms=deadline_ms)
+            elapsed = (time.perf_counter() - started) * 1000
+            stages = (result["deadline"] or {}).get("stages", [])
+            changed = ", ".join(f"{stage['stage']}={stage['status']}" for stage in stages if stage["status"] != "run") or "없음"
+            label = "제한 없음" if deadline_ms is None else f"{deadline_ms:.0f} ms"
+            print(f"   마감 {label:<8} 소요 {elapsed:7.1f} ms | degraded={result['degraded']!s:<5} | 건너뜀/낮춤: {changed}")
+    finally:
+        set_default_llm_runner(None)
+    costs = prompt_optimizer.default_stage_costs.snapshot()
+    print("   학습된 단계 비용(EWMA): " + ", ".join(f"{key} {value['estimate_ms']:.0f}ms" for key, value in costs.items()))
+
+async def _wait_for_jobs(queue: JobQueue, job_ids: List[str], timeout_s: float = 60.0) -> Dict[str, int]:
+    deadline = time.perf_counter() + timeout_s
+    while True:
+        statuses = [queue.get(job_id).status for job_id in job_ids]
+        if all(status in FINISHED_STATUSES for status in statuses) or time.perf_counter() > deadline:
+            break
+        await asyncio.sleep(0.02)
+    counts: Dict[str, int] = {}
+    for status in statuses:
+        counts[status] = counts.get(status, 0) + 1
+    return counts
+
+async def benchmark_job_queue(jobs: int = 60, workers: int = 4) -> None:
+    """비동기 작업 큐 (MCP submit_optimization 백엔드): 제출 지연, 작업 처리, 취소, 서버 재시작 후 재개"""
+    print(f"\n📮 비동기 작업 큐 - 최적화 작업 {jobs}개 (워커 {workers}개, LLM 모드 스텁 모델)")
+    print("-" * 60)
+    work_dir = tempfile.mkdtemp(prefix="benchmark_jobs_")
+    db_path = os.path.join(work_dir, "jobs.db")
+    prompts = cascade_prompts(jobs)
+
+    async def optimize(params: Dict[str, Any], progress_callback: Any) -> Dict[str, Any]:
+        return await prompt_optimizer.optimize_prompt_comprehensive(params["prompt"], progress_callback=progress_callback)
+
+    set_default_llm_runner(LLMRunner(stub_backend(prompt_optimizer)))
+    try:
+        started = time.perf_counter()
+        await optimize({"prompt": prompts[0]}, None)
+        sync_ms = (time.perf_counter() - started) * 1000
+
+        # 1차 실행: 모두 제출하고 일부가 끝난 시점에 워커 중단 (서버 재시작 흉내)
+        queue = JobQueue(db_path)
+        pool = JobWorkerPool(queue, {"optimize_prompt": optimize}, concurrency=workers)
+        started = time.perf_counter()
+        job_ids = [queue.submit("optimize_prompt", {"prompt": prompt}) for prompt in prompts]
+        submit_ms = (time.perf_counter() - started) * 1000 / jobs
+        pool.cancel(job_ids[-1])
+        pool.start()
+        await asyncio.sleep(0.3)
+        before_restart = queue.counts()
+        released = await pool.stop()
+        queue.close()
+
+        # 2차 실행: 같은 큐 파일로 다시 시작 - 정상 종료한 워커가 돌려놓은 작업을 이어서 처리
+        queue = JobQueue(db_path)
+        pool = JobWorkerPool(queue, {"optimize_prompt": optimize}, concurrency=workers)
+        pool.start()
+        counts = await _wait_for_jobs(queue, job_ids)
+        elapsed = time.perf_counter() - started
+        await pool.stop()
+        rerun = sum(queue.get(job_id).attempts > 1 for job_id in job_ids)
+        queue.close()
+    finally:
+        set_default_llm_runner(None)
+        shutil.rmtree(work_dir, ignore_errors=True)
+    print(f"   동기 최적화 1건: {sync_ms:7.1f} ms (optimize_prompt 도구 호출이 이만큼 점유됨)")
+    print(f"   작업 제출: {submit_ms:7.2f} ms/작업 (submit_optimization은 작업 ID만 바로 반환)")
+    print(f"   재시작 전 상태 {before_restart} -> 종료 시 실행 중이던 {released}개 작업 반환 ({rerun}개 재실행)")
+    print(f"   전체 처리 {elapsed * 1000:.1f} ms, 최종 상태 {counts}")
+
+async def benchmark_bulk_tools(count: int = 80, max_concurrency: int = 8, page_size: int = 25) -> None:
+    """프롬프트마다 analyze 도구를 한 번씩 호출 vs analyze_prompts_batch 한 번 (동시 실행 제한 + 페이지)"""
+    print(f"\n📚 대량 분석 도구 - 프롬프트 {count}개 (LLM 모드 스텁 모델, 동시 실행 {max_concurrency})")
+    print("-" * 60)
+    prompts = cascade_prompts(count)
+    set_default_llm_runner(LLMRunner(stub_backend(prompt_optimizer)))
+    try:
+        # 호스트가 도구 호출을 하나씩 보내고 응답을 기다리는 경우
+        started = time.perf_counter()
+        for prompt in prompts:
+            serialize_body(await prompt_optimizer.analyze_prompt(prompt))
+        sequential = time.perf_counter() - started
+
+        started = time.perf_counter()
+
+        async def analyze(prompt: str) -> Dict[str, Any]:
+            result = await prompt_optimizer.analyze_prompt(prompt)
+            return {"total_issues_found": result["total_issues_found"]}
+
+        pager = ResultPager()
+        results = await run_bounded(prompts, analyze, max_concurrency)
+        page = pager.first_page(results, page_size)
+        pages = 1
+        while page["next_cursor"]:
+            page = pager.next_page(page["next_cursor"], page_size)
+            pages += 1
+        batched = time.perf_counter() - started
+    finally:
+        set_default_llm_runner(None)
+    print(f"   도구 호출 {count}회 (순차): {sequential * 1000:8.1f} ms")
+    print(f"   대량 도구 1회 + 페이지 {pages}개: {batched * 1000:8.1f} ms ({sequential / batched:.1f}배 빠름)")
+
+def _parse_markdown_result(text: str) -> Dict[str, Any]:
+    """기계 클라이언트가 마크다운 결과에서 필드를 다시 꺼내는 방식"""
+    lines = text.splitlines()
+    fence = [index for index, line in enumerate(lines) if line == "```"]
+    parsed: Dict[str, Any] = {"optimized_prompt": "\n".join(lines[fence[0] + 1:fence[1]])}
+    for line in lines:
+        if line.startswith("- **발견된 문제**"):
+            parsed["total_issues_found"] = int(line.split(":", 1)[1].strip().rstrip("개"))
+        elif line.startswith("- **예상 개선율**"):
+            parsed["estimated_improvement"] = float(line.split(":", 1)[1].strip().rstrip("%"))
+    section = None
+    parsed["analysis_results"] = []
+    for line in lines[fence[1] + 1:]:
+        if line.startswith("## "):
+            section = line
+        elif section and "문제점" in section and line[:1].isdigit():
+            # 분석 결과는 dict repr로 출력되므로 문자열 그대로만 얻을 수 있음
+            parsed["analysis_results"].append(line.split(". ", 1)[1])
+    return parsed
+
+async def benchmark_structured_results(repeats: int = 500) -> None:
+    """큰 프롬프트의 최적화 결과: 마크다운 결과 vs JSON 결과(필드 선택 + 해시 참조) - 크기와 클라이언트 파싱 시간"""
+    from mcp_server import OPTIMIZATION_FIELDS, PromptOptimizerMCPServer
+    from structured_results import known_refs, resolve_refs, structured_json, to_structured
+
+    print(f"\n🧾 구조화된 도구 결과 - 큰 프롬프트 최적화 결과 (파싱 {repeats}회 평균)")
+    print("-" * 60)
+    prompt = benchmark_prompt()
+    result = await prompt_optimizer.optimize_prompt_comprehensive(prompt, coalesce=False)
+    # 설치된 mcp 버전에서는 Server를 만들 수 없으므로 포맷터만 사용 (서버 상태를 쓰지 않음)
+    formatter = PromptOptimizerMCPServer.__new__(PromptOptimizerMCPServer)
+    first = to_structured(result, None, OPTIMIZATION_FIELDS, [prompt])
+    # 다시 조회할 때(get_job_result 재조회, 수정 반복)는 이전 응답의 본문을 known_refs로 알려 줌
+    known = {**known_refs([prompt]), **first["blobs"]}
+    summary_fields = ["optimized_prompt", "total_issues_found"]
+    cases = [
+        ("마크다운", formatter._format_optimization_result(result, True), _parse_markdown_result),
+        ("JSON 기본 필드", structured_json(first), None),
+        ("JSON 필드 2개", structured_json(to_structured(result, summary_fields, (), [prompt])), None),
+        ("JSON 재조회", structured_json(to_structured(result, None, OPTIMIZATION_FIELDS, [prompt], list(first["blobs"]))), None),
+    ]
+
+    def parse_json(text: str) -> Dict[str, Any]:
+        payload = json.loads(text)
+        return resolve_refs(payload["result"], payload["blobs"], known)
+
+    for label, text, parse in cases:
+        parse = parse or parse_json
+        parsed = parse(text)
+        assert parsed["optimized_prompt"] == result["optimized_prompt"], label
+        started = time.perf_counter()
+        for _ in range(repeats):
+            parse(text)
+        parse_us = (time.perf_counter() - started) / repeats * 1_000_000
+        print(f"   {label:<14} {len(text.encode('utf-8')):7d} bytes | 클라이언트 파싱 {parse_us:7.1f} µs")
+
+async def benchmark_artifact_refs() -> None:
+    """큰 프롬프트의 최적화 -> 재최적화 -> 피드백 수정 2회: 매번 본문 전송 vs 해시 참조 (요청 + 응답 바이트)"""
+    from artifact_store import ArtifactStore
+    from mcp_server import PromptOptimizerMCPServer
+    from structured_results import blob_ref, known_refs, resolve_refs
+
+    print("\n🔗 내용 해시 리소스 - 큰 프롬프트 왕복 4회 (요청 + 응답 바이트)")
+    print("-" * 60)
+    prompt = benchmark_prompt()
+    feedbacks = ["Make the rules more concise.", "Add an example summary table."]
+
+    def wire_bytes(arguments: Dict[str, Any], response: List[Any]) -> int:
+        return len(json.dumps(arguments, ensure_ascii=False).encode("utf-8")) + sum(len(item.text.encode("utf-8")) for item in response)
+
+    async def session(use_refs: bool) -> tuple:
+        # 설치된 mcp 버전에서는 Server를 만들 수 없으므로 도구 처리 메서드만 사용 (self.server를 쓰지 않음)
+        server = PromptOptimizerMCPServer.__new__(PromptOptimizerMCPServer)
+        server.artifacts = ArtifactStore()
+        server.shards = None
+        known = known_refs([prompt])
+        sizes: List[int] = []
+
+        async def call(handler, arguments: Dict[str, Any]) -> Dict[str, Any]:
+            arguments = {**arguments, "response_format": "json"}
+            if use_refs:
+                arguments["known_refs"] = list(known)
+            response = await handler(arguments)
+            sizes.append(wire_bytes(arguments, response))
+            payload = json.loads(response[0].text)
+            known.update(payload["blobs"])
+            return {**resolve_refs(payload["result"], payload["blobs"], known), "resource": payload["resource"]}
+
+        first = await call(server._handle_optimize_prompt, {"prompt": prompt})
+        again = await call(server._handle_optimize_prompt, {"prompt_ref": blob_ref(prompt)} if use_refs else {"prompt": prompt})
+        assert again["optimized_prompt"] == first["optimized_prompt"]
+        current = first["optimized_prompt"]
+        known.update(known_refs([current]))
+        for feedback in feedbacks:
+            arguments = {"optimized_prompt_ref": blob_ref(current)} if use_refs else {"optimized_prompt": current}
+            revised = await call(server._handle_revise_with_feedback, {**arguments, "user_feedback": feedback})
+            current = revised["revised_prompt"]
+            known.update(known_refs([current]))
+        # 같은 서버의 다른 클라이언트는 URI만으로 수정 체인과 최적화 결과를 공유
+        chain = json.loads(server._read_resource(revised["resource"]))
+        assert len(chain) == len(feedbacks) + 1 and resolve_refs(chain[-1]["prompt"], {}, known) == current
+        assert json.loads(server._read_resource(first["resource"]))["original_prompt"] == {"$ref": blob_ref(prompt)}
+        server.artifacts.close()
+        return sizes, current
+
+    text_sizes, text_final = await session(use_refs=False)
+    ref_sizes, ref_final = await session(use_refs=True)
+    assert text_final == ref_final
+    labels = ["최적화", "재최적화", "피드백 수정 1", "피드백 수정 2"]
+    for label, text_size, ref_size in zip(labels, text_sizes, ref_sizes):
+        print(f"   {label:<12} 본문 전송 {text_size:6d} bytes | 해시 참조 {ref_size:6d} bytes")
+    print(f"   {'합계':<12} 본문 전송 {sum(text_sizes):6d} bytes | 해시 참조 {sum(ref_sizes):6d} bytes "
+          f"({sum(text_sizes) / sum(ref_sizes):.1f}배 작음)")
+
+async def benchmark_mcp_client_pool(spawn_requests: int = 3, pooled_requests: int = 32) -> None:
+    """MCP 도구 호출: 요청마다 서버 프로세스 생성 + 초기화 vs 미리 띄운 세션 풀 (로컬 스텁 서버, stdio)"""
+    from mcp_client_pool import MCPClientPool, StdioSession, tool_text
+
+    print("\n🔌 MCP 클라이언트 풀 - 요청마다 서버 생성 vs 세션 풀 (로컬 스텁 서버)")
+    print("-" * 60)
+    directory = os.path.dirname(os.path.abspath(__file__))
+    stub = [os.path.join(directory, "mcp_stub_server.py")]
+    prompts = [f"Summarize the weekly report for team {index}." for index in range(pooled_requests)]
+
+    # 요청마다 프로세스를 띄우고 initialize한 뒤 닫음 (기존 test_mcp_client 방식)
+    started = time.perf_counter()
+    for prompt in prompts[:spawn_requests]:
+        session = StdioSession(sys.executable, stub, cwd=directory)
+        await session.start()
+        result = await session.call_tool("optimize_prompt", {"prompt": prompt})
+        await session.close()
+    spawn_ms = (time.perf_counter() - started) * 1000 / spawn_requests
+    assert "optimized_prompt" in json.loads(tool_text(result))
+
+    # 세션 2개를 미리 띄워 두고 요청을 동시에 파이프라이닝
+    pool = MCPClientPool.stdio(sys.executable, stub, cwd=directory, size=2)
+    started = time.perf_counter()
+    await pool.start()
+    warmup_ms = (time.perf_counter() - started) * 1000
+    started = time.perf_counter()
+    results = await asyncio.gather(*(pool.call_tool("optimize_prompt", {"prompt": prompt}) for prompt in prompts))
+    pooled_ms = (time.perf_counter() - started) * 1000
+    assert all("optimized_prompt" in json.loads(tool_text(result)) for result in results)
+    metrics = pool.metrics()
+    await pool.close()
+    latency = metrics["latency"]["optimize_prompt"]
+
+    # 도구 호출 4번마다 서버 프로세스가 죽어도 재연결 후 재시도로 모든 요청 성공
+    async with MCPClientPool.stdio(sys.executable, stub + ["--exit-after", "4"], cwd=directory, size=1) as flaky:
+        for prompt in prompts[:12]:
+            await flaky.call_tool("analyze_prompt", {"prompt": prompt})
+        flaky_metrics = flaky.metrics()
+    assert flaky_metrics["errors"] == 0 and flaky_metrics["reconnects"] >= 2
+
+    print(f"   요청마다 서버 생성: {spawn_ms:8.1f} ms/요청 ({spawn_requests}개 순차)")
+    print(f"   세션 풀 (2개):     {pooled_ms / pooled_requests:8.1f} ms/요청 ({pooled_requests}개 동시, 최대 동시 {metrics['max_in_flight']}개, "
+          f"p50 {latency['p50_ms']:.1f} ms / p99 {latency['p99_ms']:.1f} ms)")
+    print(f"   풀 준비 (1회):     {warmup_ms:8.1f} ms | 요청당 {spawn_ms / (pooled_ms / pooled_requests):.0f}배 빠름")
+    print(f"   서버 장애 흉내:    요청 12개 성공, 재연결 {flaky_metrics['reconnects']}회, 재시도 {flaky_metrics['retries']}회")
+
+async def benchmark_sharded_service(distinct: int = 24, repeats: int = 4, workers: int = 2) -> None:
+    """반복되는 프롬프트 작업 부하: 단일 프로세스 vs 해시 친화 라우팅 워커 프로세스 + 워커 추가 시 키 이동 비율"""
+    from sharded_service import HashRing, ShardedOptimizerService
+    from structured_results import blob_ref
+
+    print(f"\n🧩 샤딩된 최적화 서비스 - 프롬프트 {distinct}개 x {repeats}회, 워커 {workers}개 (CPU {os.cpu_count()}개)")
+    print("-" * 60)
+    base = benchmark_prompt()
+    prompts = [f"{base}\n- Team {index} owns metric_{index} and reviews it every Monday." for index in range(distinct)]
+    workload = prompts * repeats
+    random.Random(7).shuffle(workload)
+
+    started = time.perf_counter()
+    for prompt in workload:
+        await prompt_optimizer.optimize_prompt_comprehensive(prompt)
+    single_ms = (time.perf_counter() - started) * 1000
+
+    async with ShardedOptimizerService(workers=workers) as service:
+        started = time.perf_counter()
+        results = await asyncio.gather(*(service.optimize(prompt) for prompt in workload))
+        sharded_ms = (time.perf_counter() - started) * 1000
+        loads = await service.load()
+        assignment = {prompt: service.worker_for(prompt) for prompt in prompts}
+    assert all(result["optimized_prompt"] for result in results)
+    hits = sum(load.cache_hits + load.coalesced for load in loads)
+    misses = sum(load.cache_misses for load in loads)
+    assert misses == distinct and all(load.cache_entries == list(assignment.values()).count(load.worker_id) for load in loads)
+
+    # 같은 캐시를 두고 라운드 로빈으로 보냈다면 - 워커마다 처음 보는 프롬프트는 모두 캐시 실패
+    seen = [set() for _ in range(workers)]
+    round_robin_misses = 0
+    for index, prompt in enumerate(workload):
+        if prompt not in seen[index % workers]:
+            seen[index % workers].add(prompt)
+            round_robin_misses += 1
+
+    # 워커 4 -> 5개: 일관된 해싱 vs 나머지(mod) 해싱으로 담당 워커가 바뀌는 키 비율
+    keys = [blob_ref(f"prompt-{index}") for index in range(10000)]
+    ring = HashRing([f"w{index}" for index in range(4)])
+    before = [ring.node_for(key) for key in keys]
+    ring.add("w4")
+    ring_moved = sum(old != ring.node_for(key) for old, key in zip(before, keys)) / len(keys)
+    mod_moved = sum(int(key[7:], 16) % 4 != int(key[7:], 16) % 5 for key in keys) / len(keys)
+
+    print(f"   단일 프로세스 (캐시 없음): {single_ms:8.1f} ms ({len(workload) / single_ms * 1000:6.1f} 요청/초)")
+    print(f"   워커 {workers}개 (동시, 캐시): {sharded_ms:8.1f} ms ({len(workload) / sharded_ms * 1000:6.1f} 요청/초)")
+    print(f"   캐시 적중: 해시 친화 {hits}/{len(workload)} (실패 {misses}) | 라운드 로빈이었다면 실패 {round_robin_misses}")
+    for load in loads:
+        print(f"   {load.worker_id}: 키 범위 {load.key_share:.1%}, 요청 {load.requests}, 적중 {load.cache_hits}, 처리 {load.busy_ms:.0f} ms")
+    if (os.cpu_count() or 1) < 2:
+        print("   ⚠️ CPU 1개 환경이므로 처리량 차이는 워커 캐시 효과이며 코어 수에 따른 확장은 측정되지 않음")
+    print(f"   워커 4->5개 키 이동: 일관된 해싱 {ring_moved:.1%} | mod 해싱 {mod_moved:.1%}")
+
+async def benchmark_shared_result_cache(distinct: int = 8, repeats: int = 3, replicas: int = 3) -> None:
+    """레플리카별 프로세스 캐시 vs 공유 캐시 백엔드(SQLite, Redis 프로토콜 스텁) + 값 인코딩 크기 + 무효화/TTL"""
+    from cache_backend import (
+        MemoryCacheBackend, RedisCacheBackend, ResultCache, SQLiteCacheBackend, decode_value, encode_value,
+        get_default_result_cache, set_default_result_cache
+    )
+    from redis_stub_server import LocalRedisServer
+
+    print(f"\n🗄️ 공유 결과 캐시 - 프롬프트 {distinct}개 x {repeats}회를 레플리카 {replicas}개가 번갈아 처리 (LLM 모드, 로컬 스텁 모델)")
+    print("-" * 60)
+    result = await prompt_optimizer.optimize_prompt_comprehensive(benchmark_prompt(), coalesce=False)
+    as_json = json.dumps(result, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    encoded = encode_value(result)
+    assert decode_value(encoded) == json.loads(as_json)
+    started = time.perf_counter()
+    for _ in range(100):
+        decode_value(encode_value(result))
+    codec_us = (time.perf_counter() - started) * 1e6 / 100
+    print(
+        f"   값 인코딩: JSON {len(as_json):,} B | JSON+zlib {len(zlib.compress(as_json, 6)):,} B | "
+        f"이진 {len(encoded):,} B (인코딩+디코딩 {codec_us:.0f} µs)"
+    )
+
+    workload = cascade_prompts(distinct) * repeats
+    previous_cache = get_default_result_cache()
+    cache_dir = tempfile.mkdtemp(prefix="benchmark_cache_")
+    redis_server = LocalRedisServer()
+    redis_server.start()
+    setups = [
+        ("레플리카별 메모리", lambda: [ResultCache(MemoryCacheBackend()) for _ in range(replicas)]),
+        ("공유 SQLite", lambda: [ResultCache(SQLiteCacheBackend(os.path.join(cache_dir, "cache.db"))) for _ in range(replicas)]),
+        ("공유 Redis 스텁", lambda: [ResultCache(RedisCacheBackend(redis_server.url)) for _ in range(replicas)]),
+    ]
+    try:
+        for label, make_caches in setups:
+            caches = make_caches()
+            runner = LLMRunner(stub_backend(prompt_optimizer))
+            set_default_llm_runner(runner)
+            started = time.perf_counter()
+            for index, prompt in enumerate(workload):
+                # 레플리카는 요청을 번갈아 받음 (같은 프롬프트의 반복 요청이 다른 레플리카로 감)
+                set_default_result_cache(caches[index % replicas])
+                await prompt_optimizer.optimize_prompt_comprehensive(prompt)
+            elapsed = time.perf_counter() - started
+            set_default_llm_runner(None)
+            hits = sum(cache.stats.hits for cache in caches)
+            lookups = hits + sum(cache.stats.misses for cache in caches)
+            stored = sum(cache.stats.bytes_written for cache in caches)
+            print(
+                f"   {label:<12} {elapsed * 1000:8.1f} ms | 모델 요청 {runner.backend.requests:3d}회 | "
+                f"캐시 적중 {hits}/{lookups} | 저장 {stored:,} B"
+            )
+            for cache in caches:
+                cache.backend.close()
+
+        # 명시적 무효화와 지시문 버전 변경: 다른 레플리카가 저장한 항목 중 영향받는 것만 버림
+        writer, reader = ResultCache(RedisCacheBackend(redis_server.url)), ResultCache(RedisCacheBackend(redis_server.url))
+        prompt = workload[0]
+        set_default_result_cache(writer)
+        await prompt_optimizer.optimize_prompt_comprehensive(prompt)
+        set_default_result_cache(reader)
+        reader.invalidate(prompt_optimizer.prompt_optimizer.name)
+        await prompt_optimizer.optimize_prompt_comprehensive(prompt)
+        invalidated = reader.stats.model_copy()
+        original_instructions = prompt_optimizer.clarity_checker.instructions
+        prompt_optimizer.clarity_checker.instructions = original_instructions + " Flag vague role definitions."
+        try:
+            await prompt_optimizer.optimize_prompt_comprehensive(prompt)
+        finally:
+            prompt_optimizer.clarity_checker.instructions = original_instructions
+        print(
+            f"   무효화: invalidate('prompt_optimizer') 후 버린 항목 {invalidated.stale}개, 재사용한 검사기 결과 {invalidated.hits}개 | "
+            f"clarity 지시문 변경 후 버린 항목 {reader.stats.stale - invalidated.stale}개, 재사용 {reader.stats.hits - invalidated.hits}개"
+        )
+        short_lived = ResultCache(RedisCacheBackend(redis_server.url), ttl_s=0.05, key_prefix="benchmark-ttl:")
+        _, stamp = short_lived.lookup("ttl", "key", [prompt_optimizer.prompt_optimizer])
+        short_lived.store("ttl", "key", stamp, result)
+        fresh = short_lived.lookup("ttl", "key", [prompt_optimizer.prompt_optimizer])[0] is not None
+        await asyncio.sleep(0.06)
+        expired = short_lived.lookup("ttl", "key", [prompt_optimizer.prompt_optimizer])[0] is None
+        print(f"   TTL 50ms: 저장 직후 적중 {fresh}, 60ms 후 만료 {expired} | 스텁 서버 명령 {redis_server.store.commands}회")
+        assert invalidated.stale == 1 and reader.stats.stale == 3 and fresh and expired
+    finally:
+        set_default_result_cache(previous_cache)
+        redis_server.stop()
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+def _percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+async def _timed_call(agent: Any, input_data: str) -> Any:
+    started = time.perf_counter()
+    try:
+        await main.Runner.run(agent, input_data)
+        failed = False
+    except Exception:
+        failed = True
+    return (time.perf_counter() - started) * 1000, failed
+
+async def benchmark_resilience(waves: int = 8, wave_size: int = 50) -> None:
+    """오류 5%, 지연 꼬리 3%(2초)를 주입한 스텁 모델에서 호출별 지연 분포: 기본 실행기 vs 복원력 실행기"""
+    calls = waves * wave_size
+    print(f"\n🛡️ 복원력 계층 - format_checker 호출 {calls}회 (주입: 오류 5%, 3% 확률로 2초 지연)")
+    print("-" * 60)
+    inputs = benchmark_developer_messages(wave_size)
+
+    def faulty_backend() -> FaultInjectingBackend:
+        return FaultInjectingBackend(stub_backend(main), error_rate=0.05, slow_rate=0.03, slow_ms=2000, seed=7)
+
+    runners = [
+        ("기본 실행기", LLMRunner(faulty_backend())),
+        ("복원력 실행기", ResilientRunner(
+            faulty_backend(), timeouts={"format_checker": 1.0}, backoff_base_s=0.05, rng=random.Random(7)
+        )),
+    ]
+    for label, runner in runners:
+        set_default_llm_runner(runner)
+        latencies: List[float] = []
+        failures = 0
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                for _ in range(waves):
+                    for latency_ms, failed in await asyncio.gather(*(_timed_call(main.format_checker, text) for text in inputs)):
+                        latencies.append(latency_ms)
+                        failures += failed
+        finally:
+            set_default_llm_runner(None)
+        print(
+            f"   {label:<10} p50 {_percentile(latencies, 0.5):7.1f} ms | p99 {_percentile(latencies, 0.99):7.1f} ms | "
+            f"최대 {max(latencies):7.1f} ms | 실패 {failures}건"
+        )
+    stats = runners[1][1].resilience_stats
+    print(
+        f"   복원력 실행기: 재시도 {stats.retries}회, 헤지 {stats.hedges}회 (헤지 승리 {stats.hedge_wins}회), "
+        f"시간 초과 {stats.timeouts}회, 로컬 휴리스틱 대체 {stats.unavailable}회"
+    )
+
+    # 공급자 장애: 서킷이 열리면 모델을 호출하지 않고 바로 로컬 휴리스틱으로 대체
+    backend = faulty_backend()
+    backend.outage = True
+    runner = ResilientRunner(backend, backoff_base_s=0.05, breaker=CircuitBreaker(failure_threshold=5, reset_timeout_s=30))
+    set_default_llm_runner(runner)
+    try:
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            results = await asyncio.gather(*(main.Runner.run(main.format_checker, text) for text in inputs))
+        elapsed = time.perf_counter() - started
+    finally:
+        set_default_llm_runner(None)
+    stats = runner.resilience_stats
+    print(
+        f"   공급자 장애: {len(results)}회 호출 {elapsed * 1000:.1f} ms, 모두 로컬 휴리스틱 결과 "
+        f"(서킷 {runner.breaker.state}, 차단 {stats.short_circuits}회, 모델 요청 {backend.injected_errors}회)"
+    )
+
+async def run_benchmarks() -> None:
+    print("🏁 프롬프트 최적화 벤치마크")
+    print("=" * 60)
+    await benchmark_fused_checkers()
+    await benchmark_micro_batching()
+    await benchmark_batch_jobs()
+    await benchmark_prompt_cache()
+    benchmark_schema_catalog()
+    await benchmark_resilience()
+    await benchmark_cascade()
+    await benchmark_deadline()
+    await benchmark_job_queue()
+    await benchmark_bulk_tools()
+    await benchmark_structured_results()
+    await benchmark_artifact_refs()
+    await benchmark_mcp_client_pool()
+    await benchmark_sharded_service()
+    await benchmark_shared_result_cache()
+
+if __name__ == "__main__":
+    asyncio.run(run_benchmarks())
@@ -0,0 +1,76 @@
+"""
+대량 MCP 도구 지원 모듈
+
+optimize_prompts_batch / analyze_prompts_batch 도구는 프롬프트 배열을 받아 서버 안에서 동시 실행 수를 제한해 처리하고,
+항목별로 압축된 결과를 돌려줍니다. 결과가 많으면 첫 페이지만 응답에 담고 나머지는 커서로 이어서 가져갑니다
+(다음 페이지를 요청할 때 프롬프트를 다시 보낼 필요 없음).
+"""
+
+import asyncio
+import collections
+import threading
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence
+
+DEFAULT_BATCH_CONCURRENCY = 8
+MAX_BATCH_CONCURRENCY = 32
+DEFAULT_PAGE_SIZE = 100
+
+async def run_bounded(
+    items: Sequence[Any],
+    worker: Callable[[Any], Awaitable[Dict[str, Any]]],
+    max_concurrency: int = DEFAULT_BATCH_CONCURRENCY
+) -> List[Dict[str, Any]]:
+    """항목마다 worker를 최대 max_concurrency개씩 동시에 실행합니다.
+    결과는 입력 순서대로 {"index": i, ...}이며, 실패한 항목은 배치를 중단하지 않고 {"index": i, "error": ...}가 됩니다."""
+    semaphore = asyncio.Semaphore(max(1, min(max_concurrency, MAX_BATCH_CONCURRENCY)))
+
+    async def run(index: int, item: Any) -> Dict[str, Any]:
+        async with semaphore:
+            try:
+                return {"index": index, **await worker(item)}
+            except Exception as exc:
+                return {"index": index, "error": f"{type(exc).__name__}: {exc}"}
+
+    return await asyncio.gather(*(run(index, item) for index, item in enumerate(items)))
+
+class ResultPager:
+    """배치 결과를 페이지로 나눠 돌려주고 남은 페이지를 커서로 보관합니다 (최근 max_batches개 배치만 유지)"""
+
+    def __init__(self, max_batches: int = 16):
+        self.max_batches = max_batches
+        self._lock = threading.Lock()
+        self._batches: "collections.OrderedDict[str, List[Dict[str, Any]]]" = collections.OrderedDict()
+
+    def first_page(self, results: List[Dict[str, Any]], page_size: int = DEFAULT_PAGE_SIZE, **summary: Any) -> Dict[str, Any]:
+        batch_id = uuid.uuid4().hex
+        if len(results) > page_size:
+            with self._lock:
+                self._batches[batch_id] = results
+                while len(self._batches) > self.max_batches:
+                    self._batches.popitem(last=False)
+        return self._page(batch_id, results, 0, page_size, summary)
+
+    def next_page(self, cursor: str, page_size: int = DEFAULT_PAGE_SIZE) -> Optional[Dict[str, Any]]:
+        """커서("batch_id:offset")의 다음 페이지 (만료되었거나 잘못된 커서면 None)"""
+        batch_id, _, offset = cursor.partition(":")
+        with self._lock:
+            results = self._batches.get(batch_id)
+        if results is None or not offset.isdigit():
+            return None
+        page = self._page(batch_id, results, int(offset), page_size, {})
+        if page["next_cursor"] is None:
+            with self._lock:
+                self._batches.pop(batch_id, None)
+        return page
+
+    def _page(self, batch_id: str, results: List[Dict[str, Any]], offset: int, page_size: int, summary: Dict[str, Any]) -> Dict[str, Any]:
+        end = offset + page_size
+        return {
+            "batch_id": batch_id,
+            "total": len(results),
+            "offset": offset,
+            **summary,
+            "items": results[offset:end],
+            "next_cursor": f"{batch_id}:{end}" if end < len(results) else None,
+        }
@@ -0,0 +1,477 @@
+"""
+공유 결과 캐시 백엔드 모듈
+
+프로세스 안의 캐시는 Streamlit 레플리카, MCP 서버/샤드 워커, 배치 작업 사이에서 공유되지 않습니다.
+ResultCache는 optimize_prompt_comprehensive 결과와 검사기 출력을 교체 가능한 백엔드에 저장합니다.
+- 백엔드: MemoryCacheBackend (프로세스 내), SQLiteCacheBackend (같은 호스트의 프로세스끼리 파일 공유),
+  RedisCacheBackend (Redis 프로토콜, 여러 호스트가 공유; redis 패키지는 선택 의존성)
+- 값: 태그 + 가변 길이 정수로 된 압축 이진 인코딩 (반복되는 문자열은 앞선 항목을 참조, 큰 값은 zlib 압축)
+- 만료: 항목마다 TTL
+- 무효화: 항목 헤더에 결과가 의존하는 Agent들의 (이름, 모델, 지시문, 세대)를 해시한 스탬프를 기록하고
+  조회 시 현재 스탬프와 비교. 지시문이 바뀐 레플리카는 예전 결과를 쓰지 않으며,
+  invalidate(agent_name)는 백엔드의 세대 카운터를 올려 모든 레플리카에서 해당 Agent에 의존하는 항목을 무효화
+캐시는 PROMPT_OPTIMIZER_CACHE_URL (memory://, sqlite:///경로, redis://호스트:포트/DB)로 설정합니다.
+"""
+
+import collections
+import hashlib
+import json
+import os
+import sqlite3
+import struct
+import threading
+import time
+import zlib
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+from pydantic import BaseModel
+
+CACHE_URL_ENV = "PROMPT_OPTIMIZER_CACHE_URL"
+DEFAULT_TTL_S = 24 * 3600
+DEFAULT_KEY_PREFIX = "prompt-optimizer:"
+
+class CacheBackendError(Exception):
+    """캐시 백엔드에 연결하거나 명령을 실행하지 못한 경우 (ResultCache는 캐시 실패로 처리)"""
+
+# ---- 값 인코딩 ----
+
+# 형식 바이트: 하위 7비트는 형식 버전, 최상위 비트는 zlib 압축 여부
+_FORMAT_VERSION = 1
+_COMPRESSED = 0x80
+COMPRESS_MIN_BYTES = 256
+
+_NONE, _FALSE, _TRUE, _INT, _FLOAT, _STR, _LIST, _DICT, _STR_REF = range(9)
+_DOUBLE = struct.Struct(">d")
+
+def _write_varint(out: bytearray, value: int) -> None:
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+def _read_varint(data: bytes, offset: int) -> Tuple[int, int]:
+    value = shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+def _encode(value: Any, out: bytearray, strings: Dict[str, int]) -> None:
+    if value is None:
+        out.append(_NONE)
+    elif value is True:
+        out.append(_TRUE)
+    elif value is False:
+        out.append(_FALSE)
+    elif isinstance(value, int):
+        out.append(_INT)
+        _write_varint(out, value << 1 if value >= 0 else (-value << 1) - 1)  # zigzag
+    elif isinstance(value, float):
+        out.append(_FLOAT)
+        out += _DOUBLE.pack(value)
+    elif isinstance(value, str):
+        index = strings.get(value)
+        if index is not None:
+            out.append(_STR_REF)
+            _write_varint(out, index)
+            return
+        strings[value] = len(strings)
+        raw = value.encode("utf-8")
+        out.append(_STR)
+        _write_varint(out, len(raw))
+        out += raw
+    elif isinstance(value, (list, tuple)):
+        out.append(_LIST)
+        _write_varint(out, len(value))
+        for item in value:
+            _encode(item, out, strings)
+    elif isinstance(value, dict):
+        out.append(_DICT)
+        _write_varint(out, len(value))
+        for key, item in value.items():
+            _encode(str(key), out, strings)
+            _encode(item, out, strings)
+    elif isinstance(value, BaseModel):
+        _encode(value.model_dump(mode="json"), out, strings)
+    else:
+        raise TypeError(f"cannot encode {type(value).__name__}")
+
+def _decode(data: bytes, offset: int, strings: List[str]) -> Tuple[Any, int]:
+    tag = data[offset]
+    offset += 1
+    if tag == _NONE:
+        return None, offset
+    if tag == _TRUE:
+        return True, offset
+    if tag == _FALSE:
+        return False, offset
+    if tag == _INT:
+        raw, offset = _read_varint(data, offset)
+        return (raw >> 1) ^ -(raw & 1), offset
+    if tag == _FLOAT:
+        return _DOUBLE.unpack_from(data, offset)[0], offset + _DOUBLE.size
+    if tag == _STR:
+        length, offset = _read_varint(data, offset)
+        text = data[offset:offset + length].decode("utf-8")
+        strings.append(text)
+        return text, offset + length
+    if tag == _STR_REF:
+        index, offset = _read_varint(data, offset)
+        return strings[index], offset
+    if tag == _LIST:
+        count, offset = _read_varint(data, offset)
+        items = []
+        for _ in range(count):
+            item, offset = _decode(data, offset, strings)
+            items.append(item)
+        return items, offset
+    if tag == _DICT:
+        count, offset = _read_varint(data, offset)
+        mapping = {}
+        for _ in range(count):
+            key, offset = _decode(data, offset, strings)
+            mapping[key], offset = _decode(data, offset, strings)
+        return mapping, offset
+    raise ValueError(f"unknown tag {tag} at offset {offset - 1}")
+
+def encode_value(value: Any) -> bytes:
+    """JSON으로 표현할 수 있는 값(dict/list/str/int/float/bool/None, pydantic 모델)을 압축 이진 형식으로 인코딩합니다"""
+    out = bytearray()
+    _encode(value, out, {})
+    payload = bytes(out)
+    if len(payload) >= COMPRESS_MIN_BYTES:
+        compressed = zlib.compress(payload, 6)
+        if len(compressed) < len(payload):
+            return bytes([_FORMAT_VERSION | _COMPRESSED]) + compressed
+    return bytes([_FORMAT_VERSION]) + payload
+
+def decode_value(data: bytes) -> Any:
+    if not data or data[0] & 0x7F != _FORMAT_VERSION:
+        raise ValueError("unsupported cache value format")
+    payload = zlib.decompress(data[1:]) if data[0] & _COMPRESSED else data[1:]
+    value, _ = _decode(payload, 0, [])
+    return value
+
+# ---- 백엔드 ----
+
+class CacheBackend:
+    """공유 캐시 백엔드 인터페이스 (키는 문자열, 값은 bytes)"""
+
+    def get_many(self, keys: Sequence[str]) -> List[Optional[bytes]]:
+        """키 목록의 값 (없거나 만료되었으면 None) - Redis에서는 MGET 한 번"""
+        raise NotImplementedError
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.get_many([key])[0]
+
+    def set(self, key: str, value: bytes, ttl_s: Optional[float] = None) -> None:
+        raise NotImplementedError
+
+    def delete(self, *keys: str) -> int:
+        raise NotImplementedError
+
+    def incr(self, key: str) -> int:
+        """정수 카운터를 원자적으로 1 올리고 새 값을 돌려줍니다 (만료 없음, 값은 10진 문자열)"""
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+class MemoryCacheBackend(CacheBackend):
+    """프로세스 안의 LRU 백엔드 (레플리카끼리 공유되지 않음, 단일 프로세스/테스트용)"""
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "collections.OrderedDict[str, Tuple[bytes, Optional[float]]]" = collections.OrderedDict()
+
+    def get_many(self, keys: Sequence[str]) -> List[Optional[bytes]]:
+        now = time.time()
+        values: List[Optional[bytes]] = []
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is not None and entry[1] is not None and entry[1] <= now:
+                    del self._entries[key]
+                    entry = None
+                if entry is not None:
+                    self._entries.move_to_end(key)
+                values.append(entry[0] if entry is not None else None)
+        return values
+
+    def set(self, key: str, value: bytes, ttl_s: Optional[float] = None) -> None:
+        with self._lock:
+            self._entries[key] = (value, time.time() + ttl_s if ttl_s else None)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                # 세대 카운터(만료 없음)는 지우지 않음 - 지우면 무효화 이전 항목이 다시 유효해짐
+                oldest = next((old for old, (_, expires_at) in self._entries.items() if expires_at is not None), None)
+                if oldest is None:
+                    break
+                del self._entries[oldest]
+
+    def delete(self, *keys: str) -> int:
+        with self._lock:
+            return sum(self._entries.pop(key, None) is not None for key in keys)
+
+    def incr(self, key: str) -> int:
+        with self._lock:
+            value = int(self._entries[key][0]) + 1 if key in self._entries else 1
+            self._entries[key] = (str(value).encode(), None)
+            return value
+
+_SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    expires_at REAL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed_at);
+"""
+
+class SQLiteCacheBackend(CacheBackend):
+    """SQLite 파일 백엔드 - 같은 호스트의 여러 프로세스(레플리카, 샤드 워커, 배치 작업)가 파일 하나를 공유"""
+
+    def __init__(self, path: str = "prompt_optimizer_cache.db", max_entries: int = 100000):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        if path != ":memory:":
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SQLITE_SCHEMA)
+
+    def get_many(self, keys: Sequence[str]) -> List[Optional[bytes]]:
+        now = time.time()
+        placeholders = ",".join("?" * len(keys))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT key, value FROM cache WHERE key IN ({placeholders}) AND (expires_at IS NULL OR expires_at > ?)",
+                (*keys, now)
+            ).fetchall()
+            if rows:
+                # 적중한 항목의 사용 시각 갱신 - _prune이 가장 오래 쓰지 않은 항목부터 지우도록 (LRU)
+                self._conn.execute(
+                    f"UPDATE cache SET accessed_at = ? WHERE key IN ({','.join('?' * len(rows))})",
+                    (now, *(key for key, _ in rows))
+                )
+        found = dict(rows)
+        return [found.get(key) for key in keys]
+
+    def set(self, key: str, value: bytes, ttl_s: Optional[float] = None) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, value, now + ttl_s if ttl_s else None, now)
+            )
+            self._writes += 1
+            if self._writes % 256 == 0:
+                self._prune(now)
+
+    def _prune(self, now: float) -> None:
+        self._conn.execute("DELETE FROM cache WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,))
+        count = self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+        if count > self.max_entries:
+            # 세대 카운터(만료 없음)는 남기고 가장 오래 쓰지 않은 항목부터 삭제
+            self._conn.execute(
+                "DELETE FROM cache WHERE key IN (SELECT key FROM cache WHERE expires_at IS NOT NULL ORDER BY accessed_at LIMIT ?)",
+                (count - self.max_entries,)
+            )
+
+    def delete(self, *keys: str) -> int:
+        with self._lock:
+            return self._conn.execute(
+                f"DELETE FROM cache WHERE key IN ({','.join('?' * len(keys))})", keys
+            ).rowcount
+
+    def incr(self, key: str) -> int:
+        with self._lock:
+            row = self._conn.execute(
+                "INSERT INTO cache (key, value, expires_at, accessed_at) VALUES (?, CAST(1 AS BLOB), NULL, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = CAST(CAST(value AS INTEGER) + 1 AS BLOB) RETURNING value",
+                (key, time.time())
+            ).fetchone()
+        return int(row[0])
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+class RedisCacheBackend(CacheBackend):
+    """Redis 프로토콜 백엔드 (redis 패키지 필요) - 여러 호스트의 레플리카가 공유"""
+
+    def __init__(self, url: str = "redis://localhost:6379/0", socket_timeout_s: float = 2.0):
+        try:
+            import redis
+        except ImportError as exc:  # redis는 선택 의존성
+            raise CacheBackendError("RedisCacheBackend를 사용하려면 redis 패키지를 설치하세요 (pip install redis)") from exc
+        self.url = url
+        self._errors: Tuple[type, ...] = (redis.RedisError,)
+        self._client = redis.Redis.from_url(url, socket_timeout=socket_timeout_s, socket_connect_timeout=socket_timeout_s)
+
+    def _call(self, method: str, *args: Any, **kwargs: Any) -> Any:
+        try:
+            return getattr(self._client, method)(*args, **kwargs)
+        except self._errors as exc:
+            raise CacheBackendError(f"Redis {method} 실패: {exc}") from exc
+
+    def get_many(self, keys: Sequence[str]) -> List[Optional[bytes]]:
+        return self._call("mget", list(keys))
+
+    def set(self, key: str, value: bytes, ttl_s: Optional[float] = None) -> None:
+        self._call("set", key, value, px=int(ttl_s * 1000) if ttl_s else None)
+
+    def delete(self, *keys: str) -> int:
+        return self._call("delete", *keys)
+
+    def incr(self, key: str) -> int:
+        return self._call("incr", key)
+
+    def close(self) -> None:
+        self._client.close()
+
+def cache_backend_from_url(url: str) -> CacheBackend:
+    """memory:// | sqlite:///경로 | redis://호스트:포트/DB -> 백엔드"""
+    if url.startswith("memory://"):
+        return MemoryCacheBackend()
+    if url.startswith("sqlite:///"):
+        # sqlite:///상대경로, sqlite:////절대경로, sqlite:/// 만 있으면 메모리 DB
+        return SQLiteCacheBackend(url[len("sqlite:///"):] or ":memory:")
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisCacheBackend(url)
+    raise ValueError(f"unsupported cache url: {url}")
+
+# ---- 결과 캐시 ----
+
+_HEADER = struct.Struct(">8s")  # 의존 Agent 스탬프
+
+class CacheStats(BaseModel):
+    """결과 캐시 통계"""
+    hits: int = 0
+    misses: int = 0
+    stale: int = 0  # 항목은 있었지만 지시문 버전/세대가 달라 버린 수 (misses에 포함)
+    stores: int = 0
+    errors: int = 0  # 백엔드 오류 (캐시 실패로 처리)
+    bytes_written: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+def instructions_version(agent: Any) -> str:
+    """Agent 지시문 버전 (모델과 지시문의 해시 앞 12자리)"""
+    return hashlib.sha256(f"{agent.model}\n{agent.instructions}".encode("utf-8")).hexdigest()[:12]
+
+class ResultCache:
+    """의존 Agent의 지시문 버전과 무효화 세대로 검증하는 공유 결과 캐시.
+
+    backend: 캐시 백엔드
+    ttl_s: 항목 만료 시간 (초)
+    key_prefix: 여러 애플리케이션이 백엔드를 공유할 때 키 충돌을 피하기 위한 접두사
+    """
+
+    def __init__(self, backend: CacheBackend, ttl_s: float = DEFAULT_TTL_S, key_prefix: str = DEFAULT_KEY_PREFIX):
+        self.backend = backend
+        self.ttl_s = ttl_s
+        self.key_prefix = key_prefix
+        self.stats = CacheStats()
+
+    def _entry_key(self, namespace: str, key: str) -> str:
+        return f"{self.key_prefix}{namespace}:{key}"
+
+    def _generation_key(self, agent_name: str) -> str:
+        return f"{self.key_prefix}generation:{agent_name}"
+
+    def _stamp(self, agents: Sequence[Any], generations: Sequence[Optional[bytes]]) -> bytes:
+        parts = [
+            [agent.name, instructions_version(agent), int(generation or 0)]
+            for agent, generation in zip(agents, generations)
+        ]
+        return hashlib.sha256(json.dumps(parts).encode("utf-8")).digest()[:_HEADER.size]
+
+    def lookup(self, namespace: str, key: str, agents: Sequence[Any]) -> Tuple[Optional[Any], bytes]:
+        """(캐시된 값 또는 None, 현재 스탬프). 스탬프는 store()에 그대로 넘깁니다.
+        의존 Agent들의 세대 카운터와 항목을 한 번의 요청으로 읽습니다."""
+        keys = [self._generation_key(agent.name) for agent in agents] + [self._entry_key(namespace, key)]
+        try:
+            values = self.backend.get_many(keys)
+        except CacheBackendError:
+            self.stats.errors += 1
+            self.stats.misses += 1
+            return None, b""
+        stamp = self._stamp(agents, values[:-1])
+        entry = values[-1]
+        if entry is None:
+            self.stats.misses += 1
+            return None, stamp
+        if entry[:_HEADER.size] != stamp:
+            # 다른 지시문 버전으로 만들었거나 무효화 이전 세대의 항목
+            self.stats.stale += 1
+            self.stats.misses += 1
+            return None, stamp
+        self.stats.hits += 1
+        return decode_value(entry[_HEADER.size:]), stamp
+
+    def store(self, namespace: str, key: str, stamp: bytes, value: Any, ttl_s: Optional[float] = None) -> None:
+        if not stamp:
+            return  # 조회 단계에서 백엔드 오류 - 세대를 모르므로 저장하지 않음
+        data = stamp + encode_value(value)
+        try:
+            self.backend.set(self._entry_key(namespace, key), data, ttl_s if ttl_s is not None else self.ttl_s)
+        except CacheBackendError:
+            self.stats.errors += 1
+            return
+        self.stats.stores += 1
+        self.stats.bytes_written += len(data)
+
+    async def get_or_compute(
+        self,
+        namespace: str,
+        key: str,
+        agents: Sequence[Any],
+        compute: Callable[[], Awaitable[Any]],
+        cacheable: Callable[[Any], bool] = lambda value: True
+    ) -> Tuple[Any, bool]:
+        """(결과, 캐시 적중 여부). 캐시에 없으면 compute()를 실행하고 cacheable(결과)이면 저장합니다"""
+        cached, stamp = self.lookup(namespace, key, agents)
+        if cached is not None:
+            return cached, True
+        value = await compute()
+        if cacheable(value):
+            self.store(namespace, key, stamp, value)
+        return value, False
+
+    def invalidate(self, *agent_names: str) -> None:
+        """Agent의 세대를 올려 그 Agent에 의존하는 모든 항목을 모든 레플리카에서 무효화합니다
+        (지시문은 그대로인데 휴리스틱/파서가 바뀐 경우 등)"""
+        for agent_name in agent_names:
+            self.backend.incr(self._generation_key(agent_name))
+
+    def metrics(self) -> Dict[str, Any]:
+        return {**self.stats.model_dump(), "hit_rate": round(self.stats.hit_rate, 3)}
+
+_default_cache: Optional[ResultCache] = None
+
+def set_default_result_cache(cache: Optional[ResultCache]) -> None:
+    """optimize_prompt_comprehensive와 검사기가 사용할 결과 캐시를 등록합니다 (None이면 캐시 없음)"""
+    global _default_cache
+    _default_cache = cache
+
+def get_default_result_cache() -> Optional[ResultCache]:
+    return _default_cache
+
+def result_cache_from_env(environ: Optional[Dict[str, str]] = None) -> Optional[ResultCache]:
+    """PROMPT_OPTIMIZER_CACHE_URL(과 PROMPT_OPTIMIZER_CACHE_TTL_S)로 결과 캐시를 만듭니다 (설정이 없으면 None)"""
+    environ = os.environ if environ is None else environ
+    url = environ.get(CACHE_URL_ENV)
+    if not url:
+        return None
+    return ResultCache(cache_backend_from_url(url), ttl_s=float(environ.get("PROMPT_OPTIMIZER_CACHE_TTL_S", DEFAULT_TTL_S)))
@@ -0,0 +1,206 @@
+"""
+색인 기반 모순 탐지 모듈
+
+프롬프트의 지시문을 (modality, subject, action) 튜플로 파싱하고 subject 용어로 역색인을 만든 뒤,
+같은 subject 용어를 공유하면서 modality가 충돌하는 절 쌍만 비교합니다.
+모든 절 쌍을 비교하지 않으므로 수백 개의 규칙이 있는 프롬프트에서도 거의 선형 시간에 동작하며,
+LLM 모순 검사기에는 전체 프롬프트 대신 후보 쌍만 전달합니다.
+"""
+
+import math
+import re
+from typing import Dict, FrozenSet, List, Optional, Tuple, Union
+
+from pydantic import BaseModel, Field
+
+from prompt_document import LIST_ITEM, PARAGRAPH, PromptDocument, parse_prompt
+
+REQUIRE = "require"
+FORBID = "forbid"
+OPTIONAL = "optional"
+
+# 서로 동시에 따를 수 없는 modality 조합
+CONFLICTING_MODALITIES = frozenset({
+    frozenset({REQUIRE, FORBID}),
+    frozenset({REQUIRE, OPTIONAL}),
+    frozenset({FORBID, OPTIONAL}),
+})
+
+# 금지 -> 선택 -> 필수 순서로 검사하고, 앞에서 매칭된 구간은 지운 뒤 다음 패턴을 검사
+# ("must not"의 "must", "may not"의 "may", "not allowed"의 "allowed"를 다시 세지 않음)
+_MODALITY_PATTERNS: List[Tuple[str, "re.Pattern[str]"]] = [
+    (FORBID, re.compile(
+        r"\b(?:never|must not|mustn't|do not|don't|does not|should not|shouldn't|cannot|can't|"
+        r"may not|avoid|prohibited|forbidden|not allowed)\b", re.IGNORECASE)),
+    (OPTIONAL, re.compile(
+        r"\b(?:optional|optionally|may|if needed|if necessary|acceptable|allowed|permitted|feel free)\b", re.IGNORECASE)),
+    (REQUIRE, re.compile(
+        r"\b(?:always|must|required?|should|ensure|make sure|need to|has to|have to|only)\b", re.IGNORECASE)),
+]
+_MARKER_WORDS = frozenset({
+    "never", "must", "mustn", "not", "do", "don", "does", "should", "shouldn", "cannot", "can", "may", "avoid",
+    "prohibited", "forbidden", "allowed", "optional", "optionally", "if", "needed", "necessary", "acceptable",
+    "permitted", "feel", "free", "always", "require", "required", "ensure", "make", "sure", "need", "has", "have",
+    "only", "t",
+})
+_STOP_WORDS = frozenset({
+    "a", "an", "the", "and", "or", "of", "to", "in", "on", "for", "with", "by", "as", "at", "is", "are", "be",
+    "it", "its", "this", "that", "these", "those", "any", "all", "each", "every", "you", "your", "from", "into",
+    "than", "then", "when", "which", "will", "would", "use", "e", "g", "eg", "etc", "instead", "but", "also",
+    "so", "just", "there", "here", "they", "them", "their", "what", "how", "our", "we", "can", "was", "were",
+})
+_IMPERATIVE_VERBS = frozenset({
+    "answer", "respond", "reply", "output", "return", "emit", "write", "use", "include", "keep", "format",
+    "list", "provide", "add", "ask", "call", "follow", "start", "end", "put", "give", "explain", "mention",
+})
+# 예외/조건 표현이 있으면 한 절 안의 서로 다른 modality는 모순이 아님
+_EXCEPTION_PATTERN = re.compile(r"\b(?:unless|except|otherwise|only if|only when)\b", re.IGNORECASE)
+_WORD_PATTERN = re.compile(r"[A-Za-z0-9_]+")
+_STEM_PREFIX = 5
+
+class Clause(BaseModel):
+    """지시문 하나를 파싱한 결과"""
+    index: int
+    text: str
+    modality: str  # require, forbid, optional
+    subject: FrozenSet[str] = Field(default_factory=frozenset)  # 지시 대상 용어 (어간)
+    action: Optional[str] = None  # 지시문의 첫 동사 (있으면)
+    mixed_modalities: bool = False  # "required but optional"처럼 한 절 안에 충돌하는 modality가 있음
+
+class ContradictionCandidate(BaseModel):
+    """subject를 공유하고 modality가 충돌하는 절 쌍"""
+    first: Clause
+    second: Clause
+    shared_terms: List[str]
+    score: float  # idf 가중 Jaccard 유사도 (0~1)
+
+class ContradictionReport(BaseModel):
+    """색인 기반 모순 탐지 결과"""
+    clauses: int
+    indexed_terms: int
+    compared_pairs: int  # 색인에서 modality를 비교한 절 쌍 수 (전체 쌍 n(n-1)/2 대비 비교 비용)
+    conflicting_pairs: int = 0  # 그중 modality가 충돌해 점수를 계산한 쌍 수
+    candidates: List[ContradictionCandidate] = Field(default_factory=list)
+
+    self_contradictory: List[Clause] = Field(default_factory=list)  # 한 절 안에서 modality가 충돌하는 절
+
+    def likely_contradictions(self, min_score: float = 0.3) -> List[ContradictionCandidate]:
+        return [candidate for candidate in self.candidates if candidate.score >= min_score]
+
+    def candidate_pairs_payload(self) -> List[Dict[str, object]]:
+        """LLM 검사기에 보낼 후보 쌍 목록"""
+        return [
+            {
+                "id": number,
+                "first": candidate.first.text,
+                "second": candidate.second.text,
+                "shared_terms": candidate.shared_terms,
+                "score": candidate.score,
+            }
+            for number, candidate in enumerate(self.candidates, 1)
+        ]
+
+def _stem(word: str) -> str:
+    # field_17 같은 식별자나 숫자는 어간을 자르면 서로 다른 규칙이 합쳐지므로 그대로 둠
+    return word[:_STEM_PREFIX] if word.isalpha() else word
+
+def split_clauses(prompt: Union[str, PromptDocument]) -> List[Tuple[str, bool]]:
+    """프롬프트를 (절, 목록 항목 여부) 목록으로 나눕니다. 제목, 표, 코드 블록, JSON 스켈레톤은 제외합니다."""
+    document = prompt if isinstance(prompt, PromptDocument) else parse_prompt(prompt)
+    clauses = []
+    for block in document.blocks:
+        # "Rules:" 같은 라벨 줄은 지시문이 아님
+        if block.kind not in (PARAGRAPH, LIST_ITEM) or block.text.strip().rstrip("*").endswith(":"):
+            continue
+        clauses.extend((sentence, block.kind == LIST_ITEM) for sentence in block.sentences)
+    return clauses
+
+def parse_clause(index: int, text: str, is_bullet: bool = False) -> Optional[Clause]:
+    """절 하나를 (modality, subject, action)으로 파싱합니다. 지시문이 아니면 None을 반환합니다."""
+    modalities = []
+    remaining = text
+    for name, pattern in _MODALITY_PATTERNS:
+        remaining, matched = pattern.subn(" ", remaining)
+        if matched:
+            modalities.append(name)
+    modality = modalities[0] if modalities else None
+    mixed = len(modalities) > 1 and not _EXCEPTION_PATTERN.search(text)
+    words = [word.lower() for word in _WORD_PATTERN.findall(text)]
+    if modality is None:
+        # 명시적 조동사가 없어도 명령형 동사로 시작하거나 목록 항목이면 필수 지시로 간주
+        if is_bullet or (words and words[0] in _IMPERATIVE_VERBS):
+            modality = REQUIRE
+        else:
+            return None
+
+    action = next((word for word in words if word in _IMPERATIVE_VERBS), None)
+    subject = frozenset(
+        _stem(word) for word in words
+        if word not in _STOP_WORDS and word not in _MARKER_WORDS and word != action
+        and (len(word) >= 3 or any(char.isdigit() for char in word))
+    )
+    if not subject and not mixed:
+        return None
+    return Clause(index=index, text=text, modality=modality, subject=subject, action=action, mixed_modalities=mixed)
+
+def parse_clauses(prompt: Union[str, PromptDocument]) -> List[Clause]:
+    clauses = []
+    for text, is_bullet in split_clauses(prompt):
+        clause = parse_clause(len(clauses), text, is_bullet)
+        if clause is not None:
+            clauses.append(clause)
+    return clauses
+
+def detect_contradictions(
+    prompt: Union[str, PromptDocument],
+    max_document_frequency: float = 0.05,
+    min_shared_terms: int = 1,
+    max_candidates: int = 50
+) -> ContradictionReport:
+    """subject 역색인으로 modality가 충돌하는 절 쌍 후보를 찾습니다.
+
+    절 수의 max_document_frequency 비율보다 자주 등장하는 용어(예: "output", "json")는
+    불용어처럼 색인에서 제외해, 같은 posting list 안의 비교 비용이 절 수에 비례해 커지지 않게 합니다.
+    """
+    clauses = parse_clauses(prompt)
+    n = len(clauses)
+
+    postings: Dict[str, List[int]] = {}
+    for clause in clauses:
+        for term in clause.subject:
+            postings.setdefault(term, []).append(clause.index)
+    # 작은 프롬프트에서는 모든 용어를 사용하고, 큰 프롬프트에서만 흔한 용어를 제외
+    max_df = max(8, int(n * max_document_frequency))
+    indexed = {term: ids for term, ids in postings.items() if len(ids) <= max_df}
+    idf = {term: math.log(1 + n / len(ids)) for term, ids in postings.items()}
+
+    shared: Dict[Tuple[int, int], List[str]] = {}
+    compared = set()
+    for term, ids in indexed.items():
+        for position, i in enumerate(ids):
+            for j in ids[position + 1:]:
+                compared.add((i, j))
+                if frozenset({clauses[i].modality, clauses[j].modality}) in CONFLICTING_MODALITIES:
+                    shared.setdefault((i, j), []).append(term)
+
+    candidates = []
+    for (i, j), terms in shared.items():
+        if len(terms) < min_shared_terms:
+            continue
+        first, second = clauses[i], clauses[j]
+        # 점수 계산에는 동사(action)도 포함해 같은 행동에 대한 지시끼리 더 높은 점수를 줌
+        first_terms = first.subject | ({first.action} if first.action else set())
+        second_terms = second.subject | ({second.action} if second.action else set())
+        weight = lambda term: idf.get(term, math.log(1 + n))
+        score = sum(map(weight, first_terms & second_terms)) / sum(map(weight, first_terms | second_terms))
+        candidates.append(ContradictionCandidate(first=first, second=second, shared_terms=sorted(terms), score=round(score, 3)))
+    candidates.sort(key=lambda candidate: (-candidate.score, candidate.first.index, candidate.second.index))
+
+    return ContradictionReport(
+        clauses=n,
+        indexed_terms=len(indexed),
+        compared_pairs=len(compared),
+        conflicting_pairs=len(shared),
+        candidates=candidates[:max_candidates],
+        self_contradictory=[clause for clause in clauses if clause.mixed_modalities]
+    )
@@ -0,0 +1,172 @@
+"""
+마감 시간 기반 단계 계획 모듈
+
+MCP 호스트와 Streamlit 사용자는 지연 예산이 있으므로 optimize_prompt_comprehensive는 deadline_ms를 받아
+남은 예산이 부족하면 선택 단계(few-shot 최적화 등)를 건너뛰거나 더 싼 변형(LLM 심층 검사 -> 로컬 휴리스틱)으로 낮춥니다.
+- 단계 비용은 최근 실행 시간의 지수 가중 이동 평균(EWMA)으로 추정합니다 (StageCostModel).
+- 선택 단계는 밀리초당 가치가 높은 순서로 남은 예산에 채워 넣습니다 (DeadlineBudget.plan).
+- 건너뛰거나 낮춘 단계가 있으면 결과에 degraded 표시와 단계별 기록을 남깁니다.
+"""
+
+import math
+import threading
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from pydantic import BaseModel
+
+# 단계 변형
+LLM = "llm"
+LOCAL = "local"
+
+# 실행 기록이 없을 때 사용하는 단계별 예상 시간(ms) - 키는 "단계:변형"
+DEFAULT_STAGE_COSTS_MS: Dict[str, float] = {
+    "analysis:llm": 3000.0,
+    "analysis:local": 5.0,
+    "optimize:llm": 4000.0,
+    "optimize:local": 5.0,
+    "compress:local": 5.0,
+    "few_shot:llm": 4000.0,
+    "few_shot:local": 5.0,
+    "fewshot_index:local": 20.0,
+}
+
+def stage_key(stage: str, variant: str) -> str:
+    return f"{stage}:{variant}"
+
+class StageCostModel:
+    """단계별 소요 시간의 지수 가중 이동 평균 (여러 요청이 공유하므로 스레드 안전)"""
+
+    def __init__(self, defaults: Optional[Dict[str, float]] = None, alpha: float = 0.3, fallback_ms: float = 1000.0):
+        self.defaults = dict(DEFAULT_STAGE_COSTS_MS if defaults is None else defaults)
+        self.alpha = alpha
+        self.fallback_ms = fallback_ms
+        self._lock = threading.Lock()
+        self._estimates: Dict[str, float] = {}
+        self._samples: Dict[str, int] = {}
+
+    def estimate(self, key: str) -> float:
+        estimate = self._estimates.get(key)
+        if estimate is not None:
+            return estimate
+        return self.defaults.get(key, self.fallback_ms)
+
+    def observe(self, key: str, elapsed_ms: float) -> None:
+        with self._lock:
+            previous = self._estimates.get(key)
+            self._estimates[key] = elapsed_ms if previous is None else self.alpha * elapsed_ms + (1 - self.alpha) * previous
+            self._samples[key] = self._samples.get(key, 0) + 1
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {
+                key: {"estimate_ms": round(value, 3), "samples": self._samples[key]}
+                for key, value in sorted(self._estimates.items())
+            }
+
+class StageRecord(BaseModel):
+    """단계 하나의 계획/실행 기록"""
+    stage: str
+    variant: Optional[str] = None  # 실행한 변형 (건너뛰면 None)
+    status: str = "run"  # run, downgraded, skipped
+    estimated_ms: float = 0.0
+    elapsed_ms: float = 0.0
+    reason: Optional[str] = None
+
+class DeadlineBudget:
+    """요청 하나의 마감 시간 예산. deadline_ms가 None이면 예산 제한 없이 모든 단계를 선호 변형으로 실행합니다."""
+
+    def __init__(self, deadline_ms: Optional[float], costs: StageCostModel):
+        self.deadline_ms = deadline_ms
+        self.costs = costs
+        self.started = time.perf_counter()
+        self.records: Dict[str, StageRecord] = {}
+        self.plan_order: List[str] = []
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.started) * 1000
+
+    def remaining_ms(self) -> float:
+        if self.deadline_ms is None:
+            return math.inf
+        return self.deadline_ms - self.elapsed_ms()
+
+    def estimate(self, stage: str, variant: str) -> float:
+        return self.costs.estimate(stage_key(stage, variant))
+
+    def _decide(self, stage: str, variants: Sequence[str], chosen: Optional[str], reason: Optional[str]) -> Optional[str]:
+        status = "run" if chosen == variants[0] else "skipped" if chosen is None else "downgraded"
+        self.records[stage] = StageRecord(
+            stage=stage,
+            variant=chosen,
+            status=status,
+            estimated_ms=round(self.estimate(stage, chosen or variants[-1]), 3),
+            reason=reason if status != "run" else None
+        )
+        return chosen
+
+    def affords(self, stages: Sequence[Tuple[str, str]]) -> bool:
+        """(단계, 변형) 목록의 예상 시간 합이 남은 예산에 맞는지 확인합니다 (계획 전에 시작하는 추측 실행 판단용)"""
+        return sum(self.estimate(stage, variant) for stage, variant in stages) <= self.remaining_ms()
+
+    def choose(self, stage: str, variants: Sequence[str], reserve_ms: float = 0.0) -> str:
+        """필수 단계의 변형 선택 - 선호 순서대로 (예상 시간 + 이후 필수 단계 예약 시간)이 남은 예산에 맞는 첫 변형,
+        맞는 것이 없으면 가장 싼 마지막 변형"""
+        remaining = self.remaining_ms()
+        for variant in variants:
+            if self.estimate(stage, variant) + reserve_ms <= remaining:
+                return self._decide(stage, variants, variant, None)
+        return self._decide(stage, variants, variants[-1], f"남은 예산 {remaining:.0f}ms 부족")
+
+    def plan(self, stages: Sequence[Tuple[str, float, Sequence[str]]]) -> Dict[str, Optional[str]]:
+        """선택 단계 (이름, 가치, 선호 순서의 변형들)를 밀리초당 가치가 높은 순서로 남은 예산에 채워 넣습니다.
+        각 단계는 예산에 맞는 가장 선호하는 변형을 받고, 맞는 변형이 없으면 건너뜁니다 (None)."""
+        left = self.remaining_ms()
+        ordered = sorted(stages, key=lambda item: item[1] / max(self.estimate(item[0], item[2][0]), 1.0), reverse=True)
+        self.plan_order = [name for name, _, _ in ordered]
+        chosen: Dict[str, Optional[str]] = {}
+        for name, _, variants in ordered:
+            variant = next((v for v in variants if self.estimate(name, v) <= left), None)
+            if variant is not None:
+                left -= self.estimate(name, variant)
+            chosen[name] = self._decide(name, variants, variant, None if variant == variants[0] else f"남은 예산 {max(left, 0):.0f}ms 부족")
+        return chosen
+
+    def recheck(self, stage: str, variants: Sequence[str]) -> Optional[str]:
+        """계획한 선택 단계를 실행하기 직전에 실제 남은 예산으로 다시 확인합니다 (앞 단계가 예상보다 오래 걸린 경우)"""
+        record = self.records.get(stage)
+        if record is None or record.variant is None:
+            return None
+        remaining = self.remaining_ms()
+        if self.estimate(stage, record.variant) <= remaining:
+            return record.variant
+        cheaper = list(variants[list(variants).index(record.variant) + 1:])
+        variant = next((v for v in cheaper if self.estimate(stage, v) <= remaining), None)
+        return self._decide(stage, variants, variant, f"실행 시점 남은 예산 {max(remaining, 0):.0f}ms 부족")
+
+    def skip(self, stage: str, variants: Sequence[str], reason: str) -> None:
+        """실행 중 마감 시간을 넘겨 중단한 단계를 건너뛴 것으로 기록합니다"""
+        self._decide(stage, variants, None, reason)
+
+    def observe(self, stage: str, variant: str, elapsed_ms: float) -> None:
+        """실행 시간을 비용 모델에 반영합니다 (예산 제한이 없어도 항상 학습)"""
+        self.costs.observe(stage_key(stage, variant), elapsed_ms)
+        record = self.records.get(stage)
+        if record is not None:
+            record.elapsed_ms = round(elapsed_ms, 3)
+
+    @property
+    def degraded(self) -> bool:
+        return any(record.status != "run" for record in self.records.values())
+
+    def report(self) -> Dict[str, object]:
+        return {
+            "deadline_ms": self.deadline_ms,
+            "elapsed_ms": round(self.elapsed_ms(), 3),
+            "degraded": self.degraded,
+            "plan_order": self.plan_order,
+            "stages": [record.model_dump() for record in self.records.values()],
+        }
+
+# 프로세스 전역 단계 비용 모델 (최근 요청들의 실행 시간으로 학습)
+default_stage_costs = StageCostModel()
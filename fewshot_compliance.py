@@ -0,0 +1,146 @@
+"""
+Few-shot 준수 여부 일괄 검사 모듈
+
+개발자 메시지에서 출력 형식 계약(출력 스키마, 길이 제한, 언어)을 한 번만 추출한 뒤,
+대량의 assistant 예제를 청크 단위로 프로세스 풀에 나눠 검사하고 예제별 결과를 스트리밍합니다.
+위반한 예제만 LLM 재작성기로 보내기 위한 사전 필터로 사용합니다.
+"""
+
+import asyncio
+import hashlib
+import re
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple
+
+from pydantic import BaseModel, Field
+
+from output_schema import OutputSchema, SchemaValidator, compile_validator, extract_output_schema
+
+DEFAULT_CHUNK_SIZE = 500
+
+_MAX_LENGTH_PATTERN = re.compile(
+    r"(?:≤|<=|at most|no more than|maximum of|max(?:imum)?|under|within)\s*(\d+)\s*(?:chars?|characters?|자)",
+    re.IGNORECASE
+)
+_LANGUAGE_PATTERN = re.compile(
+    r"\b(?:in|respond in|answer in|reply in|written in|use)\s+(english|korean)\b|\b(english|korean)\s+only\b",
+    re.IGNORECASE
+)
+_HANGUL_PATTERN = re.compile(r"[가-힣]")
+_LATIN_PATTERN = re.compile(r"[A-Za-z]")
+
+class FormatContract(BaseModel):
+    """개발자 메시지에서 추출한 객관적 출력 제약 (JSON/표 형식 여부는 output_schema.format)"""
+    required_fields: List[str] = Field(default_factory=list)
+    max_length: Optional[int] = None
+    language: Optional[str] = None  # english, korean
+    output_schema: OutputSchema = Field(default_factory=OutputSchema)
+
+    def fingerprint(self) -> str:
+        """계약 내용의 해시 (두 프롬프트가 같은 제약을 갖는지 비교할 때 사용)"""
+        return hashlib.sha256(self.model_dump_json().encode("utf-8")).hexdigest()
+
+class ExampleCompliance(BaseModel):
+    """assistant 예제 하나의 검사 결과"""
+    index: int
+    compliant: bool
+    issues: List[str] = Field(default_factory=list)
+
+def extract_format_contract(developer_message: str) -> FormatContract:
+    """개발자 메시지에서 출력 스키마, 필수 필드, 길이 제한, 언어 제약을 추출합니다"""
+    length_match = _MAX_LENGTH_PATTERN.search(developer_message)
+    language_match = _LANGUAGE_PATTERN.search(developer_message)
+    output_schema = extract_output_schema(developer_message)
+    return FormatContract(
+        required_fields=output_schema.required_paths(),
+        output_schema=output_schema,
+        max_length=int(length_match.group(1)) if length_match else None,
+        language=(language_match.group(1) or language_match.group(2)).lower() if language_match else None
+    )
+
+def check_example(contract: FormatContract, content: str, validator: Optional[SchemaValidator] = None) -> List[str]:
+    """예제 하나가 계약을 위반하는 항목을 반환합니다 (위반이 없으면 빈 목록)
+
+    여러 예제를 검사할 때는 compile_validator(contract.output_schema)로 한 번 컴파일한 검증기를 넘기세요.
+    생략하면 매번 스키마 지문을 계산해 캐시에서 검증기를 찾습니다.
+    """
+    issues = (validator or compile_validator(contract.output_schema)).validate(content)
+
+    if contract.max_length is not None and len(content) > contract.max_length:
+        issues.append(f"길이 제한 초과: {len(content)}자 > {contract.max_length}자")
+
+    if contract.language == "english" and len(_HANGUL_PATTERN.findall(content)) > len(_LATIN_PATTERN.findall(content)):
+        issues.append("영어로 작성해야 하는 요구사항을 따르지 않음")
+    elif contract.language == "korean" and not _HANGUL_PATTERN.search(content):
+        issues.append("한국어로 작성해야 하는 요구사항을 따르지 않음")
+    return issues
+
+class SpeculationCheck(BaseModel):
+    """원본 프롬프트 기준으로 미리 만든 few-shot 결과가 최종 프롬프트에서도 유효한지 검증한 결과"""
+    contract_changed: bool
+    violations: int = 0  # 계약이 바뀐 경우 최종 계약을 위반한 assistant 예제 수
+
+    @property
+    def valid(self) -> bool:
+        return self.violations == 0
+
+def validate_speculation(original_prompt: str, final_prompt: str, assistant_examples: Sequence[str]) -> SpeculationCheck:
+    """두 프롬프트의 형식 계약 지문을 비교하고, 바뀐 경우에만 예제를 최종 계약으로 다시 검사합니다"""
+    original_contract = extract_format_contract(original_prompt)
+    final_contract = extract_format_contract(final_prompt)
+    if original_contract.fingerprint() == final_contract.fingerprint():
+        return SpeculationCheck(contract_changed=False)
+    validator = compile_validator(final_contract.output_schema)
+    violations = sum(1 for content in assistant_examples if check_example(final_contract, content, validator))
+    return SpeculationCheck(contract_changed=True, violations=violations)
+
+def _check_chunk(contract_data: Dict[str, Any], chunk: List[Tuple[int, str]]) -> List[Tuple[int, List[str]]]:
+    """프로세스 풀 작업 단위 (피클 가능하도록 모듈 최상위 함수로 정의)"""
+    contract = FormatContract(**contract_data)
+    validator = compile_validator(contract.output_schema)  # 청크당 한 번만 지문 계산
+    return [(index, check_example(contract, content, validator)) for index, content in chunk]
+
+async def iter_compliance_results(
+    developer_message: str,
+    assistant_examples: Sequence[str],
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    max_workers: Optional[int] = None,
+    executor: Optional[Executor] = None
+) -> AsyncIterator[ExampleCompliance]:
+    """assistant 예제를 청크 단위로 병렬 검사하고 완료되는 대로 예제별 결과를 내보냅니다.
+
+    예제 수가 chunk_size 이하이면 프로세스 생성 비용을 피하기 위해 현재 프로세스에서 검사합니다.
+    """
+    contract = extract_format_contract(developer_message)
+    indexed = list(enumerate(assistant_examples))
+    if len(indexed) <= chunk_size:
+        for index, issues in _check_chunk(contract.model_dump(), indexed):
+            yield ExampleCompliance(index=index, compliant=not issues, issues=issues)
+        return
+
+    loop = asyncio.get_running_loop()
+    own_executor = executor is None
+    pool = executor or ProcessPoolExecutor(max_workers=max_workers)
+    try:
+        futures = [
+            loop.run_in_executor(pool, _check_chunk, contract.model_dump(), indexed[start:start + chunk_size])
+            for start in range(0, len(indexed), chunk_size)
+        ]
+        for next_done in asyncio.as_completed(futures):
+            for index, issues in await next_done:
+                yield ExampleCompliance(index=index, compliant=not issues, issues=issues)
+    finally:
+        if own_executor:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+async def check_examples_batched(
+    developer_message: str,
+    assistant_examples: Sequence[str],
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    max_workers: Optional[int] = None
+) -> List[ExampleCompliance]:
+    """모든 예제의 검사 결과를 원래 순서대로 모아 반환합니다"""
+    results = [
+        result async for result in iter_compliance_results(developer_message, assistant_examples, chunk_size, max_workers)
+    ]
+    return sorted(results, key=lambda result: result.index)
@@ -0,0 +1,93 @@
+"""
+Few-shot 검색 색인 모듈
+
+최적화된 few-shot 예제 쌍을 해시된 n-gram 벡터(NumPy 배열)로 색인해 디스크에 저장하고,
+추론 시점에는 메모리 매핑으로 불러와 실시간 사용자 입력과 가장 관련 있는 예제만 골라냅니다.
+"""
+
+import json
+import os
+from typing import Any, Dict, List, Sequence
+
+import numpy as np
+
+from fewshot_selection import DEFAULT_FEATURES, group_example_pairs, hashed_ngram_vectors, message_role_content
+
+INDEX_FORMAT_VERSION = 1
+
+class FewShotIndex:
+    """메모리 매핑 가능한 few-shot 예제 검색 색인"""
+
+    VECTORS_FILE = "vectors.npy"
+    EXAMPLES_FILE = "examples.json"
+
+    def __init__(self, vectors: np.ndarray, examples: List[List[Dict[str, str]]], n_features: int = DEFAULT_FEATURES):
+        if vectors.shape != (len(examples), n_features):
+            raise ValueError(f"vectors shape {vectors.shape} does not match {len(examples)} examples x {n_features} features")
+        self.vectors = vectors
+        self.examples = examples
+        self.n_features = n_features
+
+    def __len__(self) -> int:
+        return len(self.examples)
+
+    @classmethod
+    def build(cls, messages: Sequence[Any], n_features: int = DEFAULT_FEATURES) -> "FewShotIndex":
+        """few-shot 메시지 목록으로 색인을 만듭니다. 예제 쌍은 user 메시지 내용으로 색인됩니다."""
+        examples = []
+        keys = []
+        for group in group_example_pairs(messages):
+            example = []
+            for i in group:
+                role, content = message_role_content(messages[i])
+                example.append({"role": role, "content": content})
+            examples.append(example)
+            user_contents = [msg["content"] for msg in example if msg["role"] == "user"]
+            keys.append(" ".join(user_contents) if user_contents else " ".join(msg["content"] for msg in example))
+        vectors = hashed_ngram_vectors(keys, n_features) if keys else np.zeros((0, n_features), dtype=np.float32)
+        return cls(vectors, examples, n_features)
+
+    def save(self, path: str) -> str:
+        """색인을 디렉터리에 저장합니다 (벡터는 .npy, 예제는 JSON)"""
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, self.VECTORS_FILE), np.ascontiguousarray(self.vectors, dtype=np.float32))
+        with open(os.path.join(path, self.EXAMPLES_FILE), "w", encoding="utf-8") as f:
+            json.dump({
+                "version": INDEX_FORMAT_VERSION,
+                "n_features": self.n_features,
+                "examples": self.examples
+            }, f, ensure_ascii=False)
+        return path
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> "FewShotIndex":
+        """저장된 색인을 불러옵니다. mmap=True 이면 벡터를 메모리 매핑으로 읽습니다."""
+        with open(os.path.join(path, cls.EXAMPLES_FILE), encoding="utf-8") as f:
+            metadata = json.load(f)
+        if metadata.get("version") != INDEX_FORMAT_VERSION:
+            raise ValueError(f"Unsupported few-shot index version: {metadata.get('version')}")
+        vectors = np.load(os.path.join(path, cls.VECTORS_FILE), mmap_mode="r" if mmap else None)
+        return cls(vectors, metadata["examples"], metadata["n_features"])
+
+    def search(self, user_input: str, k: int = 3, min_score: float = 0.0) -> List[int]:
+        """사용자 입력과 코사인 유사도가 높은 예제 인덱스를 관련도 순으로 반환합니다"""
+        if not len(self.examples) or k <= 0:
+            return []
+        query = hashed_ngram_vectors([user_input], self.n_features)[0]
+        # 질의 벡터는 희소하므로 0이 아닌 열만 모아 내적 (전체 행렬 곱보다 수 배 빠름)
+        nonzero = np.flatnonzero(query)
+        scores = self.vectors[:, nonzero] @ query[nonzero]
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [int(i) for i in top if scores[i] > min_score]
+
+    def top_k_examples(self, user_input: str, k: int = 3, min_score: float = 0.0) -> List[Dict[str, str]]:
+        """관련도가 높은 예제 쌍 k개를 메시지 목록으로 펼쳐 반환합니다 (가장 관련 있는 예제가 먼저)"""
+        return [message for i in self.search(user_input, k, min_score) for message in self.examples[i]]
+
+def build_fewshot_index(messages: Sequence[Any], path: str, n_features: int = DEFAULT_FEATURES) -> Dict[str, Any]:
+    """few-shot 메시지로 색인을 만들어 저장하고 요약 정보를 반환합니다"""
+    index = FewShotIndex.build(messages, n_features)
+    index.save(path)
+    return {"path": path, "examples": len(index), "n_features": n_features}
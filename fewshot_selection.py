@@ -0,0 +1,183 @@
+"""
+Few-shot 예제 선택 모듈
+
+user/assistant 예제 쌍을 해시된 n-gram 벡터로 변환하고 군집화하여,
+토큰 예산 안에서 대표성과 다양성이 높은 k개의 예제만 남깁니다.
+외부 임베딩 모델 없이 NumPy만 사용합니다. 개수 k 없이 토큰 예산만 주면 예산 / 예제 토큰 수 중앙값으로
+k를 정하고 (최대 MAX_BUDGET_CLUSTERS), 예제가 많으면 무작위 표본(MAX_CANDIDATES개)만 군집화합니다.
+"""
+
+import re
+import zlib
+from typing import Any, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from prompt_compression import estimate_tokens
+
+DEFAULT_FEATURES = 1024
+MAX_BUDGET_CLUSTERS = 32  # 토큰 예산만 지정했을 때 k의 상한
+MAX_CANDIDATES = 1024  # 군집화할 최대 예제 수 (초과하면 무작위 표본만 사용)
+_TOKEN_PATTERN = re.compile(r"\w+")
+
+def message_role_content(message: Any) -> Tuple[str, str]:
+    """ChatMessage(pydantic) 또는 dict 메시지에서 (role, content)를 꺼냅니다"""
+    if isinstance(message, dict):
+        role, content = message.get("role", ""), message.get("content", "")
+    else:
+        role, content = message.role, message.content
+    return getattr(role, "value", str(role)), str(content)
+
+def group_example_pairs(messages: Sequence[Any]) -> List[List[int]]:
+    """메시지를 user 다음 assistant로 이어지는 예제 단위(메시지 인덱스 목록)로 묶습니다"""
+    groups = []
+    index = 0
+    while index < len(messages):
+        role, _ = message_role_content(messages[index])
+        if role == "user" and index + 1 < len(messages) and message_role_content(messages[index + 1])[0] == "assistant":
+            groups.append([index, index + 1])
+            index += 2
+        else:
+            groups.append([index])
+            index += 1
+    return groups
+
+class _BucketCache(dict):
+    """n-gram -> 해시 버킷 캐시. 같은 n-gram은 한 번만 해싱합니다."""
+
+    def __init__(self, n_features: int):
+        super().__init__()
+        self.n_features = n_features
+
+    def __missing__(self, gram: str) -> int:
+        # crc32는 프로세스와 무관하게 결정적이므로 저장된 색인과도 호환됨
+        bucket = self[gram] = zlib.crc32(gram.encode("utf-8")) % self.n_features
+        return bucket
+
+def hashed_ngram_vectors(texts: Sequence[str], n_features: int = DEFAULT_FEATURES) -> np.ndarray:
+    """단어 unigram + bigram을 해싱해 L2 정규화된 (len(texts), n_features) 행렬을 만듭니다"""
+    buckets = _BucketCache(n_features)
+    cols: List[int] = []
+    counts = np.zeros(len(texts), dtype=np.int64)
+    for row, text in enumerate(texts):
+        words = _TOKEN_PATTERN.findall(text.lower())
+        before = len(cols)
+        cols.extend(map(buckets.__getitem__, words))
+        cols.extend(map(buckets.__getitem__, map(" ".join, zip(words, words[1:]))))
+        counts[row] = len(cols) - before
+
+    flat_index = np.repeat(np.arange(len(texts), dtype=np.int64) * n_features, counts) + np.asarray(cols, dtype=np.int64)
+    vectors = np.bincount(flat_index, minlength=len(texts) * n_features).astype(np.float32).reshape(len(texts), n_features)
+    # 빈도 대신 로그 스케일을 사용해 반복 단어의 영향을 줄임
+    np.log1p(vectors, out=vectors)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    np.divide(vectors, norms, out=vectors, where=norms > 0)
+    return vectors
+
+def _spherical_kmeans(vectors: np.ndarray, k: int, rng: np.random.Generator, iterations: int = 10) -> np.ndarray:
+    """코사인 유사도 기반 k-means (k-means++ 초기화). 각 벡터의 군집 번호를 반환합니다."""
+    n = vectors.shape[0]
+    centroids = np.empty((k, vectors.shape[1]), dtype=np.float32)
+    centroids[0] = vectors[rng.integers(n)]
+    closest = 1.0 - vectors @ centroids[0]
+    for c in range(1, k):
+        weights = np.clip(closest, 0, None) ** 2
+        total = weights.sum()
+        choice = rng.choice(n, p=weights / total) if total > 0 else rng.integers(n)
+        centroids[c] = vectors[choice]
+        closest = np.minimum(closest, 1.0 - vectors @ centroids[c])
+
+    labels = np.zeros(n, dtype=np.int64)
+    for iteration in range(iterations):
+        new_labels = np.argmax(vectors @ centroids.T, axis=1)
+        if iteration and np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+        # 군집별 합을 한 번의 행렬곱으로 계산 (빈 군집은 이전 중심 유지)
+        membership = np.zeros((n, k), dtype=np.float32)
+        membership[np.arange(n), labels] = 1.0
+        sums = membership.T @ vectors
+        norms = np.linalg.norm(sums, axis=1)
+        filled = norms > 0
+        centroids[filled] = sums[filled] / norms[filled, None]
+    return labels
+
+def budget_cluster_count(token_costs: Sequence[int], token_budget: int, max_clusters: int = MAX_BUDGET_CLUSTERS) -> int:
+    """토큰 예산에 들어갈 만한 예제 수 (예산 / 예제 토큰 수 중앙값, 1 ~ max_clusters)"""
+    if not token_costs:
+        return 0
+    median_cost = max(1.0, float(np.median(token_costs)))
+    return int(max(1, min(max_clusters, len(token_costs), token_budget // median_cost)))
+
+def select_representative_examples(
+    texts: Sequence[str],
+    k: Optional[int],
+    token_costs: Optional[Sequence[int]] = None,
+    token_budget: Optional[int] = None,
+    seed: int = 0,
+    max_candidates: int = MAX_CANDIDATES
+) -> List[int]:
+    """군집별 대표(medoid) 예제를 골라 선택된 인덱스를 원래 순서대로 반환합니다.
+
+    큰 군집의 대표부터 채우며, 대표가 토큰 예산을 넘으면 같은 군집에서
+    예산에 맞는 다음으로 가까운 예제를 대신 사용합니다.
+    k가 None이면 토큰 예산으로 k를 정하고, 예산도 없으면 모든 예제를 유지합니다.
+    """
+    n = len(texts)
+    token_costs = list(token_costs) if token_costs is not None else [estimate_tokens(text) for text in texts]
+    if k is None:
+        if token_budget is None:
+            return list(range(n))
+        k = budget_cluster_count(token_costs, token_budget)
+    if n == 0 or k <= 0:
+        return []
+    if n <= k and (token_budget is None or sum(token_costs) <= token_budget):
+        return list(range(n))
+
+    rng = np.random.default_rng(seed)
+    # 예제가 많으면 무작위 표본에서 대표를 고름 - 해싱과 군집화 비용을 예제 수와 무관하게 제한
+    candidates = np.arange(n) if n <= max(max_candidates, k) else np.sort(rng.choice(n, max(max_candidates, k), replace=False))
+    vectors = hashed_ngram_vectors([texts[i] for i in candidates])
+    k = min(k, len(candidates))
+    labels = _spherical_kmeans(vectors, k, rng)
+
+    clusters = []
+    for c in range(k):
+        members = np.flatnonzero(labels == c)
+        if not len(members):
+            continue
+        centroid = vectors[members].mean(axis=0)
+        # 중심에 가까운 순으로 정렬 - 첫 번째가 군집의 medoid
+        ordered = members[np.argsort(-(vectors[members] @ centroid), kind="stable")]
+        clusters.append(candidates[ordered])
+    clusters.sort(key=len, reverse=True)
+
+    selected = []
+    remaining = token_budget
+    for ordered in clusters:
+        for candidate in ordered:
+            cost = token_costs[candidate]
+            if remaining is None or cost <= remaining:
+                selected.append(int(candidate))
+                if remaining is not None:
+                    remaining -= cost
+                break
+    return sorted(selected)
+
+def select_few_shot_examples(
+    messages: Sequence[Any],
+    k: Optional[int] = 8,
+    token_budget: Optional[int] = None,
+    seed: int = 0
+) -> List[Any]:
+    """few-shot 메시지 목록에서 대표적인 예제 쌍 최대 k개를 토큰 예산 안에서 선택합니다.
+
+    k가 None이면 토큰 예산으로 예제 수를 정합니다 (budget_cluster_count).
+
+    user/assistant 쌍은 함께 선택되며 원래 순서와 메시지 객체를 그대로 유지합니다.
+    """
+    groups = group_example_pairs(messages)
+    texts = [" ".join(message_role_content(messages[i])[1] for i in group) for group in groups]
+    costs = [sum(estimate_tokens(message_role_content(messages[i])[1]) for i in group) for group in groups]
+    chosen = select_representative_examples(texts, k, costs, token_budget, seed)
+    return [messages[i] for group_index in chosen for i in groups[group_index]]
@@ -0,0 +1,74 @@
+"""
+융합 검사기 모듈
+
+LLM 모드에서 검사기마다 전체 프롬프트를 따로 보내는 대신, 하나의 요청으로 모든 검사를 수행하도록
+검사 항목별 섹션을 가진 결합 출력 스키마(FusedIssues)와 지시문을 만들고,
+응답을 각 파이프라인의 기존 Issues 객체로 다시 나눕니다.
+"""
+
+from typing import Dict, Iterable, List, Optional
+
+from pydantic import BaseModel, Field
+
+# 섹션 이름은 prompt_optimizer.Issues.category 값과 같음
+CLARITY = "clarity"
+SPECIFICITY = "specificity"
+INSTRUCTION_FOLLOWING = "instruction_following"
+AGENTIC_CAPABILITIES = "agentic_capabilities"
+CONTRADICTION = "contradiction"
+FORMAT = "format"
+FEW_SHOT = "few_shot"
+
+class FusedSection(BaseModel):
+    """검사 항목 하나의 결과"""
+    has_issues: bool = False
+    issues: List[str] = Field(default_factory=list)
+    severity: str = "low"  # low, medium, high
+    rewrite_suggestions: List[str] = Field(default_factory=list)  # few_shot 섹션에서만 사용
+
+class FusedIssues(BaseModel):
+    """융합 검사기의 결합 출력 - 요청받지 않은 섹션은 null"""
+    clarity: Optional[FusedSection] = None
+    specificity: Optional[FusedSection] = None
+    instruction_following: Optional[FusedSection] = None
+    agentic_capabilities: Optional[FusedSection] = None
+    contradiction: Optional[FusedSection] = None
+    format: Optional[FusedSection] = None
+    few_shot: Optional[FusedSection] = None
+
+def build_fused_instructions(section_instructions: Dict[str, str], input_format: Optional[str] = None) -> str:
+    """검사기별 지시문을 섹션으로 묶은 융합 검사기 지시문을 만듭니다.
+
+    input_format을 지정하면 입력 형식 설명을 덧붙입니다 (입력의 SECTIONS로 채울 섹션을 고르는 경우 등).
+    """
+    parts = [
+        "You are a combined prompt checker. Run every requested check on the same input in a single pass "
+        "and return one JSON object matching FusedIssues.",
+        "Fill only the requested sections (all sections below unless the input names SECTIONS) and leave every "
+        "other section null. Each check is independent: do not let the findings of one section change another.",
+    ]
+    if input_format:
+        parts.append(f"## Input\n{input_format}")
+    for section, instructions in section_instructions.items():
+        parts.append(f"## Section `{section}`\n{instructions.strip()}")
+    return "\n\n".join(parts)
+
+def split_fused_issues(fused: FusedIssues, issue_types: Dict[str, type]) -> Dict[str, BaseModel]:
+    """융합 결과를 섹션별로 기존 Issues 타입 객체로 나눕니다.
+
+    요청했지만 모델이 채우지 않은(null) 섹션은 "문제 없음"이 아니라 검사 실패이므로 결과에서 빠집니다.
+    호출자는 missing_sections()로 빠진 섹션을 찾아 해당 검사기만 따로 다시 실행합니다.
+    """
+    results = {}
+    for section, issue_type in issue_types.items():
+        if getattr(fused, section) is None:
+            continue
+        data = getattr(fused, section).model_dump()
+        if "category" in issue_type.model_fields:
+            data["category"] = section
+        results[section] = issue_type.model_validate({key: value for key, value in data.items() if key in issue_type.model_fields})
+    return results
+
+def missing_sections(sections: Dict[str, BaseModel], requested: Iterable[str]) -> List[str]:
+    """split_fused_issues 결과에 없는 요청 섹션 (요청 순서대로)"""
+    return [section for section in requested if section not in sections]
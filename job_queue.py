@@ -0,0 +1,337 @@
+"""
+영속 작업 큐 모듈
+
+대규모 프롬프트 라이브러리나 LLM 모드 최적화는 몇 분이 걸릴 수 있어 MCP 도구 호출 하나 안에서 결과를 기다리기 어렵습니다.
+작업을 SQLite 큐에 저장해 두고 워커 풀이 비동기로 처리하므로, 클라이언트는 작업을 제출한 뒤 바로 돌아가
+나중에 상태와 결과를 조회할 수 있습니다. 큐는 파일에 저장되므로 서버를 다시 시작해도 작업이 유지됩니다.
+
+같은 큐 파일을 여러 서버 프로세스가 함께 쓰므로(MCPClientPool이 띄운 서버 등) 작업을 가져간 워커는
+자기 워커 ID와 하트비트 시각을 기록하고 주기적으로 하트비트를 갱신합니다. 하트비트가 lease_s보다 오래 끊긴
+작업만 주인이 죽은 것으로 보고 다시 대기 상태로 돌리며, 다른 서버가 실행 중인 작업은 건드리지 않습니다.
+실행 시작 횟수가 max_attempts에 이른 작업은 다시 돌리지 않고 실패로 끝냅니다 (서버를 죽이는 작업의 무한 반복 방지).
+"""
+
+import asyncio
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from pydantic import BaseModel
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+FINISHED_STATUSES = (SUCCEEDED, FAILED, CANCELLED)
+
+DEFAULT_LEASE_S = 60.0  # 하트비트가 이보다 오래 끊기면 작업을 가져간 워커가 죽은 것으로 판단
+DEFAULT_MAX_ATTEMPTS = 3  # 작업 하나를 실행 시작할 수 있는 최대 횟수
+
+# 작업 종류별 처리기: (매개변수, 진행 콜백) -> JSON으로 저장할 수 있는 결과
+JobHandler = Callable[[Dict[str, Any], Callable[[str], None]], Awaitable[Any]]
+
+class JobRecord(BaseModel):
+    """큐에 저장된 작업 하나"""
+    job_id: str
+    kind: str
+    status: str
+    params: Dict[str, Any]
+    result: Optional[Any] = None
+    error: Optional[str] = None
+    progress: Optional[str] = None  # 마지막 진행 메시지
+    attempts: int = 0  # 실행을 시작한 횟수 (주인이 죽어 다시 실행되면 증가)
+    worker_id: Optional[str] = None  # 실행 중인 작업을 가져간 워커
+    heartbeat_at: Optional[float] = None  # 주인 워커의 마지막 하트비트 시각
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+    def status_summary(self) -> Dict[str, Any]:
+        """결과 본문을 제외한 상태 정보"""
+        return self.model_dump(exclude={"params", "result", "heartbeat_at"})
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL,
+    params TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    progress TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    worker_id TEXT,
+    heartbeat_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at);
+"""
+
+# 임대(lease) 열이 없던 이전 버전의 큐 파일에 추가할 열
+_LEASE_COLUMNS = {"worker_id": "TEXT", "heartbeat_at": "REAL"}
+
+def new_worker_id() -> str:
+    """프로세스와 워커 풀을 구분하는 워커 ID"""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+class JobQueue:
+    """SQLite 기반 영속 작업 큐 (여러 스레드와 여러 프로세스에서 사용 가능)"""
+
+    def __init__(self, path: str, lease_s: float = DEFAULT_LEASE_S, max_attempts: int = DEFAULT_MAX_ATTEMPTS):
+        self.path = path
+        self.lease_s = lease_s
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        for name, kind in _LEASE_COLUMNS.items():
+            if name not in columns:
+                self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {name} {kind}")
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _row(self, row: Optional[sqlite3.Row]) -> Optional[JobRecord]:
+        if row is None:
+            return None
+        data = dict(row)
+        data["params"] = json.loads(data["params"])
+        data["result"] = json.loads(data["result"]) if data["result"] is not None else None
+        return JobRecord(**data)
+
+    def submit(self, kind: str, params: Dict[str, Any]) -> str:
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (job_id, kind, status, params, created_at) VALUES (?, ?, ?, ?, ?)",
+                (job_id, kind, QUEUED, json.dumps(params, ensure_ascii=False), time.time())
+            )
+        return job_id
+
+    def get(self, job_id: str) -> Optional[JobRecord]:
+        with self._lock:
+            return self._row(self._conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone())
+
+    def claim(self, worker_id: str) -> Optional[JobRecord]:
+        """가장 오래된 대기 작업 하나를 worker_id 소유의 실행 중 작업으로 바꿔 가져옵니다"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT job_id FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1", (QUEUED,)
+                ).fetchone()
+                if row is None:
+                    self._conn.execute("COMMIT")
+                    return None
+                now = time.time()
+                self._conn.execute(
+                    "UPDATE jobs SET status = ?, started_at = ?, attempts = attempts + 1, worker_id = ?, heartbeat_at = ? "
+                    "WHERE job_id = ?",
+                    (RUNNING, now, worker_id, now, row["job_id"])
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            return self._row(self._conn.execute("SELECT * FROM jobs WHERE job_id = ?", (row["job_id"],)).fetchone())
+
+    def _finish(
+        self,
+        job_id: str,
+        status: str,
+        result: Any = None,
+        error: Optional[str] = None,
+        worker_id: Optional[str] = None
+    ) -> bool:
+        # 이미 끝난 작업(예: 실행 중 취소됨)의 상태는 덮어쓰지 않음
+        # worker_id가 주어지면 임대가 만료되어 다른 워커가 다시 가져간 작업도 덮어쓰지 않음
+        query = (
+            "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ?, heartbeat_at = NULL "
+            "WHERE job_id = ? AND status NOT IN (?, ?, ?)"
+        )
+        params: List[Any] = [
+            status,
+            json.dumps(result, ensure_ascii=False) if result is not None else None,
+            error,
+            time.time(),
+            job_id,
+            *FINISHED_STATUSES,
+        ]
+        if worker_id is not None:
+            query += " AND worker_id = ?"
+            params.append(worker_id)
+        with self._lock:
+            return self._conn.execute(query, params).rowcount > 0
+
+    def complete(self, job_id: str, result: Any, worker_id: Optional[str] = None) -> bool:
+        return self._finish(job_id, SUCCEEDED, result=result, worker_id=worker_id)
+
+    def fail(self, job_id: str, error: str, worker_id: Optional[str] = None) -> bool:
+        return self._finish(job_id, FAILED, error=error, worker_id=worker_id)
+
+    def cancel(self, job_id: str) -> bool:
+        """대기 중이거나 실행 중인 작업을 취소 상태로 바꿉니다 (이미 끝난 작업이면 False)"""
+        return self._finish(job_id, CANCELLED, error="cancelled by client")
+
+    def set_progress(self, job_id: str, message: str) -> None:
+        with self._lock:
+            self._conn.execute("UPDATE jobs SET progress = ? WHERE job_id = ?", (message, job_id))
+
+    def heartbeat(self, worker_id: str) -> int:
+        """worker_id가 실행 중인 작업의 임대를 연장하고 연장한 작업 수를 돌려줍니다"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET heartbeat_at = ? WHERE status = ? AND worker_id = ?", (time.time(), RUNNING, worker_id)
+            )
+            return cursor.rowcount
+
+    def release(self, worker_id: str) -> int:
+        """worker_id가 실행 중이던 작업을 대기 상태로 돌려놓습니다 (워커 풀을 정상 종료할 때 호출)"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = ?, started_at = NULL, worker_id = NULL, heartbeat_at = NULL "
+                "WHERE status = ? AND worker_id = ?",
+                (QUEUED, RUNNING, worker_id)
+            )
+            return cursor.rowcount
+
+    def recover(self, now: Optional[float] = None) -> int:
+        """임대가 만료된(주인 워커가 죽은) 실행 중 작업을 대기 상태로 되돌리고 그 수를 돌려줍니다.
+
+        실행 시작 횟수가 max_attempts에 이른 작업은 다시 돌리지 않고 실패로 끝냅니다.
+        """
+        expired = (now if now is not None else time.time()) - self.lease_s
+        lease_expired = "status = ? AND (heartbeat_at IS NULL OR heartbeat_at < ?)"
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    f"UPDATE jobs SET status = ?, error = ?, finished_at = ?, heartbeat_at = NULL "
+                    f"WHERE {lease_expired} AND attempts >= ?",
+                    (FAILED, f"abandoned after {self.max_attempts} attempts", time.time(), RUNNING, expired, self.max_attempts)
+                )
+                cursor = self._conn.execute(
+                    f"UPDATE jobs SET status = ?, started_at = NULL, worker_id = NULL, heartbeat_at = NULL "
+                    f"WHERE {lease_expired}",
+                    (QUEUED, RUNNING, expired)
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            return cursor.rowcount
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+        return {row["status"]: row["n"] for row in rows}
+
+class JobWorkerPool:
+    """작업 큐를 비동기 워커 concurrency개로 처리합니다.
+
+    제출 시 notify()로 대기 중인 워커를 깨우고, 다른 프로세스가 넣은 작업도 poll_interval_s마다 확인합니다.
+    실행 중인 작업이 취소되면 cancel()로 해당 asyncio 작업을 취소합니다.
+    가져간 작업의 임대는 큐 lease_s의 1/3 간격으로 연장하고, 같은 주기로 임대가 만료된 작업을 회수합니다.
+    """
+
+    def __init__(
+        self,
+        queue: JobQueue,
+        handlers: Dict[str, JobHandler],
+        concurrency: int = 4,
+        poll_interval_s: float = 1.0
+    ):
+        self.queue = queue
+        self.handlers = handlers
+        self.concurrency = concurrency
+        self.poll_interval_s = poll_interval_s
+        self.worker_id = new_worker_id()
+        self._workers: List["asyncio.Task"] = []
+        self._running: Dict[str, "asyncio.Task"] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def start(self) -> int:
+        """워커를 시작하고 임대가 만료되어 회수한 작업 수를 돌려줍니다"""
+        recovered = self.queue.recover()
+        self._wakeup = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        self._workers = [loop.create_task(self._worker()) for _ in range(self.concurrency)]
+        self._workers.append(loop.create_task(self._keep_leases()))
+        return recovered
+
+    async def stop(self) -> int:
+        """워커를 멈추고 실행 중이던 작업을 대기 상태로 돌려놓은 뒤 그 수를 돌려줍니다"""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        return self.queue.release(self.worker_id)
+
+    def notify(self) -> None:
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def cancel(self, job_id: str) -> bool:
+        """작업을 취소합니다 (실행 중이면 실행도 중단)"""
+        cancelled = self.queue.cancel(job_id)
+        task = self._running.get(job_id)
+        if cancelled and task is not None:
+            task.cancel()
+        return cancelled
+
+    async def _keep_leases(self) -> None:
+        while True:
+            await asyncio.sleep(self.queue.lease_s / 3)
+            self.queue.heartbeat(self.worker_id)
+            if self.queue.recover():
+                self.notify()
+
+    async def _worker(self) -> None:
+        while True:
+            job = self.queue.claim(self.worker_id)
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval_s)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._execute(job)
+
+    async def _execute(self, job: JobRecord) -> None:
+        handler = self.handlers.get(job.kind)
+        if handler is None:
+            self.queue.fail(job.job_id, f"unknown job kind: {job.kind}", worker_id=self.worker_id)
+            return
+
+        def progress(message: str) -> None:
+            self.queue.set_progress(job.job_id, message)
+
+        task = asyncio.get_running_loop().create_task(handler(job.params, progress))
+        self._running[job.job_id] = task
+        try:
+            result = await task
+        except asyncio.CancelledError:
+            # 작업 취소(cancel_job)는 워커를 멈추지 않음 - 워커 자체가 취소된 경우에만 전파
+            if not task.cancelled() or asyncio.current_task().cancelling():
+                raise
+            return
+        except Exception as exc:
+            self.queue.fail(job.job_id, f"{type(exc).__name__}: {exc}", worker_id=self.worker_id)
+            return
+        finally:
+            self._running.pop(job.job_id, None)
+        self.queue.complete(job.job_id, result, worker_id=self.worker_id)
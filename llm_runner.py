@@ -0,0 +1,263 @@
+"""
+LLM 실행 계층 모듈
+
+Agent 호출을 실제 모델(OpenAI) 또는 로컬 스텁 모델로 보내고 구조화된 출력을 Agent.output_type으로 파싱합니다.
+기본 실행기를 등록하지 않으면 main.Runner / prompt_optimizer.Runner는 기존의 로컬 휴리스틱을 그대로 사용합니다.
+스텁 모델은 왕복 지연, 입력/출력 토큰 비례 지연, 동시 요청 제한을 흉내 내므로 네트워크 없이
+팬아웃/융합 검사기 같은 실행 방식의 지연과 토큰 비용을 비교할 수 있습니다.
+"""
+
+import asyncio
+import contextlib
+import contextvars
+import hashlib
+import inspect
+import json
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Union
+
+import openai
+from pydantic import BaseModel, Field
+
+from prompt_compression import tokenize
+from request_builder import ModelRequest, canonical_json, chat_completion_body, request_from_body
+from schema_catalog import SchemaCatalog, default_catalog
+
+class ModelResponse(BaseModel):
+    """모델 응답과 사용량"""
+    output_text: str
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cached_tokens: int = 0  # 공급자 측 프롬프트 캐시에서 처리된 입력 토큰
+    latency_ms: float = 0.0
+
+class AgentStats(BaseModel):
+    """에이전트별 누적 호출 통계"""
+    calls: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cached_tokens: int = 0
+    total_latency_ms: float = 0.0
+
+    @property
+    def average_latency_ms(self) -> float:
+        return self.total_latency_ms / self.calls if self.calls else 0.0
+
+    @property
+    def cache_hit_ratio(self) -> float:
+        """입력 토큰 중 공급자 프롬프트 캐시에서 처리된 비율"""
+        return self.cached_tokens / self.input_tokens if self.input_tokens else 0.0
+
+class ModelError(Exception):
+    """모델 호출 실패 (재시도해도 같은 결과가 예상되는 오류)"""
+
+class RetryableModelError(ModelError):
+    """일시적인 모델 호출 실패 (시간 초과, 연결 오류, 429, 5xx) - 재시도할 수 있음"""
+
+class ModelUnavailableError(ModelError):
+    """재시도/서킷 브레이커 이후에도 모델 응답을 얻지 못함 - Runner는 로컬 휴리스틱으로 대체"""
+
+class ModelBackend:
+    """모델 호출 백엔드 인터페이스"""
+
+    async def complete(self, request: ModelRequest) -> ModelResponse:
+        raise NotImplementedError
+
+    async def aclose(self) -> None:
+        """백엔드가 가진 연결을 닫습니다 (연결을 만든 이벤트 루프가 끝나기 전에 호출)"""
+
+class OpenAIBackend(ModelBackend):
+    """OpenAI Chat Completions 백엔드 (JSON 스키마 구조화 출력 사용)"""
+
+    def __init__(self, client: Any):
+        self.client = client
+
+    async def aclose(self) -> None:
+        await self.client.close()
+
+    async def complete(self, request: ModelRequest) -> ModelResponse:
+        started = time.perf_counter()
+        try:
+            response = await self.client.chat.completions.create(**chat_completion_body(request))
+        except (openai.APITimeoutError, openai.APIConnectionError, openai.RateLimitError, openai.InternalServerError) as exc:
+            raise RetryableModelError(f"{request.agent}: {exc}") from exc
+        except openai.OpenAIError as exc:
+            raise ModelError(f"{request.agent}: {exc}") from exc
+        usage = response.usage
+        details = getattr(usage, "prompt_tokens_details", None)
+        return ModelResponse(
+            output_text=response.choices[0].message.content or "{}",
+            input_tokens=getattr(usage, "prompt_tokens", 0) or 0,
+            output_tokens=getattr(usage, "completion_tokens", 0) or 0,
+            cached_tokens=getattr(details, "cached_tokens", 0) or 0,
+            latency_ms=(time.perf_counter() - started) * 1000
+        )
+
+Responder = Callable[[ModelRequest], Union[Any, Awaitable[Any]]]
+
+class StubModelBackend(ModelBackend):
+    """네트워크 없이 동작하는 로컬 스텁 모델.
+
+    responder(request)가 돌려준 객체(pydantic 모델 또는 dict)를 출력으로 사용하고,
+    지연 시간은 round_trip_ms + 입력 토큰 * ms_per_input_token + 출력 토큰 * ms_per_output_token 으로 흉내 냅니다.
+    max_concurrency를 지정하면 공급자 동시 요청 제한처럼 동시에 처리되는 요청 수를 제한합니다.
+
+    공급자 프롬프트 캐시도 흉내 냅니다: (지시문, 출력 스키마, 입력) 순서의 토큰을 cache_block_tokens 단위로 나눠
+    이전 요청과 같은 prefix 블록은 cached_tokens로 보고하고 지연 시간은 ms_per_cached_token으로 계산합니다.
+    prefix가 cache_min_tokens보다 짧으면 캐시되지 않습니다 (cache_min_tokens=None이면 캐시 없음).
+    """
+
+    def __init__(
+        self,
+        responder: Responder,
+        round_trip_ms: float = 50.0,
+        ms_per_input_token: float = 0.02,
+        ms_per_output_token: float = 0.5,
+        max_concurrency: Optional[int] = None,
+        cache_min_tokens: Optional[int] = 1024,
+        cache_block_tokens: int = 128,
+        ms_per_cached_token: float = 0.002
+    ):
+        self.responder = responder
+        self.round_trip_ms = round_trip_ms
+        self.ms_per_input_token = ms_per_input_token
+        self.ms_per_output_token = ms_per_output_token
+        self._semaphore = asyncio.Semaphore(max_concurrency) if max_concurrency else None
+        self.cache_min_tokens = cache_min_tokens
+        self.cache_block_tokens = cache_block_tokens
+        self.ms_per_cached_token = ms_per_cached_token
+        self._prefix_cache: Set[str] = set()
+        self.requests = 0
+
+    def _cached_tokens(self, tokens: List[str]) -> int:
+        """이전 요청과 공유하는 prefix 블록의 토큰 수를 구하고 이번 요청의 prefix 블록을 캐시에 추가합니다"""
+        if self.cache_min_tokens is None:
+            return 0
+        digest = hashlib.sha256()
+        cached = 0
+        for end in range(self.cache_block_tokens, len(tokens) + 1, self.cache_block_tokens):
+            digest.update("\x1f".join(tokens[end - self.cache_block_tokens:end]).encode("utf-8"))
+            key = digest.hexdigest()
+            if key in self._prefix_cache:
+                cached = end
+            else:
+                self._prefix_cache.add(key)
+        return cached if cached >= self.cache_min_tokens else 0
+
+    async def complete(self, request: ModelRequest) -> ModelResponse:
+        if self._semaphore is None:
+            return await self._complete(request)
+        async with self._semaphore:
+            return await self._complete(request)
+
+    async def _complete(self, request: ModelRequest) -> ModelResponse:
+        started = time.perf_counter()
+        self.requests += 1
+        output = self.responder(request)
+        if inspect.isawaitable(output):
+            output = await output
+        output_text = output.model_dump_json() if isinstance(output, BaseModel) else json.dumps(output, ensure_ascii=False)
+        tokens = tokenize(request.instructions) + tokenize(canonical_json(request.output_schema)) + tokenize(request.input)
+        input_tokens = len(tokens)
+        cached_tokens = self._cached_tokens(tokens)
+        output_tokens = len(tokenize(output_text))
+        simulated_ms = (
+            self.round_trip_ms
+            + (input_tokens - cached_tokens) * self.ms_per_input_token
+            + cached_tokens * self.ms_per_cached_token
+            + output_tokens * self.ms_per_output_token
+        )
+        remaining = simulated_ms / 1000 - (time.perf_counter() - started)
+        if remaining > 0:
+            await asyncio.sleep(remaining)
+        return ModelResponse(
+            output_text=output_text,
+            input_tokens=input_tokens,
+            output_tokens=output_tokens,
+            cached_tokens=cached_tokens,
+            latency_ms=(time.perf_counter() - started) * 1000
+        )
+
+class RunResult:
+    """Runner.run과 같은 형태의 실행 결과 (final_output)에 모델 응답을 덧붙인 것"""
+
+    def __init__(self, final_output: Any, response: Optional[ModelResponse] = None):
+        self.final_output = final_output
+        self.response = response
+
+class LLMRunner:
+    """Agent를 모델 백엔드로 실행하고 에이전트별 사용량을 집계합니다"""
+
+    def __init__(self, backend: ModelBackend, catalog: Optional[SchemaCatalog] = None):
+        self.backend = backend
+        self.catalog = catalog or default_catalog
+        self.stats: Dict[str, AgentStats] = {}
+
+    def build_request(self, agent: Any, input_data: str) -> ModelRequest:
+        return self.catalog.compile(agent).build_request(input_data)
+
+    def parse_output(self, agent: Any, output_text: str) -> Any:
+        return self.catalog.compile(agent).parse(output_text)
+
+    async def run(self, agent: Any, input_data: str) -> RunResult:
+        response = await self.backend.complete(self.build_request(agent, input_data))
+        self.record(agent.name, response)
+        return RunResult(self.parse_output(agent, response.output_text), response)
+
+    def record(self, agent_name: str, response: ModelResponse) -> None:
+        stats = self.stats.setdefault(agent_name, AgentStats())
+        stats.calls += 1
+        stats.input_tokens += response.input_tokens
+        stats.output_tokens += response.output_tokens
+        stats.cached_tokens += response.cached_tokens
+        stats.total_latency_ms += response.latency_ms
+
+    def totals(self) -> AgentStats:
+        total = AgentStats()
+        for stats in self.stats.values():
+            total.calls += stats.calls
+            total.input_tokens += stats.input_tokens
+            total.output_tokens += stats.output_tokens
+            total.cached_tokens += stats.cached_tokens
+            total.total_latency_ms += stats.total_latency_ms
+        return total
+
+    def metrics(self) -> Dict[str, Any]:
+        """에이전트별 사용량과 프롬프트 캐시 적중률"""
+        def summary(stats: AgentStats) -> Dict[str, Any]:
+            return {
+                **stats.model_dump(),
+                "average_latency_ms": round(stats.average_latency_ms, 1),
+                "cache_hit_ratio": round(stats.cache_hit_ratio, 3),
+            }
+
+        return {
+            "agents": {name: summary(stats) for name, stats in sorted(self.stats.items())},
+            "total": summary(self.totals()),
+        }
+
+_default_runner: Optional[LLMRunner] = None
+# use_llm_runner로 지정한 실행기 (등록된 기본 실행기보다 우선, 이 컨텍스트에서 만든 asyncio 작업에도 전달됨)
+_scoped_runner: "contextvars.ContextVar[Optional[LLMRunner]]" = contextvars.ContextVar("scoped_llm_runner", default=None)
+
+def set_default_llm_runner(runner: Optional[LLMRunner]) -> None:
+    """main.Runner / prompt_optimizer.Runner가 사용할 LLM 실행기를 등록합니다 (None이면 로컬 휴리스틱)"""
+    global _default_runner
+    _default_runner = runner
+
+def get_default_llm_runner() -> Optional[LLMRunner]:
+    scoped = _scoped_runner.get()
+    return scoped if scoped is not None else _default_runner
+
+@contextlib.contextmanager
+def use_llm_runner(runner: Optional[LLMRunner]):
+    """블록 안(과 그 안에서 만든 asyncio 작업)에서만 runner를 기본 LLM 실행기 대신 사용합니다 (None이면 기본 실행기).
+
+    전역 등록을 바꾸지 않으므로 스레드마다 다른 이벤트 루프에서 실행되는 호출(Streamlit 세션 등)이
+    각자 자기 루프에 묶인 실행기를 쓸 수 있습니다.
+    """
+    token = _scoped_runner.set(runner)
+    try:
+        yield runner
+    finally:
+        _scoped_runner.reset(token)
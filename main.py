@@ -3,9 +3,24 @@ import asyncio
 import json
 import os
 from enum import Enum
-from typing import Any, List, Dict
+from typing import Any, List, Dict, Optional
 from pydantic import BaseModel, Field
 
+from contradiction_index import detect_contradictions
+from fewshot_compliance import check_example, extract_format_contract, iter_compliance_results, validate_speculation
+from fewshot_index import build_fewshot_index
+from fewshot_selection import select_few_shot_examples
+from fused_checker import (
+    CONTRADICTION, FEW_SHOT, FORMAT, FusedIssues, FusedSection, build_fused_instructions, missing_sections, split_fused_issues
+)
+from llm_runner import ModelUnavailableError, get_default_llm_runner
+from micro_batcher import INTERACTIVE_LATENCY_BUDGET_MS, latency_budget
+from output_schema import OutputSchema, compile_validator, extract_output_schema, get_validator
+from prompt_document import parse_prompt
+from request_builder import serialize_payload
+from resilience import install_default_runner_from_env
+from schema_catalog import default_catalog
+
 # agents 모듈 대신 직접 구현
 class Agent:
     def __init__(self, name: str, model: str, output_type: type, instructions: str):
@@ -17,6 +32,20 @@ class Agent:
 class Runner:
     @staticmethod
     async def run(agent: Agent, input_data: str):
+        # LLM 실행기가 등록되어 있으면 모델을 호출하고, 아니면 로컬 시뮬레이션
+        llm_runner = get_default_llm_runner()
+        if llm_runner is None:
+            return await Runner.simulate(agent, input_data)
+        print(f"\n🤖 Agent '{agent.name}' 모델 호출 중... (입력 {len(input_data)} 문자)")
+        try:
+            return await llm_runner.run(agent, input_data)
+        except ModelUnavailableError as e:
+            # 공급자 장애/시간 초과 - 로컬 휴리스틱 분석기로 대체
+            print(f"⚠️ Agent '{agent.name}' 모델 사용 불가, 로컬 휴리스틱으로 대체: {e}")
+            return await Runner.simulate(agent, input_data)
+
+    @staticmethod
+    async def simulate(agent: Agent, input_data: str):
         # 간단한 시뮬레이션 - 실제로는 OpenAI API를 호출해야 함
         class Result:
             def __init__(self, final_output):
@@ -32,24 +61,46 @@ class Runner:
             print("🎯 모순점 검사 중...")
             # 실제 분석 로직 시뮬레이션
             issues = []
-            if "JSON" in input_data and "minified" in input_data:
+            # 코드 블록과 JSON 스켈레톤은 지시문이 아니므로 산문 부분만 검사
+            instructions_text = parse_prompt(input_data).prose_text
+            if "JSON" in instructions_text and "minified" in instructions_text:
                 issues.append("JSON 형식과 minified 요구사항이 충돌할 수 있습니다")
-            if "error" in input_data and "FIELD_MISSING" in input_data:
+            if "error" in instructions_text and "FIELD_MISSING" in instructions_text:
                 issues.append("에러 처리와 필수 필드 요구사항이 모순될 수 있습니다")
             
             result = agent.output_type(has_issues=len(issues) > 0, issues=issues)
             print(f"✅ 모순점 검사 완료: {len(issues)}개 발견")
             
+        elif agent.name == "contradiction_pair_checker":
+            print("🎯 후보 지시문 쌍 모순 검사 중...")
+            try:
+                data = json.loads(input_data)
+                pairs = data.get("CANDIDATE_PAIRS", [])
+                print(f"📊 후보 쌍: {len(pairs)}개, 자기모순 문장: {len(data.get('SELF_CONTRADICTORY', []))}개")
+                issues = [f"한 문장 안의 지시가 서로 충돌합니다: '{text}'" for text in data.get("SELF_CONTRADICTORY", [])]
+                # 실제 분석 로직 시뮬레이션 - 공유 용어가 많거나 유사도가 높은 쌍만 모순으로 판단
+                for pair in pairs:
+                    if len(pair.get("shared_terms", [])) >= 2 or pair.get("score", 0) >= 0.3:
+                        issues.append(f"'{pair['first']}'과 '{pair['second']}'는 동시에 따를 수 없습니다")
+                issues = issues[:5]
+                result = agent.output_type(has_issues=len(issues) > 0, issues=issues)
+                print(f"✅ 후보 쌍 모순 검사 완료: {len(issues)}개 발견")
+            except json.JSONDecodeError:
+                print("❌ JSON 파싱 오류")
+                result = agent.output_type(has_issues=False, issues=[])
+
         elif agent.name == "format_checker":
             print("📋 형식 요구사항 검사 중...")
             issues = []
-            if "JSON" in input_data:
-                if "schema" not in input_data:
+            instructions_text = parse_prompt(input_data).prose_text
+            if "JSON" in instructions_text:
+                # 스켈레톤이나 필수 필드 목록에서 필드를 하나도 추출할 수 없을 때만 스키마가 불명확한 것으로 판단
+                if not get_validator(input_data).schema.fields:
                     issues.append("JSON 스키마 정의가 명확하지 않습니다")
-                if "minified" in input_data and "pretty" in input_data:
+                if "minified" in instructions_text and "pretty" in instructions_text:
                     issues.append("minified와 pretty 출력 요구사항이 충돌합니다")
-            if "required fields" in input_data:
-                if "validation" not in input_data:
+            if "required fields" in instructions_text:
+                if "validation" not in instructions_text:
                     issues.append("필수 필드 검증 로직이 명시되지 않았습니다")
             
             result = agent.output_type(has_issues=len(issues) > 0, issues=issues)
@@ -66,11 +117,14 @@ class Runner:
                 issues = []
                 rewrite_suggestions = []
                 
-                # 예제 분석 로직
+                # 예제 분석 로직 - 형식 계약은 개발자 메시지에서 한 번만 추출
+                contract = extract_format_contract(data.get("DEVELOPER_MESSAGE", ""))
+                validator = compile_validator(contract.output_schema)
                 for i, example in enumerate(assistant_examples):
-                    if "JSON" not in example and "json" in data.get("DEVELOPER_MESSAGE", "").lower():
-                        issues.append(f"예제 {i+1}: JSON 형식 요구사항을 따르지 않음")
-                        rewrite_suggestions.append(f"예제 {i+1}을 JSON 형식으로 수정")
+                    violations = check_example(contract, example, validator)
+                    if violations:
+                        issues.extend(f"예제 {i+1}: {violation}" for violation in violations)
+                        rewrite_suggestions.append(f"예제 {i+1}을 개발자 메시지 형식에 맞게 수정")
                 
                 result = agent.output_type(has_issues=len(issues) > 0, issues=issues, rewrite_suggestions=rewrite_suggestions)
                 print(f"✅ Few-shot 검사 완료: {len(issues)}개 문제 발견")
@@ -79,6 +133,33 @@ class Runner:
                 print("❌ JSON 파싱 오류")
                 result = agent.output_type(has_issues=False, issues=[], rewrite_suggestions=[])
                 
+        elif agent.name == "fused_checker":
+            print("🧩 융합 검사 중...")
+            try:
+                data = json.loads(input_data)
+                developer_message = data.get("DEVELOPER_MESSAGE", "")
+                fs_input = {
+                    "DEVELOPER_MESSAGE": developer_message,
+                    "USER_EXAMPLES": data.get("USER_EXAMPLES", []),
+                    "ASSISTANT_EXAMPLES": data.get("ASSISTANT_EXAMPLES", []),
+                }
+                checkers = {
+                    CONTRADICTION: (dev_contradiction_checker, developer_message),
+                    FORMAT: (format_checker, developer_message),
+                    FEW_SHOT: (fewshot_consistency_checker, serialize_payload(fs_input)),
+                }
+                # 실제 분석 로직 시뮬레이션 - 요청된 섹션마다 개별 검사기 시뮬레이션 결과를 사용
+                sections = {}
+                for section in data.get("SECTIONS", []):
+                    checker, checker_input = checkers[section]
+                    checker_result = await Runner.simulate(checker, checker_input)
+                    sections[section] = FusedSection(**checker_result.final_output.model_dump())
+                result = agent.output_type(**sections)
+                print(f"✅ 융합 검사 완료: 섹션 {len(sections)}개")
+            except json.JSONDecodeError:
+                print("❌ JSON 파싱 오류")
+                result = agent.output_type()
+
         elif agent.name == "dev_rewriter":
             print("✏️ 개발자 메시지 재작성 중...")
             try:
@@ -109,14 +190,13 @@ class Runner:
                             'If *any* required field is missing, either return null for that field or short-circuit with: `{"error": "FIELD_MISSING:<field>"}`.'
                         )
                 
-                # 형식 문제 해결
+                # 형식 문제 해결 - 원본 메시지에서 추출한 스키마로 Output Format 섹션 작성
                 if format_issues.get('has_issues', False):
                     print("🔧 형식 문제 해결 중...")
-                    new_message += "\n\n## Output Format\nJSON 응답은 다음 스키마를 따라야 합니다:\n```json\n{\n  \"name\": \"string\",\n  \"brand\": \"string\",\n  \"sku\": \"string\",\n  \"price\": {\"value\": number, \"currency\": \"string\"},\n  \"images\": [\"string\"],\n  \"sizes\": [\"string\"],\n  \"materials\": [\"string\"],\n  \"care_instructions\": \"string\",\n  \"features\": [\"string\"]\n}\n```"
                 else:
                     # 형식 문제가 없어도 명확성을 위해 스키마 추가
                     print("🔧 명확성을 위해 JSON 스키마 추가...")
-                    new_message += "\n\n## Output Format\nJSON 응답은 다음 스키마를 따라야 합니다:\n```json\n{\n  \"name\": \"string\",\n  \"brand\": \"string\",\n  \"sku\": \"string\",\n  \"price\": {\"value\": number, \"currency\": \"string\"},\n  \"images\": [\"string\"],\n  \"sizes\": [\"string\"],\n  \"materials\": [\"string\"],\n  \"care_instructions\": \"string\",\n  \"features\": [\"string\"]\n}\n```"
+                new_message += _output_format_section(extract_output_schema(original_message))
                 
                 result = agent.output_type(new_developer_message=new_message)
                 print(f"✅ 재작성 완료: {len(new_message)} 문자")
@@ -157,6 +237,14 @@ class Runner:
         print(f"📤 Agent '{agent.name}' 결과: {type(result).__name__}")
         return Result(result)
 
+def _output_format_section(schema: OutputSchema) -> str:
+    """추출된 출력 스키마로 ## Output Format 섹션을 만듭니다"""
+    if schema.fields:
+        return f"\n\n## Output Format\nJSON 응답은 다음 스키마를 따라야 합니다:\n```json\n{schema.to_skeleton()}\n```"
+    if schema.table_columns:
+        return f"\n\n## Output Format\n응답은 다음 열을 가진 마크다운 표여야 합니다: {' | '.join(schema.table_columns)}"
+    return "\n\n## Output Format\n응답에 포함할 필드와 각 필드의 타입을 명시적으로 정의하세요."
+
 def set_default_openai_client(client):
     pass
 
@@ -252,6 +340,42 @@ dev_contradiction_checker = Agent(
 """,
 )
 
+contradiction_pair_checker = Agent(
+    name="contradiction_pair_checker",
+    model="gpt-4.1",
+    output_type=Issues,
+    instructions="""
+    You are **Dev-Contradiction-Pair-Checker**.
+
+    Goal
+    Decide which of the pre-selected clause pairs taken from a developer prompt are *genuine* contradictions.
+    Each pair in 'CANDIDATE_PAIRS' shares a subject term and has conflicting modalities (required / forbidden / optional).
+    'SELF_CONTRADICTORY' lists single sentences that mix such modalities.
+
+    Definition
+    - A contradiction = two clauses that cannot both be followed.
+    - Pairs that apply to different conditions, or are merely redundant, are *not* contradictions.
+
+    What you MUST do
+    1. Judge each candidate pair and each listed sentence on its own. Do not search for other pairs.
+    2. List at most FIVE contradictions (each on ONE bullet), quoting both clauses.
+    3. If no contradiction exists, say no.
+
+    Output format (**strict JSON**)
+    Return **only** an object that matches the 'Issues' schema:
+
+    '''json
+    {"has_issues": <bool>,
+    "issues": [
+        "<bullet 1>",
+        "<bullet 2>"
+    ]
+    }
+    - has_issues = true IF the issues arrays is non-emtpy.
+    - Do not add extra keys, comments or markdown.
+""",
+)
+
 format_checker = Agent(
     name="format_checker",
     model="gpt-4.1",
@@ -346,6 +470,24 @@ fewshot_consistency_checker = Agent(
     """
 )
 
+# 모순/형식/few-shot 검사를 한 번의 요청으로 수행하는 융합 검사기 (개발자 메시지를 한 번만 전송)
+fused_checker = Agent(
+    name="fused_checker",
+    model="gpt-4.1",
+    output_type=FusedIssues,
+    instructions=build_fused_instructions(
+        {
+            CONTRADICTION: dev_contradiction_checker.instructions,
+            FORMAT: format_checker.instructions,
+            FEW_SHOT: fewshot_consistency_checker.instructions,
+        },
+        input_format=(
+            "JSON with SECTIONS (the sections to fill), DEVELOPER_MESSAGE (the text every section checks), "
+            "USER_EXAMPLES (context only) and ASSISTANT_EXAMPLES (evaluated by the few_shot section)."
+        )
+    )
+)
+
 dev_rewriter = Agent(
     name="dev_rewriter",
     model="gpt-4.1",
@@ -415,6 +557,12 @@ fewshot_rewriter = Agent(
     """
 )
 
+# LLM 모드에서 호출마다 스키마/파서를 만들지 않도록 시작 시점에 카탈로그에 등록
+default_catalog.register([
+    dev_contradiction_checker, contradiction_pair_checker, format_checker, fewshot_consistency_checker,
+    fused_checker, dev_rewriter, fewshot_rewriter,
+])
+
 def _normalize_messages(messages: List[Any]) -> List[Dict[str, str]]:
     """Convert list of pydantic message models to JSON-serializable dicts."""
     result = []
@@ -425,13 +573,148 @@ def _normalize_messages(messages: List[Any]) -> List[Dict[str, str]]:
             result.append({"role": str(m["role"]), "content": str(m["content"])})
     return result
 
+async def _completed_result(final_output: Any):
+    """LLM 호출 없이 Runner.run과 같은 형태의 결과를 반환합니다 (검사 생략 시 사용)"""
+    class Result:
+        def __init__(self, final_output):
+            self.final_output = final_output
+    return Result(final_output)
+
+def _fewshot_input(developer_message: str, messages: List["ChatMessage"]) -> Dict[str, Any]:
+    return {
+        "DEVELOPER_MESSAGE": developer_message,
+        "USER_EXAMPLES": [m.content for m in messages if m.role == "user"],
+        "ASSISTANT_EXAMPLES": [m.content for m in messages if m.role == "assistant"],
+    }
+
+async def _run_section_checker(section: str, developer_message: str, messages: List["ChatMessage"]):
+    """융합 검사의 섹션 하나를 해당 개별 검사기로 실행합니다"""
+    if section == CONTRADICTION:
+        return await Runner.run(dev_contradiction_checker, developer_message)
+    if section == FORMAT:
+        return await Runner.run(format_checker, developer_message)
+    return await Runner.run(fewshot_consistency_checker, serialize_payload(_fewshot_input(developer_message, messages)))
+
+async def _run_fused_checker(developer_message: str, messages: List["ChatMessage"], sections: Dict[str, type]) -> Dict[str, Any]:
+    """요청된 섹션을 융합 검사기 한 번으로 검사하고 섹션별 Issues로 나눕니다"""
+    fc_input: Dict[str, Any] = {"SECTIONS": list(sections), "DEVELOPER_MESSAGE": developer_message}
+    if FEW_SHOT in sections:
+        fc_input.update(_fewshot_input(developer_message, messages))
+    fc_res = await Runner.run(fused_checker, serialize_payload(fc_input))
+    results = split_fused_issues(fc_res.final_output, sections)
+    missing = missing_sections(results, sections)
+    if missing:
+        # 모델이 채우지 않은 섹션은 "문제 없음"이 아니라 검사 실패 - 해당 검사기만 다시 실행
+        print(f"⚠️ 융합 검사 응답에 {', '.join(missing)} 섹션이 없어 해당 검사기만 다시 실행")
+        reruns = await asyncio.gather(*(_run_section_checker(section, developer_message, messages) for section in missing))
+        results.update(zip(missing, (rerun.final_output for rerun in reruns)))
+    return results
+
+async def _fused_section(fused_task: "asyncio.Task", section: str):
+    """융합 검사 결과 중 한 섹션을 Runner.run과 같은 형태로 반환합니다"""
+    return await _completed_result((await fused_task)[section])
+
+async def check_fewshot_batched(
+    developer_message: str,
+    messages: List["ChatMessage"],
+    chunk_size: int = 500,
+    max_workers: Optional[int] = None,
+) -> tuple[FewShotIssues, List[int]]:
+    """
+    Checks every assistant example against the format contract extracted once
+    from the developer message, in parallel chunks across a process pool.
+    Returns the aggregated FewShotIssues and the message positions of the
+    assistant examples that failed.
+    """
+    assistant_positions = [i for i, m in enumerate(messages) if m.role == "assistant"]
+    issues: List[str] = []
+    rewrite_suggestions: List[str] = []
+    failing_positions: List[int] = []
+    async for result in iter_compliance_results(
+        developer_message,
+        [messages[i].content for i in assistant_positions],
+        chunk_size=chunk_size,
+        max_workers=max_workers,
+    ):
+        if not result.compliant:
+            failing_positions.append(assistant_positions[result.index])
+            issues.extend(f"예제 {result.index + 1}: {issue}" for issue in result.issues)
+            rewrite_suggestions.append(f"예제 {result.index + 1}을 개발자 메시지 형식에 맞게 수정")
+    failing_positions.sort()
+    return FewShotIssues(has_issues=bool(issues), issues=issues, rewrite_suggestions=rewrite_suggestions), failing_positions
+
+async def _rewrite_fewshot_messages(
+    developer_message: str,
+    messages: List[ChatMessage],
+    fs_issues: FewShotIssues,
+    failing_positions: Optional[List[int]] = None
+) -> List[Any]:
+    """few-shot 재작성기를 실행합니다. failing_positions가 있으면 위반한 예제만 재작성해 제자리에 병합합니다."""
+    if failing_positions is not None:
+        # 위반한 assistant 예제와 직전 user 메시지만 재작성기로 보내고 결과를 제자리에 병합
+        subset_positions = sorted({
+            p for i in failing_positions
+            for p in ((i - 1, i) if i > 0 and messages[i - 1].role == "user" else (i,))
+        })
+        print(f"🔄 Few-shot 예제 재작성 필요: {len(subset_positions)}/{len(messages)}개 메시지만 재작성")
+        mr_input = {
+            "NEW_DEVELOPER_MESSAGE": developer_message,
+            "ORIGINAL_MESSAGES": _normalize_messages([messages[p] for p in subset_positions]),
+            "FEW_SHOT_ISSUES": fs_issues.model_dump(),
+        }
+        mr_res = await Runner.run(fewshot_rewriter, serialize_payload(mr_input))
+        rewritten = mr_res.final_output.messages
+        # 보낸 메시지와 개수/역할이 같아야 제자리 병합 가능 - 아니면 병합 위치를 알 수 없으므로 전체 재작성
+        if [m.role for m in rewritten] == [messages[p].role for p in subset_positions]:
+            final_messages = list(messages)
+            for position, message in zip(subset_positions, rewritten):
+                final_messages[position] = message
+            return final_messages
+        print(
+            f"⚠️ 부분 재작성 결과가 보낸 메시지와 맞지 않음 (메시지 {len(rewritten)}개, 보낸 메시지 {len(subset_positions)}개) "
+            "- 전체 예제를 다시 재작성"
+        )
+
+    print("🔄 Few-shot 예제 재작성 필요")
+    mr_input = {
+        "NEW_DEVELOPER_MESSAGE": developer_message,
+        "ORIGINAL_MESSAGES": _normalize_messages(messages),
+        "FEW_SHOT_ISSUES": fs_issues.model_dump(),
+    }
+    mr_res = await Runner.run(fewshot_rewriter, serialize_payload(mr_input))
+    return mr_res.final_output.messages
+
 async def optimize_prompt_parallel(
     developer_message: str,
     messages: List["ChatMessage"],
+    max_few_shot_examples: Optional[int] = None,
+    few_shot_token_budget: Optional[int] = None,
+    fewshot_index_path: Optional[str] = None,
+    batched_fewshot_check: bool = False,
+    indexed_contradiction_check: bool = False,
+    speculative_fewshot: bool = False,
+    fused_checkers: bool = False,
 ) -> Dict[str, Any]:
     """
     Runs contradiction, format, and few-shot checkers in parallel,
     then rewrites the prompt/examples if needed.
+    If max_few_shot_examples or few_shot_token_budget is given, only the most
+    representative example pairs are checked and rewritten.
+    If fewshot_index_path is given, the final examples are also saved as a
+    retrieval index for inference-time example selection (see fewshot_index).
+    If batched_fewshot_check is True, examples are validated locally in parallel
+    chunks (see fewshot_compliance) and only the failing ones are sent to the
+    few-shot rewriter.
+    If indexed_contradiction_check is True, clauses are indexed locally by subject
+    (see contradiction_index) and only candidate clause pairs are sent to the
+    contradiction checker; the LLM call is skipped when there are no candidates.
+    If speculative_fewshot is True, the few-shot rewriter starts against the
+    original developer message while the developer message is rewritten; its
+    output is kept unless the final message changes the format contract and
+    the rewritten examples violate it.
+    If fused_checkers is True, the checkers that would each receive the full
+    developer message run as a single fused checker request (see fused_checker)
+    and its output is split back into the per-checker issues.
     Returns a unified dict suitable for an API or endpoint.
     """
 
@@ -439,24 +722,62 @@ async def optimize_prompt_parallel(
         print("\n" + "="*60)
         print("🚀 프롬프트 최적화 워크플로우 시작")
         print("="*60)
+
+        if messages and (max_few_shot_examples is not None or few_shot_token_budget is not None):
+            selected = select_few_shot_examples(
+                messages,
+                k=max_few_shot_examples,
+                token_budget=few_shot_token_budget,
+            )
+            print(f"\n🧮 Few-shot 예제 선택: {len(messages)}개 중 {len(selected)}개 메시지 유지")
+            messages = selected
         
         # 1. Run all checkers in parallel (contradiction, format, fewshot if there are examples)
         print("\n📋 1단계: 병렬 검사기 실행")
         print("-" * 40)
         
+        # 융합 모드: 로컬에서 대신 처리하지 않는 검사를 하나의 요청으로 묶음
+        fused_task = None
+        if fused_checkers:
+            fused_sections: Dict[str, type] = {FORMAT: Issues}
+            if not indexed_contradiction_check:
+                fused_sections[CONTRADICTION] = Issues
+            if messages and not batched_fewshot_check:
+                fused_sections[FEW_SHOT] = FewShotIssues
+            print(f"\n🧩 융합 검사기 사용: {', '.join(fused_sections)} 섹션을 한 번의 요청으로 검사")
+            fused_task = asyncio.create_task(_run_fused_checker(developer_message, messages, fused_sections))
+
+        if indexed_contradiction_check:
+            report = detect_contradictions(developer_message)
+            print(f"\n🗂️ 색인 기반 모순 후보: 지시문 {report.clauses}개, 비교한 쌍 {report.compared_pairs}개 (충돌 {report.conflicting_pairs}개), 후보 {len(report.candidates)}개")
+            if report.candidates or report.self_contradictory:
+                cd_input = {
+                    "CANDIDATE_PAIRS": report.candidate_pairs_payload(),
+                    "SELF_CONTRADICTORY": [clause.text for clause in report.self_contradictory],
+                }
+                cd_task = Runner.run(contradiction_pair_checker, serialize_payload(cd_input))
+            else:
+                cd_task = _completed_result(Issues.no_issues())
+        elif fused_task is not None:
+            cd_task = _fused_section(fused_task, CONTRADICTION)
+        else:
+            cd_task = Runner.run(dev_contradiction_checker, developer_message)
+
         tasks = [
-            Runner.run(dev_contradiction_checker, developer_message),
-            Runner.run(format_checker, developer_message),
+            cd_task,
+            _fused_section(fused_task, FORMAT) if fused_task is not None else Runner.run(format_checker, developer_message),
         ]
         
-        if messages:
+        batched_check = None
+        if messages and batched_fewshot_check:
+            print(f"\n💬 Few-shot 예제 발견: {len(messages)}개 메시지 - 로컬 일괄 검사 사용")
+            batched_check = asyncio.create_task(check_fewshot_batched(developer_message, messages))
+        elif messages and fused_task is not None:
+            print(f"\n💬 Few-shot 예제 발견: {len(messages)}개 메시지 - 융합 검사기에 포함")
+            tasks.append(_fused_section(fused_task, FEW_SHOT))
+        elif messages:
             print(f"\n💬 Few-shot 예제 발견: {len(messages)}개 메시지")
-            fs_input = {
-                "DEVELOPER_MESSAGE": developer_message,
-                "USER_EXAMPLES": [m.content for m in messages if m.role == "user"],
-                "ASSISTANT_EXAMPLES": [m.content for m in messages if m.role == "assistant"],
-            }
-            tasks.append(Runner.run(fewshot_consistency_checker, json.dumps(fs_input)))
+            tasks.append(_run_section_checker(FEW_SHOT, developer_message, messages))
         else:
             print("\n💬 Few-shot 예제 없음 - fewshot 검사기 건너뜀")
 
@@ -469,7 +790,11 @@ async def optimize_prompt_parallel(
         
         cd_issues: Issues = results[0].final_output
         fi_issues: Issues = results[1].final_output
-        fs_issues: FewShotIssues = results[2].final_output if messages else FewShotIssues.no_issues()
+        failing_positions: Optional[List[int]] = None
+        if batched_check is not None:
+            fs_issues, failing_positions = await batched_check
+        else:
+            fs_issues: FewShotIssues = results[2].final_output if messages else FewShotIssues.no_issues()
 
         print(f"🎯 모순점 검사 결과: {len(cd_issues.issues)}개 문제")
         if cd_issues.issues:
@@ -490,31 +815,57 @@ async def optimize_prompt_parallel(
         print("\n✏️ 3단계: 필요시 재작성")
         print("-" * 40)
         
-        final_prompt = developer_message
-        if cd_issues.has_issues or fi_issues.has_issues:
-            print("🔄 개발자 메시지 재작성 필요")
-            pr_input = {
-                "ORIGINAL_DEVELOPER_MESSAGE": developer_message,
-                "CONTRADICTION_ISSUES": cd_issues.model_dump(),
-                "FORMAT_ISSUES": fi_issues.model_dump(),
-            }
-            pr_res = await Runner.run(dev_rewriter, json.dumps(pr_input))
-            final_prompt = pr_res.final_output.new_developer_message
-        else:
-            print("✅ 개발자 메시지 재작성 불필요")
-
-        final_messages: list[ChatMessage] | list[dict[str, str]] = messages
-        if fs_issues.has_issues:
-            print("🔄 Few-shot 예제 재작성 필요")
-            mr_input = {
-                "NEW_DEVELOPER_MESSAGE": final_prompt,
-                "ORIGINAL_MESSAGES": _normalize_messages(messages),
-                "FEW_SHOT_ISSUES": fs_issues.model_dump(),
-            }
-            mr_res = await Runner.run(fewshot_rewriter, json.dumps(mr_input))
-            final_messages = mr_res.final_output.messages
-        else:
-            print("✅ Few-shot 예제 재작성 불필요")
+        # 추측 실행: few-shot 재작성을 원본 메시지 기준으로 개발자 메시지 재작성과 동시에 시작
+        speculative_rewrite = None
+        if speculative_fewshot and fs_issues.has_issues:
+            print("⚡ Few-shot 예제 추측 재작성 시작 (원본 개발자 메시지 기준)")
+            speculative_rewrite = asyncio.create_task(
+                _rewrite_fewshot_messages(developer_message, messages, fs_issues, failing_positions)
+            )
+
+        try:
+            final_prompt = developer_message
+            if cd_issues.has_issues or fi_issues.has_issues:
+                print("🔄 개발자 메시지 재작성 필요")
+                pr_input = {
+                    "ORIGINAL_DEVELOPER_MESSAGE": developer_message,
+                    "CONTRADICTION_ISSUES": cd_issues.model_dump(),
+                    "FORMAT_ISSUES": fi_issues.model_dump(),
+                }
+                pr_res = await Runner.run(dev_rewriter, serialize_payload(pr_input))
+                final_prompt = pr_res.final_output.new_developer_message
+            else:
+                print("✅ 개발자 메시지 재작성 불필요")
+
+            final_messages: list[ChatMessage] | list[dict[str, str]] = messages
+            speculation = None
+            if speculative_rewrite is not None:
+                final_messages = await speculative_rewrite
+                # 재작성으로 예제가 의존하는 형식 계약이 바뀌어 위반이 생긴 경우에만 다시 재작성
+                check = validate_speculation(
+                    developer_message,
+                    final_prompt,
+                    [m["content"] for m in _normalize_messages(final_messages) if m["role"] == "assistant"]
+                )
+                speculation = {"contract_changed": check.contract_changed, "violations": check.violations, "reworked": not check.valid}
+                if check.valid:
+                    print("✅ 추측 재작성 결과 유효 - 최종 개발자 메시지와 형식 계약 일치")
+                else:
+                    print(f"♻️ 형식 계약 변경으로 Few-shot 예제 다시 재작성 ({check.violations}개 예제 위반)")
+                    final_messages = await _rewrite_fewshot_messages(final_prompt, messages, fs_issues, failing_positions)
+            elif fs_issues.has_issues:
+                final_messages = await _rewrite_fewshot_messages(final_prompt, messages, fs_issues, failing_positions)
+            else:
+                print("✅ Few-shot 예제 재작성 불필요")
+        finally:
+            if speculative_rewrite is not None and not speculative_rewrite.done():
+                speculative_rewrite.cancel()
+
+        new_messages = _normalize_messages(final_messages)
+        fewshot_index = None
+        if fewshot_index_path and new_messages:
+            fewshot_index = build_fewshot_index(new_messages, fewshot_index_path)
+            print(f"🗂️ Few-shot 검색 색인 저장: {fewshot_index['path']} ({fewshot_index['examples']}개 예제)")
 
         print("\n" + "="*60)
         print("✅ 프롬프트 최적화 워크플로우 완료")
@@ -523,10 +874,12 @@ async def optimize_prompt_parallel(
         return {
             "changes": True,
             "new_developer_message": final_prompt,
-            "new_messages": _normalize_messages(final_messages),
+            "new_messages": new_messages,
             "contradiction_issues": "\n".join(cd_issues.issues),
             "few_shot_contradiction_issues": "\n".join(fs_issues.issues),
             "format_issues": "\n".join(fi_issues.issues),
+            "fewshot_index": fewshot_index,
+            "speculative_fewshot": speculation,
         }
 
 async def main():
@@ -570,9 +923,12 @@ Note: It is acceptable to output null for any missing field instead of an error
     print(f"📝 원본 개발자 메시지:\n{developer_message}\n")
     print(f"💬 예제 메시지 개수: {len(messages)}개\n")
     
+    # PROMPT_OPTIMIZER_LLM_BACKEND가 설정되어 있으면 실제 모델을 ResilientRunner로 호출 (없으면 로컬 휴리스틱)
+    install_default_runner_from_env()
     try:
-        # 프롬프트 최적화 실행
-        result = await optimize_prompt_parallel(developer_message, messages)
+        # 프롬프트 최적화 실행 (대화형 실행이므로 마이크로 배치 대기 없이)
+        with latency_budget(INTERACTIVE_LATENCY_BUDGET_MS):
+            result = await optimize_prompt_parallel(developer_message, messages)
         
         print("✅ 최적화 완료!")
         print("\n" + "="*50)
@@ -0,0 +1,434 @@
+"""
+MCP 클라이언트 풀 모듈
+
+최적화기를 호출하는 서비스가 요청마다 MCP 서버 프로세스를 띄우고 초기화하지 않도록, 미리 연결해 둔 세션 풀을 제공합니다.
+- 세션: stdio 하위 프로세스(StdioSession) 또는 Streamable HTTP 연결(HttpSession). initialize는 세션을 만들 때 한 번만 수행
+- 파이프라이닝: 한 세션에서 요청 ID로 응답을 짝지어 여러 요청을 동시에 보냄 (세션당 max_in_flight개까지, 가장 한가한 세션 선택)
+- 재연결: 연결이 끊긴 세션은 새 세션으로 바꾸고 요청을 다시 보냄 (max_retries번까지)
+- 시간 초과: 서버에 notifications/cancelled를 보내고 오류를 돌려줌. 세션이 살아 있으면 서버가 원래 호출을 계속 실행했을 수
+  있으므로 다시 보내지 않음 (idempotent_tools로 지정한 도구만 재시도)
+- 통계: 도구별 지연 시간 백분위수, 요청/오류/재시도/재연결/세션 생성 수
+
+    async with MCPClientPool.stdio(sys.executable, ["mcp_server.py"], size=2) as pool:
+        result = await pool.call_tool("optimize_prompt", {"prompt": "..."})
+        print(tool_text(result))
+"""
+
+import asyncio
+import itertools
+import json
+import os
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import httpx
+from pydantic import BaseModel
+
+from resilience import LatencyTracker
+
+PROTOCOL_VERSION = "2024-11-05"
+CLIENT_INFO = {"name": "prompt-optimizer-client", "version": "1.0.0"}
+
+class MCPClientError(Exception):
+    """서버가 JSON-RPC 오류로 응답한 경우 (다시 보내도 같은 결과이므로 재시도하지 않음)"""
+
+    def __init__(self, message: str, code: Optional[int] = None):
+        super().__init__(message)
+        self.code = code
+
+class MCPConnectionError(Exception):
+    """연결이 끊겼거나 응답 시간 제한을 넘긴 경우 (세션이 닫혔으면 새 세션으로 재시도)"""
+
+class MCPTimeoutError(MCPConnectionError):
+    """응답 시간 제한을 넘긴 경우 - 세션은 살아 있고 서버는 취소 알림을 받기 전까지 호출을 계속 실행했을 수 있음"""
+
+class ClientStats(BaseModel):
+    """클라이언트 풀 통계"""
+    requests: int = 0  # call_tool 호출 수
+    errors: int = 0  # 재시도 후에도 실패한 호출 수
+    retries: int = 0
+    reconnects: int = 0  # 끊긴 세션을 새 세션으로 바꾼 횟수
+    sessions_started: int = 0  # 만든 세션 수 (초기 세션 + 재연결)
+    max_in_flight: int = 0  # 동시에 처리 중이던 최대 요청 수
+
+def tool_text(result: Dict[str, Any]) -> str:
+    """tools/call 결과의 텍스트 내용"""
+    return "\n".join(item.get("text", "") for item in result.get("content", []) if item.get("type") == "text")
+
+class MCPSession:
+    """MCP 서버 세션 하나 (전송 방식은 하위 클래스가 구현)"""
+
+    def __init__(self):
+        self.in_flight = 0
+        self.closed = False
+        self.server_info: Dict[str, Any] = {}
+        self._ids = itertools.count(1)
+
+    async def start(self) -> None:
+        """연결하고 initialize 핸드셰이크를 수행합니다"""
+        await self._open()
+        result = await self.request("initialize", {
+            "protocolVersion": PROTOCOL_VERSION,
+            "capabilities": {},
+            "clientInfo": CLIENT_INFO
+        })
+        self.server_info = result.get("serverInfo", {})
+        await self._notify({"jsonrpc": "2.0", "method": "notifications/initialized"})
+
+    async def request(self, method: str, params: Optional[Dict[str, Any]] = None, timeout_s: Optional[float] = None) -> Any:
+        if self.closed:
+            raise MCPConnectionError("세션이 닫혔습니다")
+        message = {"jsonrpc": "2.0", "id": next(self._ids), "method": method, "params": params or {}}
+        self.in_flight += 1
+        try:
+            response = await asyncio.wait_for(self._request(message), timeout_s)
+        except asyncio.TimeoutError:
+            await self._cancel(message["id"], f"{timeout_s}초 안에 응답이 없어 클라이언트가 취소함")
+            raise MCPTimeoutError(f"{method}: {timeout_s}초 안에 응답이 없습니다") from None
+        finally:
+            self.in_flight -= 1
+        if "error" in response:
+            error = response["error"]
+            raise MCPClientError(f"{method}: {error.get('message')}", error.get("code"))
+        return response.get("result")
+
+    async def call_tool(self, name: str, arguments: Dict[str, Any], timeout_s: Optional[float] = None) -> Dict[str, Any]:
+        return await self.request("tools/call", {"name": name, "arguments": arguments}, timeout_s)
+
+    async def _cancel(self, request_id: int, reason: str) -> None:
+        """서버에 요청 취소를 알립니다 (실패해도 무시 - 세션이 끊겼으면 서버도 호출을 이어가지 못함)"""
+        if self.closed:
+            return
+        try:
+            await self._notify({
+                "jsonrpc": "2.0",
+                "method": "notifications/cancelled",
+                "params": {"requestId": request_id, "reason": reason}
+            })
+        except (MCPClientError, MCPConnectionError):
+            pass
+
+    async def _open(self) -> None:
+        raise NotImplementedError
+
+    async def _request(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    async def _notify(self, message: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        raise NotImplementedError
+
+class StdioSession(MCPSession):
+    """하위 프로세스의 stdin/stdout으로 줄 단위 JSON-RPC를 주고받는 세션.
+    응답을 읽는 작업 하나가 요청 ID별 Future를 완료시키므로 여러 요청이 동시에 진행됩니다."""
+
+    def __init__(self, command: str, args: Sequence[str] = (), env: Optional[Dict[str, str]] = None, cwd: Optional[str] = None):
+        super().__init__()
+        self.command = command
+        self.args = list(args)
+        self.env = env
+        self.cwd = cwd
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self._pending: Dict[int, "asyncio.Future[Dict[str, Any]]"] = {}
+        self._reader: Optional[asyncio.Task] = None
+
+    async def _open(self) -> None:
+        self.process = await asyncio.create_subprocess_exec(
+            self.command,
+            *self.args,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+            env={**os.environ, **self.env} if self.env else None,
+            cwd=self.cwd,
+            limit=16 * 1024 * 1024
+        )
+        self._reader = asyncio.get_running_loop().create_task(self._read_loop())
+
+    async def _read_loop(self) -> None:
+        try:
+            while True:
+                line = await self.process.stdout.readline()
+                if not line:
+                    break
+                try:
+                    message = json.loads(line)
+                except ValueError:
+                    continue  # 서버가 stdout에 쓴 JSON이 아닌 출력은 무시
+                if "method" in message:
+                    if "id" in message:
+                        # 서버 요청(ping 등)에는 빈 결과로 응답
+                        await self._write({"jsonrpc": "2.0", "id": message["id"], "result": {}})
+                    continue
+                future = self._pending.pop(message.get("id"), None)
+                if future is not None and not future.done():
+                    future.set_result(message)
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            self._fail_pending(MCPConnectionError(f"서버 프로세스 연결이 끊겼습니다 ({self.command})"))
+
+    def _fail_pending(self, error: Exception) -> None:
+        self.closed = True
+        pending, self._pending = self._pending, {}
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(error)
+
+    async def _write(self, message: Dict[str, Any]) -> None:
+        try:
+            self.process.stdin.write(json.dumps(message, ensure_ascii=False).encode("utf-8") + b"\n")
+            await self.process.stdin.drain()
+        except (ConnectionError, RuntimeError) as exc:
+            self._fail_pending(MCPConnectionError(f"서버 프로세스에 쓸 수 없습니다: {exc}"))
+            raise MCPConnectionError(f"서버 프로세스에 쓸 수 없습니다: {exc}") from exc
+
+    async def _request(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        future = asyncio.get_running_loop().create_future()
+        self._pending[message["id"]] = future
+        try:
+            await self._write(message)
+            return await future
+        finally:
+            self._pending.pop(message["id"], None)
+
+    async def _notify(self, message: Dict[str, Any]) -> None:
+        await self._write(message)
+
+    async def close(self) -> None:
+        self.closed = True
+        if self.process is None:
+            return
+        if self.process.returncode is None:
+            try:
+                self.process.stdin.close()
+                await asyncio.wait_for(self.process.wait(), timeout=2.0)
+            except (asyncio.TimeoutError, ConnectionError):
+                self.process.kill()
+                await self.process.wait()
+        if self._reader is not None:
+            await asyncio.gather(self._reader, return_exceptions=True)
+
+class HttpSession(MCPSession):
+    """Streamable HTTP 세션. 요청마다 POST 하나를 보내며 keep-alive 연결을 재사용하고,
+    initialize 응답의 Mcp-Session-Id를 이후 요청에 붙입니다. 응답은 JSON 또는 SSE(text/event-stream)입니다."""
+
+    def __init__(self, url: str, headers: Optional[Dict[str, str]] = None, client: Optional[httpx.AsyncClient] = None):
+        super().__init__()
+        self.url = url
+        self.headers = dict(headers or {})
+        self.session_id: Optional[str] = None
+        self._client = client
+        self._owns_client = client is None
+
+    async def _open(self) -> None:
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=None)
+
+    async def _post(self, message: Dict[str, Any]) -> httpx.Response:
+        headers = {"Accept": "application/json, text/event-stream", "Content-Type": "application/json", **self.headers}
+        if self.session_id is not None:
+            headers["Mcp-Session-Id"] = self.session_id
+        try:
+            response = await self._client.post(self.url, content=json.dumps(message, ensure_ascii=False).encode("utf-8"), headers=headers)
+        except httpx.TransportError as exc:
+            self.closed = True
+            raise MCPConnectionError(f"{self.url}: {exc!r}") from exc
+        if response.status_code == 404 and self.session_id is not None:
+            # 서버가 세션을 잊음 (재시작 등) - 새 세션 필요
+            self.closed = True
+            raise MCPConnectionError(f"{self.url}: 세션이 만료되었습니다")
+        if response.status_code >= 500:
+            raise MCPConnectionError(f"{self.url}: HTTP {response.status_code}")
+        if response.status_code >= 400:
+            raise MCPClientError(f"{self.url}: HTTP {response.status_code}")
+        return response
+
+    async def _request(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        response = await self._post(message)
+        session_id = response.headers.get("mcp-session-id")
+        if session_id:
+            self.session_id = session_id
+        if response.headers.get("content-type", "").startswith("text/event-stream"):
+            for line in response.text.splitlines():
+                if line.startswith("data:"):
+                    event = json.loads(line[5:])
+                    if event.get("id") == message["id"] and "method" not in event:
+                        return event
+            raise MCPConnectionError(f"{self.url}: 응답 이벤트가 없습니다")
+        return response.json()
+
+    async def _notify(self, message: Dict[str, Any]) -> None:
+        await self._post(message)
+
+    async def close(self) -> None:
+        self.closed = True
+        if self._client is None:
+            return
+        if self.session_id is not None:
+            try:
+                await self._client.delete(self.url, headers={"Mcp-Session-Id": self.session_id})
+            except httpx.HTTPError:
+                pass
+        if self._owns_client:
+            await self._client.aclose()
+
+class MCPClientPool:
+    """미리 초기화한 MCP 세션 size개를 공유하는 비동기 클라이언트.
+
+    session_factory: 새 (시작 전) 세션을 만드는 함수
+    max_in_flight: 세션당 동시에 보낼 최대 요청 수 (전체 동시 요청은 size * max_in_flight개까지, 나머지는 대기)
+    request_timeout_s: 요청 하나의 응답 시간 제한
+    max_retries: 연결 오류에 대한 재시도 횟수. 세션이 닫힌 경우에만 새 세션으로 다시 보냄
+    idempotent_tools: 세션이 살아 있는 연결 오류(시간 초과, HTTP 5xx)에도 다시 보내도 되는 도구 이름
+        (다시 보내면 서버에서 같은 호출이 두 번 실행될 수 있으므로 기본값은 없음)
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], MCPSession],
+        size: int = 2,
+        max_in_flight: int = 8,
+        request_timeout_s: float = 120.0,
+        start_timeout_s: float = 30.0,
+        max_retries: int = 1,
+        idempotent_tools: Sequence[str] = ()
+    ):
+        self.session_factory = session_factory
+        self.size = size
+        self.max_in_flight = max_in_flight
+        self.request_timeout_s = request_timeout_s
+        self.start_timeout_s = start_timeout_s
+        self.max_retries = max_retries
+        self.idempotent_tools = frozenset(idempotent_tools)
+        self.stats = ClientStats()
+        self.latency = LatencyTracker(window=1000, min_samples=1)
+        self._sessions: List[MCPSession] = []
+        self._slots = asyncio.Semaphore(size * max_in_flight)
+        self._reconnecting: Dict[int, "asyncio.Future[MCPSession]"] = {}
+
+    @classmethod
+    def stdio(
+        cls, command: str, args: Sequence[str] = (), env: Optional[Dict[str, str]] = None, cwd: Optional[str] = None, **options: Any
+    ) -> "MCPClientPool":
+        return cls(lambda: StdioSession(command, args, env, cwd), **options)
+
+    @classmethod
+    def http(cls, url: str, headers: Optional[Dict[str, str]] = None, **options: Any) -> "MCPClientPool":
+        return cls(lambda: HttpSession(url, headers), **options)
+
+    async def __aenter__(self) -> "MCPClientPool":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.close()
+
+    async def start(self) -> None:
+        """세션 size개를 동시에 만들고 초기화합니다 (하나라도 실패하면 만든 세션을 닫고 MCPConnectionError)"""
+        results = await asyncio.gather(*(self._new_session() for _ in range(self.size)), return_exceptions=True)
+        sessions = [result for result in results if isinstance(result, MCPSession)]
+        errors = [result for result in results if not isinstance(result, MCPSession)]
+        if errors:
+            await asyncio.gather(*(session.close() for session in sessions), return_exceptions=True)
+            raise MCPConnectionError(f"MCP 서버 세션을 시작할 수 없습니다: {errors[0]}") from errors[0]
+        self._sessions = sessions
+
+    async def close(self) -> None:
+        sessions, self._sessions = self._sessions, []
+        await asyncio.gather(*(session.close() for session in sessions), return_exceptions=True)
+
+    async def _new_session(self) -> MCPSession:
+        session = self.session_factory()
+        try:
+            await asyncio.wait_for(session.start(), self.start_timeout_s)
+        except (asyncio.TimeoutError, MCPClientError, MCPConnectionError, OSError) as exc:
+            await session.close()
+            if isinstance(exc, MCPConnectionError):
+                raise
+            raise MCPConnectionError(f"세션 초기화 실패: {exc!r}") from exc
+        self.stats.sessions_started += 1
+        return session
+
+    async def _reconnect(self, index: int) -> MCPSession:
+        """끊긴 세션 index를 새 세션으로 바꿉니다 (동시에 여러 요청이 같은 세션의 끊김을 발견해도 한 번만 연결)"""
+        pending = self._reconnecting.get(index)
+        if pending is not None:
+            return await pending
+        future = asyncio.get_running_loop().create_future()
+        self._reconnecting[index] = future
+        try:
+            await self._sessions[index].close()
+            session = await self._new_session()
+            self._sessions[index] = session
+            self.stats.reconnects += 1
+            future.set_result(session)
+            return session
+        except BaseException as exc:
+            future.set_exception(exc)
+            future.exception()  # 기다리는 요청이 없어도 경고가 남지 않도록 예외를 확인 처리
+            raise
+        finally:
+            del self._reconnecting[index]
+
+    async def _session(self) -> MCPSession:
+        """가장 한가한 살아 있는 세션 (모두 끊겼으면 재연결)"""
+        index = min(range(len(self._sessions)), key=lambda i: (self._sessions[i].closed, self._sessions[i].in_flight))
+        if self._sessions[index].closed:
+            return await self._reconnect(index)
+        return self._sessions[index]
+
+    def _replace_later(self, session: MCPSession) -> None:
+        """끊긴 세션을 백그라운드에서 새 세션으로 바꿈 (다음 요청이 재연결을 기다리지 않도록)"""
+        if session in self._sessions:
+            index = self._sessions.index(session)
+            if index not in self._reconnecting:
+                task = asyncio.get_running_loop().create_task(self._reconnect(index))
+                task.add_done_callback(lambda done: done.cancelled() or done.exception())
+
+    async def call_tool(self, name: str, arguments: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """도구를 호출하고 tools/call 결과({"content": [...], "isError": ...})를 돌려줍니다"""
+        if not self._sessions:
+            raise MCPConnectionError("풀이 시작되지 않았습니다 (start() 또는 async with 필요)")
+        self.stats.requests += 1
+        started = time.perf_counter()
+        async with self._slots:
+            in_flight = sum(session.in_flight for session in self._sessions) + 1
+            self.stats.max_in_flight = max(self.stats.max_in_flight, in_flight)
+            for attempt in range(self.max_retries + 1):
+                session: Optional[MCPSession] = None
+                try:
+                    session = await self._session()
+                    result = await session.call_tool(name, arguments or {}, self.request_timeout_s)
+                except MCPConnectionError:
+                    # 세션이 살아 있으면 서버가 호출을 계속 실행 중일 수 있으므로 멱등 도구만 다시 보냄
+                    closed = session is None or session.closed
+                    if attempt == self.max_retries or not (closed or name in self.idempotent_tools):
+                        self.stats.errors += 1
+                        raise
+                    self.stats.retries += 1
+                    if session is not None and session.closed:
+                        self._replace_later(session)
+                    continue
+                except MCPClientError:
+                    self.stats.errors += 1
+                    raise
+                self.latency.observe(name, time.perf_counter() - started)
+                return result
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            **self.stats.model_dump(),
+            "sessions": len(self._sessions),
+            "alive_sessions": sum(not session.closed for session in self._sessions),
+            "in_flight": sum(session.in_flight for session in self._sessions),
+            "latency": self.latency.snapshot(),
+        }
+
+def optimizer_server_pool(size: int = 2, **options: Any) -> MCPClientPool:
+    """이 저장소의 mcp_server.py를 stdio 하위 프로세스로 띄우는 풀"""
+    directory = os.path.dirname(os.path.abspath(__file__))
+    return MCPClientPool.stdio(sys.executable, [os.path.join(directory, "mcp_server.py")], cwd=directory, size=size, **options)
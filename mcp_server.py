@@ -7,8 +7,10 @@ MCP Server for Prompt Optimizer
 """
 
 import asyncio
+import contextlib
 import json
 import logging
+import os
 from typing import Any, Dict, List, Optional, Sequence
 from datetime import datetime
 
@@ -20,6 +22,7 @@ from mcp.types import (
     CallToolResult,
     ListToolsRequest,
     ListToolsResult,
+    Resource,
     Tool,
     TextContent,
     ImageContent,
@@ -27,7 +30,15 @@ from mcp.types import (
 )
 
 # 우리의 프롬프트 최적화 모듈 임포트
+from artifact_store import ANALYSIS, OPTIMIZATION, REVISION, ArtifactStore, artifact_uri
+from bulk_tools import DEFAULT_BATCH_CONCURRENCY, DEFAULT_PAGE_SIZE, MAX_BATCH_CONCURRENCY, ResultPager, run_bounded
+from job_queue import SUCCEEDED, JobQueue, JobWorkerPool
+from micro_batcher import INTERACTIVE_LATENCY_BUDGET_MS, latency_budget
+from resilience import install_default_runner_from_env
+from sharded_service import ShardedOptimizerService
+from structured_results import blob_ref, structured_json, to_structured
 from prompt_optimizer import (
+    analyze_prompt,
     optimize_prompt_comprehensive,
     revise_prompt_with_feedback,
     ChatMessage,
@@ -38,12 +49,178 @@ from prompt_optimizer import (
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("prompt-optimizer-mcp")
 
+# 비동기 작업 큐 파일 (서버를 다시 시작해도 작업이 유지됨)
+JOB_DB_PATH = os.environ.get(
+    "PROMPT_OPTIMIZER_JOB_DB", os.path.join(os.path.dirname(os.path.abspath(__file__)), "prompt_optimizer_jobs.db")
+)
+JOB_WORKERS = int(os.environ.get("PROMPT_OPTIMIZER_JOB_WORKERS", "4"))
+
+# 호출자가 응답을 기다리는 도구 (submit_optimization 작업과 *_batch 도구는 마이크로 배치로 묶일 수 있음)
+INTERACTIVE_TOOLS = frozenset({"optimize_prompt", "revise_with_feedback", "analyze_prompt"})
+
+# 최적화를 실행할 워커 프로세스 수 (0이면 서버 프로세스 안에서 실행, 1 이상이면 프롬프트 해시로 워커에 나눠 보냄)
+SHARD_WORKERS = int(os.environ.get("PROMPT_OPTIMIZER_SHARDS", "0"))
+
+# 내용 해시 아티팩트 저장소 파일 (MCP 리소스로 공개되며 같은 서버의 클라이언트끼리 공유)
+ARTIFACT_DB_PATH = os.environ.get(
+    "PROMPT_OPTIMIZER_ARTIFACT_DB", os.path.join(os.path.dirname(os.path.abspath(__file__)), "prompt_optimizer_artifacts.db")
+)
+
+# optimize_prompt와 submit_optimization이 공유하는 입력 스키마 속성
+OPTIMIZATION_PROPERTIES = {
+    "prompt": {
+        "type": "string",
+        "description": "최적화할 프롬프트 텍스트"
+    },
+    "prompt_ref": {
+        "type": "string",
+        "description": "prompt 대신 보낼 수 있는 서버에 저장된 프롬프트의 해시 참조 (sha256:...)"
+    },
+    "few_shot_messages": {
+        "type": "array",
+        "description": "Few-shot 예제 메시지들 (선택사항)",
+        "items": {
+            "type": "object",
+            "properties": {
+                "role": {
+                    "type": "string",
+                    "enum": ["user", "assistant"],
+                    "description": "메시지 역할"
+                },
+                "content": {
+                    "type": "string",
+                    "description": "메시지 내용"
+                }
+            },
+            "required": ["role", "content"]
+        }
+    },
+    "max_few_shot_examples": {
+        "type": "integer",
+        "description": "유지할 대표 few-shot 예제 쌍의 최대 개수 (선택사항)",
+        "minimum": 1
+    },
+    "few_shot_token_budget": {
+        "type": "integer",
+        "description": "선택된 few-shot 예제의 최대 토큰 수 (선택사항)",
+        "minimum": 1
+    },
+    "deadline_ms": {
+        "type": "number",
+        "description": "응답 시간 제한(ms). 부족하면 선택 단계를 건너뛰거나 낮춘 부분 결과를 degraded로 표시해 반환 (선택사항)",
+        "exclusiveMinimum": 0
+    }
+}
+
+# 프롬프트 본문 또는 해시 참조 중 하나가 필요
+PROMPT_OR_REF = [{"required": ["prompt"]}, {"required": ["prompt_ref"]}]
+
+JOB_ID_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "job_id": {
+            "type": "string",
+            "description": "submit_optimization이 돌려준 작업 ID"
+        }
+    },
+    "required": ["job_id"]
+}
+
+# 대량 도구 공통 입력 속성 (cursor를 주면 이전 배치의 다음 페이지를 반환하고 prompts는 무시)
+BATCH_PROPERTIES = {
+    "prompts": {
+        "type": "array",
+        "description": "처리할 프롬프트 텍스트 배열",
+        "items": {"type": "string"}
+    },
+    "max_concurrency": {
+        "type": "integer",
+        "description": f"서버 안에서 동시에 처리할 항목 수 (기본값: {DEFAULT_BATCH_CONCURRENCY})",
+        "minimum": 1,
+        "maximum": MAX_BATCH_CONCURRENCY
+    },
+    "page_size": {
+        "type": "integer",
+        "description": f"한 번에 반환할 항목 수 (기본값: {DEFAULT_PAGE_SIZE}). 남은 항목은 next_cursor로 이어서 조회",
+        "minimum": 1
+    },
+    "cursor": {
+        "type": "string",
+        "description": "이전 응답의 next_cursor (다음 페이지 조회)"
+    }
+}
+
+ANALYSIS_TYPES_PROPERTY = {
+    "type": "array",
+    "description": "수행할 분석 유형들",
+    "items": {
+        "type": "string",
+        "enum": ["clarity", "specificity", "instruction_following", "agentic_capabilities"]
+    },
+    "default": ["clarity", "specificity", "instruction_following", "agentic_capabilities"]
+}
+
+# 결과 형식 선택 (json이면 고른 필드만 담고 긴 문자열은 내용 해시로 참조)
+RESULT_FORMAT_PROPERTIES = {
+    "response_format": {
+        "type": "string",
+        "enum": ["markdown", "json"],
+        "description": "결과 형식 (기본값: markdown). json은 필드별 구조화 결과이며 긴 문자열은 {\"$ref\": \"sha256:...\"}로 참조하고 본문은 blobs에 한 번만 포함",
+        "default": "markdown"
+    },
+    "fields": {
+        "type": "array",
+        "description": "json 형식에서 포함할 결과 필드 (예: optimized_prompt, total_issues_found, analysis_results; [\"*\"]이면 전체)",
+        "items": {"type": "string"}
+    },
+    "known_refs": {
+        "type": "array",
+        "description": "json 형식에서 클라이언트가 이미 가진 본문의 참조 (이전 응답의 sha256:... 값). 이 본문은 blobs에 다시 담지 않음",
+        "items": {"type": "string"}
+    }
+}
+
+# json 형식의 기본 필드 (include_analysis=false이면 요약 필드만)
+OPTIMIZATION_FIELDS = ("optimized_prompt", "total_issues_found", "estimated_improvement", "degraded", "analysis_results", "optimized_messages")
+OPTIMIZATION_SUMMARY_FIELDS = OPTIMIZATION_FIELDS[:4]
+REVISION_FIELDS = ("revised_prompt", "changes_made", "feedback_addressed", "feedback_analysis")
+REVISION_SUMMARY_FIELDS = REVISION_FIELDS[:3]
+ANALYSIS_FIELDS = ("total_issues_found", "analysis_results")
+
+def _structured_text(
+    result: dict, arguments: dict, default_fields: tuple, known_texts: list, resource_uri: Optional[str] = None
+) -> list[TextContent]:
+    """json 형식 결과 - 클라이언트가 보낸 텍스트(known_texts)는 참조만 남김"""
+    structured = to_structured(result, arguments.get("fields"), default_fields, known_texts, arguments.get("known_refs", ()))
+    if resource_uri is not None:
+        structured["resource"] = resource_uri
+    return [TextContent(type="text", text=structured_json(structured))]
+
+def _resource_footer(resource_uri: str, prompt: str, ref_argument: str) -> str:
+    """마크다운 결과 끝에 붙이는 리소스 안내 (다음 호출에서 본문 대신 참조를 보낼 수 있음)"""
+    return f"\n\n---\n🔗 **리소스**: `{resource_uri}` (`{ref_argument}`: `{blob_ref(prompt)}`)"
+
+def _json_text(data: Any) -> list[TextContent]:
+    return [TextContent(type="text", text=json.dumps(data, ensure_ascii=False))]
+
 class PromptOptimizerMCPServer:
     """프롬프트 최적화를 위한 MCP 서버"""
     
-    def __init__(self):
+    def __init__(
+        self,
+        job_db_path: str = JOB_DB_PATH,
+        job_workers: int = JOB_WORKERS,
+        artifact_db_path: str = ARTIFACT_DB_PATH,
+        shard_workers: int = SHARD_WORKERS
+    ):
         self.server = Server("prompt-optimizer")
+        self.jobs = JobQueue(job_db_path)
+        self.job_pool = JobWorkerPool(self.jobs, {"optimize_prompt": self._run_optimization_job}, concurrency=job_workers)
+        self.batch_pages = ResultPager()
+        self.artifacts = ArtifactStore(artifact_db_path)
+        self.shards = ShardedOptimizerService(shard_workers) if shard_workers > 0 else None
         self.setup_tools()
+        self.setup_resources()
     
     def setup_tools(self):
         """MCP 도구들을 설정합니다"""
@@ -58,36 +235,15 @@ class PromptOptimizerMCPServer:
                     inputSchema={
                         "type": "object",
                         "properties": {
-                            "prompt": {
-                                "type": "string",
-                                "description": "최적화할 프롬프트 텍스트"
-                            },
-                            "few_shot_messages": {
-                                "type": "array",
-                                "description": "Few-shot 예제 메시지들 (선택사항)",
-                                "items": {
-                                    "type": "object",
-                                    "properties": {
-                                        "role": {
-                                            "type": "string",
-                                            "enum": ["user", "assistant"],
-                                            "description": "메시지 역할"
-                                        },
-                                        "content": {
-                                            "type": "string",
-                                            "description": "메시지 내용"
-                                        }
-                                    },
-                                    "required": ["role", "content"]
-                                }
-                            },
+                            **OPTIMIZATION_PROPERTIES,
                             "include_analysis": {
                                 "type": "boolean",
                                 "description": "상세한 분석 결과를 포함할지 여부 (기본값: true)",
                                 "default": True
-                            }
+                            },
+                            **RESULT_FORMAT_PROPERTIES
                         },
-                        "required": ["prompt"]
+                        "anyOf": PROMPT_OR_REF
                     }
                 ),
                 Tool(
@@ -100,6 +256,10 @@ class PromptOptimizerMCPServer:
                                 "type": "string",
                                 "description": "이미 최적화된 프롬프트"
                             },
+                            "optimized_prompt_ref": {
+                                "type": "string",
+                                "description": "optimized_prompt 대신 보낼 수 있는 해시 참조 (sha256:...)"
+                            },
                             "user_feedback": {
                                 "type": "string",
                                 "description": "사용자의 피드백"
@@ -108,9 +268,11 @@ class PromptOptimizerMCPServer:
                                 "type": "boolean",
                                 "description": "피드백 분석 결과를 포함할지 여부 (기본값: true)",
                                 "default": True
-                            }
+                            },
+                            **RESULT_FORMAT_PROPERTIES
                         },
-                        "required": ["optimized_prompt", "user_feedback"]
+                        "required": ["user_feedback"],
+                        "anyOf": [{"required": ["optimized_prompt"]}, {"required": ["optimized_prompt_ref"]}]
                     }
                 ),
                 Tool(
@@ -123,17 +285,11 @@ class PromptOptimizerMCPServer:
                                 "type": "string",
                                 "description": "분석할 프롬프트 텍스트"
                             },
-                            "analysis_types": {
-                                "type": "array",
-                                "description": "수행할 분석 유형들",
-                                "items": {
-                                    "type": "string",
-                                    "enum": ["clarity", "specificity", "instruction_following", "agentic_capabilities"]
-                                },
-                                "default": ["clarity", "specificity", "instruction_following", "agentic_capabilities"]
-                            }
+                            "prompt_ref": OPTIMIZATION_PROPERTIES["prompt_ref"],
+                            "analysis_types": ANALYSIS_TYPES_PROPERTY,
+                            **RESULT_FORMAT_PROPERTIES
                         },
-                        "required": ["prompt"]
+                        "anyOf": PROMPT_OR_REF
                     }
                 ),
                 Tool(
@@ -161,6 +317,64 @@ class PromptOptimizerMCPServer:
                         },
                         "required": ["domain"]
                     }
+                ),
+                Tool(
+                    name="submit_optimization",
+                    description="프롬프트 최적화를 작업 큐에 제출하고 바로 작업 ID를 반환합니다 (오래 걸리는 최적화용, 서버 재시작 후에도 유지)",
+                    inputSchema={
+                        "type": "object",
+                        "properties": OPTIMIZATION_PROPERTIES,
+                        "anyOf": PROMPT_OR_REF
+                    }
+                ),
+                Tool(
+                    name="get_job_status",
+                    description="제출한 최적화 작업의 상태(queued, running, succeeded, failed, cancelled)와 진행 메시지를 반환합니다",
+                    inputSchema=JOB_ID_SCHEMA
+                ),
+                Tool(
+                    name="get_job_result",
+                    description="완료된 최적화 작업의 결과를 optimize_prompt와 같은 형식으로 반환합니다",
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            **JOB_ID_SCHEMA["properties"],
+                            "include_analysis": {
+                                "type": "boolean",
+                                "description": "상세한 분석 결과를 포함할지 여부 (기본값: true)",
+                                "default": True
+                            },
+                            **RESULT_FORMAT_PROPERTIES
+                        },
+                        "required": ["job_id"]
+                    }
+                ),
+                Tool(
+                    name="cancel_job",
+                    description="대기 중이거나 실행 중인 최적화 작업을 취소합니다",
+                    inputSchema=JOB_ID_SCHEMA
+                ),
+                Tool(
+                    name="optimize_prompts_batch",
+                    description="여러 프롬프트를 한 번의 호출로 최적화합니다 (서버 안에서 동시 실행, 항목별 압축 결과를 JSON으로 반환)",
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            **BATCH_PROPERTIES,
+                            "deadline_ms": OPTIMIZATION_PROPERTIES["deadline_ms"]
+                        }
+                    }
+                ),
+                Tool(
+                    name="analyze_prompts_batch",
+                    description="여러 프롬프트를 한 번의 호출로 분석합니다 (최적화하지 않음, 항목별 압축 결과를 JSON으로 반환)",
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            **BATCH_PROPERTIES,
+                            "analysis_types": ANALYSIS_TYPES_PROPERTY
+                        }
+                    }
                 )
             ]
         
@@ -174,16 +388,30 @@ class PromptOptimizerMCPServer:
                 arguments = {}
             
             try:
-                if name == "optimize_prompt":
-                    return await self._handle_optimize_prompt(arguments)
-                elif name == "revise_with_feedback":
-                    return await self._handle_revise_with_feedback(arguments)
-                elif name == "analyze_prompt":
-                    return await self._handle_analyze_prompt(arguments)
-                elif name == "get_prompt_suggestions":
-                    return await self._handle_get_prompt_suggestions(arguments)
-                else:
-                    raise ValueError(f"Unknown tool: {name}")
+                # 호출자가 응답을 기다리는 도구는 마이크로 배처가 등록되어 있어도 배치 대기 없이 바로 실행
+                with latency_budget(INTERACTIVE_LATENCY_BUDGET_MS) if name in INTERACTIVE_TOOLS else contextlib.nullcontext():
+                    if name == "optimize_prompt":
+                        return await self._handle_optimize_prompt(arguments)
+                    elif name == "revise_with_feedback":
+                        return await self._handle_revise_with_feedback(arguments)
+                    elif name == "analyze_prompt":
+                        return await self._handle_analyze_prompt(arguments)
+                    elif name == "get_prompt_suggestions":
+                        return await self._handle_get_prompt_suggestions(arguments)
+                    elif name == "submit_optimization":
+                        return await self._handle_submit_optimization(arguments)
+                    elif name == "get_job_status":
+                        return await self._handle_get_job_status(arguments)
+                    elif name == "get_job_result":
+                        return await self._handle_get_job_result(arguments)
+                    elif name == "cancel_job":
+                        return await self._handle_cancel_job(arguments)
+                    elif name == "optimize_prompts_batch":
+                        return await self._handle_optimize_prompts_batch(arguments)
+                    elif name == "analyze_prompts_batch":
+                        return await self._handle_analyze_prompts_batch(arguments)
+                    else:
+                        raise ValueError(f"Unknown tool: {name}")
                     
             except Exception as e:
                 logger.error(f"Error handling tool {name}: {str(e)}")
@@ -194,35 +422,108 @@ class PromptOptimizerMCPServer:
                     )
                 ]
     
+    def setup_resources(self):
+        """저장된 아티팩트(프롬프트, 최적화/분석 결과, 수정 체인)를 내용 해시 URI의 MCP 리소스로 공개합니다"""
+        
+        @self.server.list_resources()
+        async def handle_list_resources() -> list[Resource]:
+            """최근 사용한 아티팩트 목록을 반환합니다"""
+            return self._list_resources()
+        
+        @self.server.read_resource()
+        async def handle_read_resource(uri) -> str:
+            """아티팩트 본문을 반환합니다"""
+            return self._read_resource(str(uri))
+    
+    def _list_resources(self) -> list[Resource]:
+        return [
+            Resource(uri=entry["uri"], name=f"{entry['kind']} {entry['ref'][:19]}", mimeType=entry["mime_type"])
+            for entry in self.artifacts.entries()
+        ]
+    
+    def _read_resource(self, uri: str) -> str:
+        found = self.artifacts.read(uri)
+        if found is None:
+            raise ValueError(f"리소스를 찾을 수 없습니다: {uri}")
+        return found[1]
+    
+    def _resolve_text(self, arguments: dict, key: str) -> str:
+        """본문 인자(key) 또는 해시 참조 인자(key_ref)의 텍스트 (참조가 저장소에 없으면 ValueError)"""
+        ref = arguments.get(f"{key}_ref")
+        if not ref:
+            return arguments.get(key, "")
+        text = self.artifacts.get_text(ref)
+        if text is None:
+            raise ValueError(f"저장소에 없는 참조입니다: {ref} ({key} 본문을 보내주세요)")
+        return text
+    
+    def _publish_result(self, kind: str, source: str, result: dict, texts: list) -> str:
+        """결과 전체를 source(원본 텍스트) 해시 URI의 아티팩트로 저장합니다 (긴 문자열은 blob으로 따로 저장)"""
+        source_ref = self.artifacts.put_text(source)
+        for text in texts:
+            self.artifacts.put_text(text)
+        structured = to_structured(result, ["*"], known_texts=[source, *texts])
+        self.artifacts.put_blobs(structured["blobs"])
+        return self.artifacts.put_json(kind, source_ref, structured["result"])
+    
+    async def _optimize_comprehensive(self, prompt: str, progress_callback=None, **options) -> dict:
+        """종합 최적화 실행 - 샤드 워커가 있으면 프롬프트 해시를 담당하는 워커 프로세스에서 실행"""
+        if self.shards is not None:
+            return await self.shards.optimize(prompt, progress_callback=progress_callback, **options)
+        return await optimize_prompt_comprehensive(prompt=prompt, progress_callback=progress_callback, **options)
+    
+    async def _analyze(self, prompt: str, analysis_types: Optional[list] = None) -> dict:
+        if self.shards is not None:
+            return await self.shards.analyze(prompt, analysis_types)
+        return await analyze_prompt(prompt, analysis_types)
+    
+    async def _optimize(self, arguments: dict, progress_callback=None) -> dict:
+        """optimize_prompt 도구와 최적화 작업이 공유하는 최적화 실행"""
+        # Few-shot 메시지 변환
+        chat_messages = []
+        for msg in arguments.get("few_shot_messages", []):
+            role = Role.user if msg["role"] == "user" else Role.assistant
+            chat_messages.append(ChatMessage(role=role, content=msg["content"]))
+        
+        # 프롬프트 최적화 실행
+        return await self._optimize_comprehensive(
+            arguments["prompt"],
+            few_shot_messages=chat_messages if chat_messages else None,
+            progress_callback=progress_callback,
+            max_few_shot_examples=arguments.get("max_few_shot_examples"),
+            few_shot_token_budget=arguments.get("few_shot_token_budget"),
+            deadline_ms=arguments.get("deadline_ms")
+        )
+    
     async def _handle_optimize_prompt(self, arguments: dict) -> list[TextContent]:
         """프롬프트 최적화 도구 처리"""
-        prompt = arguments.get("prompt", "")
-        few_shot_messages = arguments.get("few_shot_messages", [])
+        prompt = self._resolve_text(arguments, "prompt")
         include_analysis = arguments.get("include_analysis", True)
         
         if not prompt:
             return [TextContent(type="text", text="프롬프트가 제공되지 않았습니다.")]
         
-        # Few-shot 메시지 변환
-        chat_messages = []
-        for msg in few_shot_messages:
-            role = Role.user if msg["role"] == "user" else Role.assistant
-            chat_messages.append(ChatMessage(role=role, content=msg["content"]))
+        result = await self._optimize({**arguments, "prompt": prompt})
+        resource_uri = self._publish_result(OPTIMIZATION, prompt, result, [result["optimized_prompt"]])
         
-        # 프롬프트 최적화 실행
-        result = await optimize_prompt_comprehensive(
-            prompt=prompt,
-            few_shot_messages=chat_messages if chat_messages else None
-        )
+        if arguments.get("response_format") == "json":
+            return _structured_text(
+                result,
+                arguments,
+                OPTIMIZATION_FIELDS if include_analysis else OPTIMIZATION_SUMMARY_FIELDS,
+                [prompt] + [msg["content"] for msg in arguments.get("few_shot_messages", [])],
+                resource_uri
+            )
         
         # 결과 포맷팅
         response = self._format_optimization_result(result, include_analysis)
+        response += _resource_footer(resource_uri, result["optimized_prompt"], "optimized_prompt_ref")
         
         return [TextContent(type="text", text=response)]
     
     async def _handle_revise_with_feedback(self, arguments: dict) -> list[TextContent]:
         """피드백 기반 개선 도구 처리"""
-        optimized_prompt = arguments.get("optimized_prompt", "")
+        optimized_prompt = self._resolve_text(arguments, "optimized_prompt")
         user_feedback = arguments.get("user_feedback", "")
         include_analysis = arguments.get("include_analysis", True)
         
@@ -235,27 +536,43 @@ class PromptOptimizerMCPServer:
             user_feedback=user_feedback
         )
         
+        revised_ref = self.artifacts.add_revision(optimized_prompt, user_feedback, result["revised_prompt"])
+        resource_uri = artifact_uri(REVISION, revised_ref)
+        
+        if arguments.get("response_format") == "json":
+            return _structured_text(
+                result,
+                arguments,
+                REVISION_FIELDS if include_analysis else REVISION_SUMMARY_FIELDS,
+                [optimized_prompt, user_feedback],
+                resource_uri
+            )
+        
         # 결과 포맷팅
         response = self._format_revision_result(result, include_analysis)
+        response += _resource_footer(resource_uri, result["revised_prompt"], "optimized_prompt_ref")
         
         return [TextContent(type="text", text=response)]
     
     async def _handle_analyze_prompt(self, arguments: dict) -> list[TextContent]:
         """프롬프트 분석 도구 처리"""
-        prompt = arguments.get("prompt", "")
+        prompt = self._resolve_text(arguments, "prompt")
         analysis_types = arguments.get("analysis_types", ["clarity", "specificity", "instruction_following", "agentic_capabilities"])
         
         if not prompt:
             return [TextContent(type="text", text="프롬프트가 제공되지 않았습니다.")]
         
-        # 분석만 수행 (최적화 없이)
-        result = await optimize_prompt_comprehensive(
-            prompt=prompt,
-            few_shot_messages=None
-        )
+        # 요청한 검사기만 실행 (최적화/few-shot 단계 없이)
+        result = await self._analyze(prompt, analysis_types)
+        
+        resource_uri = self._publish_result(ANALYSIS, prompt, {field: result[field] for field in ANALYSIS_FIELDS}, [])
+        
+        if arguments.get("response_format") == "json":
+            return _structured_text(result, arguments, ANALYSIS_FIELDS, [prompt], resource_uri)
         
         # 분석 결과만 포맷팅
         response = self._format_analysis_only(result, analysis_types)
+        response += _resource_footer(resource_uri, prompt, "prompt_ref")
         
         return [TextContent(type="text", text=response)]
     
@@ -270,6 +587,113 @@ class PromptOptimizerMCPServer:
         
         return [TextContent(type="text", text=suggestions)]
     
+    async def _run_optimization_job(self, params: dict, progress_callback) -> dict:
+        """작업 큐 워커가 실행하는 최적화 작업 (결과는 아티팩트로도 공개)"""
+        result = await self._optimize(params, progress_callback)
+        self._publish_result(OPTIMIZATION, params["prompt"], result, [result["optimized_prompt"]])
+        return result
+    
+    async def _handle_submit_optimization(self, arguments: dict) -> list[TextContent]:
+        """최적화 작업 제출 도구 처리"""
+        prompt = self._resolve_text(arguments, "prompt")
+        if not prompt:
+            return [TextContent(type="text", text="프롬프트가 제공되지 않았습니다.")]
+        
+        # 참조는 제출 시점에 본문으로 바꿔 저장 (실행 전에 아티팩트가 지워져도 작업은 유지)
+        params = {key: arguments[key] for key in OPTIMIZATION_PROPERTIES if arguments.get(key) is not None and key != "prompt_ref"}
+        params["prompt"] = prompt
+        job_id = self.jobs.submit("optimize_prompt", params)
+        self.job_pool.notify()
+        return _json_text({"job_id": job_id, "status": "queued"})
+    
+    async def _handle_get_job_status(self, arguments: dict) -> list[TextContent]:
+        """작업 상태 조회 도구 처리"""
+        job = self.jobs.get(arguments.get("job_id", ""))
+        if job is None:
+            return [TextContent(type="text", text=f"작업을 찾을 수 없습니다: {arguments.get('job_id')}")]
+        return _json_text(job.status_summary())
+    
+    async def _handle_get_job_result(self, arguments: dict) -> list[TextContent]:
+        """작업 결과 조회 도구 처리"""
+        job = self.jobs.get(arguments.get("job_id", ""))
+        if job is None:
+            return [TextContent(type="text", text=f"작업을 찾을 수 없습니다: {arguments.get('job_id')}")]
+        if job.status != SUCCEEDED:
+            # 아직 끝나지 않았거나 실패/취소된 작업은 상태만 반환
+            return _json_text(job.status_summary())
+        include_analysis = arguments.get("include_analysis", True)
+        if arguments.get("response_format") == "json":
+            return _structured_text(
+                job.result,
+                arguments,
+                OPTIMIZATION_FIELDS if include_analysis else OPTIMIZATION_SUMMARY_FIELDS,
+                [job.params["prompt"]] + [msg["content"] for msg in job.params.get("few_shot_messages", [])],
+                artifact_uri(OPTIMIZATION, blob_ref(job.params["prompt"]))
+            )
+        return [TextContent(type="text", text=self._format_optimization_result(job.result, include_analysis))]
+    
+    async def _handle_cancel_job(self, arguments: dict) -> list[TextContent]:
+        """작업 취소 도구 처리"""
+        job_id = arguments.get("job_id", "")
+        cancelled = self.job_pool.cancel(job_id)
+        job = self.jobs.get(job_id)
+        if job is None:
+            return [TextContent(type="text", text=f"작업을 찾을 수 없습니다: {job_id}")]
+        return _json_text({"job_id": job_id, "cancelled": cancelled, "status": job.status})
+    
+    async def _handle_batch(self, arguments: dict, worker) -> list[TextContent]:
+        """대량 도구 공통 처리 - 커서가 있으면 다음 페이지, 없으면 prompts를 동시 실행해 첫 페이지 반환"""
+        page_size = arguments.get("page_size") or DEFAULT_PAGE_SIZE
+        if arguments.get("cursor"):
+            page = self.batch_pages.next_page(arguments["cursor"], page_size)
+            if page is None:
+                return [TextContent(type="text", text="만료되었거나 잘못된 커서입니다. 배치를 다시 요청해주세요.")]
+            return _json_text(page)
+        
+        prompts = arguments.get("prompts") or []
+        if not prompts:
+            return [TextContent(type="text", text="프롬프트가 제공되지 않았습니다.")]
+        
+        results = await run_bounded(prompts, worker, arguments.get("max_concurrency") or DEFAULT_BATCH_CONCURRENCY)
+        return _json_text(self.batch_pages.first_page(
+            results,
+            page_size,
+            failed=sum("error" in item for item in results),
+            total_issues_found=sum(item.get("total_issues_found", 0) for item in results)
+        ))
+    
+    async def _handle_optimize_prompts_batch(self, arguments: dict) -> list[TextContent]:
+        """대량 최적화 도구 처리 (항목별로 최적화된 프롬프트와 요약만 반환)"""
+        async def optimize(prompt: str) -> dict:
+            result = await self._optimize_comprehensive(prompt, deadline_ms=arguments.get("deadline_ms"))
+            item = {
+                "optimized_prompt": result["optimized_prompt"],
+                "total_issues_found": result["total_issues_found"],
+                "estimated_improvement": result["estimated_improvement"]
+            }
+            if result.get("degraded"):
+                item["degraded"] = True
+            return item
+        
+        return await self._handle_batch(arguments, optimize)
+    
+    async def _handle_analyze_prompts_batch(self, arguments: dict) -> list[TextContent]:
+        """대량 분석 도구 처리 (항목별로 문제가 있는 분석 유형의 문제 목록과 심각도만 반환)"""
+        analysis_types = arguments.get("analysis_types")
+        
+        async def analyze(prompt: str) -> dict:
+            result = await self._analyze(prompt, analysis_types)
+            return {
+                "total_issues_found": result["total_issues_found"],
+                "issues": {
+                    issues["category"]: {"severity": issues["severity"], "issues": issues["issues"]}
+                    for issues in result["analysis_results"]
+                    if issues["has_issues"]
+                }
+            }
+        
+        return await self._handle_batch(arguments, analyze)
+    
     def _format_optimization_result(self, result: dict, include_analysis: bool) -> str:
         """최적화 결과를 포맷팅합니다"""
         output = []
@@ -281,6 +705,13 @@ class PromptOptimizerMCPServer:
         output.append("## 📊 최적화 요약")
         output.append(f"- **발견된 문제**: {result.get('total_issues_found', 0)}개")
         output.append(f"- **예상 개선율**: {result.get('estimated_improvement', 0):.0f}%")
+        if result.get('degraded'):
+            stages = [
+                f"{stage['stage']}({stage['status']})"
+                for stage in result['deadline']['stages']
+                if stage['status'] != 'run'
+            ]
+            output.append(f"- **degraded**: 응답 시간 제한으로 부분 결과 - {', '.join(stages)}")
         output.append("")
         
         # 최적화된 프롬프트
@@ -494,6 +925,23 @@ class PromptOptimizerMCPServer:
     
     async def run(self):
         """MCP 서버를 실행합니다"""
+        runner = install_default_runner_from_env()
+        if runner is not None:
+            logger.info(f"모델 호출에 {type(runner).__name__}를 사용합니다")
+        if self.shards is not None:
+            await self.shards.start()
+            logger.info(f"최적화 워커 프로세스 {len(self.shards.ring.nodes)}개를 시작했습니다")
+        recovered = self.job_pool.start()
+        if recovered:
+            logger.info(f"주인 서버가 응답하지 않는(임대가 만료된) 작업 {recovered}개를 다시 대기열에 넣었습니다")
+        try:
+            await self._serve()
+        finally:
+            await self.job_pool.stop()
+            if self.shards is not None:
+                await self.shards.close()
+    
+    async def _serve(self):
         async with stdio_server() as (read_stream, write_stream):
             await self.server.run(
                 read_stream,
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+로컬 MCP 스텁 서버 (클라이언트 풀 검증용 대역)
+
+mcp SDK 없이 MCP JSON-RPC 프로토콜을 직접 처리하는 작은 서버로, optimize_prompt / analyze_prompt 도구만 제공합니다.
+도구는 prompt_optimizer를 그대로 호출하므로 프로세스 시작과 초기화 비용은 실제 서버와 비슷합니다.
+- stdio (기본): 줄 단위 JSON-RPC. 요청은 도착하는 대로 동시에 처리하고 응답은 끝나는 순서대로 씁니다
+- --http PORT: Streamable HTTP (POST 한 번에 JSON 응답 하나, Mcp-Session-Id 헤더)
+- --exit-after N: 도구 호출 N번을 처리한 뒤 프로세스를 끝냄 (서버 장애 흉내, 재연결 검증용)
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import uuid
+from typing import Any, Dict, Optional
+
+import prompt_optimizer
+
+PROTOCOL_VERSION = "2024-11-05"
+
+TOOLS = [
+    {
+        "name": "optimize_prompt",
+        "description": "프롬프트를 최적화합니다 (스텁: 최적화된 프롬프트와 요약만 JSON으로 반환)",
+        "inputSchema": {"type": "object", "properties": {"prompt": {"type": "string"}}, "required": ["prompt"]}
+    },
+    {
+        "name": "analyze_prompt",
+        "description": "프롬프트를 분석합니다 (스텁: 문제 수와 분석 결과를 JSON으로 반환)",
+        "inputSchema": {"type": "object", "properties": {"prompt": {"type": "string"}}, "required": ["prompt"]}
+    }
+]
+
+class StubMCPServer:
+    def __init__(self, exit_after: Optional[int] = None):
+        self.exit_after = exit_after
+        self.tool_calls = 0
+
+    async def call_tool(self, name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        prompt = arguments.get("prompt", "")
+        if name == "optimize_prompt":
+            result = await prompt_optimizer.optimize_prompt_comprehensive(prompt)
+            payload = {
+                "optimized_prompt": result["optimized_prompt"],
+                "total_issues_found": result["total_issues_found"],
+                "estimated_improvement": result["estimated_improvement"]
+            }
+        elif name == "analyze_prompt":
+            result = await prompt_optimizer.analyze_prompt(prompt)
+            payload = {"total_issues_found": result["total_issues_found"], "analysis_results": result["analysis_results"]}
+        else:
+            raise KeyError(name)
+        return {"content": [{"type": "text", "text": json.dumps(payload, ensure_ascii=False)}], "isError": False}
+
+    async def handle(self, message: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """JSON-RPC 메시지 하나를 처리합니다 (알림이면 None)"""
+        if "id" not in message:
+            return None
+        method = message.get("method")
+        params = message.get("params") or {}
+        if method == "initialize":
+            result: Any = {
+                "protocolVersion": PROTOCOL_VERSION,
+                "capabilities": {"tools": {}},
+                "serverInfo": {"name": "prompt-optimizer-stub", "version": "1.0.0"}
+            }
+        elif method == "ping":
+            result = {}
+        elif method == "tools/list":
+            result = {"tools": TOOLS}
+        elif method == "tools/call":
+            try:
+                result = await self.call_tool(params.get("name"), params.get("arguments") or {})
+            except KeyError:
+                return {"jsonrpc": "2.0", "id": message["id"], "error": {"code": -32602, "message": f"Unknown tool: {params.get('name')}"}}
+            self.tool_calls += 1
+        else:
+            return {"jsonrpc": "2.0", "id": message["id"], "error": {"code": -32601, "message": f"Method not found: {method}"}}
+        return {"jsonrpc": "2.0", "id": message["id"], "result": result}
+
+    def should_exit(self) -> bool:
+        return self.exit_after is not None and self.tool_calls >= self.exit_after
+
+async def serve_stdio(server: StubMCPServer) -> None:
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader(limit=16 * 1024 * 1024)
+    await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+    out = sys.stdout.buffer
+    tasks = set()
+
+    async def respond(message: Dict[str, Any]) -> None:
+        response = await server.handle(message)
+        if response is not None:
+            out.write(json.dumps(response, ensure_ascii=False).encode("utf-8") + b"\n")
+            out.flush()
+        if server.should_exit():
+            os._exit(0)
+
+    while True:
+        line = await reader.readline()
+        if not line:
+            break
+        task = loop.create_task(respond(json.loads(line)))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+    await asyncio.gather(*tasks)
+
+async def serve_http(server: StubMCPServer, port: int) -> None:
+    async def connection(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        # HTTP/1.1 keep-alive - 연결 하나에서 요청을 차례로 처리
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method = request_line.split(b" ", 1)[0].decode()
+                headers: Dict[str, str] = {}
+                while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    key, _, value = line.decode().partition(":")
+                    headers[key.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", "0")))
+                status, extra, payload = 200, {}, b""
+                if method == "POST":
+                    message = json.loads(body)
+                    response = await server.handle(message)
+                    if response is None:
+                        status = 202
+                    else:
+                        if message.get("method") == "initialize":
+                            extra["Mcp-Session-Id"] = uuid.uuid4().hex
+                        payload = json.dumps(response, ensure_ascii=False).encode("utf-8")
+                        extra["Content-Type"] = "application/json"
+                head = [f"HTTP/1.1 {status} {'OK' if status == 200 else 'Accepted'}", f"Content-Length: {len(payload)}"]
+                head += [f"{key}: {value}" for key, value in extra.items()]
+                writer.write(("\r\n".join(head) + "\r\n\r\n").encode() + payload)
+                await writer.drain()
+                if server.should_exit():
+                    os._exit(0)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async with await asyncio.start_server(connection, "127.0.0.1", port) as http_server:
+        await http_server.serve_forever()
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="로컬 MCP 스텁 서버")
+    parser.add_argument("--http", type=int, default=None, metavar="PORT", help="stdio 대신 Streamable HTTP로 서비스")
+    parser.add_argument("--exit-after", type=int, default=None, metavar="N", help="도구 호출 N번 후 종료 (장애 흉내)")
+    args = parser.parse_args()
+    server = StubMCPServer(exit_after=args.exit_after)
+    if args.http is not None:
+        asyncio.run(serve_http(server, args.http))
+    else:
+        asyncio.run(serve_stdio(server))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+"""
+요청 간 마이크로 배칭 모듈
+
+배치 부하에서 같은 Agent(예: format_checker)에 대한 작은 Runner.run 호출이 각각 HTTP 요청이 되지 않도록,
+호출을 최대 max_wait_ms 동안 또는 max_items개까지 모아 하나의 다중 항목 구조화 요청(또는 오프라인 배치 작업 파일)으로
+보내고 결과를 기다리던 각 호출자에게 나눠 돌려줍니다.
+
+지연 예산(latency_budget)이 지정된 대화형 호출은 예산이 대기 시간보다 짧으면 배처를 우회해 바로 실행됩니다.
+MicroBatcher는 LLMRunner이므로 llm_runner.set_default_llm_runner로 그대로 등록할 수 있습니다.
+"""
+
+import asyncio
+import contextlib
+import contextvars
+import inspect
+import json
+import os
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+from pydantic import BaseModel, create_model
+
+from llm_runner import LLMRunner, ModelBackend, ModelRequest, ModelResponse, RunResult, request_from_body
+from request_builder import serialize_payload
+from schema_catalog import SchemaCatalog, default_catalog
+
+BATCH_AGENT_SUFFIX = "__batch"
+BATCH_ENDPOINT = "/v1/chat/completions"
+
+# 사용자가 응답을 기다리는 호출(MCP 대화형 도구, Streamlit, CLI)의 지연 예산 - 배처 대기 없이 바로 실행
+INTERACTIVE_LATENCY_BUDGET_MS = 0.0
+
+# 현재 호출 흐름의 지연 예산(ms) - asyncio 작업으로 전파됨
+_latency_budget: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("latency_budget", default=None)
+
+@contextlib.contextmanager
+def latency_budget(max_latency_ms: float) -> Iterator[None]:
+    """블록 안의 Agent 호출에 지연 예산을 지정합니다 (대화형 호출은 0 등 짧은 예산으로 배처를 우회)"""
+    token = _latency_budget.set(max_latency_ms)
+    try:
+        yield
+    finally:
+        _latency_budget.reset(token)
+
+class BatcherStats(BaseModel):
+    """마이크로 배처 통계"""
+    submitted: int = 0  # 배처로 들어온 호출 수
+    bypassed: int = 0  # 지연 예산 때문에 바로 실행된 호출 수
+    batches: int = 0  # 전송한 배치 수
+    batched_items: int = 0  # 배치로 처리된 호출 수
+    fallbacks: int = 0  # 배치 응답에서 빠져 개별 호출로 다시 실행한 항목 수
+
+    @property
+    def average_batch_size(self) -> float:
+        return self.batched_items / self.batches if self.batches else 0.0
+
+class _Pending:
+    """전송을 기다리는 Agent 호출 하나"""
+
+    def __init__(self, agent: Any, input_data: str, future: "asyncio.Future[RunResult]"):
+        self.agent = agent
+        self.input_data = input_data
+        self.future = future
+
+class _BatchAgent:
+    """여러 입력을 한 번에 처리하도록 지시문과 출력 스키마를 확장한 Agent"""
+
+    def __init__(self, agent: Any):
+        item_type = agent.output_type if isinstance(agent.output_type, type) and issubclass(agent.output_type, BaseModel) else Dict[str, Any]
+        prefix = "".join(part.title() for part in agent.name.split("_"))
+        item_model = create_model(f"{prefix}BatchItem", id=(int, ...), output=(item_type, ...))
+        self.name = agent.name + BATCH_AGENT_SUFFIX
+        self.model = agent.model
+        self.output_type = create_model(f"{prefix}BatchOutput", results=(List[item_model], ...))
+        self.instructions = (
+            f"{agent.instructions.strip()}\n\n"
+            "## Batch mode\n"
+            'The input is a JSON object with ITEMS: a list of {"id": <int>, "input": <string>}. '
+            "Apply the instructions above to each item's input independently, as if it were the only input, and return "
+            '{"results": [{"id": <id>, "output": <result for that item>}]} with exactly one result per id.'
+        )
+
+def is_batch_request(request: ModelRequest) -> bool:
+    return request.agent.endswith(BATCH_AGENT_SUFFIX)
+
+def unpack_batch_request(request: ModelRequest) -> List[Tuple[int, ModelRequest]]:
+    """다중 항목 요청을 (id, 항목 요청) 목록으로 나눕니다 (스텁 모델에서 사용, 항목 요청의 지시문은 비어 있음)"""
+    agent = request.agent[:-len(BATCH_AGENT_SUFFIX)]
+    return [
+        (item["id"], ModelRequest(agent=agent, model=request.model, instructions="", input=item["input"]))
+        for item in json.loads(request.input)["ITEMS"]
+    ]
+
+def batch_responder(responder: Callable[[ModelRequest], Any]) -> Callable[[ModelRequest], Awaitable[Any]]:
+    """항목 하나에 응답하는 스텁 responder를 다중 항목 요청도 처리하도록 감쌉니다"""
+    async def respond(request: ModelRequest) -> Any:
+        if not is_batch_request(request):
+            output = responder(request)
+            return await output if inspect.isawaitable(output) else output
+        results = []
+        for item_id, item_request in unpack_batch_request(request):
+            output = responder(item_request)
+            output = await output if inspect.isawaitable(output) else output
+            results.append({"id": item_id, "output": output.model_dump() if isinstance(output, BaseModel) else output})
+        return {"results": results}
+
+    return respond
+
+# 배치 파일 경로를 받아 custom_id -> 모델 응답을 돌려주는 실행기
+BatchFileExecutor = Callable[[str], Awaitable[Dict[str, ModelResponse]]]
+
+def write_batch_file(
+    batch_dir: str, name: str, requests: List[Tuple[str, ModelRequest]], catalog: SchemaCatalog = default_catalog
+) -> str:
+    """요청을 OpenAI Batch API 형식의 JSONL 파일로 저장합니다 (요청 본문은 카탈로그의 본문 조각으로 구성)"""
+    os.makedirs(batch_dir, exist_ok=True)
+    path = os.path.join(batch_dir, f"{name}-{int(time.time() * 1000)}-{uuid.uuid4().hex[:8]}.jsonl")
+    with open(path, "w", encoding="utf-8") as f:
+        for custom_id, request in requests:
+            f.write(
+                f'{{"custom_id":{json.dumps(custom_id)},"method":"POST","url":"{BATCH_ENDPOINT}",'
+                f'"body":{catalog.body_json(request)}}}\n'
+            )
+    return path
+
+def local_batch_file_executor(backend: ModelBackend) -> BatchFileExecutor:
+    """배치 파일의 각 줄을 backend로 실행하는 로컬 실행기 (배치 엔드포인트 대신 사용)"""
+    async def execute(path: str) -> Dict[str, ModelResponse]:
+        with open(path, encoding="utf-8") as f:
+            lines = [json.loads(line) for line in f if line.strip()]
+        responses = await asyncio.gather(*(backend.complete(request_from_body(line["body"])) for line in lines))
+        return {line["custom_id"]: response for line, response in zip(lines, responses)}
+
+    return execute
+
+class MicroBatcher(LLMRunner):
+    """Agent별로 호출을 모아 다중 항목 요청 하나(또는 배치 작업 파일)로 보내는 LLM 실행기.
+
+    max_wait_ms: 첫 호출 이후 배치를 보내기까지 기다리는 최대 시간
+    max_items: 이 개수가 모이면 즉시 전송
+    batch_agents: 배칭할 Agent 이름 (None이면 모든 Agent)
+    batch_dir: 지정하면 다중 항목 요청 대신 항목별 요청을 배치 작업 파일로 저장해 file_executor로 실행
+    """
+
+    def __init__(
+        self,
+        backend: ModelBackend,
+        max_wait_ms: float = 20.0,
+        max_items: int = 32,
+        batch_agents: Optional[Set[str]] = None,
+        batch_dir: Optional[str] = None,
+        file_executor: Optional[BatchFileExecutor] = None
+    ):
+        super().__init__(backend)
+        self.max_wait_ms = max_wait_ms
+        self.max_items = max_items
+        self.batch_agents = batch_agents
+        self.batch_dir = batch_dir
+        self.file_executor = file_executor or local_batch_file_executor(backend)
+        self.batcher_stats = BatcherStats()
+        self._pending: Dict[str, List[_Pending]] = {}
+        self._timers: Dict[str, asyncio.TimerHandle] = {}
+        self._batch_agents: Dict[str, _BatchAgent] = {}
+        self._flushes: Set["asyncio.Task"] = set()
+
+    def _bypass(self, agent: Any, max_latency_ms: Optional[float]) -> bool:
+        if self.batch_agents is not None and agent.name not in self.batch_agents:
+            return True
+        if max_latency_ms is None:
+            return False
+        # 배치 작업 파일은 완료 시점을 보장할 수 없으므로 지연 예산이 있는 호출은 항상 우회
+        return self.batch_dir is not None or max_latency_ms < self.max_wait_ms
+
+    async def run(self, agent: Any, input_data: str, max_latency_ms: Optional[float] = None) -> RunResult:
+        if max_latency_ms is None:
+            max_latency_ms = _latency_budget.get()
+        if self._bypass(agent, max_latency_ms):
+            self.batcher_stats.bypassed += 1
+            return await super().run(agent, input_data)
+
+        loop = asyncio.get_running_loop()
+        self.batcher_stats.submitted += 1
+        pending = _Pending(agent, input_data, loop.create_future())
+        queue = self._pending.setdefault(agent.name, [])
+        queue.append(pending)
+        if len(queue) >= self.max_items:
+            self._flush(agent.name)
+        elif len(queue) == 1:
+            self._timers[agent.name] = loop.call_later(self.max_wait_ms / 1000, self._flush, agent.name)
+        return await pending.future
+
+    async def flush(self) -> None:
+        """대기 중인 모든 호출을 즉시 전송하고 진행 중인 배치가 끝날 때까지 기다립니다"""
+        for agent_name in list(self._pending):
+            self._flush(agent_name)
+        if self._flushes:
+            await asyncio.gather(*self._flushes, return_exceptions=True)
+
+    def _flush(self, agent_name: str) -> None:
+        timer = self._timers.pop(agent_name, None)
+        if timer is not None:
+            timer.cancel()
+        items = [item for item in self._pending.pop(agent_name, []) if not item.future.done()]
+        if not items:
+            return
+        task = asyncio.get_running_loop().create_task(self._send(items))
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+
+    async def _send(self, items: List[_Pending]) -> None:
+        self.batcher_stats.batches += 1
+        self.batcher_stats.batched_items += len(items)
+        try:
+            if len(items) == 1:
+                results = {0: await super().run(items[0].agent, items[0].input_data)}
+            elif self.batch_dir is not None:
+                results = await self._send_file(items)
+            else:
+                results = await self._send_multi_item(items)
+        except Exception as exc:
+            for item in items:
+                if not item.future.done():
+                    item.future.set_exception(exc)
+            return
+
+        # 응답에서 빠진 항목은 개별 호출로 다시 실행
+        missing = [index for index in range(len(items)) if index not in results]
+        self.batcher_stats.fallbacks += len(missing)
+        retried = await asyncio.gather(
+            *(super(MicroBatcher, self).run(items[index].agent, items[index].input_data) for index in missing),
+            return_exceptions=True
+        )
+        results.update(zip(missing, retried))
+        for index, item in enumerate(items):
+            if item.future.done():
+                continue
+            if isinstance(results[index], BaseException):
+                item.future.set_exception(results[index])
+            else:
+                item.future.set_result(results[index])
+
+    async def _send_multi_item(self, items: List[_Pending]) -> Dict[int, RunResult]:
+        agent = items[0].agent
+        batch_agent = self._batch_agents.get(agent.name)
+        if batch_agent is None:
+            batch_agent = self._batch_agents[agent.name] = _BatchAgent(agent)
+        payload = {"ITEMS": [{"id": index, "input": item.input_data} for index, item in enumerate(items)]}
+        result = await super().run(batch_agent, serialize_payload(payload))
+        return {
+            entry.id: RunResult(entry.output, result.response)
+            for entry in result.final_output.results
+            if 0 <= entry.id < len(items)
+        }
+
+    async def _send_file(self, items: List[_Pending]) -> Dict[int, RunResult]:
+        agent_name = items[0].agent.name
+        path = write_batch_file(
+            self.batch_dir,
+            agent_name,
+            [(str(index), self.build_request(item.agent, item.input_data)) for index, item in enumerate(items)],
+            self.catalog
+        )
+        responses = await self.file_executor(path)
+        results = {}
+        for custom_id, response in responses.items():
+            index = int(custom_id)
+            if 0 <= index < len(items):
+                self.record(agent_name, response)
+                results[index] = RunResult(self.parse_output(items[index].agent, response.output_text), response)
+        return results
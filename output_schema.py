@@ -0,0 +1,294 @@
+"""
+출력 스키마 추출 및 검증기 모듈
+
+개발자 메시지에 적힌 출력 형식(```json 스켈레톤, "Required fields:" 목록, 마크다운 표)을
+한 번만 추출해 검증기로 컴파일하고, 프롬프트 해시로 캐시합니다.
+컴파일된 검증기는 수천 개의 assistant 예제나 운영 환경 출력을 빠르게 검사하는 데 사용합니다.
+"""
+
+import hashlib
+import json
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from pydantic import BaseModel, Field
+
+try:
+    import orjson
+
+    _json_loads = orjson.loads
+    _JSON_ERRORS: Tuple[type, ...] = (orjson.JSONDecodeError, TypeError)
+except ImportError:  # orjson은 선택 의존성
+    _json_loads = json.loads
+    _JSON_ERRORS = (json.JSONDecodeError, TypeError)
+
+VALIDATOR_CACHE_SIZE = 256
+_MISSING = object()
+
+_JSON_BLOCK_PATTERN = re.compile(r"```json[^\n]*\n(.*?)(?:```|\Z)", re.DOTALL | re.IGNORECASE)
+_BARE_TYPE_PATTERN = re.compile(r"(?<=[:\[,])\s*(number|integer|string|boolean|any)\b(?!\")")
+_REQUIRED_FIELDS_PATTERN = re.compile(r"required fields?\**\s*:\**\s*(.*)", re.IGNORECASE)
+_FIELD_PATTERN = re.compile(r"[A-Za-z_][\w.]*")
+_TABLE_SEPARATOR_PATTERN = re.compile(r"^\|?\s*:?-{3,}:?\s*(\|\s*:?-{3,}:?\s*)*\|?$")
+_ERROR_OBJECT_PATTERN = re.compile(r"\{\s*\"error\"\s*:")
+_BARE_PLACEHOLDER_PATTERN = re.compile(r'"\\u0000(\w+)\\u0000"')
+
+_PYTHON_TYPES: Dict[str, Tuple[type, ...]] = {
+    "string": (str,),
+    "number": (int, float),
+    "boolean": (bool,),
+    "array": (list,),
+    "object": (dict,),
+}
+
+class FieldSpec(BaseModel):
+    """출력 필드 하나의 경로와 타입"""
+    path: str  # 중첩 필드는 점으로 구분 (예: price.value)
+    type: str = "any"  # string, number, boolean, array, object, any
+    items: Optional[str] = None  # 배열 원소의 타입 (type이 array이고 예시 원소가 있을 때)
+    required: bool = True
+
+class OutputSchema(BaseModel):
+    """개발자 메시지에서 추출한 출력 스키마"""
+    format: Optional[str] = None  # json, markdown_table
+    fields: List[FieldSpec] = Field(default_factory=list)
+    table_columns: List[str] = Field(default_factory=list)
+    nullable: bool = False  # 누락된 필드에 null 출력 허용 여부
+    error_key: Optional[str] = None  # {"error": ...} 형태의 단락 응답 허용 시 키 이름
+
+    def fingerprint(self) -> str:
+        return hashlib.sha256(self.model_dump_json().encode("utf-8")).hexdigest()
+
+    def required_paths(self) -> List[str]:
+        return [spec.path for spec in self.fields if spec.required]
+
+    def to_skeleton(self) -> str:
+        """스키마를 사람이 읽을 수 있는 JSON 스켈레톤으로 렌더링합니다 (재작성 시 사용)"""
+        skeleton: Dict[str, Any] = {}
+        for spec in self.fields:
+            parts = spec.path.split(".")
+            node = skeleton
+            for part in parts[:-1]:
+                child = node.get(part)
+                if not isinstance(child, dict):
+                    child = node[part] = {}
+                node = child
+            if not isinstance(node.get(parts[-1]), dict):
+                if spec.type == "array":
+                    node[parts[-1]] = [_placeholder(spec.items)] if spec.items else []
+                else:
+                    node[parts[-1]] = _placeholder(spec.type)
+        # 문자열 외의 타입 이름은 원본 프롬프트 스켈레톤처럼 따옴표 없이 표시 ("value": number)
+        return _BARE_PLACEHOLDER_PATTERN.sub(r"\1", json.dumps(skeleton, indent=2, ensure_ascii=False))
+
+def _placeholder(type_name: str) -> Any:
+    """스켈레톤에 들어갈 타입 자리 표시자 (JSON 직렬화 후 따옴표를 벗길 타입은 \\0으로 감쌈)"""
+    if type_name == "object":
+        return {}
+    if type_name == "array":
+        return []
+    return type_name if type_name == "string" else f"\0{type_name}\0"
+
+def _value_type(value: Any) -> str:
+    if isinstance(value, bool):
+        return "boolean"
+    if isinstance(value, (int, float)):
+        return "number"
+    if isinstance(value, str):
+        return {"integer": "number", "number": "number", "boolean": "boolean", "any": "any"}.get(value, "string")
+    if isinstance(value, list):
+        return "array"
+    if isinstance(value, dict):
+        return "object"
+    return "any"
+
+def _flatten_skeleton(document: Dict[str, Any], prefix: str = "") -> List[Tuple[str, str, Optional[str]]]:
+    """스켈레톤 -> (필드 경로, 타입, 배열 원소 타입) 목록"""
+    fields = []
+    for key, value in document.items():
+        path = f"{prefix}{key}"
+        items = _value_type(value[0]) if isinstance(value, list) and value else None
+        fields.append((path, _value_type(value), items))
+        if isinstance(value, dict):
+            fields.extend(_flatten_skeleton(value, f"{path}."))
+    return fields
+
+def _parse_json_skeleton(developer_message: str) -> Optional[Dict[str, Any]]:
+    for block in _JSON_BLOCK_PATTERN.findall(developer_message):
+        start = block.find("{")
+        if start < 0:
+            continue
+        # 따옴표 없는 타입 이름(number, string ...)을 문자열로 바꿔 파싱 가능하게 만듦
+        candidate = _BARE_TYPE_PATTERN.sub(lambda match: f' "{match.group(1)}"', block[start:])
+        try:
+            # 닫히지 않은 코드 블록 뒤에 이어지는 설명 문장은 무시
+            document, _ = json.JSONDecoder().raw_decode(candidate)
+        except json.JSONDecodeError:
+            continue
+        if isinstance(document, dict) and document:
+            return document
+    return None
+
+def parse_required_fields(developer_message: str) -> List[str]:
+    """"Required fields:" 줄(또는 다음 줄)의 | 또는 , 로 구분된 필드 목록을 파싱합니다"""
+    lines = developer_message.splitlines()
+    for position, line in enumerate(lines):
+        match = _REQUIRED_FIELDS_PATTERN.search(line)
+        if not match:
+            continue
+        field_line = match.group(1).strip()
+        if not field_line:
+            # "**Required fields:**" 다음 줄에 목록이 오는 형식
+            field_line = next((candidate for candidate in lines[position + 1:] if candidate.strip()), "")
+        fields = []
+        for token in re.split(r"[|,]", field_line):
+            field = _FIELD_PATTERN.search(token.replace("[]", ""))
+            if field and field.group(0) not in fields:
+                fields.append(field.group(0))
+        return fields
+    return []
+
+def _split_table_row(line: str) -> List[str]:
+    return [cell.strip() for cell in line.strip().strip("|").split("|")]
+
+def _parse_markdown_table(text: str) -> List[str]:
+    """마크다운 표의 헤더 열 이름을 반환합니다 (헤더 다음 줄이 구분선이어야 함)"""
+    lines = text.splitlines()
+    for header, separator in zip(lines, lines[1:]):
+        if header.strip().startswith("|") and _TABLE_SEPARATOR_PATTERN.match(separator.strip()):
+            return [cell for cell in _split_table_row(header) if cell]
+    return []
+
+def extract_output_schema(developer_message: str) -> OutputSchema:
+    """개발자 메시지에서 JSON 스켈레톤, 필수 필드 목록, 마크다운 표 형식을 추출합니다"""
+    lowered = developer_message.lower()
+    skeleton = _parse_json_skeleton(developer_message)
+    required = parse_required_fields(developer_message)
+
+    if skeleton is not None or (required and "json" in lowered):
+        flattened = _flatten_skeleton(skeleton) if skeleton else []
+        types = {path: type_name for path, type_name, _ in flattened}
+        item_types = {path: items for path, _, items in flattened}
+        required_set = set(required)
+        # 필수 목록에 있는 중첩 필드의 상위 객체도 필수
+        for path in required:
+            parts = path.split(".")
+            required_set.update(".".join(parts[:i]) for i in range(1, len(parts)))
+        paths = list(types) + [path for path in required if path not in types]
+        fields = [
+            FieldSpec(
+                path=path,
+                type=types.get(path, "object" if any(other.startswith(f"{path}.") for other in required) else "any"),
+                items=item_types.get(path),
+                required=path in required_set if required else True
+            )
+            for path in paths
+        ]
+        return OutputSchema(
+            format="json",
+            fields=fields,
+            nullable="null" in lowered,
+            error_key="error" if _ERROR_OBJECT_PATTERN.search(developer_message) else None
+        )
+
+    table_columns = _parse_markdown_table(developer_message)
+    if table_columns and "table" in lowered:
+        return OutputSchema(format="markdown_table", table_columns=table_columns)
+
+    return OutputSchema(format="json" if "json" in lowered else None)
+
+class SchemaValidator:
+    """OutputSchema를 미리 컴파일한 검증기. 필드 경로와 타입 검사를 한 번만 준비합니다."""
+
+    def __init__(self, schema: OutputSchema):
+        self.schema = schema
+        self._checks = [
+            (spec.path, tuple(spec.path.split(".")), _PYTHON_TYPES.get(spec.type), spec.type, spec.required)
+            for spec in schema.fields
+        ]
+        self._table_columns = [column.lower() for column in schema.table_columns]
+
+    def validate(self, output: str) -> List[str]:
+        """출력 하나를 검사해 위반 항목을 반환합니다 (위반이 없으면 빈 목록)"""
+        if self.schema.format == "json":
+            return self._validate_json(output)
+        if self.schema.format == "markdown_table":
+            return self._validate_table(output)
+        return []
+
+    def validate_many(self, outputs: Sequence[str]) -> List[List[str]]:
+        return [self.validate(output) for output in outputs]
+
+    def _validate_json(self, output: str) -> List[str]:
+        try:
+            document = _json_loads(output)
+        except _JSON_ERRORS:
+            return ["JSON 형식 요구사항을 따르지 않음"]
+        if not isinstance(document, dict):
+            return ["JSON 객체가 아님"] if self._checks else []
+        if self.schema.error_key and set(document) == {self.schema.error_key}:
+            return []
+
+        missing = []
+        mistyped = []
+        for path, parts, python_types, type_name, required in self._checks:
+            value = document
+            for part in parts:
+                if not isinstance(value, dict) or part not in value:
+                    value = _MISSING
+                    break
+                value = value[part]
+            if value is _MISSING:
+                if required:
+                    missing.append(path)
+            elif value is None:
+                if not self.schema.nullable:
+                    mistyped.append(f"{path} (null 불가)")
+            elif python_types and (not isinstance(value, python_types) or (type_name == "number" and isinstance(value, bool))):
+                mistyped.append(f"{path} ({type_name} 필요)")
+
+        issues = []
+        if missing:
+            issues.append(f"필수 필드 누락: {', '.join(missing)}")
+        if mistyped:
+            issues.append(f"필드 타입 불일치: {', '.join(mistyped)}")
+        return issues
+
+    def _validate_table(self, output: str) -> List[str]:
+        columns = [column.lower() for column in _parse_markdown_table(output)]
+        if not columns:
+            return ["마크다운 표 형식 요구사항을 따르지 않음"]
+        missing = [column for column in self._table_columns if column not in columns]
+        return [f"표 열 누락: {', '.join(missing)}"] if missing else []
+
+_validators_by_prompt: "OrderedDict[str, SchemaValidator]" = OrderedDict()
+_validators_by_schema: "OrderedDict[str, SchemaValidator]" = OrderedDict()
+
+# 스레드 풀 검사기(check_fewshot_batched)와 Streamlit 세션 스레드가 함께 쓰므로 두 캐시 접근을 잠금으로 묶음
+_validators_lock = threading.Lock()
+
+def _cached(cache: "OrderedDict[str, SchemaValidator]", key: str, factory) -> SchemaValidator:
+    with _validators_lock:
+        validator = cache.get(key)
+        if validator is not None:
+            cache.move_to_end(key)
+            return validator
+    # 컴파일은 잠금 밖에서 (get_validator의 factory가 compile_validator로 다시 _cached를 호출함)
+    validator = factory()
+    with _validators_lock:
+        cache[key] = validator
+        cache.move_to_end(key)
+        if len(cache) > VALIDATOR_CACHE_SIZE:
+            cache.popitem(last=False)
+    return validator
+
+def compile_validator(schema: OutputSchema) -> SchemaValidator:
+    """스키마 지문으로 캐시된 검증기를 반환합니다"""
+    return _cached(_validators_by_schema, schema.fingerprint(), lambda: SchemaValidator(schema))
+
+def get_validator(developer_message: str) -> SchemaValidator:
+    """개발자 메시지 해시로 캐시된 검증기를 반환합니다 (스키마 추출과 컴파일은 프롬프트당 한 번)"""
+    prompt_hash = hashlib.sha256(developer_message.encode("utf-8")).hexdigest()
+    return _cached(_validators_by_prompt, prompt_hash, lambda: compile_validator(extract_output_schema(developer_message)))
@@ -0,0 +1,208 @@
+"""
+프롬프트 압축 모듈
+
+최적화 과정에서 누적된 중복 문장과 반복되는 보일러플레이트를 제거해
+다운스트림 추론 호출마다 지불하는 토큰 수를 줄입니다.
+근사 중복은 정규화한 문장의 문자 3-gram shingle + SimHash로 찾고, 검사기가 의존하는 키워드는
+압축 후에도 코드 블록 밖 문장에 반드시 남도록 보호합니다.
+"""
+
+import hashlib
+import re
+from typing import Dict, Iterable, List, Sequence, Set
+
+import numpy as np
+from pydantic import BaseModel
+
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+_WORD_PATTERN = re.compile(r"\w+")
+_SENTENCE_SPLIT_PATTERN = re.compile(r"(?<=[.!?])\s+")
+_SIMHASH_BITS = 64
+_SIMHASH_BANDS = 8
+_NEGATION_WORDS = frozenset({"not", "no", "never", "don", "doesn", "without", "avoid", "nor"})
+_FILLER_WORDS = frozenset({"a", "an", "the", "and", "or", "of", "to", "please", "you", "your", "that", "is", "are"})
+_STEM_PREFIX = 5
+_BAND_BITS = _SIMHASH_BITS // _SIMHASH_BANDS
+
+class CompressionResult(BaseModel):
+    """프롬프트 압축 결과"""
+    original_prompt: str
+    compressed_prompt: str
+    removed_sentences: List[str]
+    tokens_before: int
+    tokens_after: int
+    tokens_saved: int
+
+def tokenize(text: str) -> List[str]:
+    """텍스트를 단어/기호 단위 근사 토큰으로 나눕니다"""
+    return _TOKEN_PATTERN.findall(text)
+
+def estimate_tokens(text: str) -> int:
+    """단어/기호 단위로 토큰 수를 근사합니다 (토크나이저 없이 비교용으로 사용)"""
+    return len(tokenize(text))
+
+def _normalize(text: str) -> str:
+    return " ".join(_WORD_PATTERN.findall(text.lower()))
+
+def shingles(text: str, size: int = 3) -> Set[str]:
+    """정규화된 텍스트의 문자 n-gram(shingle) 집합을 반환합니다"""
+    normalized = _normalize(text)
+    if len(normalized) < size:
+        return {normalized} if normalized else set()
+    return {normalized[i:i + size] for i in range(len(normalized) - size + 1)}
+
+def simhash(features: Iterable[str], bits: int = _SIMHASH_BITS) -> int:
+    """특징 집합의 SimHash 지문을 계산합니다"""
+    digests = b"".join(hashlib.blake2b(feature.encode("utf-8"), digest_size=bits // 8).digest() for feature in features)
+    if not digests:
+        return 0
+    bit_matrix = np.unpackbits(np.frombuffer(digests, dtype=np.uint8).reshape(-1, bits // 8), axis=1)
+    votes = bit_matrix.sum(axis=0, dtype=np.int64) * 2 > bit_matrix.shape[0]
+    return int.from_bytes(np.packbits(votes).tobytes(), "big")
+
+def hamming_distance(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+def _jaccard(a: Set[str], b: Set[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+def _same_content_words(a: str, b: str) -> bool:
+    """두 문장의 차이가 어형 변화(같은 어간)나 기능어뿐인지 확인합니다"""
+    a_words, b_words = set(a.split()), set(b.split())
+    for only, other in ((a_words - b_words, b_words), (b_words - a_words, a_words)):
+        for word in only - _FILLER_WORDS:
+            # 숫자나 짧은 단어가 다르면 서로 다른 규칙으로 간주
+            if word.isdigit() or len(word) < _STEM_PREFIX:
+                return False
+            if not any(candidate.startswith(word[:_STEM_PREFIX]) for candidate in other):
+                return False
+    return True
+
+def _split_segments(prompt: str) -> List[List[str]]:
+    """프롬프트를 줄 단위 문장 목록으로 나눕니다. 코드 블록 안의 줄은 통째로 하나의 단위입니다."""
+    lines = []
+    in_code_block = False
+    for line in prompt.split("\n"):
+        if line.strip().startswith("```"):
+            in_code_block = not in_code_block
+            lines.append([line])
+        elif in_code_block or not line.strip():
+            lines.append([line])
+        else:
+            lines.append(_SENTENCE_SPLIT_PATTERN.split(line))
+    return lines
+
+def _prose_keyword_counts(segments: List[List[str]], protected_keywords: Sequence[str]) -> Dict[str, int]:
+    """코드 블록 밖 문장에서의 보호 키워드 등장 횟수 (코드 블록 안의 예시는 규칙 문장을 대신하지 못함)"""
+    prose = []
+    in_code_block = False
+    for line_sentences in segments:
+        if len(line_sentences) == 1 and line_sentences[0].strip().startswith("```"):
+            in_code_block = not in_code_block
+        elif not in_code_block:
+            prose.extend(line_sentences)
+    lowered_prose = "\n".join(prose).lower()
+    return {keyword: lowered_prose.count(keyword) for keyword in protected_keywords if keyword in lowered_prose}
+
+def _is_compressible(sentence: str, min_words: int) -> bool:
+    stripped = sentence.strip()
+    # 제목, 코드 블록 경계, 짧은 라벨은 구조를 유지하기 위해 건드리지 않음
+    if not stripped or stripped.startswith(("#", "```", "|")):
+        return False
+    return len(_WORD_PATTERN.findall(stripped)) >= min_words
+
+def compress_prompt(
+    prompt: str,
+    protected_keywords: Sequence[str] = (),
+    max_hamming_distance: int = 6,
+    min_jaccard: float = 0.8,
+    min_words: int = 4
+) -> CompressionResult:
+    """근사 중복 문장과 반복되는 보일러플레이트를 제거합니다.
+
+    먼저 등장한 문장을 남기고 이후의 중복만 제거하며, 부정어 유무가 다른 문장은
+    중복으로 보지 않습니다. 제거 후 코드 블록 밖에서 보호 키워드의 등장 횟수가 0이 되는 문장은 남겨둡니다.
+    """
+    segments = _split_segments(prompt)
+    keyword_counts = _prose_keyword_counts(segments, protected_keywords)
+    kept_shingles: List[Set[str]] = []
+    kept_fingerprints: List[int] = []
+    kept_negations: List[frozenset] = []
+    kept_normalized: List[str] = []
+    band_index: Dict[tuple, List[int]] = {}
+    seen_normalized: Set[str] = set()
+    removed: List[str] = []
+    in_code_block = False
+
+    for line_sentences in segments:
+        if len(line_sentences) == 1 and line_sentences[0].strip().startswith("```"):
+            in_code_block = not in_code_block
+            continue
+        if in_code_block:
+            continue
+
+        for position, sentence in enumerate(line_sentences):
+            if not _is_compressible(sentence, min_words):
+                continue
+
+            normalized = _normalize(sentence)
+            negations = _NEGATION_WORDS.intersection(normalized.split())
+            features = shingles(sentence)
+            fingerprint = simhash(features)
+            bands = [(band, fingerprint >> (band * _BAND_BITS) & ((1 << _BAND_BITS) - 1)) for band in range(_SIMHASH_BANDS)]
+
+            duplicate = normalized in seen_normalized
+            if not duplicate:
+                # 해밍 거리가 밴드 수보다 작으면 적어도 한 밴드가 일치하므로 밴드 색인으로 후보만 비교
+                candidates = {index for band in bands for index in band_index.get(band, [])}
+                duplicate = any(
+                    hamming_distance(fingerprint, kept_fingerprints[index]) <= max_hamming_distance
+                    and kept_negations[index] == negations
+                    and _jaccard(features, kept_shingles[index]) >= min_jaccard
+                    and _same_content_words(normalized, kept_normalized[index])
+                    for index in candidates
+                )
+
+            if duplicate:
+                lowered_sentence = sentence.lower()
+                occurrences = {keyword: lowered_sentence.count(keyword) for keyword in keyword_counts}
+                if all(keyword_counts[keyword] - count > 0 for keyword, count in occurrences.items()):
+                    for keyword, count in occurrences.items():
+                        keyword_counts[keyword] -= count
+                    removed.append(sentence.strip())
+                    line_sentences[position] = None
+                    continue
+
+            seen_normalized.add(normalized)
+            kept_shingles.append(features)
+            kept_fingerprints.append(fingerprint)
+            kept_negations.append(negations)
+            kept_normalized.append(normalized)
+            for band in bands:
+                band_index.setdefault(band, []).append(len(kept_fingerprints) - 1)
+
+    if not removed:
+        compressed = prompt
+    else:
+        output_lines = []
+        for original_line, line_sentences in zip(prompt.split("\n"), segments):
+            kept = [sentence for sentence in line_sentences if sentence is not None]
+            if len(kept) == len(line_sentences):
+                output_lines.append(original_line)
+            elif kept:
+                output_lines.append(" ".join(kept))
+        # 문장 제거로 생긴 연속 빈 줄을 하나로 합침
+        compressed = re.sub(r"\n{3,}", "\n\n", "\n".join(output_lines)).strip("\n")
+
+    tokens_before = estimate_tokens(prompt)
+    tokens_after = estimate_tokens(compressed)
+    return CompressionResult(
+        original_prompt=prompt,
+        compressed_prompt=compressed,
+        removed_sentences=removed,
+        tokens_before=tokens_before,
+        tokens_after=tokens_after,
+        tokens_saved=tokens_before - tokens_after
+    )
@@ -0,0 +1,300 @@
+"""
+프롬프트 문서 중간 표현(IR) 모듈
+
+프롬프트를 한 번만 파싱해 섹션, 블록(제목/문단/목록/표/코드), 문장, 토큰 범위, 소문자 뷰를 담은
+PromptDocument로 만들고 내용 해시로 캐시합니다. 분석기와 재작성기는 원문 문자열 대신 이 IR을 사용하므로
+코드 블록이나 JSON 스켈레톤을 지시문으로 오인하지 않고, 같은 프롬프트를 여러 번 파싱하지 않습니다.
+재작성기가 문장을 덧붙이거나 바꿀 때는 편집된 블록만 다시 파싱합니다.
+"""
+
+import hashlib
+import json
+import re
+import threading
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from pydantic import BaseModel, Field
+
+DOCUMENT_CACHE_SIZE = 128
+
+HEADING = "heading"
+PARAGRAPH = "paragraph"
+LIST_ITEM = "list_item"
+TABLE = "table"
+CODE = "code"
+PROSE_KINDS = frozenset({HEADING, PARAGRAPH, LIST_ITEM})
+
+_FENCE = "```"
+_HEADING_PATTERN = re.compile(r"^(#{1,6})\s+(.*)$")
+_BULLET_PATTERN = re.compile(r"^\s*(?:[-*•]|\d+[.)])\s+")
+_SENTENCE_SPLIT_PATTERN = re.compile(r"(?<=[.!?])\s+")
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+_BARE_TYPE_PATTERN = re.compile(r"(?<=[:\[,])(\s*)(number|integer|string|boolean|any)\b(?!\")")
+_JSON_DECODER = json.JSONDecoder()
+
+class Block(BaseModel):
+    """프롬프트의 구조 단위 하나 (코드 블록은 펜스를 포함한 여러 줄, 나머지는 한 줄)"""
+    kind: str  # heading, paragraph, list_item, table, code
+    text: str
+    start: int  # 원문에서의 문자 오프셋 [start, end)
+    end: int
+    sentences: List[str] = Field(default_factory=list)  # 산문 블록의 문장 목록
+    level: int = 0  # 제목 수준 (heading만)
+    language: Optional[str] = None  # 코드 블록 언어 (```json 등, JSON 스켈레톤 줄은 json)
+
+    def shifted(self, offset: int) -> "Block":
+        return self if offset == 0 else self.model_copy(update={"start": self.start + offset, "end": self.end + offset})
+
+class Section(BaseModel):
+    """제목 하나와 다음 같은 수준 이상의 제목 전까지의 블록 범위"""
+    title: str
+    level: int
+    start: int
+    end: int
+    blocks: List[int] = Field(default_factory=list)  # PromptDocument.blocks 인덱스
+
+def _prose_block(kind: str, text: str, start: int, level: int = 0) -> Block:
+    body = _BULLET_PATTERN.sub("", text) if kind == LIST_ITEM else text.strip()
+    sentences = [sentence.strip() for sentence in _SENTENCE_SPLIT_PATTERN.split(body) if sentence.strip()]
+    return Block(kind=kind, text=text, start=start, end=start + len(text), sentences=sentences, level=level)
+
+def _is_json_line(stripped: str) -> bool:
+    """줄 전체가 JSON 값인지 확인합니다 (스켈레톤의 따옴표 없는 타입 이름 허용, "[Important] ..." 같은 문장은 제외)"""
+    if not stripped.startswith(("{", "[")):
+        return False
+    for candidate in (stripped, _BARE_TYPE_PATTERN.sub(r'\1"\2"', stripped)):
+        try:
+            _, end = _JSON_DECODER.raw_decode(candidate)
+        except json.JSONDecodeError:
+            continue
+        return not candidate[end:].strip()
+    return False
+
+def _parse_blocks(text: str, base: int = 0) -> Tuple[List[Block], bool]:
+    """텍스트를 블록 목록으로 파싱합니다. (블록 목록, 닫히지 않은 코드 펜스 존재 여부)를 반환합니다."""
+    lines = text.split("\n")
+    offsets = []
+    position = base
+    for line in lines:
+        offsets.append(position)
+        position += len(line) + 1
+
+    fences = [number for number, line in enumerate(lines) if line.strip().startswith(_FENCE)]
+    unclosed = len(fences) % 2 == 1
+    # 닫히지 않은 마지막 펜스는 코드 블록을 열지 않음 (뒤따르는 설명 문장을 지시문으로 유지)
+    closed_fences = fences[:len(fences) - 1] if unclosed else fences
+
+    blocks: List[Block] = []
+    fence_pairs = dict(zip(closed_fences[0::2], closed_fences[1::2]))
+    number = 0
+    while number < len(lines):
+        line = lines[number]
+        stripped = line.strip()
+        start = offsets[number]
+        if number in fence_pairs:
+            close = fence_pairs[number]
+            block_text = "\n".join(lines[number:close + 1])
+            language = stripped[len(_FENCE):].strip().lower() or None
+            blocks.append(Block(kind=CODE, text=block_text, start=start, end=start + len(block_text), language=language))
+            number = close + 1
+            continue
+        number += 1
+        if not stripped or stripped.startswith(_FENCE):
+            continue
+        heading = _HEADING_PATTERN.match(stripped)
+        if heading:
+            blocks.append(_prose_block(HEADING, line, start, level=len(heading.group(1))))
+        elif stripped.startswith("|"):
+            blocks.append(Block(kind=TABLE, text=line, start=start, end=start + len(line)))
+        elif _is_json_line(stripped):
+            # 펜스 없이 적힌 JSON 스켈레톤 줄 (줄 단위로만 판별하므로 edit()의 부분 재파싱과 결과가 같음)
+            blocks.append(Block(kind=CODE, text=line, start=start, end=start + len(line), language="json"))
+        elif _BULLET_PATTERN.match(line):
+            blocks.append(_prose_block(LIST_ITEM, line, start))
+        else:
+            blocks.append(_prose_block(PARAGRAPH, line, start))
+    return blocks, unclosed
+
+def _build_sections(blocks: List[Block], text_length: int) -> List[Section]:
+    sections = [Section(title="", level=0, start=0, end=text_length)]
+    open_sections: List[int] = [0]
+    for index, block in enumerate(blocks):
+        if block.kind == HEADING:
+            while len(open_sections) > 1 and sections[open_sections[-1]].level >= block.level:
+                sections[open_sections.pop()].end = block.start
+            sections.append(Section(title=block.text.strip().lstrip("#").strip(), level=block.level, start=block.start, end=text_length))
+            open_sections.append(len(sections) - 1)
+        for section_index in open_sections:
+            sections[section_index].blocks.append(index)
+    return sections
+
+class PromptDocument:
+    """파싱된 프롬프트. 파생 뷰(소문자, 산문, 토큰)는 처음 사용할 때 한 번만 계산합니다."""
+
+    def __init__(self, text: str, blocks: Optional[List[Block]] = None, unclosed_fence: Optional[bool] = None):
+        self.text = text
+        if blocks is None or unclosed_fence is None:
+            blocks, unclosed_fence = _parse_blocks(text)
+        self.blocks = blocks
+        self.unclosed_fence = unclosed_fence
+        self._hash: Optional[str] = None
+        self._sections: Optional[List[Section]] = None
+        self._lower: Optional[str] = None
+        self._prose_text: Optional[str] = None
+        self._prose_lower: Optional[str] = None
+        self._token_spans: Optional[List[Tuple[int, int]]] = None
+
+    @property
+    def hash(self) -> str:
+        if self._hash is None:
+            self._hash = hashlib.sha256(self.text.encode("utf-8")).hexdigest()
+        return self._hash
+
+    @property
+    def sections(self) -> List[Section]:
+        if self._sections is None:
+            self._sections = _build_sections(self.blocks, len(self.text))
+        return self._sections
+
+    @property
+    def lower(self) -> str:
+        """원문 전체의 소문자 뷰"""
+        if self._lower is None:
+            self._lower = self.text.lower()
+        return self._lower
+
+    @property
+    def prose_text(self) -> str:
+        """코드 블록, JSON 스켈레톤, 표를 제외한 지시문 텍스트"""
+        if self._prose_text is None:
+            self._prose_text = "\n".join(block.text for block in self.blocks if block.kind in PROSE_KINDS)
+        return self._prose_text
+
+    @property
+    def prose_lower(self) -> str:
+        if self._prose_lower is None:
+            self._prose_lower = self.prose_text.lower()
+        return self._prose_lower
+
+    @property
+    def token_spans(self) -> List[Tuple[int, int]]:
+        """원문에서 단어/기호 토큰의 (start, end) 범위 (prompt_compression.estimate_tokens와 같은 규칙)"""
+        if self._token_spans is None:
+            self._token_spans = [match.span() for match in _TOKEN_PATTERN.finditer(self.text)]
+        return self._token_spans
+
+    @property
+    def token_count(self) -> int:
+        return len(self.token_spans)
+
+    @property
+    def word_count(self) -> int:
+        return len(self.text.split())
+
+    @property
+    def sentences(self) -> List[str]:
+        return [sentence for block in self.blocks if block.kind in PROSE_KINDS for sentence in block.sentences]
+
+    @property
+    def code_blocks(self) -> List[Block]:
+        return [block for block in self.blocks if block.kind == CODE]
+
+    @property
+    def list_items(self) -> List[Block]:
+        return [block for block in self.blocks if block.kind == LIST_ITEM]
+
+    @property
+    def question_count(self) -> int:
+        """지시문(산문)에 포함된 물음표 수"""
+        return self.prose_text.count("?")
+
+    def ends_with_complete_sentence(self) -> bool:
+        """마지막 산문 문장이 마침표나 느낌표로 끝나는지 확인합니다 (뒤따르는 코드 블록은 무시)"""
+        for block in reversed(self.blocks):
+            if block.kind in PROSE_KINDS:
+                return block.text.strip().endswith((".", "!"))
+        return False
+
+    def tokens_in(self, start: int, end: int) -> List[Tuple[int, int]]:
+        """[start, end) 범위에 포함된 토큰 범위 목록"""
+        spans = self.token_spans
+        first = bisect_left(spans, (start, start))
+        last = bisect_right(spans, (end, end))
+        return [span for span in spans[first:last] if span[1] <= end]
+
+    def contains(self, keyword: str, prose_only: bool = True) -> bool:
+        """소문자 키워드가 (기본적으로 지시문 안에) 등장하는지 확인합니다"""
+        return keyword in (self.prose_lower if prose_only else self.lower)
+
+    def edit(self, start: int, end: int, replacement: str) -> "PromptDocument":
+        """원문의 [start, end) 범위를 바꾼 새 문서를 반환합니다.
+
+        편집 범위와 겹치는 블록만 다시 파싱하고 나머지 블록은 오프셋만 옮겨 재사용합니다.
+        코드 펜스의 짝이 바뀌는 편집은 뒤쪽 구조 전체가 달라지므로 전체를 다시 파싱합니다.
+        """
+        new_text = self.text[:start] + replacement + self.text[end:]
+        if self.unclosed_fence or _FENCE in replacement or _FENCE in self.text[start:end]:
+            return parse_prompt(new_text)
+
+        # 편집 범위를 줄 경계와 겹치는 블록 경계까지 넓힘
+        region_start = self.text.rfind("\n", 0, start) + 1
+        region_end = self.text.find("\n", end)
+        region_end = len(self.text) if region_end < 0 else region_end
+        first = 0
+        while first < len(self.blocks) and self.blocks[first].end < region_start:
+            first += 1
+        last = first
+        while last < len(self.blocks) and self.blocks[last].start <= region_end:
+            region_start = min(region_start, self.blocks[last].start)
+            region_end = max(region_end, self.blocks[last].end)
+            last += 1
+
+        delta = len(replacement) - (end - start)
+        region_text = new_text[region_start:region_end + delta]
+        region_blocks, region_unclosed = _parse_blocks(region_text, base=region_start)
+        if region_unclosed:
+            # 편집으로 펜스 짝이 깨지면 뒤쪽 블록 구조가 바뀌므로 전체를 다시 파싱
+            return parse_prompt(new_text)
+        blocks = self.blocks[:first] + region_blocks + [block.shifted(delta) for block in self.blocks[last:]]
+        return _cache_document(PromptDocument(new_text, blocks, unclosed_fence=False))
+
+    def append(self, suffix: str) -> "PromptDocument":
+        return self.edit(len(self.text), len(self.text), suffix)
+
+    def prepend(self, prefix: str) -> "PromptDocument":
+        return self.edit(0, 0, prefix)
+
+    def replace(self, old: str, new: str) -> "PromptDocument":
+        """old의 모든 등장을 new로 바꿉니다 (뒤에서부터 편집해 앞쪽 오프셋이 유지되도록 함)"""
+        positions = [match.start() for match in re.finditer(re.escape(old), self.text)] if old else []
+        document = self
+        for position in reversed(positions):
+            document = document.edit(position, position + len(old), new)
+        return document
+
+_documents: "OrderedDict[str, PromptDocument]" = OrderedDict()
+# Streamlit 세션 스레드, 스레드 풀 검사기가 함께 쓰므로 조회-순서 갱신-제거를 잠금으로 묶음
+_documents_lock = threading.Lock()
+
+def _cache_document(document: PromptDocument) -> PromptDocument:
+    with _documents_lock:
+        _documents[document.hash] = document
+        _documents.move_to_end(document.hash)
+        if len(_documents) > DOCUMENT_CACHE_SIZE:
+            _documents.popitem(last=False)
+    return document
+
+def parse_prompt(text: str) -> PromptDocument:
+    """내용 해시로 캐시된 PromptDocument를 반환합니다 (같은 프롬프트는 한 번만 파싱)"""
+    prompt_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    with _documents_lock:
+        document = _documents.get(prompt_hash)
+        if document is not None:
+            _documents.move_to_end(prompt_hash)
+            return document
+    # 파싱은 잠금 밖에서 (다른 스레드가 같은 프롬프트를 동시에 파싱하면 나중 결과로 교체될 뿐)
+    document = PromptDocument(text)
+    document._hash = prompt_hash
+    return _cache_document(document)
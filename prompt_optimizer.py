@@ -1,12 +1,34 @@
 from openai import AsyncOpenAI
 import asyncio
+import contextlib
+import contextvars
+import copy
+import hashlib
 import json
 import os
+import time
 from enum import Enum
-from typing import Any, List, Dict, Optional
+from typing import Any, List, Dict, Optional, Tuple
 from pydantic import BaseModel, Field
 import streamlit as st
 
+from cache_backend import get_default_result_cache, result_cache_from_env, set_default_result_cache
+from contradiction_index import detect_contradictions
+from deadline_planner import LLM, LOCAL, DeadlineBudget, default_stage_costs
+from fewshot_compliance import validate_speculation
+from fewshot_index import build_fewshot_index
+from fewshot_selection import select_few_shot_examples
+from fused_checker import (
+    AGENTIC_CAPABILITIES, CLARITY, INSTRUCTION_FOLLOWING, SPECIFICITY, FusedIssues, FusedSection,
+    build_fused_instructions, missing_sections, split_fused_issues
+)
+from llm_runner import ModelUnavailableError, RunResult, get_default_llm_runner
+from prompt_compression import compress_prompt, estimate_tokens
+from prompt_document import parse_prompt
+from request_builder import serialize_payload
+from schema_catalog import default_catalog
+from singleflight import SingleFlight, request_key
+
 # 기본 모델 정의
 class Role(str, Enum):
     """Role enum for chat messages"""
@@ -25,6 +47,7 @@ class Issues(BaseModel):
     issues: List[str]
     severity: str = "medium"  # low, medium, high
     category: str = "general"  # general, clarity, specificity, instruction_following, etc.
+    confidence: float = 1.0  # 0-1, 로컬 휴리스틱 결과의 확신도 (캐스케이드 모드에서 LLM 검사 여부 판단)
 
     @classmethod
     def no_issues(cls) -> "Issues":
@@ -72,6 +95,90 @@ class RevisedPrompt(BaseModel):
     feedback_addressed: List[str]
     improvement_explanation: str
 
+class CascadeReport(BaseModel):
+    """캐스케이드 분석 배치 보고서 (로컬 휴리스틱 우선, 필요한 섹션만 LLM 검사)"""
+    prompts: int = 0
+    sections: int = 0
+    escalated_sections: int = 0
+    escalated_prompts: int = 0  # 섹션이 하나 이상 LLM으로 올라간 프롬프트 수
+    reasons: Dict[str, int] = Field(default_factory=dict)  # low_confidence / high_severity 별 섹션 수
+    heuristic_ms: float = 0.0
+    llm_ms: float = 0.0
+    llm_calls_saved: int = 0
+    estimated_saved_ms: float = 0.0  # 올리지 않은 섹션의 예상 LLM 호출 시간 합계
+
+    @property
+    def escalation_rate(self) -> float:
+        return self.escalated_sections / self.sections if self.sections else 0.0
+
+    def add(self, cascade: Dict[str, Any]) -> None:
+        """프롬프트 하나의 캐스케이드 결과(_run_cascade_checkers의 보고)를 누적합니다"""
+        self.prompts += 1
+        self.sections += len(cascade["decisions"])
+        escalated = [decision for decision in cascade["decisions"] if decision["escalated"]]
+        self.escalated_sections += len(escalated)
+        self.escalated_prompts += bool(escalated)
+        for decision in escalated:
+            self.reasons[decision["reason"]] = self.reasons.get(decision["reason"], 0) + 1
+        self.heuristic_ms += cascade["heuristic_ms"]
+        self.llm_ms += cascade["llm_ms"]
+        self.llm_calls_saved += len(cascade["decisions"]) - len(escalated)
+        self.estimated_saved_ms += cascade["estimated_saved_ms"]
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            **self.model_dump(),
+            "escalation_rate": round(self.escalation_rate, 3),
+            "heuristic_ms": round(self.heuristic_ms, 1),
+            "llm_ms": round(self.llm_ms, 1),
+            "estimated_saved_ms": round(self.estimated_saved_ms, 1),
+        }
+
+# 최적화 규칙이 추가하는 문장 (재실행 시 중복 추가 여부 판단에 사용)
+ROLE_PREFIX = "You are a helpful AI assistant. "
+PERSISTENCE_INSTRUCTION = "Please keep going until the task is completely resolved, before ending your turn."
+TOOL_USE_INSTRUCTION = "If you are not sure about information needed for the task, use available tools to gather relevant information - do NOT guess or make up an answer."
+PLANNING_INSTRUCTION = "Plan extensively before taking action, and reflect on the outcomes of your actions."
+DETAILED_RESPONSE_INSTRUCTION = "Please provide detailed, comprehensive responses with clear explanations."
+PRIORITY_INSTRUCTION = "Please prioritize important instructions and ensure they are clear."
+OUTPUT_FORMAT_INSTRUCTION = "Provide your response in a clear, structured format."
+
+# 검사기가 존재 여부를 확인하는 키워드
+ROLE_KEYWORDS = ['you are', 'task', 'goal', 'objective']
+FORMAT_KEYWORDS = ['format', 'structure', 'example', 'template']
+PERSISTENCE_KEYWORDS = ['keep going', 'continue', 'persist', 'until complete', 'multi-step']
+TOOL_GUIDANCE_KEYWORDS = ['tools', 'function', 'use available', 'do not guess']
+PLANNING_KEYWORDS = ['plan', 'step by step', 'think through', 'reflect']
+
+# 압축 단계에서 사라지면 검사 결과가 달라지는 키워드 (제거 금지)
+CHECKER_KEYWORDS = ROLE_KEYWORDS + FORMAT_KEYWORDS + PERSISTENCE_KEYWORDS + TOOL_GUIDANCE_KEYWORDS + PLANNING_KEYWORDS + ['priority']
+
+# 지시사항 준수 분석에서 보고할 모순 항목 최대 개수 (LLM 모순 검사기와 동일)
+MAX_CONTRADICTION_ISSUES = 5
+
+# 휴리스틱 확신도: 판단이 경계에 걸린 신호마다 감점, 키워드 검사로 다루기 어려운 긴 프롬프트도 감점
+HEURISTIC_BASE_CONFIDENCE = 0.95
+UNCERTAIN_SIGNAL_PENALTY = 0.2
+LONG_PROMPT_WORDS = 400
+LONG_PROMPT_PENALTY = 0.2
+
+# 캐스케이드 모드: 확신도가 이 값보다 낮거나 심각도가 high인 섹션만 LLM 검사기로 올림
+CASCADE_CONFIDENCE_THRESHOLD = 0.7
+
+# 마감 시간 모드에서 선택 단계의 상대적 가치 (밀리초당 가치가 높은 단계부터 남은 예산을 배분)
+OPTIONAL_STAGE_VALUES = {"compress": 1.0, "few_shot": 3.0, "fewshot_index": 1.0}
+
+def heuristic_confidence(document: Any, uncertain_signals: int) -> float:
+    """키워드 휴리스틱 결과의 확신도 (0.1-0.95)"""
+    confidence = HEURISTIC_BASE_CONFIDENCE - UNCERTAIN_SIGNAL_PENALTY * uncertain_signals
+    if document.word_count > LONG_PROMPT_WORDS:
+        confidence -= LONG_PROMPT_PENALTY
+    return round(max(0.1, confidence), 2)
+
+def content_hash(text: str) -> str:
+    """텍스트 내용의 SHA-256 해시 (캐시 키 및 고정점 판정에 사용)"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
 # Agent 구현
 class Agent:
     def __init__(self, name: str, model: str, output_type: type, instructions: str):
@@ -80,9 +187,69 @@ class Agent:
         self.output_type = output_type
         self.instructions = instructions
 
+# 모델 장애로 로컬 휴리스틱으로 대체한 Agent 기록 (대체 결과가 섞인 종합 최적화 결과는 캐시하지 않음)
+_model_fallbacks: "contextvars.ContextVar[Optional[List[str]]]" = contextvars.ContextVar("model_fallbacks", default=None)
+
+@contextlib.contextmanager
+def track_model_fallbacks():
+    """블록 안에서 모델 장애로 로컬 휴리스틱으로 대체한 Agent 이름 목록을 모읍니다.
+
+    중첩해서 사용할 수 있으며, 안쪽 블록의 기록은 끝날 때 바깥 블록에도 전달됩니다.
+    """
+    fallbacks: List[str] = []
+    token = _model_fallbacks.set(fallbacks)
+    try:
+        yield fallbacks
+    finally:
+        _model_fallbacks.reset(token)
+        outer = _model_fallbacks.get()
+        if outer is not None:
+            outer.extend(fallbacks)
+
+def _execution_mode() -> str:
+    """결과 캐시 키에 포함하는 실행 방식 (LLM 결과와 로컬 휴리스틱 결과를 섞지 않음)"""
+    return "llm" if get_default_llm_runner() is not None else "local"
+
 class Runner:
     @staticmethod
     async def run(agent: Agent, input_data: str, progress_callback=None):
+        # 검사기 출력은 공유 결과 캐시(등록된 경우)에서 먼저 찾음
+        result_cache = get_default_result_cache()
+        if result_cache is None or agent.name not in CACHED_CHECKERS:
+            return (await Runner._run(agent, input_data, progress_callback))[0]
+        key = request_key(agent.name, _execution_mode(), input_data)
+        cached, stamp = result_cache.lookup(agent.name, key, [agent])
+        if cached is not None:
+            if progress_callback:
+                progress_callback(f"💾 Agent '{agent.name}' 캐시된 결과 사용")
+            return RunResult(agent.output_type.model_validate(cached))
+        result, cacheable = await Runner._run(agent, input_data, progress_callback)
+        if cacheable:
+            result_cache.store(agent.name, key, stamp, result.final_output)
+        return result
+
+    @staticmethod
+    async def _run(agent: Agent, input_data: str, progress_callback=None) -> Tuple[Any, bool]:
+        """(실행 결과, 캐시 가능 여부) - 모델 장애로 로컬 휴리스틱으로 대체한 결과는 캐시하지 않음"""
+        # LLM 실행기가 등록되어 있으면 모델을 호출하고, 아니면 로컬 휴리스틱으로 시뮬레이션
+        llm_runner = get_default_llm_runner()
+        if llm_runner is None:
+            return await Runner.simulate(agent, input_data, progress_callback), True
+        if progress_callback:
+            progress_callback(f"🤖 Agent '{agent.name}' 모델 호출 중...")
+        try:
+            return await llm_runner.run(agent, input_data), True
+        except ModelUnavailableError:
+            # 공급자 장애/시간 초과 - 로컬 휴리스틱 분석기로 대체
+            if progress_callback:
+                progress_callback(f"⚠️ Agent '{agent.name}' 모델 사용 불가 - 로컬 휴리스틱으로 대체")
+            fallbacks = _model_fallbacks.get()
+            if fallbacks is not None:
+                fallbacks.append(agent.name)
+            return await Runner.simulate(agent, input_data, progress_callback), False
+
+    @staticmethod
+    async def simulate(agent: Agent, input_data: str, progress_callback=None):
         if progress_callback:
             progress_callback(f"🔍 Agent '{agent.name}' 실행 중...")
         
@@ -99,6 +266,8 @@ class Runner:
             return await Runner._analyze_instruction_following(agent, input_data, progress_callback)
         elif agent.name == "agentic_capability_checker":
             return await Runner._analyze_agentic_capabilities(agent, input_data, progress_callback)
+        elif agent.name == "fused_prompt_checker":
+            return await Runner._analyze_fused(agent, input_data, progress_callback)
         elif agent.name == "prompt_optimizer":
             return await Runner._optimize_prompt(agent, input_data, progress_callback)
         elif agent.name == "few_shot_optimizer":
@@ -120,26 +289,37 @@ class Runner:
                 self.final_output = final_output
         
         issues = []
+        uncertain_signals = 0
+        # 프롬프트 IR은 내용 해시로 캐시되므로 분석기마다 다시 파싱하지 않음 (코드 블록은 지시문에서 제외)
+        document = parse_prompt(input_data)
         
         # 명확성 체크 로직 (GPT-4.1 가이드 기반)
-        if len(input_data.strip()) < 20:
+        if len(document.text.strip()) < 20:
             issues.append("프롬프트가 너무 짧아 명확한 지시사항을 제공하지 못합니다")
         
-        if not any(keyword in input_data.lower() for keyword in ['you are', 'task', 'goal', 'objective']):
+        if not any(document.contains(keyword) for keyword in ROLE_KEYWORDS):
             issues.append("역할이나 목표가 명확하게 정의되지 않았습니다")
+        elif not document.contains('you are'):
+            # 'task', 'goal' 같은 일반 단어만으로 역할이 정의되었다고 판단한 경우
+            uncertain_signals += 1
         
-        if input_data.count('?') > 5:
+        if document.question_count > 5:
             issues.append("너무 많은 질문이 포함되어 혼란을 야기할 수 있습니다")
+        elif document.question_count >= 3:
+            uncertain_signals += 1
         
         ambiguous_words = ['maybe', 'perhaps', 'might', 'could be', 'possibly']
-        if any(word in input_data.lower() for word in ambiguous_words):
+        if any(document.contains(word) for word in ambiguous_words):
             issues.append("모호한 표현이 포함되어 있어 명확성을 해칩니다")
+            # 조건을 설명하는 정당한 표현일 수도 있음
+            uncertain_signals += 1
         
         result = agent.output_type(
             has_issues=len(issues) > 0,
             issues=issues,
             severity="high" if len(issues) > 2 else "medium" if len(issues) > 0 else "low",
-            category="clarity"
+            category="clarity",
+            confidence=heuristic_confidence(document, uncertain_signals)
         )
         
         if progress_callback:
@@ -157,27 +337,37 @@ class Runner:
                 self.final_output = final_output
         
         issues = []
+        uncertain_signals = 0
+        document = parse_prompt(input_data)
         
         # 구체성 체크 로직
         vague_instructions = ['do something', 'help me', 'make it better', 'improve']
-        if any(instruction in input_data.lower() for instruction in vague_instructions):
+        matched_vague = [instruction for instruction in vague_instructions if document.contains(instruction)]
+        if matched_vague:
             issues.append("지시사항이 너무 추상적입니다. 구체적인 행동을 명시해주세요")
+            if matched_vague == ['improve']:
+                # 'improve'는 구체적인 지시에도 자주 쓰이는 단어
+                uncertain_signals += 1
         
-        if not any(keyword in input_data.lower() for keyword in ['format', 'structure', 'example', 'template']):
+        # 코드 블록으로 제시된 출력 예시(JSON 스켈레톤 등)도 형식 지침으로 인정
+        if not document.code_blocks and not any(document.contains(keyword) for keyword in FORMAT_KEYWORDS):
             issues.append("출력 형식이나 구조에 대한 명시적 지침이 없습니다")
         
-        if len(input_data.split()) < 50:
+        if document.word_count < 50:
             issues.append("프롬프트가 너무 짧아 충분한 컨텍스트를 제공하지 못합니다")
+        if 35 <= document.word_count < 70:
+            uncertain_signals += 1
         
         # GPT-4.1 가이드: 도구 사용 및 계획 유도 체크
-        if 'tool' in input_data.lower() and 'plan' not in input_data.lower():
+        if document.contains('tool') and not document.contains('plan'):
             issues.append("도구 사용이 언급되었지만 계획 수립에 대한 지침이 없습니다")
         
         result = agent.output_type(
             has_issues=len(issues) > 0,
             issues=issues,
             severity="medium" if len(issues) > 1 else "low",
-            category="specificity"
+            category="specificity",
+            confidence=heuristic_confidence(document, uncertain_signals)
         )
         
         if progress_callback:
@@ -195,25 +385,32 @@ class Runner:
                 self.final_output = final_output
         
         issues = []
+        document = parse_prompt(input_data)
         
         # GPT-4.1은 지시사항을 더 문자 그대로 따르므로 명확한 지시가 중요
-        if not input_data.strip().endswith('.') and not input_data.strip().endswith('!'):
+        if not document.ends_with_complete_sentence():
             issues.append("지시사항이 완전한 문장으로 끝나지 않아 모호할 수 있습니다")
         
-        contradictory_words = [('always', 'never'), ('must', 'optional'), ('required', 'if needed')]
-        for word1, word2 in contradictory_words:
-            if word1 in input_data.lower() and word2 in input_data.lower():
-                issues.append(f"'{word1}'과 '{word2}'와 같은 상충되는 지시사항이 포함되어 있습니다")
+        # 지시문을 subject 용어로 색인해 modality가 충돌하는 절 쌍만 비교 (모든 절 쌍을 비교하지 않음)
+        report = detect_contradictions(document)
+        for clause in report.self_contradictory[:MAX_CONTRADICTION_ISSUES]:
+            issues.append(f"한 문장 안에 상충되는 지시사항이 포함되어 있습니다: '{clause.text}'")
+        likely_contradictions = report.likely_contradictions()
+        for candidate in likely_contradictions[:MAX_CONTRADICTION_ISSUES]:
+            issues.append(f"상충되는 지시사항이 포함되어 있습니다: '{candidate.first.text}' ↔ '{candidate.second.text}'")
+        # 절 쌍의 modality 비교는 후보일 뿐이므로 후보가 있으면 확신도를 낮춤
+        uncertain_signals = min(2, len(likely_contradictions))
         
         # 우선순위 체크
-        if 'important' in input_data.lower() and 'priority' not in input_data.lower():
+        if document.contains('important') and not document.contains('priority'):
             issues.append("중요도는 언급되었지만 우선순위가 명확하지 않습니다")
         
         result = agent.output_type(
             has_issues=len(issues) > 0,
             issues=issues,
             severity="high" if len(issues) > 2 else "medium",
-            category="instruction_following"
+            category="instruction_following",
+            confidence=heuristic_confidence(document, uncertain_signals)
         )
         
         if progress_callback:
@@ -231,20 +428,25 @@ class Runner:
                 self.final_output = final_output
         
         issues = []
+        document = parse_prompt(input_data)
         
         # GPT-4.1 가이드의 3가지 핵심 요소 체크
-        has_persistence = any(keyword in input_data.lower() for keyword in 
-                            ['keep going', 'continue', 'persist', 'until complete', 'multi-step'])
-        has_tool_guidance = any(keyword in input_data.lower() for keyword in 
-                              ['tools', 'function', 'use available', 'do not guess'])
-        has_planning = any(keyword in input_data.lower() for keyword in 
-                         ['plan', 'step by step', 'think through', 'reflect'])
+        has_persistence = any(document.contains(keyword) for keyword in PERSISTENCE_KEYWORDS)
+        has_tool_guidance = any(document.contains(keyword) for keyword in TOOL_GUIDANCE_KEYWORDS)
+        has_planning = any(document.contains(keyword) for keyword in PLANNING_KEYWORDS)
         
+        uncertain_signals = 0
         if not has_persistence:
             issues.append("지속성(persistence) 지침이 없습니다. 멀티턴 작업에서 중요합니다")
+        elif not any(document.contains(keyword) for keyword in PERSISTENCE_KEYWORDS if keyword != 'continue'):
+            # 'continue'만으로는 멀티턴 지속성 지침인지 알 수 없음
+            uncertain_signals += 1
         
-        if not has_tool_guidance and 'tool' in input_data.lower():
-            issues.append("도구 사용에 대한 명확한 지침이 없습니다")
+        if document.contains('tool'):
+            # 도구 지침이 충분한지는 문맥에 따라 달라짐
+            uncertain_signals += 1
+            if not has_tool_guidance:
+                issues.append("도구 사용에 대한 명확한 지침이 없습니다")
         
         if not has_planning:
             issues.append("계획 수립 및 반성적 사고에 대한 지침이 없습니다")
@@ -253,7 +455,8 @@ class Runner:
             has_issues=len(issues) > 0,
             issues=issues,
             severity="medium",
-            category="agentic_capabilities"
+            category="agentic_capabilities",
+            confidence=heuristic_confidence(document, uncertain_signals)
         )
         
         if progress_callback:
@@ -261,6 +464,25 @@ class Runner:
         
         return Result(result)
 
+    @staticmethod
+    async def _analyze_fused(agent: Agent, input_data: str, progress_callback=None):
+        # 로컬 시뮬레이션에서는 네 분석기의 결과를 섹션으로 묶음 (LLM 모드에서는 한 번의 요청으로 처리)
+        class Result:
+            def __init__(self, final_output):
+                self.final_output = final_output
+        
+        results = await asyncio.gather(
+            Runner._analyze_clarity(clarity_checker, input_data, progress_callback),
+            Runner._analyze_specificity(specificity_checker, input_data, progress_callback),
+            Runner._analyze_instruction_following(instruction_following_checker, input_data, progress_callback),
+            Runner._analyze_agentic_capabilities(agentic_capability_checker, input_data, progress_callback),
+        )
+        sections = {
+            result.final_output.category: FusedSection(**result.final_output.model_dump(include={"has_issues", "issues", "severity"}))
+            for result in results
+        }
+        return Result(FusedIssues(**sections))
+
     @staticmethod
     async def _optimize_prompt(agent: Agent, input_data: str, progress_callback=None):
         if progress_callback:
@@ -275,59 +497,56 @@ class Runner:
             original_prompt = data.get("original_prompt", "")
             all_issues = data.get("all_issues", [])
             
-            # GPT-4.1 가이드 기반 최적화
-            optimized_prompt = original_prompt
+            # GPT-4.1 가이드 기반 최적화 - 편집할 때마다 바뀐 블록만 다시 파싱해 IR을 최신으로 유지
+            document = parse_prompt(original_prompt)
             changes_made = []
             
             # 1. 역할 명확화
-            if not optimized_prompt.lower().startswith('you are'):
-                optimized_prompt = "You are a helpful AI assistant. " + optimized_prompt
+            if not document.lower.startswith('you are'):
+                document = document.prepend(ROLE_PREFIX)
                 changes_made.append("명확한 역할 정의 추가")
             
             # 2. GPT-4.1 에이전틱 구성 요소 추가
             agentic_components = []
             
             # Persistence 추가
-            if not any(keyword in optimized_prompt.lower() for keyword in ['keep going', 'until complete']):
-                agentic_components.append(
-                    "Please keep going until the task is completely resolved, before ending your turn."
-                )
+            if not any(document.contains(keyword) for keyword in ['keep going', 'until complete']):
+                agentic_components.append(PERSISTENCE_INSTRUCTION)
                 changes_made.append("지속성(persistence) 지침 추가")
             
             # Tool-calling guidance 추가 (필요시)
-            if 'tool' in optimized_prompt.lower() and 'do not guess' not in optimized_prompt.lower():
-                agentic_components.append(
-                    "If you are not sure about information needed for the task, use available tools to gather relevant information - do NOT guess or make up an answer."
-                )
+            if document.contains('tool') and not document.contains('do not guess'):
+                agentic_components.append(TOOL_USE_INSTRUCTION)
                 changes_made.append("도구 사용 지침 추가")
             
             # Planning guidance 추가
-            if not any(keyword in optimized_prompt.lower() for keyword in ['plan', 'step by step']):
-                agentic_components.append(
-                    "Plan extensively before taking action, and reflect on the outcomes of your actions."
-                )
+            if not any(document.contains(keyword) for keyword in ['plan', 'step by step']):
+                agentic_components.append(PLANNING_INSTRUCTION)
                 changes_made.append("계획 수립 지침 추가")
             
-            # 3. 구체적 개선사항 적용
+            # 3. 구체적 개선사항 적용 (규칙마다 한 번만, 이미 반영된 경우 건너뜀)
             for issue_set in all_issues:
                 for issue in issue_set.get('issues', []):
                     if '너무 짧' in issue:
-                        optimized_prompt += "\n\nPlease provide detailed, comprehensive responses with clear explanations."
-                        changes_made.append("상세한 응답 요구사항 추가")
+                        if DETAILED_RESPONSE_INSTRUCTION not in document.text:
+                            document = document.append("\n\n" + DETAILED_RESPONSE_INSTRUCTION)
+                            changes_made.append("상세한 응답 요구사항 추가")
                     elif '모호한 표현' in issue:
-                        optimized_prompt = optimized_prompt.replace('maybe', 'specifically')
-                        optimized_prompt = optimized_prompt.replace('perhaps', 'exactly')
-                        changes_made.append("모호한 표현 제거")
+                        disambiguated = document.replace('maybe', 'specifically').replace('perhaps', 'exactly')
+                        if disambiguated.text != document.text:
+                            document = disambiguated
+                            changes_made.append("모호한 표현 제거")
             
             # 에이전틱 구성 요소 추가
             if agentic_components:
-                optimized_prompt += "\n\n" + "\n".join(agentic_components)
+                document = document.append("\n\n" + "\n".join(agentic_components))
             
             # 4. 출력 형식 명시
-            if 'format' not in optimized_prompt.lower():
-                optimized_prompt += "\n\nProvide your response in a clear, structured format."
+            if not document.contains('format'):
+                document = document.append("\n\n" + OUTPUT_FORMAT_INSTRUCTION)
                 changes_made.append("출력 형식 지침 추가")
             
+            optimized_prompt = document.text
             result = OptimizedPrompt(
                 original_prompt=original_prompt,
                 optimized_prompt=optimized_prompt,
@@ -486,43 +705,44 @@ class Runner:
             improvement_explanation = "피드백에 따라 프롬프트를 수정했습니다."
 
             # 모호한 표현 제거
-            if "모호한 표현" in user_feedback:
-                revised_prompt = revised_prompt.replace('maybe', 'specifically').replace('perhaps', 'exactly')
+            disambiguated = revised_prompt.replace('maybe', 'specifically').replace('perhaps', 'exactly')
+            if "모호한 표현" in user_feedback and disambiguated != revised_prompt:
+                revised_prompt = disambiguated
                 changes_made.append("모호한 표현 제거")
                 feedback_addressed.append("모호한 표현 제거")
                 improvement_explanation += " 모호한 표현을 제거했습니다."
 
             # 너무 짧은 응답 개선
-            if "너무 짧은 응답" in user_feedback:
-                revised_prompt += "\n\nPlease provide detailed, comprehensive responses with clear explanations."
+            if "너무 짧은 응답" in user_feedback and DETAILED_RESPONSE_INSTRUCTION not in revised_prompt:
+                revised_prompt += "\n\n" + DETAILED_RESPONSE_INSTRUCTION
                 changes_made.append("더 구체적인 응답 제공")
                 feedback_addressed.append("너무 짧은 응답 개선")
                 improvement_explanation += " 더 구체적인 응답을 제공했습니다."
 
             # 중요한 지시사항 강조
-            if "중요한 지시사항" in user_feedback:
-                revised_prompt += "\n\nPlease prioritize important instructions and ensure they are clear."
+            if "중요한 지시사항" in user_feedback and PRIORITY_INSTRUCTION not in revised_prompt:
+                revised_prompt += "\n\n" + PRIORITY_INSTRUCTION
                 changes_made.append("중요한 지시사항에 대한 우선순위 명확히 하기")
                 feedback_addressed.append("중요한 지시사항 강조")
                 improvement_explanation += " 중요한 지시사항에 대한 우선순위를 명확히 했습니다."
 
             # 도구 사용 지침 추가
-            if "도구 사용" in user_feedback:
-                revised_prompt += "\n\nIf you are not sure about information needed for the task, use available tools to gather relevant information - do NOT guess or make up an answer."
+            if "도구 사용" in user_feedback and TOOL_USE_INSTRUCTION not in revised_prompt:
+                revised_prompt += "\n\n" + TOOL_USE_INSTRUCTION
                 changes_made.append("도구 사용에 대한 명확한 지침 추가")
                 feedback_addressed.append("도구 사용 지침 추가")
                 improvement_explanation += " 도구 사용에 대한 명확한 지침을 추가했습니다."
 
             # 계획 수립 지침 추가
-            if "계획 수립" in user_feedback:
-                revised_prompt += "\n\nPlan extensively before taking action, and reflect on the outcomes of your actions."
+            if "계획 수립" in user_feedback and PLANNING_INSTRUCTION not in revised_prompt:
+                revised_prompt += "\n\n" + PLANNING_INSTRUCTION
                 changes_made.append("계획 수립 지침 추가")
                 feedback_addressed.append("계획 수립 지침 추가")
                 improvement_explanation += " 계획 수립 및 반성적 사고에 대한 지침을 추가했습니다."
 
-            # 출력 형식 명시
-            if 'format' not in revised_prompt.lower():
-                revised_prompt += "\n\nProvide your response in a clear, structured format."
+            # 출력 형식 명시 (코드 블록 안의 'format'은 지침으로 보지 않음)
+            if not parse_prompt(revised_prompt).contains('format'):
+                revised_prompt += "\n\n" + OUTPUT_FORMAT_INSTRUCTION
                 changes_made.append("출력 형식 지침 추가")
                 feedback_addressed.append("출력 형식 명시")
                 improvement_explanation += " 출력 형식을 명시했습니다."
@@ -582,6 +802,21 @@ agentic_capability_checker = Agent(
     instructions="Analyze agentic workflow capabilities based on GPT-4.1 guide"
 )
 
+# 네 검사기를 한 번의 요청으로 실행하는 융합 검사기 (LLM 모드에서 프롬프트를 한 번만 전송)
+FUSED_CHECKERS = {
+    CLARITY: clarity_checker,
+    SPECIFICITY: specificity_checker,
+    INSTRUCTION_FOLLOWING: instruction_following_checker,
+    AGENTIC_CAPABILITIES: agentic_capability_checker,
+}
+
+fused_prompt_checker = Agent(
+    name="fused_prompt_checker",
+    model="gpt-4.1",
+    output_type=FusedIssues,
+    instructions=build_fused_instructions({section: checker.instructions for section, checker in FUSED_CHECKERS.items()})
+)
+
 prompt_optimizer = Agent(
     name="prompt_optimizer",
     model="gpt-4.1",
@@ -610,68 +845,548 @@ prompt_reviser = Agent(
     instructions="Revise the prompt based on user feedback to improve clarity and adherence"
 )
 
+# LLM 모드에서 호출마다 스키마/파서를 만들지 않도록 시작 시점에 카탈로그에 등록
+default_catalog.register([
+    clarity_checker, specificity_checker, instruction_following_checker, agentic_capability_checker,
+    fused_prompt_checker, prompt_optimizer, few_shot_optimizer, feedback_analyzer, prompt_reviser,
+])
+
+# 공유 결과 캐시에 출력을 저장하는 검사기와 종합 최적화 결과가 의존하는 Agent (지시문이 바뀌거나 무효화되면 캐시 항목도 무효)
+CACHED_CHECKERS = {checker.name for checker in (*FUSED_CHECKERS.values(), fused_prompt_checker)}
+OPTIMIZATION_AGENTS = [*FUSED_CHECKERS.values(), fused_prompt_checker, prompt_optimizer, few_shot_optimizer]
+OPTIMIZATION_CACHE_NAMESPACE = "optimize_prompt_comprehensive"
+
+# PROMPT_OPTIMIZER_CACHE_URL이 설정되어 있으면 Streamlit 레플리카, MCP 서버/샤드 워커, 배치 작업이 같은 캐시를 공유
+if get_default_result_cache() is None:
+    set_default_result_cache(result_cache_from_env())
+
 # 메인 최적화 함수
+# 같은 입력으로 동시에 들어온 최적화 요청을 하나로 합치는 프로세스 전역 병합기
+optimization_flights = SingleFlight()
+
 async def optimize_prompt_comprehensive(
     prompt: str,
     few_shot_messages: List[ChatMessage] = None,
-    progress_callback=None
+    progress_callback=None,
+    compress: bool = False,
+    max_few_shot_examples: Optional[int] = None,
+    few_shot_token_budget: Optional[int] = None,
+    fewshot_index_path: Optional[str] = None,
+    coalesce: bool = True,
+    speculative_few_shot: bool = False,
+    fused_checkers: bool = False,
+    cascade: bool = False,
+    cascade_confidence_threshold: float = CASCADE_CONFIDENCE_THRESHOLD,
+    deadline_ms: Optional[float] = None
 ) -> Dict[str, Any]:
-    """GPT-4.1 가이드라인 기반 종합적 프롬프트 최적화"""
-    
+    """GPT-4.1 가이드라인 기반 종합적 프롬프트 최적화
+
+    compress=True 이면 최적화된 프롬프트에서 근사 중복 문장을 제거해 토큰 수를 줄입니다.
+    max_few_shot_examples / few_shot_token_budget 을 지정하면 few-shot 예제 중
+    대표적인 예제 쌍만 골라 최적화합니다.
+    fewshot_index_path 를 지정하면 최적화된 예제로 추론 시점 검색 색인을 만들어 저장합니다.
+    coalesce=True 이면 같은 입력으로 동시에 들어온 호출은 진행 중인 최적화 하나에 합류합니다
+    (진행 메시지는 합류한 모든 호출자에게 전달됨).
+    speculative_few_shot=True 이면 few-shot 최적화를 원본 프롬프트 기준으로 분석/재작성과 동시에 시작하고,
+    최종 프롬프트의 형식 계약이 바뀌어 예제가 위반하는 경우에만 다시 실행합니다.
+    fused_checkers=True 이면 네 검사기를 융합 검사기 하나로 실행해 LLM 모드에서 프롬프트를 한 번만 전송하고,
+    결과는 검사기별 Issues로 다시 나눕니다.
+    cascade=True 이면 로컬 휴리스틱 분석기를 먼저 실행하고 확신도가 cascade_confidence_threshold보다 낮거나
+    심각도가 high인 섹션만 LLM 검사기로 다시 검사합니다 (결과의 "cascade"에 섹션별 판단과 절감 시간 보고).
+    deadline_ms 를 지정하면 남은 예산이 부족할 때 LLM 심층 검사/최적화를 로컬 휴리스틱으로 낮추고
+    선택 단계(압축, few-shot 최적화, 검색 색인)는 밀리초당 가치 순으로 예산에 맞는 것만 실행합니다.
+    건너뛰거나 낮춘 단계가 있으면 결과의 "degraded"가 True이고 "deadline"에 단계별 기록이 남습니다.
+    공유 결과 캐시가 등록되어 있으면(PROMPT_OPTIMIZER_CACHE_URL) 같은 입력의 결과를 캐시에서 돌려줍니다
+    (fewshot_index_path / deadline_ms 를 지정한 호출, 단계를 낮추거나 모델 대신 휴리스틱을 쓴 결과는 캐시하지 않음).
+    """
+    options = {
+        "compress": compress,
+        "max_few_shot_examples": max_few_shot_examples,
+        "few_shot_token_budget": few_shot_token_budget,
+        "fewshot_index_path": fewshot_index_path,
+        "speculative_few_shot": speculative_few_shot,
+        "fused_checkers": fused_checkers,
+        "cascade": cascade,
+        "cascade_confidence_threshold": cascade_confidence_threshold,
+        "deadline_ms": deadline_ms
+    }
+    key = request_key("optimize_prompt_comprehensive", prompt, few_shot_messages or [], options)
+    # 공유 결과 캐시: 색인 파일을 쓰거나(fewshot_index_path) 마감 시간에 따라 결과가 달라지는 호출은 제외
+    result_cache = get_default_result_cache() if fewshot_index_path is None and deadline_ms is None else None
+    stamp = b""
+    if result_cache is not None:
+        key = request_key(key, _execution_mode())
+        cached, stamp = result_cache.lookup(OPTIMIZATION_CACHE_NAMESPACE, key, OPTIMIZATION_AGENTS)
+        if cached is not None:
+            if progress_callback:
+                progress_callback("💾 공유 캐시에 저장된 최적화 결과 사용")
+            return cached
+
+    async def compute(flight_progress) -> Dict[str, Any]:
+        with track_model_fallbacks() as fallbacks:
+            result = await _optimize_prompt_comprehensive(prompt, few_shot_messages, flight_progress, **options)
+        if result_cache is not None and not result["degraded"] and not fallbacks:
+            result_cache.store(OPTIMIZATION_CACHE_NAMESPACE, key, stamp, result)
+        return result
+
+    if not coalesce:
+        return await compute(progress_callback)
+    result, shared = await optimization_flights.do(key, compute, progress_callback)
+    # 합류한 호출자는 결과를 수정해도 다른 호출자에게 영향이 없도록 복사본을 받음
+    return copy.deepcopy(result) if shared else result
+
+async def _optimize_prompt_comprehensive(
+    prompt: str,
+    few_shot_messages: Optional[List[ChatMessage]],
+    progress_callback,
+    compress: bool,
+    max_few_shot_examples: Optional[int],
+    few_shot_token_budget: Optional[int],
+    fewshot_index_path: Optional[str],
+    speculative_few_shot: bool,
+    fused_checkers: bool,
+    cascade: bool,
+    cascade_confidence_threshold: float,
+    deadline_ms: Optional[float]
+) -> Dict[str, Any]:
+    # 마감 시간은 few-shot 예제 선택을 포함한 전체 처리 시간 기준
+    budget = DeadlineBudget(deadline_ms, default_stage_costs)
     if progress_callback:
         progress_callback("🚀 종합적 프롬프트 분석 시작...")
     
-    # 1단계: 병렬 분석
-    analysis_tasks = [
-        Runner.run(clarity_checker, prompt, progress_callback),
-        Runner.run(specificity_checker, prompt, progress_callback),
-        Runner.run(instruction_following_checker, prompt, progress_callback),
-        Runner.run(agentic_capability_checker, prompt, progress_callback),
-    ]
+    # 0단계: Few-shot 예제 선택 (개수/토큰 예산이 지정된 경우, 프롬프트와 무관하므로 먼저 수행)
+    few_shot_selection = None
+    if few_shot_messages and (max_few_shot_examples is not None or few_shot_token_budget is not None):
+        selected_messages = select_few_shot_examples(
+            few_shot_messages,
+            k=max_few_shot_examples,
+            token_budget=few_shot_token_budget
+        )
+        few_shot_selection = {
+            "original_messages": len(few_shot_messages),
+            "selected_messages": len(selected_messages),
+            "tokens_before": sum(estimate_tokens(msg.content) for msg in few_shot_messages),
+            "tokens_after": sum(estimate_tokens(msg.content) for msg in selected_messages)
+        }
+        few_shot_messages = selected_messages
+        if progress_callback:
+            progress_callback(
+                f"🧮 Few-shot 예제 선택 완료: {few_shot_selection['original_messages']}개 중 "
+                f"{few_shot_selection['selected_messages']}개 메시지 유지"
+            )
     
-    analysis_results = await asyncio.gather(*analysis_tasks)
+    # 추측 실행: 원본 프롬프트 기준 few-shot 최적화를 분석/재작성과 겹쳐서 시작
+    # (결과는 LLM few-shot 단계에서만 쓰이므로, 필수 단계를 가장 싼 변형으로 실행해도 그 단계를 예산에 넣을 수 없으면 시작하지 않음)
+    speculative_task = None
+    if (
+        speculative_few_shot and few_shot_messages and get_default_llm_runner() is not None
+        and budget.affords([("analysis", LOCAL), ("optimize", LOCAL), ("few_shot", LLM)])
+    ):
+        speculative_task = asyncio.create_task(_run_few_shot_optimizer(few_shot_messages, prompt, progress_callback))
+    try:
+        return await _optimize_prompt_stages(
+            prompt, few_shot_messages, progress_callback, compress, fewshot_index_path, few_shot_selection, speculative_task,
+            fused_checkers, cascade, cascade_confidence_threshold, budget
+        )
+    finally:
+        if speculative_task is not None and not speculative_task.done():
+            speculative_task.cancel()
+
+async def _run_few_shot_optimizer(
+    few_shot_messages: List[ChatMessage], optimized_prompt: str, progress_callback, run=Runner.run
+) -> List[Dict[str, Any]]:
+    few_shot_input = {
+        "messages": [msg.model_dump() for msg in few_shot_messages],
+        "optimized_prompt": optimized_prompt
+    }
+    few_shot_result = await run(
+        few_shot_optimizer,
+        serialize_payload(few_shot_input),
+        progress_callback
+    )
+    return few_shot_result.final_output.get("messages", [])
+
+async def _few_shot_stage(
+    prompt: str,
+    optimized_prompt: str,
+    few_shot_messages: List[ChatMessage],
+    progress_callback,
+    speculative_task: Optional["asyncio.Task"],
+    run
+) -> Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]]]:
+    """Few-shot 최적화 (추측 실행 결과가 있으면 형식 계약 검증 후 필요할 때만 다시 실행)"""
+    if speculative_task is None:
+        return await _run_few_shot_optimizer(few_shot_messages, optimized_prompt, progress_callback, run), None
+    final_messages = await speculative_task
+    # 최종 프롬프트의 형식 계약이 바뀌었고 예제가 이를 위반할 때만 다시 실행
+    check = validate_speculation(
+        prompt, optimized_prompt, [msg.get("content", "") for msg in final_messages if msg.get("role") == "assistant"]
+    )
+    speculation = {"contract_changed": check.contract_changed, "violations": check.violations, "reworked": not check.valid}
+    if not check.valid:
+        if progress_callback:
+            progress_callback(f"♻️ 형식 계약 변경으로 Few-shot 최적화 재실행 ({check.violations}개 예제 위반)")
+        final_messages = await _run_few_shot_optimizer(few_shot_messages, optimized_prompt, progress_callback, run)
+    return final_messages, speculation
+
+def _elapsed_ms(started: float) -> float:
+    return (time.perf_counter() - started) * 1000
+
+async def _optimize_prompt_stages(
+    prompt: str,
+    few_shot_messages: Optional[List[ChatMessage]],
+    progress_callback,
+    compress: bool,
+    fewshot_index_path: Optional[str],
+    few_shot_selection: Optional[Dict[str, int]],
+    speculative_task: Optional["asyncio.Task"],
+    fused_checkers: bool,
+    cascade: bool,
+    cascade_confidence_threshold: float,
+    budget: DeadlineBudget
+) -> Dict[str, Any]:
+    # LLM 모드에서는 모델 호출 단계를 로컬 휴리스틱으로 낮출 수 있음 (선호 순서대로)
+    model_variants = [LLM, LOCAL] if get_default_llm_runner() is not None else [LOCAL]
+    
+    # 1단계: 병렬 분석 (융합 모드에서는 한 번의 요청으로 분석하고 검사기별 결과로 나눔,
+    # 캐스케이드 모드에서는 로컬 휴리스틱 결과가 불확실한 섹션만 LLM 검사)
+    # 이후 필수 단계(최적화)의 최소 비용은 남겨 두고 분석 변형을 고름
+    analysis_variant = budget.choose("analysis", model_variants, reserve_ms=budget.estimate("optimize", model_variants[-1]))
+    started = time.perf_counter()
+    cascade_report = None
+    if analysis_variant != model_variants[0]:
+        if progress_callback:
+            progress_callback("⏱️ 마감 시간이 부족해 LLM 심층 검사 대신 로컬 휴리스틱으로 분석합니다")
+        analysis_outputs = [
+            result.final_output
+            for result in await asyncio.gather(*(Runner.simulate(checker, prompt, progress_callback) for checker in FUSED_CHECKERS.values()))
+        ]
+    elif cascade:
+        analysis_outputs, cascade_report = await _run_cascade_checkers(prompt, progress_callback, cascade_confidence_threshold)
+    elif fused_checkers:
+        fused_result = await Runner.run(fused_prompt_checker, prompt, progress_callback)
+        sections = split_fused_issues(fused_result.final_output, {section: Issues for section in FUSED_CHECKERS})
+        missing = missing_sections(sections, FUSED_CHECKERS)
+        if missing:
+            # 모델이 채우지 않은 섹션은 "문제 없음"이 아니라 검사 실패 - 해당 검사기만 다시 실행
+            if progress_callback:
+                progress_callback(f"⚠️ 융합 검사 응답에 {', '.join(missing)} 섹션이 없어 해당 검사기만 다시 실행합니다")
+            reruns = await asyncio.gather(*(Runner.run(FUSED_CHECKERS[section], prompt, progress_callback) for section in missing))
+            sections.update(zip(missing, (result.final_output for result in reruns)))
+        analysis_outputs = [sections[section] for section in FUSED_CHECKERS]
+    else:
+        analysis_tasks = [
+            Runner.run(checker, prompt, progress_callback) for checker in FUSED_CHECKERS.values()
+        ]
+        analysis_outputs = [result.final_output for result in await asyncio.gather(*analysis_tasks)]
+    budget.observe("analysis", analysis_variant, _elapsed_ms(started))
     
     # 2단계: 결과 집계
-    all_issues = [result.final_output.model_dump() for result in analysis_results]
+    all_issues = [issues.model_dump() for issues in analysis_outputs]
     total_issues = sum(len(issues['issues']) for issues in all_issues)
     
     if progress_callback:
         progress_callback(f"📊 분석 완료: 총 {total_issues}개 문제 발견")
     
-    # 3단계: 프롬프트 최적화
+    # 3단계: 프롬프트 최적화 (필수 - 예산이 부족하면 로컬 규칙 기반 최적화)
     optimization_input = {
         "original_prompt": prompt,
         "all_issues": all_issues
     }
     
-    optimization_result = await Runner.run(
+    optimize_variant = budget.choose("optimize", model_variants)
+    started = time.perf_counter()
+    optimization_result = await (Runner.simulate if optimize_variant == LOCAL else Runner.run)(
         prompt_optimizer, 
-        json.dumps(optimization_input),
+        serialize_payload(optimization_input),
         progress_callback
     )
+    budget.observe("optimize", optimize_variant, _elapsed_ms(started))
+    optimization_details = optimization_result.final_output.model_dump()
+    optimized_prompt = optimization_details["optimized_prompt"]
     
-    # 4단계: Few-shot 최적화 (있는 경우)
-    final_messages = few_shot_messages or []
+    # 선택 단계: 밀리초당 가치가 높은 순서로 남은 예산에 맞는 단계(와 변형)만 실행
+    optional_stages = []
+    if compress:
+        optional_stages.append(("compress", OPTIONAL_STAGE_VALUES["compress"], [LOCAL]))
     if few_shot_messages:
-        few_shot_input = {
-            "messages": [msg.model_dump() for msg in few_shot_messages],
-            "optimized_prompt": optimization_result.final_output.optimized_prompt
-        }
-        few_shot_result = await Runner.run(
-            few_shot_optimizer,
-            json.dumps(few_shot_input),
-            progress_callback
-        )
-        final_messages = few_shot_result.final_output.get("messages", [])
+        optional_stages.append(("few_shot", OPTIONAL_STAGE_VALUES["few_shot"], model_variants))
+        if fewshot_index_path:
+            optional_stages.append(("fewshot_index", OPTIONAL_STAGE_VALUES["fewshot_index"], [LOCAL]))
+    planned = budget.plan(optional_stages)
+    if speculative_task is not None and planned.get("few_shot") != LLM:
+        # 계획에서 LLM few-shot 단계가 빠지면 추측 실행 결과를 쓰지 않으므로 모델 호출을 바로 취소
+        speculative_task.cancel()
+    
+    # 4단계: 프롬프트 압축 (검사기가 의존하는 키워드는 보존)
+    compression = None
+    if budget.recheck("compress", [LOCAL]):
+        started = time.perf_counter()
+        compression = compress_prompt(optimized_prompt, protected_keywords=CHECKER_KEYWORDS)
+        if compression.removed_sentences:
+            optimized_prompt = compression.compressed_prompt
+            optimization_details["optimized_prompt"] = optimized_prompt
+            optimization_details["changes_made"].append(
+                f"중복 문장 {len(compression.removed_sentences)}개 제거 (토큰 {compression.tokens_saved}개 절감)"
+            )
+        budget.observe("compress", LOCAL, _elapsed_ms(started))
+        if progress_callback and compression.tokens_saved > 0:
+            progress_callback(f"🗜️ 프롬프트 압축 완료: 토큰 {compression.tokens_saved}개 절감")
+    
+    # 5단계: Few-shot 최적화 (있는 경우, 건너뛰면 원본 예제를 그대로 반환)
+    final_messages = [msg.model_dump(mode="json") for msg in few_shot_messages or []]
+    speculation = None
+    few_shot_variant = budget.recheck("few_shot", model_variants)
+    if speculative_task is not None and few_shot_variant != LLM:
+        speculative_task.cancel()
+    if few_shot_variant is not None:
+        started = time.perf_counter()
+        remaining_ms = budget.remaining_ms()
+        try:
+            # 예상보다 오래 걸리면 마감 시간에 중단하고 원본 예제로 부분 결과를 반환
+            final_messages, speculation = await asyncio.wait_for(
+                _few_shot_stage(
+                    prompt, optimized_prompt, few_shot_messages, progress_callback,
+                    speculative_task if few_shot_variant == LLM else None,
+                    Runner.simulate if few_shot_variant == LOCAL else Runner.run
+                ),
+                timeout=None if remaining_ms == float("inf") else max(remaining_ms, 0) / 1000
+            )
+            budget.observe("few_shot", few_shot_variant, _elapsed_ms(started))
+        except asyncio.TimeoutError:
+            budget.skip("few_shot", model_variants, "마감 시간 초과로 중단")
+            budget.observe("few_shot", few_shot_variant, _elapsed_ms(started))
+    
+    # 6단계: 추론 시점 few-shot 검색 색인 생성 (경로가 지정된 경우)
+    fewshot_index = None
+    if final_messages and budget.recheck("fewshot_index", [LOCAL]):
+        started = time.perf_counter()
+        fewshot_index = build_fewshot_index(final_messages, fewshot_index_path)
+        budget.observe("fewshot_index", LOCAL, _elapsed_ms(started))
+        if progress_callback:
+            progress_callback(f"🗂️ Few-shot 검색 색인 저장 완료: {fewshot_index['examples']}개 예제")
+    
+    if budget.degraded and progress_callback:
+        progress_callback("⏱️ 마감 시간 때문에 일부 단계를 건너뛰거나 낮춰 부분 결과를 반환합니다")
     
     return {
         "original_prompt": prompt,
-        "optimized_prompt": optimization_result.final_output.optimized_prompt,
+        "optimized_prompt": optimized_prompt,
         "analysis_results": all_issues,
-        "optimization_details": optimization_result.final_output.model_dump(),
+        "optimization_details": optimization_details,
         "optimized_messages": final_messages,
         "total_issues_found": total_issues,
-        "estimated_improvement": optimization_result.final_output.estimated_improvement
+        "estimated_improvement": optimization_result.final_output.estimated_improvement,
+        "compression": compression.model_dump() if compression else None,
+        "few_shot_selection": few_shot_selection,
+        "fewshot_index": fewshot_index,
+        "speculative_few_shot": speculation,
+        "cascade": cascade_report,
+        "degraded": budget.degraded,
+        "deadline": budget.report() if budget.deadline_ms is not None else None
+    }
+
+async def analyze_prompt(
+    prompt: str,
+    analysis_types: Optional[List[str]] = None,
+    progress_callback=None
+) -> Dict[str, Any]:
+    """최적화 없이 지정한 검사기(clarity, specificity, instruction_following, agentic_capabilities)만 실행합니다"""
+    analysis_types = analysis_types or list(FUSED_CHECKERS)
+    unknown = [analysis_type for analysis_type in analysis_types if analysis_type not in FUSED_CHECKERS]
+    if unknown:
+        raise ValueError(f"unknown analysis types: {unknown}")
+    results = await asyncio.gather(
+        *(Runner.run(FUSED_CHECKERS[analysis_type], prompt, progress_callback) for analysis_type in analysis_types)
+    )
+    all_issues = [result.final_output.model_dump() for result in results]
+    return {
+        "original_prompt": prompt,
+        "analysis_results": all_issues,
+        "total_issues_found": sum(len(issues["issues"]) for issues in all_issues)
+    }
+
+def _cascade_reason(issues: Issues, confidence_threshold: float) -> Optional[str]:
+    if issues.severity == "high":
+        return "high_severity"
+    if issues.confidence < confidence_threshold:
+        return "low_confidence"
+    return None
+
+def _average_llm_latency_ms(agent_name: str) -> float:
+    """등록된 LLM 실행기에서 측정한 Agent의 평균 호출 시간 (기록이 없으면 전체 평균, LLM 모드가 아니면 0)"""
+    llm_runner = get_default_llm_runner()
+    if llm_runner is None:
+        return 0.0
+    if agent_name in llm_runner.stats:
+        return llm_runner.stats[agent_name].average_latency_ms
+    return llm_runner.totals().average_latency_ms
+
+async def _run_cascade_checkers(
+    prompt: str, progress_callback, confidence_threshold: float = CASCADE_CONFIDENCE_THRESHOLD
+) -> Tuple[List[Issues], Dict[str, Any]]:
+    """로컬 휴리스틱 분석기를 먼저 실행하고, 확신도가 낮거나 심각도가 high인 섹션만 LLM 검사기로 다시 검사합니다"""
+    started = time.perf_counter()
+    local_results = await asyncio.gather(
+        *(Runner.simulate(checker, prompt, progress_callback) for checker in FUSED_CHECKERS.values())
+    )
+    heuristic_ms = (time.perf_counter() - started) * 1000
+
+    outputs = [result.final_output for result in local_results]
+    decisions = []
+    escalate = []
+    for index, (section, issues) in enumerate(zip(FUSED_CHECKERS, outputs)):
+        reason = _cascade_reason(issues, confidence_threshold)
+        decisions.append({
+            "category": section,
+            "confidence": issues.confidence,
+            "severity": issues.severity,
+            "escalated": reason is not None,
+            "reason": reason
+        })
+        if reason is not None:
+            escalate.append(index)
+
+    llm_ms = 0.0
+    if escalate:
+        if progress_callback:
+            progress_callback(f"⬆️ 캐스케이드: {len(escalate)}/{len(outputs)}개 섹션을 LLM 검사기로 재검사")
+        started = time.perf_counter()
+        checkers = list(FUSED_CHECKERS.values())
+        escalated = await asyncio.gather(*(Runner.run(checkers[index], prompt, progress_callback) for index in escalate))
+        llm_ms = (time.perf_counter() - started) * 1000
+        for index, result in zip(escalate, escalated):
+            outputs[index] = result.final_output
+
+    estimated_saved_ms = sum(
+        _average_llm_latency_ms(checker.name)
+        for decision, checker in zip(decisions, FUSED_CHECKERS.values())
+        if not decision["escalated"]
+    )
+    return outputs, {
+        "confidence_threshold": confidence_threshold,
+        "decisions": decisions,
+        "escalation_rate": round(len(escalate) / len(decisions), 3),
+        "heuristic_ms": round(heuristic_ms, 3),
+        "llm_ms": round(llm_ms, 3),
+        "estimated_saved_ms": round(estimated_saved_ms, 3)
+    }
+
+async def analyze_prompts_cascade(
+    prompts: List[str],
+    confidence_threshold: float = CASCADE_CONFIDENCE_THRESHOLD,
+    progress_callback=None
+) -> Dict[str, Any]:
+    """여러 프롬프트를 캐스케이드 모드로 분석하고 배치 단위 에스컬레이션 비율과 지연 절감을 보고합니다"""
+    report = CascadeReport()
+    started = time.perf_counter()
+    analyses = await asyncio.gather(
+        *(_run_cascade_checkers(prompt, progress_callback, confidence_threshold) for prompt in prompts)
+    )
+    results = []
+    for prompt, (outputs, cascade) in zip(prompts, analyses):
+        report.add(cascade)
+        results.append({
+            "prompt_hash": content_hash(prompt),
+            "analysis_results": [issues.model_dump() for issues in outputs],
+            "total_issues_found": sum(len(issues.issues) for issues in outputs),
+            "cascade": cascade
+        })
+    if progress_callback:
+        progress_callback(
+            f"📉 캐스케이드 배치 완료: 섹션 {report.sections}개 중 {report.escalated_sections}개 LLM 검사 "
+            f"(비율 {report.escalation_rate:.0%})"
+        )
+    return {
+        "results": results,
+        "report": report.summary(),
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 3)
+    }
+
+def _optimization_state_hash(prompt: str, messages: List[Any]) -> str:
+    """프롬프트와 few-shot 메시지를 합친 상태의 내용 해시"""
+    normalized = [msg.model_dump(mode="json") if hasattr(msg, "model_dump") else msg for msg in messages or []]
+    return content_hash(json.dumps({"prompt": prompt, "messages": normalized}, sort_keys=True, ensure_ascii=False))
+
+async def optimize_until_stable(
+    prompt: str,
+    few_shot_messages: List[ChatMessage] = None,
+    max_iterations: int = 5,
+    progress_callback=None,
+    **options: Any
+) -> Dict[str, Any]:
+    """최적화 결과를 다시 입력으로 넣어 더 이상 변경이 없을 때(고정점)까지 반복 최적화
+
+    options(compress, max_few_shot_examples, deadline_ms 등)는 매 반복의 optimize_prompt_comprehensive에 그대로 전달됩니다.
+    """
+    if max_iterations < 1:
+        raise ValueError("max_iterations must be at least 1")
+
+    current_prompt = prompt
+    current_messages = few_shot_messages
+    current_hash = _optimization_state_hash(prompt, few_shot_messages)
+    seen_hashes = {current_hash}
+    iterations = []
+    first_result = None
+    last_result = None
+    converged = False
+
+    for iteration in range(1, max_iterations + 1):
+        if progress_callback:
+            progress_callback(f"🔁 반복 최적화 {iteration}/{max_iterations} 시작...")
+
+        started = time.perf_counter()
+        result = await optimize_prompt_comprehensive(
+            prompt=current_prompt,
+            few_shot_messages=current_messages,
+            progress_callback=progress_callback,
+            **options
+        )
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        next_messages = [ChatMessage(**msg) if isinstance(msg, dict) else msg for msg in result["optimized_messages"]]
+        next_hash = _optimization_state_hash(result["optimized_prompt"], next_messages)
+        changed = next_hash != current_hash
+        iterations.append({
+            "iteration": iteration,
+            "input_hash": current_hash,
+            "output_hash": next_hash,
+            "changed": changed,
+            "changes_made": result["optimization_details"]["changes_made"] if changed else [],
+            "elapsed_ms": round(elapsed_ms, 3)
+        })
+
+        if first_result is None:
+            first_result = result
+        if not changed:
+            converged = True
+            if progress_callback:
+                progress_callback(f"✅ 고정점 도달: {iteration}회 반복 후 변경 없음")
+            break
+
+        last_result = result
+        if next_hash in seen_hashes:
+            # 이전 상태로 되돌아가는 순환 - 더 반복해도 수렴하지 않음
+            if progress_callback:
+                progress_callback("⚠️ 순환이 감지되어 반복 최적화를 중단합니다")
+            break
+
+        seen_hashes.add(next_hash)
+        current_prompt = result["optimized_prompt"]
+        current_messages = next_messages
+        current_hash = next_hash
+
+    # 분석 결과는 원본 프롬프트 기준(첫 번째 반복), 최적화 결과는 마지막으로 변경이 있었던 반복 기준
+    final_result = last_result or first_result
+    return {
+        **first_result,
+        "optimized_prompt": final_result["optimized_prompt"],
+        "optimization_details": final_result["optimization_details"],
+        "optimized_messages": final_result["optimized_messages"],
+        "converged": converged,
+        "fixpoint_hash": current_hash if converged else None,
+        "iterations": iterations,
+        "total_elapsed_ms": round(sum(item["elapsed_ms"] for item in iterations), 3)
     }
 
 async def revise_prompt_with_feedback(
@@ -691,7 +1406,7 @@ async def revise_prompt_with_feedback(
     
     feedback_analysis_result = await Runner.run(
         feedback_analyzer,
-        json.dumps(feedback_input),
+        serialize_payload(feedback_input),
         progress_callback
     )
     
@@ -706,7 +1421,7 @@ async def revise_prompt_with_feedback(
     
     revision_result = await Runner.run(
         prompt_reviser,
-        json.dumps(revision_input),
+        serialize_payload(revision_input),
         progress_callback
     )
     
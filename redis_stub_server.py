@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""
+로컬 Redis 프로토콜 스텁 서버 (공유 캐시 백엔드 검증용 대역)
+
+Redis 없이 RESP2/RESP3 프로토콜(HELLO로 전환)을 직접 처리하는 작은 서버로, RedisCacheBackend가 쓰는 명령과 몇 가지 관리 명령만 지원합니다.
+- 문자열: GET, SET (EX/PX/NX/XX), MGET, DEL, EXISTS, INCR, INCRBY, EXPIRE, PEXPIRE, TTL, PTTL
+- 트랜잭션: MULTI, EXEC, DISCARD (redis-py 파이프라인 기본값)
+- 관리: HELLO, PING, ECHO, SELECT, DBSIZE, FLUSHDB, FLUSHALL, CLIENT (항상 OK), QUIT
+LocalRedisServer는 테스트/벤치마크에서 같은 프로세스의 백그라운드 스레드로 실행하고,
+명령줄에서 실행하면 (--port) 다른 프로세스의 레플리카가 공유할 수 있습니다. 데이터는 메모리에만 있습니다.
+"""
+
+import argparse
+import asyncio
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+class RespError(Exception):
+    """클라이언트에 -ERR 응답으로 돌려줄 명령 오류"""
+
+Reply = Union[None, int, bytes, str, List[Any], Dict[str, Any], RespError]
+
+def encode_reply(reply: Reply, resp3: bool = False) -> bytes:
+    """응답 값 -> RESP 바이트 (resp3=True이면 null과 맵을 RESP3 형식으로)"""
+    if reply is None:
+        return b"_\r\n" if resp3 else b"$-1\r\n"
+    if isinstance(reply, RespError):
+        return f"-{reply}\r\n".encode()
+    if isinstance(reply, bool):
+        return f":{int(reply)}\r\n".encode()
+    if isinstance(reply, int):
+        return f":{reply}\r\n".encode()
+    if isinstance(reply, str):
+        return f"+{reply}\r\n".encode()  # 단순 문자열 (OK, PONG)
+    if isinstance(reply, bytes):
+        return b"$%d\r\n%s\r\n" % (len(reply), reply)
+    if isinstance(reply, dict):
+        items = [item for pair in reply.items() for item in pair]
+        head = b"%%%d\r\n" % len(reply) if resp3 else b"*%d\r\n" % len(items)
+        return head + b"".join(encode_reply(item.encode() if isinstance(item, str) else item, resp3) for item in items)
+    return b"*%d\r\n" % len(reply) + b"".join(encode_reply(item, resp3) for item in reply)
+
+class RedisStubStore:
+    """만료 시각을 가진 바이트 문자열 저장소 (명령 실행은 이벤트 루프 스레드 하나에서만)"""
+
+    def __init__(self):
+        self.data: Dict[bytes, Tuple[bytes, Optional[float]]] = {}
+        self.commands = 0
+
+    def _live(self, key: bytes) -> Optional[Tuple[bytes, Optional[float]]]:
+        entry = self.data.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= time.time():
+            del self.data[key]
+            return None
+        return entry
+
+    def execute(self, args: List[bytes]) -> Reply:
+        if not args:
+            return RespError("ERR empty command")
+        self.commands += 1
+        name = args[0].decode().upper()
+        handler = getattr(self, f"cmd_{name.lower()}", None)
+        if handler is None:
+            return RespError(f"ERR unknown command '{name}'")
+        try:
+            return handler(*args[1:])
+        except TypeError:
+            return RespError(f"ERR wrong number of arguments for '{name.lower()}' command")
+        except ValueError:
+            return RespError("ERR value is not an integer or out of range")
+
+    def cmd_ping(self, message: Optional[bytes] = None) -> Reply:
+        return "PONG" if message is None else message
+
+    def cmd_echo(self, message: bytes) -> Reply:
+        return message
+
+    def cmd_select(self, index: bytes) -> Reply:
+        return "OK"
+
+    def cmd_client(self, *args: bytes) -> Reply:
+        return "OK"  # SETINFO/SETNAME 등 연결 설정 명령
+
+    def cmd_dbsize(self) -> Reply:
+        return sum(self._live(key) is not None for key in list(self.data))
+
+    def cmd_flushdb(self, *args: bytes) -> Reply:
+        self.data.clear()
+        return "OK"
+
+    cmd_flushall = cmd_flushdb
+
+    def cmd_get(self, key: bytes) -> Reply:
+        entry = self._live(key)
+        return entry[0] if entry is not None else None
+
+    def cmd_mget(self, key: bytes, *keys: bytes) -> Reply:
+        return [self.cmd_get(item) for item in (key, *keys)]
+
+    def cmd_set(self, key: bytes, value: bytes, *options: bytes) -> Reply:
+        expires_at = None
+        only_if: Optional[str] = None
+        index = 0
+        while index < len(options):
+            option = options[index].decode().upper()
+            if option in ("EX", "PX") and index + 1 < len(options):
+                amount = int(options[index + 1])
+                if amount <= 0:
+                    return RespError("ERR invalid expire time in 'set' command")
+                expires_at = time.time() + (amount if option == "EX" else amount / 1000)
+                index += 2
+            elif option in ("NX", "XX"):
+                only_if = option
+                index += 1
+            else:
+                return RespError("ERR syntax error")
+        exists = self._live(key) is not None
+        if (only_if == "NX" and exists) or (only_if == "XX" and not exists):
+            return None
+        self.data[key] = (value, expires_at)
+        return "OK"
+
+    def cmd_del(self, key: bytes, *keys: bytes) -> Reply:
+        removed = 0
+        for item in (key, *keys):
+            if self._live(item) is not None:
+                del self.data[item]
+                removed += 1
+        return removed
+
+    def cmd_exists(self, key: bytes, *keys: bytes) -> Reply:
+        return sum(self._live(item) is not None for item in (key, *keys))
+
+    def cmd_incr(self, key: bytes) -> Reply:
+        return self.cmd_incrby(key, b"1")
+
+    def cmd_incrby(self, key: bytes, amount: bytes) -> Reply:
+        entry = self._live(key)
+        value = (int(entry[0]) if entry is not None else 0) + int(amount)
+        self.data[key] = (str(value).encode(), entry[1] if entry is not None else None)
+        return value
+
+    def cmd_pexpire(self, key: bytes, milliseconds: bytes) -> Reply:
+        entry = self._live(key)
+        if entry is None:
+            return 0
+        self.data[key] = (entry[0], time.time() + int(milliseconds) / 1000)
+        return 1
+
+    def cmd_expire(self, key: bytes, seconds: bytes) -> Reply:
+        return self.cmd_pexpire(key, str(int(seconds) * 1000).encode())
+
+    def cmd_pttl(self, key: bytes) -> Reply:
+        entry = self._live(key)
+        if entry is None:
+            return -2
+        return -1 if entry[1] is None else max(0, int((entry[1] - time.time()) * 1000))
+
+    def cmd_ttl(self, key: bytes) -> Reply:
+        remaining = self.cmd_pttl(key)
+        return remaining if remaining < 0 else (remaining + 500) // 1000
+
+async def read_command(reader: asyncio.StreamReader) -> Optional[List[bytes]]:
+    """RESP 배열(또는 인라인 명령) 하나를 읽습니다 (연결이 닫히면 None)"""
+    line = await reader.readline()
+    if not line:
+        return None
+    if not line.startswith(b"*"):
+        return line.split()
+    args = []
+    for _ in range(int(line[1:])):
+        header = await reader.readline()
+        if not header.startswith(b"$"):
+            raise RespError("ERR Protocol error: expected '$'")
+        args.append((await reader.readexactly(int(header[1:]) + 2))[:-2])
+    return args
+
+def hello_reply(args: List[bytes]) -> Tuple[Reply, Optional[int]]:
+    """HELLO [protover ...] -> (응답, 전환할 프로토콜 버전)"""
+    version = int(args[0]) if args else 2
+    if version not in (2, 3):
+        return RespError("NOPROTO unsupported protocol version"), None
+    return {
+        "server": "redis", "version": "7.2.0", "proto": version, "id": 1,
+        "mode": "standalone", "role": "master", "modules": []
+    }, version
+
+async def serve_connection(store: RedisStubStore, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    resp3 = False
+    queued: Optional[List[List[bytes]]] = None  # MULTI 이후 EXEC까지 모은 명령
+    try:
+        while True:
+            try:
+                args = await read_command(reader)
+            except RespError as exc:
+                writer.write(encode_reply(exc))
+                break
+            if args is None:
+                break
+            command = args[0].upper() if args else b""
+            if command == b"QUIT":
+                writer.write(encode_reply("OK"))
+                break
+            if command == b"HELLO":
+                try:
+                    reply, version = hello_reply(args[1:])
+                except ValueError:
+                    reply, version = RespError("ERR Protocol version is not an integer or out of range"), None
+                if version is not None:
+                    resp3 = version == 3
+            elif command == b"MULTI":
+                queued, reply = [], "OK"
+            elif command in (b"EXEC", b"DISCARD"):
+                if queued is None:
+                    reply = RespError(f"ERR {command.decode()} without MULTI")
+                else:
+                    # 명령은 이벤트 루프 스레드 하나에서 실행되므로 큐에 모은 명령을 차례로 실행하면 원자적
+                    reply = [store.execute(queued_args) for queued_args in queued] if command == b"EXEC" else "OK"
+                    queued = None
+            elif queued is not None:
+                queued.append(args)
+                reply = "QUEUED"
+            else:
+                reply = store.execute(args)
+            writer.write(encode_reply(reply, resp3))
+            await writer.drain()
+        await writer.drain()
+    except (ConnectionError, asyncio.IncompleteReadError, ValueError, asyncio.CancelledError):
+        pass  # 연결 종료 또는 서버 정지
+    finally:
+        writer.close()
+
+class LocalRedisServer:
+    """같은 프로세스의 백그라운드 스레드에서 실행되는 Redis 프로토콜 스텁 서버.
+
+    with LocalRedisServer() as server:
+        backend = RedisCacheBackend(server.url)
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self.host = host
+        self.port = port
+        self.store = RedisStubStore()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        return f"redis://{self.host}:{self.port}/0"
+
+    def __enter__(self) -> "LocalRedisServer":
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def start(self) -> None:
+        ready = threading.Event()
+
+        def run() -> None:
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)  # 종료 시 gather가 이 스레드의 루프를 사용
+            self._server = self._loop.run_until_complete(asyncio.start_server(
+                lambda reader, writer: serve_connection(self.store, reader, writer), self.host, self.port
+            ))
+            self.port = self._server.sockets[0].getsockname()[1]
+            ready.set()
+            self._loop.run_forever()
+            # 열린 연결을 정리한 뒤 루프 종료
+            self._server.close()
+            connections = asyncio.all_tasks(self._loop)
+            for task in connections:
+                task.cancel()
+            self._loop.run_until_complete(asyncio.gather(*connections, return_exceptions=True))
+            self._loop.close()
+
+        self._thread = threading.Thread(target=run, name="redis-stub", daemon=True)
+        self._thread.start()
+        ready.wait()
+
+    def stop(self) -> None:
+        if self._loop is not None and self._thread is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._thread = None
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="로컬 Redis 프로토콜 스텁 서버")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6379)
+    args = parser.parse_args()
+    store = RedisStubStore()
+
+    async def serve() -> None:
+        async with await asyncio.start_server(
+            lambda reader, writer: serve_connection(store, reader, writer), args.host, args.port
+        ) as server:
+            await server.serve_forever()
+
+    asyncio.run(serve())
+
+if __name__ == "__main__":
+    main()
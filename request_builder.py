@@ -0,0 +1,118 @@
+"""
+프롬프트 캐시 친화적 요청 구성 모듈
+
+공급자 측 프롬프트 캐시는 요청의 앞부분(prefix)이 바이트 단위로 같을 때만 적중합니다.
+각 Agent의 정적 prefix(지시문 + 출력 스키마)는 한 번만 컴파일해 매 요청에 같은 객체를 사용하고,
+가변 입력은 항상 마지막에 둡니다. 가변 입력 JSON도 결정적으로 직렬화하되, 여러 호출에서 반복되는 키
+(예: DEVELOPER_MESSAGE)를 앞에 두어 같은 개발자 메시지에 대한 호출끼리 더 긴 prefix를 공유하게 합니다.
+"""
+
+import hashlib
+import json
+import threading
+from typing import Any, Dict, Sequence, Tuple
+
+from pydantic import BaseModel, Field
+
+from prompt_compression import estimate_tokens
+
+# 호출 간에 반복되는 값을 담는 페이로드 키 - 이 순서대로 앞에 두고 나머지 키는 정렬
+STABLE_PAYLOAD_KEYS: Tuple[str, ...] = (
+    "SECTIONS",
+    "DEVELOPER_MESSAGE",
+    "NEW_DEVELOPER_MESSAGE",
+    "ORIGINAL_DEVELOPER_MESSAGE",
+    "original_prompt",
+    "optimized_prompt",
+    "original_optimized_prompt",
+)
+
+class ModelRequest(BaseModel):
+    """모델에 보낼 요청 하나"""
+    agent: str
+    model: str
+    instructions: str
+    input: str
+    output_schema: Dict[str, Any] = Field(default_factory=dict)
+
+def chat_completion_body(request: ModelRequest) -> Dict[str, Any]:
+    """요청을 Chat Completions 요청 본문으로 변환합니다 (API 호출과 배치 파일에서 공통 사용)"""
+    return {
+        "model": request.model,
+        "messages": [
+            {"role": "system", "content": request.instructions},
+            {"role": "user", "content": request.input},
+        ],
+        "response_format": {
+            "type": "json_schema",
+            "json_schema": {"name": request.agent, "schema": request.output_schema},
+        },
+    }
+
+def request_from_body(body: Dict[str, Any]) -> ModelRequest:
+    """chat_completion_body의 역변환"""
+    messages = {message["role"]: message["content"] for message in body["messages"]}
+    json_schema = body["response_format"]["json_schema"]
+    return ModelRequest(
+        agent=json_schema["name"],
+        model=body["model"],
+        instructions=messages.get("system", ""),
+        input=messages.get("user", ""),
+        output_schema=json_schema.get("schema", {})
+    )
+
+def canonical_json(value: Any) -> str:
+    """결정적 JSON 직렬화 (키 정렬, 공백 없음, 유니코드 그대로)"""
+    return json.dumps(value, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+
+def serialize_payload(payload: Dict[str, Any], stable_keys: Sequence[str] = STABLE_PAYLOAD_KEYS) -> str:
+    """Agent 입력 페이로드를 직렬화합니다. 반복되는 키를 먼저, 나머지는 정렬된 순서로 둡니다."""
+    keys = [key for key in stable_keys if key in payload]
+    keys += sorted(key for key in payload if key not in stable_keys)
+    return "{" + ",".join(f"{canonical_json(key)}:{canonical_json(payload[key])}" for key in keys) + "}"
+
+def output_schema_for(output_type: Any) -> Dict[str, Any]:
+    """Agent.output_type의 JSON 스키마 (pydantic 모델이 아니면 임의의 객체)"""
+    if isinstance(output_type, type) and issubclass(output_type, BaseModel):
+        return output_type.model_json_schema()
+    return {"type": "object"}
+
+class CompiledPrefix(BaseModel):
+    """Agent 하나의 정적 요청 prefix"""
+    agent: str
+    model: str
+    instructions: str
+    output_schema: Dict[str, Any]
+    serialized_schema: str  # 결정적으로 직렬화한 출력 스키마
+    prefix_hash: str
+    prefix_tokens: int
+
+class RequestBuilder:
+    """Agent별 정적 prefix를 한 번만 컴파일해 캐시합니다 (지시문이나 출력 타입이 바뀌면 다시 컴파일)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._prefixes: Dict[Tuple[str, str, int, int], CompiledPrefix] = {}
+        self.compilations = 0
+
+    def compile(self, agent: Any) -> CompiledPrefix:
+        key = (agent.name, agent.model, hash(agent.instructions), id(agent.output_type))
+        prefix = self._prefixes.get(key)
+        if prefix is not None:
+            return prefix
+        output_schema = output_schema_for(agent.output_type)
+        serialized_schema = canonical_json(output_schema)
+        prefix = CompiledPrefix(
+            agent=agent.name,
+            model=agent.model,
+            instructions=agent.instructions,
+            output_schema=output_schema,
+            serialized_schema=serialized_schema,
+            prefix_hash=hashlib.sha256(f"{agent.model}\n{agent.instructions}\n{serialized_schema}".encode("utf-8")).hexdigest(),
+            prefix_tokens=estimate_tokens(agent.instructions) + estimate_tokens(serialized_schema)
+        )
+        with self._lock:
+            self.compilations += 1
+            return self._prefixes.setdefault(key, prefix)
+
+default_request_builder = RequestBuilder()
@@ -0,0 +1,335 @@
+"""
+모델 호출 복원력 모듈
+
+실제 모델을 호출할 때 느린 호출 하나(예: dev_rewriter)가 optimize_prompt_parallel 전체를 붙잡지 않도록
+LLM 실행기에 다음을 더합니다.
+- Agent별 시간 제한 (timeouts, 기본값 default_timeout_s)
+- 재시도 가능한 오류(시간 초과, 연결 오류, 429, 5xx)에 대한 지터 재시도 (full jitter 지수 백오프)
+- 헤징: 응답이 Agent의 최근 p95 지연 시간을 넘도록 오지 않으면 같은 요청을 하나 더 보내고 먼저 온 응답을 사용
+- 서킷 브레이커: 연속 실패가 쌓이면 일정 시간 모델 호출을 멈추고 ModelUnavailableError를 즉시 발생
+최종적으로 응답을 얻지 못하면 ModelUnavailableError를 발생시키고, main.Runner / prompt_optimizer.Runner는
+이를 받아 로컬 휴리스틱 분석기(Runner.simulate)로 대체합니다.
+
+FaultInjectingBackend는 임의의 백엔드(보통 StubModelBackend) 앞에서 오류와 지연 꼬리를 주입하는 로컬 스텁으로,
+네트워크 없이 꼬리 지연(p99)과 장애 대응을 검증하는 데 사용합니다.
+
+MCP 서버, Streamlit 앱, main.py는 시작할 때 install_default_runner_from_env()를 호출합니다.
+PROMPT_OPTIMIZER_LLM_BACKEND=openai 이면 OpenAI 백엔드를 ResilientRunner로 감싸 등록하고, 설정하지 않으면 로컬 휴리스틱을 그대로 사용합니다.
+"""
+
+import asyncio
+import collections
+import os
+import random
+import time
+from typing import Any, Deque, Dict, Optional, Tuple
+
+from openai import AsyncOpenAI
+from pydantic import BaseModel, ValidationError
+
+from llm_runner import (
+    LLMRunner,
+    ModelBackend,
+    ModelError,
+    ModelRequest,
+    ModelResponse,
+    ModelUnavailableError,
+    OpenAIBackend,
+    RetryableModelError,
+    RunResult,
+    get_default_llm_runner,
+    set_default_llm_runner,
+)
+from schema_catalog import SchemaCatalog
+
+class ResilienceStats(BaseModel):
+    """복원력 계층 통계"""
+    calls: int = 0  # run() 호출 수
+    attempts: int = 0  # 시도 수 (재시도 포함, 헤지 요청 제외)
+    retries: int = 0
+    timeouts: int = 0  # 시간 제한을 넘긴 시도 수
+    hedges: int = 0  # 보낸 헤지 요청 수
+    hedge_wins: int = 0  # 헤지 요청이 먼저 응답한 횟수
+    short_circuits: int = 0  # 서킷이 열려 있어 모델을 호출하지 않은 횟수
+    unavailable: int = 0  # ModelUnavailableError로 끝난 호출 수 (로컬 휴리스틱으로 대체됨)
+
+class CircuitBreaker:
+    """연속 실패 기반 서킷 브레이커.
+
+    closed: 정상 호출. failure_threshold번 연속 실패하면 open.
+    open: reset_timeout_s 동안 호출을 막음. 시간이 지나면 half_open.
+    half_open: 시험 호출 half_open_max_calls개만 허용. 성공하면 closed, 실패하면 다시 open.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout_s: float = 30.0, half_open_max_calls: int = 1):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_s = reset_timeout_s
+        self.half_open_max_calls = half_open_max_calls
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.trips = 0
+        self._trial_calls = 0
+
+    def allow(self) -> bool:
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.reset_timeout_s:
+                return False
+            self.state = self.HALF_OPEN
+            self._trial_calls = 0
+        if self.state == self.HALF_OPEN:
+            if self._trial_calls >= self.half_open_max_calls:
+                return False
+            self._trial_calls += 1
+        return True
+
+    def release(self) -> None:
+        """결과 없이 끝난 호출(취소)의 시험 호출 자리를 돌려줍니다 - half_open에서 다음 호출이 다시 시험할 수 있게 함"""
+        if self.state == self.HALF_OPEN and self._trial_calls > 0:
+            self._trial_calls -= 1
+
+    def record_success(self) -> None:
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+
+    def record_failure(self) -> None:
+        self.consecutive_failures += 1
+        if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                self.trips += 1
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+class LatencyTracker:
+    """Agent별 최근 지연 시간 창과 백분위수"""
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.window = window
+        self.min_samples = min_samples
+        self._samples: Dict[str, Deque[float]] = {}
+
+    def observe(self, agent_name: str, latency_s: float) -> None:
+        samples = self._samples.get(agent_name)
+        if samples is None:
+            samples = self._samples[agent_name] = collections.deque(maxlen=self.window)
+        samples.append(latency_s)
+
+    def percentile(self, agent_name: str, q: float) -> Optional[float]:
+        """표본이 min_samples개 미만이면 None"""
+        samples = self._samples.get(agent_name)
+        if not samples or len(samples) < self.min_samples:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def snapshot(self, quantiles: Tuple[float, ...] = (0.5, 0.95, 0.99)) -> Dict[str, Dict[str, float]]:
+        """이름별 표본 수와 백분위수(ms) - 표본이 min_samples개 미만인 이름은 표본 수만"""
+        snapshot: Dict[str, Dict[str, float]] = {}
+        for agent_name, samples in sorted(self._samples.items()):
+            entry: Dict[str, float] = {"samples": len(samples)}
+            for q in quantiles:
+                value = self.percentile(agent_name, q)
+                if value is not None:
+                    entry[f"p{round(q * 100)}_ms"] = round(value * 1000, 3)
+            snapshot[agent_name] = entry
+        return snapshot
+
+class ResilientRunner(LLMRunner):
+    """시간 제한, 지터 재시도, 헤징, 서킷 브레이커를 적용한 LLM 실행기.
+
+    timeouts: Agent 이름 -> 시도당 시간 제한(초). 없으면 default_timeout_s
+    max_retries: 재시도 가능한 오류에 대한 최대 재시도 횟수
+    backoff_base_s / backoff_max_s: 재시도 대기 시간 상한 min(backoff_max_s, backoff_base_s * 2^n) 안에서 균등 분포
+    hedge_quantile: 이 백분위수 지연 시간이 지나도 응답이 없으면 헤지 요청 전송 (None이면 헤징 없음)
+    """
+
+    def __init__(
+        self,
+        backend: ModelBackend,
+        catalog: Optional[SchemaCatalog] = None,
+        timeouts: Optional[Dict[str, float]] = None,
+        default_timeout_s: float = 60.0,
+        max_retries: int = 2,
+        backoff_base_s: float = 0.2,
+        backoff_max_s: float = 5.0,
+        hedge_quantile: Optional[float] = 0.95,
+        breaker: Optional[CircuitBreaker] = None,
+        latency_tracker: Optional[LatencyTracker] = None,
+        rng: Optional[random.Random] = None
+    ):
+        super().__init__(backend, catalog)
+        self.timeouts = dict(timeouts or {})
+        self.default_timeout_s = default_timeout_s
+        self.max_retries = max_retries
+        self.backoff_base_s = backoff_base_s
+        self.backoff_max_s = backoff_max_s
+        self.hedge_quantile = hedge_quantile
+        self.breaker = breaker or CircuitBreaker()
+        self.latency = latency_tracker or LatencyTracker()
+        self.rng = rng or random.Random()
+        self.resilience_stats = ResilienceStats()
+
+    def timeout_for(self, agent_name: str) -> float:
+        return self.timeouts.get(agent_name, self.default_timeout_s)
+
+    def backoff_s(self, retry: int) -> float:
+        return self.rng.uniform(0, min(self.backoff_max_s, self.backoff_base_s * (2 ** retry)))
+
+    async def run(self, agent: Any, input_data: str) -> RunResult:
+        stats = self.resilience_stats
+        stats.calls += 1
+        request = self.build_request(agent, input_data)
+        last_error: Optional[BaseException] = None
+        for attempt in range(self.max_retries + 1):
+            if not self.breaker.allow():
+                stats.short_circuits += 1
+                stats.unavailable += 1
+                raise ModelUnavailableError(f"{agent.name}: 서킷 브레이커 열림") from last_error
+            if attempt:
+                stats.retries += 1
+            stats.attempts += 1
+            try:
+                response = await self._attempt(request)
+                result = RunResult(self.parse_output(agent, response.output_text), response)
+            except (RetryableModelError, asyncio.TimeoutError) as exc:
+                last_error = exc
+                self.breaker.record_failure()
+                if attempt < self.max_retries:
+                    await asyncio.sleep(self.backoff_s(attempt))
+                continue
+            except (ModelError, ValidationError) as exc:
+                # 재시도해도 같은 결과가 예상되는 오류 (잘못된 요청, 스키마에 맞지 않는 출력)
+                # 응답은 받았으므로 스키마 검증 실패는 공급자 장애로 보지 않음
+                if isinstance(exc, ModelError):
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.record_success()
+                stats.unavailable += 1
+                raise ModelUnavailableError(f"{agent.name}: {exc}") from exc
+            except asyncio.CancelledError:
+                # 호출자가 취소함 (마감 시간의 wait_for 등) - 공급자 상태를 알 수 없으므로 시험 호출 자리만 반환
+                self.breaker.release()
+                raise
+            except BaseException:
+                self.breaker.record_failure()
+                raise
+            self.breaker.record_success()
+            self.record(agent.name, response)
+            return result
+        stats.unavailable += 1
+        raise ModelUnavailableError(f"{agent.name}: {self.max_retries + 1}번 시도 모두 실패 ({last_error!r})") from last_error
+
+    async def _attempt(self, request: ModelRequest) -> ModelResponse:
+        """시도 하나 - 시간 제한 안에서 첫 요청과 (필요하면) 헤지 요청 중 먼저 성공한 응답"""
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        deadline = started + self.timeout_for(request.agent)
+        hedge_delay = self.latency.percentile(request.agent, self.hedge_quantile) if self.hedge_quantile is not None else None
+        hedge_at = started + hedge_delay if hedge_delay is not None else None
+        tasks = [loop.create_task(self.backend.complete(request))]
+        hedge_task: Optional[asyncio.Task] = None
+        last_error: Optional[BaseException] = None
+        try:
+            while True:
+                wake_at = deadline if hedge_task is not None or hedge_at is None else min(deadline, hedge_at)
+                done, _ = await asyncio.wait(tasks, timeout=max(0.0, wake_at - loop.time()), return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    tasks.remove(task)
+                    if task.exception() is None:
+                        if task is hedge_task:
+                            self.resilience_stats.hedge_wins += 1
+                        self.latency.observe(request.agent, loop.time() - started)
+                        return task.result()
+                    last_error = task.exception()
+                if not tasks:
+                    raise last_error
+                now = loop.time()
+                if now >= deadline:
+                    self.resilience_stats.timeouts += 1
+                    # 시간 초과도 지연 분포에 반영해야 p95가 실제 꼬리를 따라감
+                    self.latency.observe(request.agent, now - started)
+                    raise asyncio.TimeoutError(f"{request.agent}: {self.timeout_for(request.agent)}초 시간 제한 초과")
+                if hedge_task is None and hedge_at is not None and now >= hedge_at:
+                    hedge_task = loop.create_task(self.backend.complete(request))
+                    tasks.append(hedge_task)
+                    self.resilience_stats.hedges += 1
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def metrics(self) -> Dict[str, Any]:
+        metrics = super().metrics()
+        metrics["resilience"] = {
+            **self.resilience_stats.model_dump(),
+            "circuit_state": self.breaker.state,
+            "circuit_trips": self.breaker.trips,
+        }
+        return metrics
+
+class FaultInjectingBackend(ModelBackend):
+    """오류와 지연 꼬리를 주입하는 로컬 스텁 백엔드.
+
+    error_rate: RetryableModelError(503)로 실패할 확률
+    slow_rate / slow_ms: 이 확률로 응답 전에 slow_ms만큼 추가 지연
+    outage: True이면 모든 요청이 실패 (공급자 장애 흉내)
+    """
+
+    def __init__(
+        self,
+        inner: ModelBackend,
+        error_rate: float = 0.0,
+        slow_rate: float = 0.0,
+        slow_ms: float = 2000.0,
+        seed: Optional[int] = None
+    ):
+        self.inner = inner
+        self.error_rate = error_rate
+        self.slow_rate = slow_rate
+        self.slow_ms = slow_ms
+        self.outage = False
+        self.rng = random.Random(seed)
+        self.injected_errors = 0
+        self.injected_delays = 0
+
+    async def complete(self, request: ModelRequest) -> ModelResponse:
+        if self.outage or self.rng.random() < self.error_rate:
+            self.injected_errors += 1
+            await asyncio.sleep(0.005)
+            raise RetryableModelError(f"{request.agent}: 503 Service Unavailable (주입된 오류)")
+        started = time.perf_counter()
+        if self.rng.random() < self.slow_rate:
+            self.injected_delays += 1
+            await asyncio.sleep(self.slow_ms / 1000)
+        response = await self.inner.complete(request)
+        return response.model_copy(update={"latency_ms": (time.perf_counter() - started) * 1000})
+
+LLM_BACKEND_ENV = "PROMPT_OPTIMIZER_LLM_BACKEND"  # openai: 실제 모델 호출, 미설정: 로컬 휴리스틱
+LLM_TIMEOUT_ENV = "PROMPT_OPTIMIZER_LLM_TIMEOUT_S"  # Agent 호출 시도당 시간 제한(초)
+
+def runner_from_env() -> Optional[ResilientRunner]:
+    """환경 변수에 모델 백엔드가 설정되어 있으면 새 ResilientRunner를 만듭니다 (등록하지 않음, 설정이 없으면 None).
+
+    OpenAI 클라이언트의 연결 풀은 처음 사용한 이벤트 루프에 묶이므로, 호출마다 asyncio.run을 새로 하는 곳(Streamlit)은
+    루프마다 이 함수로 실행기를 만들고 llm_runner.use_llm_runner로 지정한 뒤 루프가 끝나기 전에 backend.aclose()로 닫습니다.
+    """
+    if os.environ.get(LLM_BACKEND_ENV, "").strip().lower() != "openai":
+        return None
+    return ResilientRunner(OpenAIBackend(AsyncOpenAI()), default_timeout_s=float(os.environ.get(LLM_TIMEOUT_ENV, "60")))
+
+def install_default_runner_from_env() -> Optional[LLMRunner]:
+    """환경 변수에 모델 백엔드가 설정되어 있으면 ResilientRunner를 기본 LLM 실행기로 등록하고 반환합니다.
+
+    이벤트 루프 하나에서 계속 실행되는 프로세스(MCP 서버, CLI, 샤드 워커)용입니다.
+    이미 실행기가 등록되어 있으면(테스트, 벤치마크) 그 실행기를 그대로 사용합니다.
+    """
+    runner = get_default_llm_runner()
+    if runner is not None:
+        return runner
+    runner = runner_from_env()
+    if runner is not None:
+        set_default_llm_runner(runner)
+    return runner
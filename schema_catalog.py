@@ -0,0 +1,95 @@
+"""
+구조화 출력 스키마 카탈로그 모듈
+
+실제 모델을 호출할 때마다 Agent.output_type에서 JSON 스키마를 만들고 응답 파서를 준비하지 않도록,
+시작 시점에 Agent별로 다음을 미리 만들어 둡니다.
+- 정적 prefix (지시문 + 출력 스키마, request_builder.CompiledPrefix)
+- 직렬화된 요청 본문 조각 (가변 입력 앞/뒤의 JSON 문자열)
+- 컴파일된 검증기 (pydantic TypeAdapter)
+호출마다 남는 작업은 가변 입력을 본문 조각 사이에 끼워 넣고 응답을 검증하는 것뿐입니다.
+"""
+
+import json
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from pydantic import BaseModel, TypeAdapter
+
+from request_builder import CompiledPrefix, ModelRequest, RequestBuilder, chat_completion_body, default_request_builder
+
+# 본문 조각을 나눌 위치 표시 (지시문이나 스키마에 나타날 수 없는 문자열)
+_INPUT_SENTINEL = "\u0000AGENT_INPUT\u0000"
+
+def serialize_body(body: Dict[str, Any]) -> str:
+    """요청 본문 직렬화 (공백 없음, 유니코드 그대로)"""
+    return json.dumps(body, ensure_ascii=False, separators=(",", ":"))
+
+class AgentSpec:
+    """Agent 하나에 대해 미리 계산한 스키마, 요청 본문 조각, 응답 검증기"""
+
+    def __init__(self, prefix: CompiledPrefix, output_type: Any):
+        self.prefix = prefix
+        item_type = output_type if isinstance(output_type, type) and issubclass(output_type, BaseModel) else Dict[str, Any]
+        self.adapter = TypeAdapter(item_type)
+        template = self.build_request(_INPUT_SENTINEL)
+        self.body_head, self.body_tail = serialize_body(chat_completion_body(template)).split(
+            json.dumps(_INPUT_SENTINEL, ensure_ascii=False)
+        )
+
+    def build_request(self, input_data: str) -> ModelRequest:
+        # 정적 필드는 컴파일된 객체를 그대로 쓰고 가변 입력만 마지막에 붙임 (검증 생략)
+        return ModelRequest.model_construct(
+            agent=self.prefix.agent,
+            model=self.prefix.model,
+            instructions=self.prefix.instructions,
+            input=input_data,
+            output_schema=self.prefix.output_schema
+        )
+
+    def body_json(self, input_data: str) -> str:
+        """Chat Completions 요청 본문 JSON (serialize_body(chat_completion_body(...))와 같은 문자열)"""
+        return self.body_head + json.dumps(input_data, ensure_ascii=False) + self.body_tail
+
+    def parse(self, output_text: str) -> Any:
+        return self.adapter.validate_json(output_text)
+
+class SchemaCatalog:
+    """Agent별 AgentSpec 카탈로그 (등록되지 않은 Agent는 처음 사용할 때 컴파일)"""
+
+    def __init__(self, request_builder: Optional[RequestBuilder] = None):
+        self.request_builder = request_builder or default_request_builder
+        self._lock = threading.Lock()
+        self._specs: Dict[Tuple[str, str, int, int], AgentSpec] = {}
+        self._by_name: Dict[Tuple[str, str], AgentSpec] = {}
+
+    def register(self, agents: Iterable[Any]) -> None:
+        """시작 시점에 Agent들의 스키마/본문 조각/검증기를 미리 만듭니다"""
+        for agent in agents:
+            self.compile(agent)
+
+    def compile(self, agent: Any) -> AgentSpec:
+        key = (agent.name, agent.model, hash(agent.instructions), id(agent.output_type))
+        spec = self._specs.get(key)
+        if spec is not None:
+            return spec
+        spec = AgentSpec(self.request_builder.compile(agent), agent.output_type)
+        with self._lock:
+            spec = self._specs.setdefault(key, spec)
+            self._by_name[(agent.name, agent.model)] = spec
+        return spec
+
+    def agents(self) -> List[str]:
+        return sorted({name for name, _ in self._by_name})
+
+    def body_json(self, request: ModelRequest) -> str:
+        """요청 본문 JSON - 카탈로그의 정적 prefix와 같은 요청이면 본문 조각에 입력만 끼워 넣음"""
+        spec = self._by_name.get((request.agent, request.model))
+        if (
+            spec is not None
+            and spec.prefix.instructions == request.instructions
+            and (spec.prefix.output_schema is request.output_schema or spec.prefix.output_schema == request.output_schema)
+        ):
+            return spec.body_json(request.input)
+        return serialize_body(chat_completion_body(request))
+
+default_catalog = SchemaCatalog()
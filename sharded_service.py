@@ -0,0 +1,367 @@
+"""
+해시 친화 라우팅 멀티 프로세스 최적화 서비스 모듈
+
+프로세스 하나에서 실행되는 최적화는 GIL에 묶이고 캐시도 프로세스마다 따로입니다. ShardedOptimizerService는
+앞단 프로세스에서 요청을 워커 프로세스 N개로 나눠 보냅니다.
+- 라우팅: 프롬프트 내용 해시(sha256)를 일관된 해시 링(HashRing, 워커당 가상 노드 vnodes개)에 올려 담당 워커를 정함.
+  같은 프롬프트는 항상 같은 워커로 가므로 워커의 결과 캐시(LRU)와 single-flight 병합이 자기 키 범위에서만 뜨겁게 유지됨
+- 워커 추가/제거: 링에서 해당 워커의 가상 노드만 바뀌므로 키의 약 1/N만 다른 워커로 이동
+- 부하: 워커별 요청 수, 처리 중 요청 수, 캐시 적중/실패, 처리 시간, 담당 키 범위 비율 (load())
+워커가 죽으면 링에서 빼고 요청을 다음 담당 워커로 한 번 다시 보냅니다.
+"""
+
+import asyncio
+import bisect
+import collections
+import hashlib
+import itertools
+import multiprocessing
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from pydantic import BaseModel
+
+from singleflight import SingleFlight, request_key
+from structured_results import blob_ref
+
+DEFAULT_VNODES = 128
+DEFAULT_WORKER_CACHE_ENTRIES = 1024
+
+class WorkerUnavailableError(Exception):
+    """워커 프로세스가 종료되어 요청을 처리할 수 없는 경우"""
+
+def _ring_position(label: str) -> int:
+    return int.from_bytes(hashlib.sha256(label.encode("utf-8")).digest()[:8], "big")
+
+class HashRing:
+    """가상 노드를 사용하는 일관된 해시 링"""
+
+    def __init__(self, nodes: Iterable[str] = (), vnodes: int = DEFAULT_VNODES):
+        self.vnodes = vnodes
+        self._positions: List[int] = []
+        self._owners: List[str] = []
+        self.nodes: List[str] = []
+        for node in nodes:
+            self.add(node)
+
+    def add(self, node: str) -> None:
+        if node in self.nodes:
+            return
+        self.nodes.append(node)
+        for replica in range(self.vnodes):
+            position = _ring_position(f"{node}#{replica}")
+            index = bisect.bisect(self._positions, position)
+            self._positions.insert(index, position)
+            self._owners.insert(index, node)
+
+    def remove(self, node: str) -> None:
+        if node not in self.nodes:
+            return
+        self.nodes.remove(node)
+        kept = [(position, owner) for position, owner in zip(self._positions, self._owners) if owner != node]
+        self._positions = [position for position, _ in kept]
+        self._owners = [owner for _, owner in kept]
+
+    def node_for(self, key: str) -> str:
+        """key(보통 내용 해시)를 담당하는 노드 - 링에서 key 위치 다음의 첫 가상 노드"""
+        if not self._positions:
+            raise WorkerUnavailableError("해시 링에 워커가 없습니다")
+        index = bisect.bisect(self._positions, _ring_position(key)) % len(self._positions)
+        return self._owners[index]
+
+    def ownership(self) -> Dict[str, float]:
+        """노드별 담당 키 범위 비율"""
+        shares = {node: 0 for node in self.nodes}
+        span = 1 << 64
+        for index, owner in enumerate(self._owners):
+            previous = self._positions[index - 1] if index else self._positions[-1] - span
+            shares[owner] += self._positions[index] - previous
+        return {node: round(share / span, 4) for node, share in shares.items()}
+
+class WorkerLoad(BaseModel):
+    """워커 하나의 부하 (앞단에서 센 값 + 워커가 보고한 캐시 통계)"""
+    worker_id: str
+    pid: Optional[int] = None
+    alive: bool = True
+    key_share: float = 0.0  # 링에서 담당하는 키 범위 비율
+    requests: int = 0
+    in_flight: int = 0
+    errors: int = 0
+    busy_ms: float = 0.0  # 워커 안에서 요청을 처리한 시간 합계
+    cache_hits: int = 0
+    cache_misses: int = 0
+    coalesced: int = 0  # 계산 중인 같은 요청에 합류한 수
+    cache_entries: int = 0
+
+# ---- 워커 프로세스 ----
+
+def _worker_main(conn: Any, cache_entries: int) -> None:
+    """워커 프로세스 진입점 - 요청을 받아 이벤트 루프에서 동시에 처리하고 결과를 돌려보냄"""
+    import prompt_optimizer
+    from resilience import install_default_runner_from_env
+
+    install_default_runner_from_env()  # 서버와 같은 환경 변수로 모델 백엔드 설정
+    cache: "collections.OrderedDict[str, Any]" = collections.OrderedDict()
+    flights = SingleFlight()
+    stats = {"cache_hits": 0, "cache_misses": 0, "coalesced": 0, "busy_ms": 0.0}
+    send_lock = threading.Lock()
+
+    def send(message: Tuple[Any, ...]) -> None:
+        with send_lock:
+            conn.send(message)
+
+    async def compute(key: str, method: str, params: Dict[str, Any], progress: Callable[[str], None]) -> Any:
+        with prompt_optimizer.track_model_fallbacks() as fallbacks:
+            if method == "optimize":
+                result = await prompt_optimizer.optimize_prompt_comprehensive(progress_callback=progress, **params)
+            elif method == "analyze":
+                result = await prompt_optimizer.analyze_prompt(progress_callback=progress, **params)
+            else:
+                raise ValueError(f"unknown method: {method}")
+        stats["cache_misses"] += 1
+        # 마감 시간으로 단계를 건너뛴(degraded) 결과와 모델 장애로 로컬 휴리스틱이 섞인 결과는
+        # 공유 결과 캐시와 같은 규칙으로 저장하지 않음 - 같은 요청이 다시 오면 새로 계산
+        if fallbacks or result.get("degraded"):
+            return result
+        # 계산이 끝난 시점(single-flight가 대기자에게 결과를 넘기기 전)에 캐시를 채움 -
+        # 계산 중에 온 같은 요청은 single-flight로 합류하고, 이후 요청은 캐시에서 받음
+        cache[key] = result
+        while len(cache) > cache_entries:
+            cache.popitem(last=False)
+        return result
+
+    async def execute(request_id: int, method: str, params: Dict[str, Any]) -> Any:
+        if method == "stats":
+            return {**stats, "cache_entries": len(cache), "pid": os.getpid()}
+        key = request_key(method, params)
+        if key in cache:
+            cache.move_to_end(key)
+            stats["cache_hits"] += 1
+            return cache[key]
+
+        def progress(message: str) -> None:
+            send(("progress", request_id, message))
+
+        # 같은 키가 계산 중이면 합류 (캐시가 채워지기 전에 몰린 중복 요청)
+        result, shared = await flights.do(key, lambda fan_out: compute(key, method, params, fan_out), progress)
+        if shared:
+            stats["coalesced"] += 1
+        return result
+
+    async def handle(request_id: int, method: str, params: Dict[str, Any]) -> None:
+        started = time.perf_counter()
+        try:
+            result = await execute(request_id, method, params)
+        except Exception as exc:
+            send(("error", request_id, f"{type(exc).__name__}: {exc}"))
+            return
+        finally:
+            stats["busy_ms"] += (time.perf_counter() - started) * 1000
+        send(("result", request_id, result))
+
+    async def serve() -> None:
+        loop = asyncio.get_running_loop()
+        tasks = set()
+        while True:
+            try:
+                message = await loop.run_in_executor(None, conn.recv)
+            except EOFError:
+                break
+            if message is None:
+                break
+            task = loop.create_task(handle(*message))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        await asyncio.gather(*tasks)
+
+    asyncio.run(serve())
+    conn.close()
+
+# ---- 앞단 ----
+
+class _WorkerHandle:
+    """앞단에서 본 워커 프로세스 하나 (응답은 수신 스레드가 이벤트 루프의 Future로 전달)"""
+
+    def __init__(self, worker_id: str, cache_entries: int, loop: asyncio.AbstractEventLoop):
+        self.worker_id = worker_id
+        self.loop = loop
+        self.load = WorkerLoad(worker_id=worker_id)
+        self._ids = itertools.count(1)
+        self._pending: Dict[int, "asyncio.Future[Any]"] = {}
+        self._progress: Dict[int, Callable[[str], None]] = {}
+        self._send_lock = threading.Lock()
+        context = multiprocessing.get_context("spawn")
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_conn, cache_entries), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.load.pid = self.process.pid
+        self._receiver = threading.Thread(target=self._receive, name=f"shard-{worker_id}", daemon=True)
+        self._receiver.start()
+
+    def _receive(self) -> None:
+        try:
+            while True:
+                kind, request_id, payload = self.conn.recv()
+                if kind == "progress":
+                    callback = self._progress.get(request_id)
+                    if callback is not None:
+                        self.loop.call_soon_threadsafe(callback, payload)
+                    continue
+                self.loop.call_soon_threadsafe(self._resolve, request_id, kind, payload)
+        except (EOFError, OSError):
+            pass
+        try:
+            self.loop.call_soon_threadsafe(self._fail_all)
+        except RuntimeError:
+            pass  # 이벤트 루프가 이미 닫힘
+
+    def _resolve(self, request_id: int, kind: str, payload: Any) -> None:
+        future = self._pending.pop(request_id, None)
+        self._progress.pop(request_id, None)
+        if future is None or future.done():
+            return
+        if kind == "error":
+            future.set_exception(RuntimeError(payload))
+        else:
+            future.set_result(payload)
+
+    def _fail_all(self) -> None:
+        self.load.alive = False
+        pending, self._pending = self._pending, {}
+        self._progress.clear()
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(WorkerUnavailableError(f"워커 {self.worker_id}가 종료되었습니다"))
+
+    async def call(self, method: str, params: Dict[str, Any], progress_callback: Optional[Callable[[str], None]] = None) -> Any:
+        if not self.load.alive:
+            raise WorkerUnavailableError(f"워커 {self.worker_id}가 종료되었습니다")
+        request_id = next(self._ids)
+        future = self.loop.create_future()
+        self._pending[request_id] = future
+        if progress_callback is not None:
+            self._progress[request_id] = progress_callback
+        try:
+            with self._send_lock:
+                self.conn.send((request_id, method, params))
+        except (OSError, ValueError) as exc:
+            self._pending.pop(request_id, None)
+            self._fail_all()
+            raise WorkerUnavailableError(f"워커 {self.worker_id}에 요청을 보낼 수 없습니다: {exc}") from exc
+        return await future
+
+    async def stop(self, timeout_s: float = 5.0) -> None:
+        if self.load.alive:
+            try:
+                with self._send_lock:
+                    self.conn.send(None)
+            except (OSError, ValueError):
+                pass
+        await asyncio.get_running_loop().run_in_executor(None, self.process.join, timeout_s)
+        if self.process.is_alive():
+            self.process.kill()
+            await asyncio.get_running_loop().run_in_executor(None, self.process.join)
+        self.conn.close()
+        self.load.alive = False
+
+class ShardedOptimizerService:
+    """프롬프트 내용 해시의 일관된 해싱으로 워커 프로세스에 요청을 나누는 최적화 서비스.
+
+    workers: 시작할 워커 수 (기본값: CPU 수)
+    vnodes: 워커당 가상 노드 수 (많을수록 키 범위가 고르게 나뉨)
+    cache_entries: 워커별 결과 캐시(LRU) 크기
+    """
+
+    def __init__(self, workers: Optional[int] = None, vnodes: int = DEFAULT_VNODES, cache_entries: int = DEFAULT_WORKER_CACHE_ENTRIES):
+        self.initial_workers = workers or os.cpu_count() or 1
+        self.cache_entries = cache_entries
+        self.ring = HashRing(vnodes=vnodes)
+        self._workers: Dict[str, _WorkerHandle] = {}
+        self._worker_ids = itertools.count()
+
+    async def __aenter__(self) -> "ShardedOptimizerService":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.close()
+
+    async def start(self) -> None:
+        for _ in range(self.initial_workers):
+            self.add_worker()
+        # 워커가 모듈을 불러오고 응답할 수 있을 때까지 대기
+        await asyncio.gather(*(worker.call("stats", {}) for worker in self._workers.values()))
+
+    async def close(self) -> None:
+        workers, self._workers = list(self._workers.values()), {}
+        for worker in workers:
+            self.ring.remove(worker.worker_id)
+        await asyncio.gather(*(worker.stop() for worker in workers))
+
+    def add_worker(self) -> str:
+        """워커 프로세스를 하나 더 띄우고 링에 추가합니다 (키의 약 1/N이 새 워커로 이동)"""
+        worker_id = f"worker-{next(self._worker_ids)}"
+        self._workers[worker_id] = _WorkerHandle(worker_id, self.cache_entries, asyncio.get_running_loop())
+        self.ring.add(worker_id)
+        return worker_id
+
+    async def remove_worker(self, worker_id: str) -> None:
+        """워커를 링에서 빼고(새 요청은 다음 담당 워커로) 처리 중인 요청이 끝나면 프로세스를 종료합니다"""
+        self.ring.remove(worker_id)
+        worker = self._workers.pop(worker_id, None)
+        if worker is not None:
+            await worker.stop()
+
+    def worker_for(self, prompt: str) -> str:
+        return self.ring.node_for(blob_ref(prompt))
+
+    async def _route(self, prompt: str, method: str, params: Dict[str, Any], progress_callback: Optional[Callable[[str], None]]) -> Any:
+        for attempt in range(2):
+            worker = self._workers[self.worker_for(prompt)]
+            worker.load.requests += 1
+            worker.load.in_flight += 1
+            try:
+                return await worker.call(method, params, progress_callback)
+            except WorkerUnavailableError:
+                worker.load.errors += 1
+                # 죽은 워커는 링에서 빼고 다음 담당 워커로 한 번 다시 보냄
+                self.ring.remove(worker.worker_id)
+                if attempt or not self.ring.nodes:
+                    raise
+            except Exception:
+                worker.load.errors += 1
+                raise
+            finally:
+                worker.load.in_flight -= 1
+
+    async def optimize(self, prompt: str, few_shot_messages: Optional[List[Any]] = None, progress_callback=None, **options: Any) -> Dict[str, Any]:
+        """담당 워커에서 optimize_prompt_comprehensive를 실행합니다 (같은 입력은 워커 캐시에서 반환)"""
+        params = {"prompt": prompt, "few_shot_messages": few_shot_messages, **options}
+        return await self._route(prompt, "optimize", params, progress_callback)
+
+    async def analyze(self, prompt: str, analysis_types: Optional[List[str]] = None, progress_callback=None) -> Dict[str, Any]:
+        """담당 워커에서 analyze_prompt를 실행합니다"""
+        return await self._route(prompt, "analyze", {"prompt": prompt, "analysis_types": analysis_types}, progress_callback)
+
+    async def load(self) -> List[WorkerLoad]:
+        """워커별 부하 (살아 있는 워커는 캐시 통계를 직접 물어봄)"""
+        shares = self.ring.ownership()
+        workers = list(self._workers.values())
+        reports = await asyncio.gather(
+            *(worker.call("stats", {}) for worker in workers), return_exceptions=True
+        )
+        loads = []
+        for worker, report in zip(workers, reports):
+            load = worker.load.model_copy()
+            load.key_share = shares.get(worker.worker_id, 0.0)
+            if isinstance(report, dict):
+                load.cache_hits = report["cache_hits"]
+                load.cache_misses = report["cache_misses"]
+                load.coalesced = report["coalesced"]
+                load.cache_entries = report["cache_entries"]
+                load.busy_ms = round(report["busy_ms"], 3)
+            loads.append(load)
+        return loads
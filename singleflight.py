@@ -0,0 +1,158 @@
+"""
+요청 병합(single-flight) 모듈
+
+같은 요청 해시로 동시에 들어온 호출은 이미 진행 중인 계산 하나에 합류해 결과를 공유합니다.
+MCP 클라이언트(같은 이벤트 루프)와 Streamlit 세션(스레드마다 다른 이벤트 루프)이 섞여 있어도 동작하도록
+결과는 스레드 안전한 concurrent.futures.Future로 전달하고, 진행 메시지는 대기자마다 자기 이벤트 루프(스레드)에서
+실행되도록 전달합니다 (Streamlit 콜백의 st.session_state는 실행 스레드의 세션으로 결정됨).
+대기자 하나의 진행 콜백이 예외를 내도 로그만 남기고 공유 계산과 다른 대기자에게는 영향을 주지 않습니다.
+
+취소 규칙
+- 대기자 하나가 취소되면 그 대기자만 빠지고 계산은 계속됩니다 (asyncio.shield).
+- 마지막 대기자가 빠지면 아무도 결과를 기다리지 않으므로 계산을 취소합니다.
+- 계산을 실행하던 이벤트 루프가 종료되어 계산이 취소되면 남은 대기자는 새 계산을 시작합니다.
+"""
+
+import asyncio
+import concurrent.futures
+import hashlib
+import json
+import logging
+import threading
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from pydantic import BaseModel
+
+ProgressCallback = Callable[[str], None]
+
+logger = logging.getLogger(__name__)
+
+class FlightStats(BaseModel):
+    """single-flight 통계"""
+    calls: int = 0  # do() 호출 수
+    executions: int = 0  # 실제로 시작된 계산 수
+    coalesced: int = 0  # 진행 중인 계산에 합류한 호출 수
+    cancelled: int = 0  # 모든 대기자가 떠나 취소된 계산 수
+    in_flight: int = 0
+
+def request_key(*args: Any, **kwargs: Any) -> str:
+    """요청 인자의 SHA-256 해시 (pydantic 모델은 JSON으로 직렬화해 비교)"""
+    def default(value: Any) -> Any:
+        if hasattr(value, "model_dump"):
+            return value.model_dump(mode="json")
+        return repr(value)
+
+    payload = json.dumps({"args": args, "kwargs": kwargs}, sort_keys=True, ensure_ascii=False, default=default)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def _deliver(callback: ProgressCallback, message: str) -> None:
+    try:
+        callback(message)
+    except Exception:
+        logger.exception("single-flight 진행 콜백 오류 (무시하고 계산을 계속함)")
+
+class _Flight:
+    """진행 중인 계산 하나와 그 대기자들"""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.task: Optional[asyncio.Task] = None
+        self.future: concurrent.futures.Future = concurrent.futures.Future()
+        self.waiters = 0
+        self.callbacks: List[Tuple[ProgressCallback, asyncio.AbstractEventLoop]] = []  # (콜백, 대기자의 이벤트 루프)
+
+    def progress(self, message: str) -> None:
+        # 진행 메시지는 현재 합류해 있는 모든 호출자에게, 각자의 이벤트 루프 스레드에서 전달
+        for callback, loop in list(self.callbacks):
+            if loop is self.loop:
+                _deliver(callback, message)
+                continue
+            try:
+                loop.call_soon_threadsafe(_deliver, callback, message)
+            except RuntimeError:
+                pass  # 대기자의 이벤트 루프가 이미 닫힘
+
+class SingleFlight:
+    """요청 키별로 진행 중인 계산을 하나로 합치는 병합기"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights: Dict[str, _Flight] = {}
+        self.stats = FlightStats()
+
+    def in_flight(self, key: str) -> bool:
+        with self._lock:
+            return key in self._flights
+
+    async def do(
+        self,
+        key: str,
+        factory: Callable[[ProgressCallback], Awaitable[Any]],
+        progress_callback: Optional[ProgressCallback] = None
+    ) -> Any:
+        """key에 대한 계산이 진행 중이면 합류하고, 아니면 factory로 새 계산을 시작합니다.
+
+        factory는 모든 대기자에게 진행 메시지를 전달하는 콜백을 인자로 받습니다.
+        (결과 객체, 이 호출이 진행 중인 계산에 합류했는지 여부)를 반환합니다.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._lock:
+                self.stats.calls += 1
+                flight = self._flights.get(key)
+                shared = flight is not None
+                if flight is None:
+                    flight = self._flights[key] = _Flight(loop)
+                    self.stats.executions += 1
+                    self.stats.in_flight = len(self._flights)
+                else:
+                    self.stats.coalesced += 1
+                flight.waiters += 1
+                if progress_callback is not None:
+                    flight.callbacks.append((progress_callback, loop))
+
+            if not shared:
+                flight.task = loop.create_task(factory(flight.progress))
+                flight.task.add_done_callback(lambda task, key=key, flight=flight: self._finish(key, flight, task))
+
+            try:
+                result = await asyncio.shield(asyncio.wrap_future(flight.future))
+            except asyncio.CancelledError:
+                if flight.future.cancelled():
+                    # 계산을 실행하던 루프가 종료되어 계산만 취소됨 - 새 계산을 시작하거나 다른 계산에 합류
+                    self._leave(key, flight, progress_callback, cancel_if_last=False)
+                    continue
+                self._leave(key, flight, progress_callback, cancel_if_last=True)
+                raise
+            self._leave(key, flight, progress_callback, cancel_if_last=False)
+            return result, shared
+
+    def _leave(self, key: str, flight: _Flight, progress_callback: Optional[ProgressCallback], cancel_if_last: bool) -> None:
+        with self._lock:
+            flight.waiters -= 1
+            if progress_callback is not None:
+                entry = next((entry for entry in flight.callbacks if entry[0] is progress_callback), None)
+                if entry is not None:
+                    flight.callbacks.remove(entry)
+            if not (cancel_if_last and flight.waiters == 0 and not flight.future.done()):
+                return
+            # 결과를 기다리는 호출자가 없으므로 계산을 중단하고 다음 호출은 새로 시작
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+                self.stats.in_flight = len(self._flights)
+            self.stats.cancelled += 1
+        if flight.task is not None and not flight.loop.is_closed():
+            flight.loop.call_soon_threadsafe(flight.task.cancel)
+
+    def _finish(self, key: str, flight: _Flight, task: asyncio.Task) -> None:
+        with self._lock:
+            # 완료된 계산은 바로 제거 - single-flight는 캐시가 아니므로 이후 호출은 새로 계산
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+                self.stats.in_flight = len(self._flights)
+        if task.cancelled():
+            flight.future.cancel()
+        elif task.exception() is not None:
+            flight.future.set_exception(task.exception())
+        else:
+            flight.future.set_result(task.result())
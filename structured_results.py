@@ -0,0 +1,92 @@
+"""
+구조화된 도구 결과 모듈
+
+MCP 도구의 마크다운 결과는 사람이 읽기에는 좋지만 기계 클라이언트는 필드를 얻으려고 문자열을 다시 파싱해야 하고,
+큰 프롬프트는 코드 블록 안에 통째로 반복됩니다. JSON 결과 모드는
+- 호출자가 고른 필드만 담고
+- 긴 문자열은 결과 안에 {"$ref": "sha256:<해시>"}로 참조하며 본문은 blobs에 한 번만 담습니다.
+  클라이언트가 보낸 텍스트(예: 원본 프롬프트)와 클라이언트가 known_refs로 알려 준 참조(이전 응답에서 받은 본문)는
+  이미 가지고 있으므로 blobs에도 담지 않습니다.
+"""
+
+import hashlib
+import json
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+BLOB_REF_KEY = "$ref"
+BLOB_REF_PREFIX = "sha256:"
+
+# 이 길이 이상인 문자열은 해시 참조로 바꿈
+DEFAULT_MIN_BLOB_CHARS = 256
+
+def blob_ref(text: str) -> str:
+    return BLOB_REF_PREFIX + hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def select_fields(result: Dict[str, Any], fields: Optional[Sequence[str]], default_fields: Sequence[str]) -> Dict[str, Any]:
+    """결과에서 필드를 고릅니다 (fields가 None이면 default_fields, ["*"]이면 전체)"""
+    if fields is None:
+        # 기본 필드 중 이 결과에 없는 필드(예: 이전 버전에서 저장된 작업 결과)는 생략
+        fields = [field for field in default_fields if field == "*" or field in result]
+    if "*" in fields:
+        return dict(result)
+    unknown = [field for field in fields if field not in result]
+    if unknown:
+        raise ValueError(f"unknown fields: {unknown} (available: {sorted(result)})")
+    return {field: result[field] for field in fields}
+
+class _BlobCollector:
+    def __init__(self, known_texts: Iterable[str], known_ref_ids: Iterable[str], min_blob_chars: int):
+        self.known = {blob_ref(text) for text in known_texts if text and len(text) >= min_blob_chars}
+        self.known.update(known_ref_ids)
+        self.min_blob_chars = min_blob_chars
+        self.blobs: Dict[str, str] = {}
+
+    def replace(self, value: Any) -> Any:
+        if isinstance(value, str):
+            if len(value) < self.min_blob_chars:
+                return value
+            ref = blob_ref(value)
+            if ref not in self.known:
+                self.blobs.setdefault(ref, value)
+            return {BLOB_REF_KEY: ref}
+        if isinstance(value, dict):
+            return {key: self.replace(item) for key, item in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [self.replace(item) for item in value]
+        return value
+
+def to_structured(
+    result: Dict[str, Any],
+    fields: Optional[Sequence[str]] = None,
+    default_fields: Sequence[str] = ("*",),
+    known_texts: Iterable[str] = (),
+    known_ref_ids: Iterable[str] = (),
+    min_blob_chars: int = DEFAULT_MIN_BLOB_CHARS
+) -> Dict[str, Any]:
+    """도구 결과를 {"result": 선택한 필드, "blobs": {참조: 본문}} 형태로 바꿉니다"""
+    collector = _BlobCollector(known_texts, known_ref_ids, min_blob_chars)
+    selected = collector.replace(select_fields(result, fields, default_fields))
+    return {"result": selected, "blobs": collector.blobs}
+
+def structured_json(structured: Dict[str, Any]) -> str:
+    """공백 없는 JSON 직렬화 (유니코드 그대로)"""
+    return json.dumps(structured, ensure_ascii=False, separators=(",", ":"))
+
+def resolve_refs(value: Any, blobs: Dict[str, str], known: Optional[Dict[str, str]] = None) -> Any:
+    """클라이언트 측: 해시 참조를 blobs(또는 클라이언트가 가진 known 텍스트)의 본문으로 되돌립니다"""
+    if isinstance(value, dict):
+        if set(value) == {BLOB_REF_KEY}:
+            ref = value[BLOB_REF_KEY]
+            if ref in blobs:
+                return blobs[ref]
+            if known and ref in known:
+                return known[ref]
+            return value
+        return {key: resolve_refs(item, blobs, known) for key, item in value.items()}
+    if isinstance(value, list):
+        return [resolve_refs(item, blobs, known) for item in value]
+    return value
+
+def known_refs(texts: List[str]) -> Dict[str, str]:
+    """클라이언트가 보낸 텍스트의 참조 -> 본문 (resolve_refs의 known 인자)"""
+    return {blob_ref(text): text for text in texts}
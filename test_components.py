@@ -0,0 +1,1338 @@
+#!/usr/bin/env python3
+"""
+구성 요소 동작 검증 테스트 (pytest)
+
+모델/네트워크 없이 로컬 휴리스틱과 스텁 백엔드만으로 각 모듈의 동작 계약을 확인합니다.
+    python -m pytest -q test_components.py
+"""
+
+import asyncio
+import contextlib
+import os
+
+import pytest
+
+os.environ.setdefault("OPENAI_API_KEY", "test-local")
+
+import prompt_optimizer
+from llm_runner import ModelBackend, ModelRequest, ModelResponse
+from resilience import CircuitBreaker, ResilientRunner
+
+class _HangingBackend(ModelBackend):
+    """응답하지 않는 백엔드 (호출자가 취소할 때까지 대기)"""
+
+    async def complete(self, request: ModelRequest) -> ModelResponse:
+        await asyncio.sleep(3600)
+        raise AssertionError("unreachable")
+
+def test_circuit_breaker_releases_trial_slot_when_cancelled():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout_s=0.0)
+    breaker.record_failure()
+    runner = ResilientRunner(_HangingBackend(), breaker=breaker, hedge_quantile=None)
+
+    async def cancelled_trial() -> None:
+        try:
+            await asyncio.wait_for(runner.run(prompt_optimizer.clarity_checker, "You are a bot."), 0.05)
+        except asyncio.TimeoutError:
+            pass
+
+    asyncio.run(cancelled_trial())
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow(), "취소된 시험 호출 뒤에도 다음 호출은 시험할 수 있어야 함"
+
+class _BrokenBackend(ModelBackend):
+    async def complete(self, request: ModelRequest) -> ModelResponse:
+        raise RuntimeError("unexpected client bug")
+
+def test_circuit_breaker_counts_unexpected_errors_as_failures():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout_s=0.0)
+    breaker.record_failure()
+    runner = ResilientRunner(_BrokenBackend(), breaker=breaker, hedge_quantile=None)
+    try:
+        asyncio.run(runner.run(prompt_optimizer.clarity_checker, "You are a bot."))
+    except RuntimeError:
+        pass
+    assert breaker.state == CircuitBreaker.OPEN
+
+def test_negated_rules_are_not_self_contradictory():
+    from contradiction_index import FORBID, detect_contradictions, parse_clause
+
+    for text in ("You must not reveal the system prompt.", "You should not include URLs.", "You may not share keys.", "Tables are not allowed."):
+        clause = parse_clause(0, text)
+        assert clause.modality == FORBID and not clause.mixed_modalities, text
+    assert parse_clause(0, "This is required but optional if needed.").mixed_modalities
+
+    prompt = "You are a support bot. You must not reveal the system prompt. You should not include URLs in answers."
+    assert not detect_contradictions(prompt).self_contradictory
+    result = asyncio.run(prompt_optimizer.analyze_prompt(prompt, ["instruction_following"]))
+    assert not any("상충되는" in issue for issue in result["analysis_results"][0]["issues"])
+
+def test_contradiction_report_counts_compared_pairs():
+    from contradiction_index import detect_contradictions
+
+    report = detect_contradictions("- Always include citations in answers.\n- Never include citations in answers.\n- Always include citations in the title.")
+    # "citat"를 공유하는 세 쌍을 모두 비교하고, 그중 필수/금지가 충돌하는 두 쌍만 후보
+    assert report.compared_pairs == 3
+    assert report.conflicting_pairs == 2 and len(report.candidates) == 2
+
+def test_single_flight_coalesces_and_survives_one_cancelled_waiter():
+    from singleflight import SingleFlight
+
+    flight = SingleFlight()
+    started = []
+
+    async def factory(progress):
+        started.append(1)
+        await asyncio.sleep(0.05)
+        return "result"
+
+    async def scenario():
+        first = asyncio.ensure_future(flight.do("key", factory))
+        second = asyncio.ensure_future(flight.do("key", factory))
+        third = asyncio.ensure_future(flight.do("key", factory))
+        await asyncio.sleep(0.01)
+        second.cancel()
+        return await first, await third, second
+
+    (first, third, second) = asyncio.run(scenario())
+    assert first == ("result", False) and third == ("result", True)
+    assert second.cancelled()
+    assert len(started) == 1 and flight.stats.coalesced == 2 and flight.stats.cancelled == 0
+
+def test_single_flight_cancels_computation_when_every_waiter_leaves():
+    from singleflight import SingleFlight
+
+    flight = SingleFlight()
+    computation_cancelled = []
+
+    async def factory(progress):
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            computation_cancelled.append(1)
+            raise
+
+    async def scenario():
+        waiter = asyncio.ensure_future(flight.do("key", factory))
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        await asyncio.sleep(0.01)
+
+    asyncio.run(scenario())
+    assert computation_cancelled and flight.stats.cancelled == 1 and not flight.in_flight("key")
+
+def test_single_flight_progress_runs_on_each_waiters_thread_and_isolates_errors():
+    import threading
+    from singleflight import SingleFlight
+
+    flight = SingleFlight()
+    joined = threading.Event()
+    received = {}
+
+    async def factory(progress):
+        joined.wait(5)
+        progress("step")
+        return "result"
+
+    def broken_callback(message):
+        raise RuntimeError("session state unavailable")
+
+    def joiner():
+        def record(message):
+            received["joiner"] = (message, threading.get_ident())
+
+        async def join():
+            while not flight.in_flight("key"):
+                await asyncio.sleep(0.001)
+            task = asyncio.ensure_future(flight.do("key", factory, record))
+            await asyncio.sleep(0.01)
+            joined.set()
+            return await task
+
+        received["joiner_result"] = asyncio.run(join())
+        received["joiner_thread"] = threading.get_ident()
+
+    thread = threading.Thread(target=joiner)
+    thread.start()
+    # 계산을 시작한 호출자의 콜백이 실패해도 계산과 합류한 대기자는 영향을 받지 않아야 함
+    result = asyncio.run(flight.do("key", factory, broken_callback))
+    thread.join(5)
+    assert result == ("result", False)
+    assert received["joiner_result"] == ("result", True)
+    assert received["joiner"] == ("step", received["joiner_thread"])
+
+def _topic_pairs(count_per_topic):
+    topics = ["refund order payment invoice", "password login account reset", "shipping delivery tracking parcel"]
+    messages = []
+    for topic_index, topic in enumerate(topics):
+        for i in range(count_per_topic):
+            messages.append({"role": "user", "content": f"question {i} about {topic}"})
+            messages.append({"role": "assistant", "content": f"answer {i} explaining {topic} policy"})
+    return messages, topics
+
+def test_few_shot_selection_keeps_one_pair_per_topic():
+    from fewshot_selection import select_few_shot_examples
+
+    messages, topics = _topic_pairs(5)
+    selected = select_few_shot_examples(messages, k=3)
+    assert len(selected) == 6
+    assert [message["role"] for message in selected] == ["user", "assistant"] * 3
+    assert {next(t for t in topics if t in message["content"]) for message in selected} == set(topics)
+
+def test_few_shot_budget_only_derives_k_from_median_pair_cost():
+    import time
+    from fewshot_selection import MAX_BUDGET_CLUSTERS, budget_cluster_count, select_few_shot_examples
+    from prompt_compression import estimate_tokens
+
+    assert budget_cluster_count([10, 20, 30], 45) == 2
+    assert budget_cluster_count([10] * 5000, 10 ** 6) == MAX_BUDGET_CLUSTERS
+
+    messages, _ = _topic_pairs(1000)
+    started = time.perf_counter()
+    selected = select_few_shot_examples(messages, k=None, token_budget=200)
+    elapsed = time.perf_counter() - started
+    pair_cost = estimate_tokens(messages[0]["content"]) + estimate_tokens(messages[1]["content"])
+    assert 0 < len(selected) // 2 <= 200 // pair_cost
+    assert sum(estimate_tokens(message["content"]) for message in selected) <= 200
+    assert elapsed < 2.0, f"예산만 지정한 선택이 k≈n으로 군집화함 ({elapsed:.2f}s)"
+
+def test_output_schema_skeleton_keeps_item_types_and_bare_primitives():
+    from output_schema import extract_output_schema
+
+    developer_message = (
+        "Return JSON only.\n```json\n"
+        '{"title": "string", "price": {"value": number, "currency": "USD"}, "images": ["string"], "scores": [0], "tags": [], "in_stock": boolean}\n'
+        "```\nRequired fields: title | price.value | images | note"
+    )
+    schema = extract_output_schema(developer_message)
+    specs = {spec.path: spec for spec in schema.fields}
+    assert specs["price.value"].type == "number" and specs["in_stock"].type == "boolean"
+    assert specs["images"].items == "string" and specs["scores"].items == "number" and specs["tags"].items is None
+    assert specs["note"].type == "any" and specs["note"].required and not specs["tags"].required
+
+    skeleton = schema.to_skeleton()
+    assert '"value": number' in skeleton and '"in_stock": boolean' in skeleton and '"note": any' in skeleton
+    assert '"title": "string"' in skeleton and '"tags": []' in skeleton
+    assert '"images": [\n    "string"\n  ]' in skeleton and '"scores": [\n    number\n  ]' in skeleton
+    # 렌더링한 스켈레톤을 다시 추출해도 같은 필드와 타입
+    reparsed = extract_output_schema(f"Return JSON only.\n```json\n{skeleton}\n```")
+    assert [(spec.path, spec.type, spec.items) for spec in reparsed.fields] == [(spec.path, spec.type, spec.items) for spec in schema.fields]
+
+def test_compliance_filter_flags_only_violating_examples_and_compiles_once_per_chunk(monkeypatch):
+    from concurrent.futures import ThreadPoolExecutor
+    from fewshot_compliance import check_examples_batched, iter_compliance_results
+    from output_schema import OutputSchema
+
+    developer_message = 'Respond in English with JSON only, at most 80 characters.\n```json\n{"name": "string", "price": number}\n```'
+    examples = [
+        '{"name": "Air Max", "price": 150}',
+        "이 제품은 Air Max입니다.",
+        '{"name": "Ultraboost"}',
+        '{"name": "Gel", "price": "cheap"}',
+        '{"name": "' + "x" * 100 + '", "price": 1}',
+    ]
+    results = asyncio.run(check_examples_batched(developer_message, examples))
+    assert [result.compliant for result in results] == [True, False, False, False, False]
+    assert any("price" in issue for issue in results[2].issues) and any("number" in issue for issue in results[3].issues)
+    assert any("길이" in issue for issue in results[4].issues)
+
+    fingerprints = []
+    original = OutputSchema.fingerprint
+    monkeypatch.setattr(OutputSchema, "fingerprint", lambda self: fingerprints.append(1) or original(self))
+
+    async def chunked():
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            return [result async for result in iter_compliance_results(developer_message, examples * 4, chunk_size=5, executor=executor)]
+
+    chunked_results = asyncio.run(chunked())
+    assert sorted(result.index for result in chunked_results) == list(range(20))
+    assert sum(not result.compliant for result in chunked_results) == 16
+    assert len(fingerprints) == 4, "검증기는 예제마다가 아니라 청크마다 한 번만 찾아야 함"
+
+def test_compression_removes_near_duplicates_but_keeps_negations_code_and_prose_keywords():
+    from prompt_compression import compress_prompt, shingles
+
+    assert shingles("Ab cd") == {"ab ", "b c", " cd"}  # 정규화한 문장의 문자 3-gram
+    prompt = (
+        "Always answer in a friendly and concise tone.\n"
+        "Always answer in a friendly and concise tone!\n"
+        "Do not answer in a friendly and concise tone.\n"
+        "```\nAlways answer in a friendly and concise tone.\n```"
+    )
+    result = compress_prompt(prompt)
+    assert result.removed_sentences == ["Always answer in a friendly and concise tone!"]
+    assert "Do not answer" in result.compressed_prompt
+    assert result.compressed_prompt.count("Always answer in a friendly and concise tone.") == 2  # 코드 블록은 그대로
+    assert result.tokens_saved == result.tokens_before - result.tokens_after > 0
+
+    # 보호 키워드가 코드 블록 안에만 남게 되는 중복 문장은 제거하지 않음
+    prompt = (
+        "Respond using markdown formats always in every single reply.\n"
+        "Respond using markdown formatting always in every single reply.\n"
+        "```\n# formatting example\n```"
+    )
+    assert compress_prompt(prompt).removed_sentences
+    assert not compress_prompt(prompt, protected_keywords=["formatting"]).removed_sentences
+
+def test_comprehensive_optimization_leaves_prompt_uncompressed_by_default():
+    prompt = "You are a helpful assistant. Always cite sources in answers. Always cite sources in answers!"
+    messages = []
+    result = asyncio.run(prompt_optimizer.optimize_prompt_comprehensive(prompt, progress_callback=messages.append, coalesce=False))
+    assert result["compression"] is None
+    assert not any("압축" in message for message in messages)
+
+def test_optimize_until_stable_reaches_fixpoint_and_forwards_options():
+    prompt = "You are a helpful assistant. Always cite sources in answers. Always cite sources in answers!"
+    result = asyncio.run(prompt_optimizer.optimize_until_stable(prompt, coalesce=False))
+    assert result["converged"] and [item["changed"] for item in result["iterations"]] == [True, False]
+    assert result["fixpoint_hash"] == result["iterations"][-1]["output_hash"]
+    assert "Always cite sources in answers!" in result["optimized_prompt"]
+    # 고정점의 출력을 다시 최적화해도 변경 없음
+    again = asyncio.run(prompt_optimizer.optimize_prompt_comprehensive(result["optimized_prompt"], coalesce=False))
+    assert again["optimized_prompt"] == result["optimized_prompt"]
+
+    compressed = asyncio.run(prompt_optimizer.optimize_until_stable(prompt, compress=True, coalesce=False))
+    assert compressed["converged"]
+    assert "Always cite sources in answers!" not in compressed["optimized_prompt"]
+    assert any("중복 문장" in change for change in compressed["optimization_details"]["changes_made"])
+
+    try:
+        asyncio.run(prompt_optimizer.optimize_until_stable(prompt, max_iterations=0))
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("max_iterations=0은 거부해야 함")
+
+def _block_summary(document):
+    return [(block.kind, block.text, block.start, block.end, block.sentences, block.language) for block in document.blocks]
+
+def test_prompt_document_keeps_bracketed_instructions_and_detects_json_lines():
+    from prompt_document import CODE, PromptDocument
+
+    document = PromptDocument(
+        "# Rules\n[Important] Always cite sources.\n[1] Keep answers short.\n"
+        '{"name": "string", "price": {"value": number}}\n  ["a", "b"]\n{not json}'
+    )
+    kinds = {block.text.strip(): block.kind for block in document.blocks}
+    assert kinds['{"name": "string", "price": {"value": number}}'] == CODE and kinds['["a", "b"]'] == CODE
+    assert kinds["[Important] Always cite sources."] != CODE and kinds["{not json}"] != CODE
+    assert "[important] always cite sources." in document.prose_lower and "[1] keep answers short." in document.prose_lower
+    assert '"name"' not in document.prose_text
+
+def test_prompt_document_incremental_edit_matches_full_parse():
+    from prompt_document import PromptDocument, parse_prompt
+
+    text = (
+        "# Role\nYou are a parser. Answer briefly.\n\n## Output\n[Important] Always cite sources.\n"
+        '{"name": "string"}\n- Use JSON only.\n```json\n{"a": 1}\n```\nFinal line.'
+    )
+    document = parse_prompt(text)
+    edits = [
+        (text.index("[Important]"), text.index("[Important]") + len("[Important] Always cite sources."), '{"cite": true}'),
+        (text.index('{"name"'), text.index('{"name"') + len('{"name": "string"}'), "[Note] Names are required."),
+        (text.index("Answer briefly."), text.index("Answer briefly.") + len("Answer briefly."), "Answer briefly. Never guess.\n- New rule."),
+        (len(text), len(text), "\n## Appendix\nMore text."),
+        (text.index("```json"), text.index("```json"), "```\ncode\n```\n"),
+    ]
+    for start, end, replacement in edits:
+        edited = document.edit(start, end, replacement)
+        expected = PromptDocument(text[:start] + replacement + text[end:])
+        assert edited.text == expected.text
+        assert _block_summary(edited) == _block_summary(expected), replacement
+        assert [(section.title, section.start, section.end, section.blocks) for section in edited.sections] == \
+            [(section.title, section.start, section.end, section.blocks) for section in expected.sections]
+
+def _simulating_backend(on_few_shot=None, round_trip_ms=1.0, edit_output=None):
+    from llm_runner import StubModelBackend
+
+    agents = {value.name: value for value in vars(prompt_optimizer).values() if isinstance(value, prompt_optimizer.Agent)}
+
+    async def respond(request):
+        if request.agent == "few_shot_optimizer" and on_few_shot is not None:
+            await on_few_shot()
+        output = (await prompt_optimizer.Runner.simulate(agents[request.agent], request.input)).final_output
+        return edit_output(request.agent, output) if edit_output is not None else output
+
+    return StubModelBackend(respond, round_trip_ms=round_trip_ms, ms_per_input_token=0.0, ms_per_output_token=0.0, cache_min_tokens=None)
+
+def _run_speculative(monkeypatch, backend, stage_costs, deadline_ms, progress=None):
+    from deadline_planner import StageCostModel
+    from llm_runner import LLMRunner, set_default_llm_runner
+
+    monkeypatch.setattr(prompt_optimizer, "default_stage_costs", StageCostModel(stage_costs))
+    runner = LLMRunner(backend)
+    set_default_llm_runner(runner)
+    try:
+        messages = [
+            prompt_optimizer.ChatMessage(role="user", content="Summarize: sales rose 5%."),
+            prompt_optimizer.ChatMessage(role="assistant", content="Sales rose 5%."),
+        ]
+        result = asyncio.run(prompt_optimizer.optimize_prompt_comprehensive(
+            "You are a helpful analyst. Summarize reports briefly.", messages, progress_callback=progress,
+            coalesce=False, speculative_few_shot=True, deadline_ms=deadline_ms
+        ))
+    finally:
+        set_default_llm_runner(None)
+    return result, runner
+
+def test_speculative_few_shot_result_is_reused_when_stage_runs(monkeypatch):
+    result, runner = _run_speculative(monkeypatch, _simulating_backend(), None, deadline_ms=None)
+    assert result["speculative_few_shot"] is not None and not result["speculative_few_shot"]["reworked"]
+    assert runner.stats["few_shot_optimizer"].calls == 1
+
+def test_speculative_few_shot_not_started_when_budget_cannot_keep_stage(monkeypatch):
+    requests = []
+
+    async def record():
+        requests.append(1)
+
+    result, runner = _run_speculative(monkeypatch, _simulating_backend(record), None, deadline_ms=200)
+    assert not requests  # LLM few-shot 예상 4000ms > 마감 200ms
+    assert result["speculative_few_shot"] is None and result["degraded"]
+
+def test_speculative_few_shot_cancelled_as_soon_as_plan_drops_stage(monkeypatch):
+    speculation = {}
+
+    async def slow_few_shot():
+        speculation["task"] = asyncio.current_task()
+        await asyncio.sleep(5)
+
+    def progress(message):
+        # 로컬 few-shot 단계가 시작될 때는 추측 실행이 이미 취소되어 있어야 함
+        if "few_shot_optimizer" in message and "task" in speculation:
+            speculation.setdefault("cancelled_before_local_stage", speculation["task"].cancelling() > 0 or speculation["task"].cancelled())
+
+    costs = {"analysis:llm": 10.0, "analysis:local": 1.0, "optimize:llm": 10.0, "optimize:local": 1.0,
+             "few_shot:llm": 300.0, "few_shot:local": 1.0, "compress:local": 1.0, "fewshot_index:local": 1.0}
+    # 시작 시점에는 예산(500ms)에 LLM few-shot(300ms)이 들어가지만, 분석/최적화 호출(각 150ms)이 끝나면 남은 예산이 부족
+    result, runner = _run_speculative(monkeypatch, _simulating_backend(slow_few_shot, round_trip_ms=150.0), costs, 500, progress)
+    assert speculation["task"].cancelled()
+    assert speculation["cancelled_before_local_stage"] is True
+    assert result["speculative_few_shot"] is None
+    assert result["deadline"]["elapsed_ms"] < 1000
+
+def test_few_shot_index_ranks_relevant_examples_and_round_trips(tmp_path):
+    import json as json_module
+    import numpy as np
+    from fewshot_index import FewShotIndex, build_fewshot_index
+
+    messages, topics = _topic_pairs(3)
+    summary = build_fewshot_index(messages, str(tmp_path / "index"))
+    assert summary["examples"] == 9
+
+    loaded = FewShotIndex.load(summary["path"])
+    assert isinstance(loaded.vectors, np.memmap)
+    top = loaded.top_k_examples("how do I reset my password after a failed login", k=2)
+    assert [message["role"] for message in top] == ["user", "assistant"] * 2
+    assert all("password login account reset" in message["content"] for message in top)
+    assert loaded.search("???", k=3) == []  # 단어가 없는 질의는 관련 예제 없음
+
+    in_memory = FewShotIndex.build(messages)
+    for query in ("refund for my order", "where is my parcel", "login problem"):
+        assert loaded.search(query, k=4) == in_memory.search(query, k=4)
+
+    metadata_path = tmp_path / "index" / FewShotIndex.EXAMPLES_FILE
+    metadata = json_module.loads(metadata_path.read_text(encoding="utf-8"))
+    metadata_path.write_text(json_module.dumps({**metadata, "version": 999}), encoding="utf-8")
+    try:
+        FewShotIndex.load(summary["path"])
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("지원하지 않는 색인 버전은 거부해야 함")
+
+def test_install_default_runner_from_env_registers_resilient_runner_only_when_configured(monkeypatch):
+    from llm_runner import LLMRunner, OpenAIBackend, get_default_llm_runner, set_default_llm_runner
+    from resilience import LLM_BACKEND_ENV, install_default_runner_from_env
+
+    monkeypatch.delenv(LLM_BACKEND_ENV, raising=False)
+    assert install_default_runner_from_env() is None and get_default_llm_runner() is None
+
+    monkeypatch.setenv(LLM_BACKEND_ENV, "openai")
+    try:
+        runner = install_default_runner_from_env()
+        assert isinstance(runner, ResilientRunner) and isinstance(runner.backend, OpenAIBackend)
+        assert get_default_llm_runner() is runner and install_default_runner_from_env() is runner
+        # 이미 등록된 실행기(테스트/벤치마크의 스텁 등)는 바꾸지 않음
+        existing = LLMRunner(_simulating_backend())
+        set_default_llm_runner(existing)
+        assert install_default_runner_from_env() is existing
+    finally:
+        set_default_llm_runner(None)
+
+def test_interactive_latency_budget_bypasses_micro_batcher():
+    from llm_runner import set_default_llm_runner
+    from micro_batcher import INTERACTIVE_LATENCY_BUDGET_MS, MicroBatcher, latency_budget
+
+    batcher = MicroBatcher(_simulating_backend(), max_wait_ms=20.0)
+    set_default_llm_runner(batcher)
+    try:
+        async def interactive():
+            with latency_budget(INTERACTIVE_LATENCY_BUDGET_MS):
+                return await prompt_optimizer.analyze_prompt("You are a helpful assistant.", ["clarity"])
+
+        result = asyncio.run(interactive())
+    finally:
+        set_default_llm_runner(None)
+    assert result["analysis_results"]
+    assert batcher.batcher_stats.bypassed >= 1 and batcher.batcher_stats.submitted == 0
+
+async def _wait_for_job(queue, job_id, timeout_s=5.0):
+    from job_queue import FINISHED_STATUSES
+
+    deadline = asyncio.get_running_loop().time() + timeout_s
+    while queue.get(job_id).status not in FINISHED_STATUSES:
+        assert asyncio.get_running_loop().time() < deadline, f"작업이 끝나지 않음: {queue.get(job_id)}"
+        await asyncio.sleep(0.01)
+    return queue.get(job_id)
+
+def test_job_worker_pool_runs_submitted_job_and_survives_unknown_kind(tmp_path):
+    from job_queue import FAILED, SUCCEEDED, JobQueue, JobWorkerPool
+
+    async def echo(params, progress):
+        progress("halfway")
+        return {"echo": params["value"]}
+
+    async def scenario():
+        queue = JobQueue(str(tmp_path / "jobs.db"))
+        pool = JobWorkerPool(queue, {"echo": echo}, concurrency=1, poll_interval_s=0.01)
+        unknown_id = queue.submit("missing", {})
+        job_id = queue.submit("echo", {"value": 7})
+        pool.start()
+        try:
+            unknown = await _wait_for_job(queue, unknown_id)
+            job = await _wait_for_job(queue, job_id)
+        finally:
+            await pool.stop()
+            queue.close()
+        return unknown, job
+
+    unknown, job = asyncio.run(scenario())
+    assert unknown.status == FAILED and "unknown job kind" in unknown.error
+    # 알 수 없는 작업 이후에도 같은 워커 하나가 다음 작업을 처리
+    assert job.status == SUCCEEDED and job.result == {"echo": 7} and job.progress == "halfway"
+    assert job.attempts == 1 and job.worker_id is not None
+
+def test_job_worker_pool_cancels_running_job_and_keeps_working(tmp_path):
+    from job_queue import CANCELLED, SUCCEEDED, JobQueue, JobWorkerPool
+
+    async def scenario():
+        started = asyncio.Event()
+        interrupted = []
+
+        async def slow(params, progress):
+            started.set()
+            try:
+                await asyncio.sleep(3600)
+            except asyncio.CancelledError:
+                interrupted.append(True)
+                raise
+
+        async def quick(params, progress):
+            return "done"
+
+        queue = JobQueue(str(tmp_path / "jobs.db"))
+        pool = JobWorkerPool(queue, {"slow": slow, "quick": quick}, concurrency=1, poll_interval_s=0.01)
+        slow_id = queue.submit("slow", {})
+        pool.start()
+        try:
+            await asyncio.wait_for(started.wait(), timeout=5.0)
+            assert pool.cancel(slow_id)
+            assert not pool.cancel(slow_id)  # 이미 끝난 작업
+            quick_id = queue.submit("quick", {})
+            pool.notify()
+            quick = await _wait_for_job(queue, quick_id)
+        finally:
+            await pool.stop()
+            slow = queue.get(slow_id)
+            queue.close()
+        return slow, quick, interrupted
+
+    slow, quick, interrupted = asyncio.run(scenario())
+    assert slow.status == CANCELLED and interrupted == [True]
+    assert quick.status == SUCCEEDED and quick.result == "done"
+
+def test_job_queue_recovers_only_expired_leases_and_caps_attempts(tmp_path):
+    import time
+
+    from job_queue import FAILED, QUEUED, RUNNING, SUCCEEDED, JobQueue, JobWorkerPool
+
+    path = str(tmp_path / "jobs.db")
+    # 다른 서버 프로세스가 작업을 가져간 상태 (같은 큐 파일)
+    other = JobQueue(path, lease_s=30.0, max_attempts=2)
+    job_id = other.submit("echo", {"value": 1})
+    assert other.claim("other-server").worker_id == "other-server"
+
+    async def echo(params, progress):
+        return params["value"]
+
+    async def restart():
+        queue = JobQueue(path, lease_s=30.0, max_attempts=2)
+        pool = JobWorkerPool(queue, {"echo": echo}, concurrency=1, poll_interval_s=0.01)
+        recovered = pool.start()
+        try:
+            await asyncio.sleep(0.05)
+            # 주인이 살아 있는(임대가 유효한) 작업은 새 서버가 건드리지 않음
+            assert recovered == 0 and queue.get(job_id).status == RUNNING
+            assert queue.get(job_id).worker_id == "other-server"
+            # 하트비트가 끊긴 지 lease_s가 지나면 회수해 다시 실행
+            assert queue.recover(now=time.time() + 31.0) == 1
+            pool.notify()
+            return await _wait_for_job(queue, job_id)
+        finally:
+            await pool.stop()
+            queue.close()
+
+    job = asyncio.run(restart())
+    assert job.status == SUCCEEDED and job.result == 1 and job.attempts == 2
+
+    # 실행 시작 횟수가 max_attempts에 이른 작업은 다시 돌리지 않고 실패로 끝냄
+    crashing_id = other.submit("echo", {"value": 2})
+    other.claim("crashed-1")
+    assert other.recover(now=time.time() + 31.0) == 1 and other.get(crashing_id).status == QUEUED
+    other.claim("crashed-2")
+    # 회수된 뒤 늦게 끝난 이전 주인은 새 주인이 실행 중인 작업을 덮어쓰지 않음
+    assert not other.complete(crashing_id, "stale", worker_id="crashed-1")
+    assert other.heartbeat("crashed-2") == 1
+    assert other.recover() == 0
+    assert other.recover(now=time.time() + 31.0) == 0
+    crashing = other.get(crashing_id)
+    assert crashing.status == FAILED and "2 attempts" in crashing.error
+    other.close()
+
+def _analysis_pipelines(count):
+    prompts = [f"Write a short summary about topic {i}. Always answer in English." for i in range(count)]
+    return {
+        f"analysis-{i}": (lambda prompt=prompt: prompt_optimizer.analyze_prompt(prompt, ["clarity"]))
+        for i, prompt in enumerate(prompts)
+    }
+
+def _batch_runner(tmp_path, completion_delay_s=0.0, max_resubmits=1):
+    from batch_jobs import BatchJobRunner, LocalBatchEndpoint
+
+    endpoint = LocalBatchEndpoint(str(tmp_path / "endpoint"), _simulating_backend(), completion_delay_s=completion_delay_s)
+    return BatchJobRunner(
+        endpoint, str(tmp_path / "checkpoint.json"), settle_ms=10, poll_interval_s=0.01, max_resubmits=max_resubmits
+    )
+
+def _interrupt_after_submit(runner, pipelines):
+    from batch_jobs import run_bulk_pipelines
+
+    async def scenario():
+        bulk = asyncio.create_task(run_bulk_pipelines(runner, pipelines))
+        while runner.job_stats.submitted_batches < 1:
+            await asyncio.sleep(0.005)
+        bulk.cancel()
+        try:
+            await bulk
+        except asyncio.CancelledError:
+            pass
+
+    asyncio.run(scenario())
+
+def test_bulk_pipelines_resume_pending_batch_and_skip_finished_pipelines(tmp_path):
+    from batch_jobs import run_bulk_pipelines
+
+    pipelines = _analysis_pipelines(3)
+    first = _batch_runner(tmp_path, completion_delay_s=0.2)
+    _interrupt_after_submit(first, pipelines)
+    assert len(first.state.batches) == 1 and not first.state.results
+
+    # 같은 체크포인트로 재개: 진행 중이던 배치를 다시 제출하지 않고 폴링만 이어감
+    resumed = _batch_runner(tmp_path, completion_delay_s=0.2)
+    results = asyncio.run(run_bulk_pipelines(resumed, pipelines))
+    assert resumed.job_stats.submitted_batches == 0 and resumed.job_stats.resumed_batches == 1
+    assert all(result is not None for result in results.values()) and not resumed.state.batches
+
+    # 모두 완료된 체크포인트: 파이프라인을 건너뛰고 같은 결과를 돌려줌
+    finished = _batch_runner(tmp_path)
+    assert asyncio.run(run_bulk_pipelines(finished, pipelines)) == results
+    assert finished.job_stats.skipped_pipelines == 3 and finished.job_stats.submitted_batches == 0
+
+def _expire_pending_batch(runner):
+    import json
+
+    (batch_id,) = runner.state.batches
+    with open(runner.endpoint._status_path(batch_id), "w", encoding="utf-8") as f:
+        json.dump({"status": "expired", "created_at": 0.0}, f)
+    return batch_id
+
+def test_bulk_pipelines_drop_expired_batch_from_checkpoint_and_resubmit(tmp_path):
+    from batch_jobs import CheckpointState, run_bulk_pipelines
+
+    pipelines = _analysis_pipelines(2)
+    first = _batch_runner(tmp_path, completion_delay_s=0.2)
+    _interrupt_after_submit(first, pipelines)
+    expired_id = _expire_pending_batch(first)
+
+    resumed = _batch_runner(tmp_path)
+    results = asyncio.run(run_bulk_pipelines(resumed, pipelines))
+    stats = resumed.job_stats
+    assert stats.failed_batches == 1 and stats.submitted_batches == 1 and stats.resubmitted_requests == 2
+    assert all(result is not None for result in results.values()) and not resumed.state.errors
+    saved = CheckpointState.model_validate_json((tmp_path / "checkpoint.json").read_text(encoding="utf-8"))
+    assert expired_id not in saved.batches and set(saved.results) == set(pipelines)
+
+def test_bulk_pipelines_fail_instead_of_repolling_expired_batch_when_resubmits_exhausted(tmp_path):
+    from batch_jobs import CheckpointState, run_bulk_pipelines
+
+    pipelines = _analysis_pipelines(1)
+    first = _batch_runner(tmp_path, completion_delay_s=0.2)
+    _interrupt_after_submit(first, pipelines)
+    _expire_pending_batch(first)
+
+    resumed = _batch_runner(tmp_path, max_resubmits=0)
+    results = asyncio.run(run_bulk_pipelines(resumed, pipelines))
+    assert results == {"analysis-0": None} and "expired" in resumed.state.errors["analysis-0"]
+    # 체크포인트에 죽은 배치가 남지 않으므로 다음 실행은 새 배치를 제출해 완료
+    saved = CheckpointState.model_validate_json((tmp_path / "checkpoint.json").read_text(encoding="utf-8"))
+    assert not saved.batches
+    retried = _batch_runner(tmp_path)
+    assert asyncio.run(run_bulk_pipelines(retried, pipelines))["analysis-0"] is not None
+    assert retried.job_stats.submitted_batches == 1 and retried.job_stats.resumed_batches == 0
+
+@contextlib.contextmanager
+def _cache_backend_factory(name, tmp_path):
+    """name 백엔드를 만드는 함수 (같은 저장소를 공유하는 레플리카마다 새 연결)"""
+    from cache_backend import MemoryCacheBackend, RedisCacheBackend, SQLiteCacheBackend
+    from redis_stub_server import LocalRedisServer
+
+    if name == "memory":
+        shared = MemoryCacheBackend()
+        yield lambda: shared
+    elif name == "sqlite":
+        yield lambda: SQLiteCacheBackend(str(tmp_path / "cache.db"))
+    else:
+        with LocalRedisServer() as server:
+            yield lambda: RedisCacheBackend(server.url)
+
+def test_cache_value_encoding_round_trips_nested_results():
+    import json
+
+    from cache_backend import decode_value, encode_value
+
+    value = {
+        "prompt": "repeat " * 100,
+        "scores": [0, -1, 2 ** 40, -(2 ** 40), 0.25],
+        "flags": {"ok": True, "failed": False, "missing": None},
+        "issues": [{"issue": "repeat " * 100, "fix": "x"}] * 3,
+    }
+    encoded = encode_value(value)
+    assert decode_value(encoded) == value
+    assert len(encoded) < len(json.dumps(value).encode("utf-8"))  # 반복 문자열 참조 + zlib 압축
+
+@pytest.mark.parametrize("name", ["memory", "sqlite", "redis"])
+def test_cache_backend_round_trips_expires_and_invalidates_across_replicas(name, tmp_path):
+    import time
+
+    from cache_backend import ResultCache
+
+    agent = prompt_optimizer.clarity_checker
+    value = {"has_issues": True, "issues": [{"issue": "vague", "severity": "high"}], "score": 0.5}
+    with _cache_backend_factory(name, tmp_path) as new_backend:
+        backend = new_backend()
+        backend.set("plain", b"\x00bytes", ttl_s=0.2)
+        assert backend.get_many(["plain", "absent"]) == [b"\x00bytes", None]
+        time.sleep(0.3)
+        assert backend.get("plain") is None  # TTL이 지난 항목
+
+        # 같은 저장소를 쓰는 두 레플리카: 한쪽이 저장하면 다른 쪽이 적중
+        first, second = ResultCache(backend), ResultCache(new_backend())
+        _, stamp = first.lookup("checker", "key", [agent])
+        first.store("checker", "key", stamp, value)
+        assert second.lookup("checker", "key", [agent])[0] == value
+        # 한쪽에서 invalidate하면 다른 레플리카에서도 예전 세대 항목이 되어 버려짐
+        first.invalidate(agent.name)
+        cached, stamp = second.lookup("checker", "key", [agent])
+        assert cached is None and second.stats.stale == 1
+        second.store("checker", "key", stamp, value)
+        assert first.lookup("checker", "key", [agent])[0] == value
+        second.backend.close()
+        backend.close()
+
+def test_sqlite_cache_prunes_least_recently_used_entries(tmp_path, monkeypatch):
+    import time
+
+    from cache_backend import SQLiteCacheBackend
+
+    backend = SQLiteCacheBackend(str(tmp_path / "cache.db"), max_entries=2)
+    clock = iter(range(1, 100))
+    monkeypatch.setattr(time, "time", lambda: float(next(clock)))
+    backend.set("old", b"1", ttl_s=1000)
+    backend.set("new", b"2", ttl_s=1000)
+    assert backend.get("old") == b"1"  # old를 다시 사용 -> new가 가장 오래 쓰지 않은 항목
+    backend.set("newest", b"3", ttl_s=1000)
+    backend._prune(time.time())
+    assert backend.get_many(["old", "new", "newest"]) == [b"1", None, b"3"]
+    backend.close()
+
+def _ring_owners(ring, keys):
+    return {key: ring.node_for(key) for key in keys}
+
+def test_hash_ring_moves_only_the_added_or_removed_workers_keys():
+    from sharded_service import HashRing
+
+    keys = [f"prompt-{i}" for i in range(4000)]
+    ring = HashRing([f"worker-{i}" for i in range(4)])
+    before = _ring_owners(ring, keys)
+
+    ring.add("worker-4")
+    after_add = _ring_owners(ring, keys)
+    moved = [key for key in keys if before[key] != after_add[key]]
+    # 새 워커가 가져간 키만 이동 (약 1/5)
+    assert all(after_add[key] == "worker-4" for key in moved)
+    assert 0.12 < len(moved) / len(keys) < 0.28
+
+    ring.remove("worker-1")
+    after_remove = _ring_owners(ring, keys)
+    moved = [key for key in keys if after_add[key] != after_remove[key]]
+    # 빠진 워커의 키만 나머지 워커로 이동
+    assert {after_add[key] for key in moved} == {"worker-1"}
+    assert "worker-1" not in set(after_remove.values())
+    assert len(moved) == sum(owner == "worker-1" for owner in after_add.values())
+
+def test_hash_ring_ownership_covers_the_whole_ring():
+    from sharded_service import HashRing
+
+    ring = HashRing([f"worker-{i}" for i in range(4)])
+    shares = ring.ownership()
+    assert set(shares) == set(ring.nodes)
+    assert abs(sum(shares.values()) - 1.0) < 1e-3
+    assert all(0.1 < share < 0.4 for share in shares.values())
+    # 키 분포도 담당 범위 비율을 따름
+    owners = list(_ring_owners(ring, [f"prompt-{i}" for i in range(4000)]).values())
+    for node, share in shares.items():
+        assert abs(owners.count(node) / len(owners) - share) < 0.05
+
+class _FakeShard:
+    """프로세스 없이 ShardedOptimizerService 라우팅을 확인하는 워커 대역"""
+
+    def __init__(self, worker_id, alive=True):
+        from sharded_service import WorkerLoad
+
+        self.worker_id = worker_id
+        self.load = WorkerLoad(worker_id=worker_id)
+        self.alive = alive
+        self.calls = []
+
+    async def call(self, method, params, progress_callback=None):
+        from sharded_service import WorkerUnavailableError
+
+        self.calls.append(params["prompt"])
+        if not self.alive:
+            raise WorkerUnavailableError(f"워커 {self.worker_id}가 종료되었습니다")
+        return {"worker": self.worker_id}
+
+def test_sharded_service_retries_next_worker_when_owner_died():
+    from sharded_service import ShardedOptimizerService, WorkerUnavailableError
+
+    service = ShardedOptimizerService(workers=3)
+    shards = {worker_id: _FakeShard(worker_id) for worker_id in ("worker-0", "worker-1", "worker-2")}
+    for worker_id, shard in shards.items():
+        service._workers[worker_id] = shard
+        service.ring.add(worker_id)
+    prompt = "Summarize the quarterly report."
+    owner = service.worker_for(prompt)
+    shards[owner].alive = False
+
+    result = asyncio.run(service.analyze(prompt))
+    # 죽은 워커는 링에서 빠지고 요청은 다음 담당 워커가 처리
+    assert owner not in service.ring.nodes and result["worker"] == service.worker_for(prompt) != owner
+    assert shards[owner].calls == [prompt] and shards[owner].load.errors == 1
+    assert shards[result["worker"]].calls == [prompt] and shards[result["worker"]].load.in_flight == 0
+
+    # 두 번째 담당 워커도 죽었으면 한 번만 다시 보내고 오류를 전달
+    for shard in shards.values():
+        shard.alive = False
+    try:
+        asyncio.run(service.analyze("Another prompt entirely."))
+    except WorkerUnavailableError:
+        pass
+    else:
+        raise AssertionError("모든 재시도가 실패하면 WorkerUnavailableError를 전달해야 함")
+    assert len(service.ring.nodes) == 0
+
+def test_shard_worker_does_not_cache_degraded_results():
+    import multiprocessing
+    import threading
+
+    from llm_runner import LLMRunner, set_default_llm_runner
+    from sharded_service import _worker_main
+
+    parent, child = multiprocessing.Pipe()
+    set_default_llm_runner(LLMRunner(_simulating_backend()))
+    worker = threading.Thread(target=_worker_main, args=(child, 8), daemon=True)
+    worker.start()
+    try:
+        def call(request_id, method, params):
+            parent.send((request_id, method, params))
+            while True:
+                kind, reply_id, payload = parent.recv()
+                if kind != "progress":
+                    assert (kind, reply_id) == ("result", request_id), payload
+                    return payload
+
+        prompt = "You are a helpful analyst. Summarize reports briefly."
+        # 기본 예상 비용(LLM 단계 수 초)으로는 200ms 안에 선택 단계를 실행할 수 없어 degraded
+        degraded = [call(i, "optimize", {"prompt": prompt, "deadline_ms": 200}) for i in (1, 2)]
+        assert all(result["degraded"] for result in degraded)
+        assert call(3, "stats", {})["cache_hits"] == 0
+        full = [call(i, "optimize", {"prompt": prompt}) for i in (4, 5)]
+        assert not full[0]["degraded"] and full[0] == full[1]
+        stats = call(6, "stats", {})
+        assert stats["cache_hits"] == 1 and stats["cache_entries"] == 1
+    finally:
+        parent.send(None)
+        worker.join(timeout=10)
+        set_default_llm_runner(None)
+
+class _ScriptedMCPServer:
+    """도구 호출마다 정해진 동작(ok / hang / drop)을 하는 프로세스 없는 MCP 서버 대역"""
+
+    def __init__(self, script):
+        self.script = list(script)
+        self.calls = []
+        self.notifications = []
+
+    def session(self):
+        from mcp_client_pool import MCPConnectionError, MCPSession
+
+        server = self
+
+        class Session(MCPSession):
+            async def _open(self):
+                pass
+
+            async def _request(self, message):
+                if message["method"] != "tools/call":
+                    return {"jsonrpc": "2.0", "id": message["id"], "result": {}}
+                server.calls.append(message["params"]["name"])
+                action = server.script.pop(0)
+                if action == "hang":
+                    await asyncio.sleep(3600)
+                if action == "drop":
+                    self.closed = True
+                    raise MCPConnectionError("서버 프로세스 연결이 끊겼습니다")
+                return {"jsonrpc": "2.0", "id": message["id"], "result": {"content": [{"type": "text", "text": "ok"}]}}
+
+            async def _notify(self, message):
+                server.notifications.append(message)
+
+            async def close(self):
+                self.closed = True
+
+        return Session()
+
+def _call_pool(server, tool, **options):
+    from mcp_client_pool import MCPClientPool, tool_text
+
+    async def scenario():
+        async with MCPClientPool(server.session, size=1, request_timeout_s=0.05, **options) as pool:
+            try:
+                return tool_text(await pool.call_tool(tool, {"prompt": "p"})), pool.metrics()
+            except Exception as exc:
+                return exc, pool.metrics()
+
+    return asyncio.run(scenario())
+
+def test_mcp_pool_does_not_resend_timed_out_call_on_live_session():
+    from mcp_client_pool import MCPClientError, MCPConnectionError, MCPTimeoutError
+
+    assert not issubclass(MCPConnectionError, MCPClientError)
+    server = _ScriptedMCPServer(["hang", "ok"])
+    error, metrics = _call_pool(server, "optimize_prompt")
+    # 서버는 원래 호출을 계속 실행 중일 수 있으므로 취소만 알리고 다시 보내지 않음
+    assert isinstance(error, MCPTimeoutError) and server.calls == ["optimize_prompt"]
+    assert metrics["retries"] == 0 and metrics["errors"] == 1
+    (cancel,) = server.notifications[1:]  # 첫 알림은 notifications/initialized
+    assert cancel["method"] == "notifications/cancelled" and "requestId" in cancel["params"]
+
+def test_mcp_pool_retries_closed_sessions_and_opted_in_idempotent_tools():
+    server = _ScriptedMCPServer(["drop", "ok"])
+    text, metrics = _call_pool(server, "optimize_prompt")
+    assert text == "ok" and server.calls == ["optimize_prompt"] * 2 and metrics["retries"] == 1
+
+    server = _ScriptedMCPServer(["hang", "ok"])
+    text, metrics = _call_pool(server, "analyze_prompt", idempotent_tools=["analyze_prompt"])
+    assert text == "ok" and server.calls == ["analyze_prompt"] * 2 and metrics["retries"] == 1
+
+def test_runner_from_env_builds_a_loop_scoped_runner_per_asyncio_run(monkeypatch):
+    from llm_runner import LLMRunner, get_default_llm_runner, set_default_llm_runner, use_llm_runner
+    from resilience import LLM_BACKEND_ENV, runner_from_env
+
+    monkeypatch.delenv(LLM_BACKEND_ENV, raising=False)
+    assert runner_from_env() is None
+    monkeypatch.setenv(LLM_BACKEND_ENV, "openai")
+    registered = LLMRunner(_simulating_backend())
+    set_default_llm_runner(registered)
+
+    async def current():
+        await asyncio.sleep(0)
+        return get_default_llm_runner()
+
+    async def click():
+        # Streamlit 버튼 클릭 하나: 이 루프에서 만든 실행기를 쓰고 루프가 끝나기 전에 닫음
+        runner = runner_from_env()
+        try:
+            with use_llm_runner(runner):
+                seen = await asyncio.gather(current(), asyncio.create_task(current()))
+        finally:
+            await runner.backend.aclose()
+        return runner, seen
+
+    try:
+        first, first_seen = asyncio.run(click())
+        second, second_seen = asyncio.run(click())
+        # 클릭마다 새 클라이언트 - 닫힌 루프에 묶인 연결 풀을 재사용하지 않음
+        assert first is not second and first.backend.client is not second.backend.client
+        assert first.backend.client.is_closed() and second.backend.client.is_closed()
+        assert all(runner is first for runner in first_seen) and all(runner is second for runner in second_seen)
+        # 전역 등록은 바뀌지 않음 (다른 스레드의 세션에 영향 없음)
+        assert get_default_llm_runner() is registered
+    finally:
+        set_default_llm_runner(None)
+
+def test_fused_checker_reruns_only_the_section_the_model_left_null():
+    from llm_runner import LLMRunner, set_default_llm_runner
+
+    def drop_specificity(agent, output):
+        return output.model_copy(update={"specificity": None}) if agent == "fused_prompt_checker" else output
+
+    prompt = "Maybe write something good about our product. Make it nice."
+    expected = asyncio.run(prompt_optimizer.Runner.simulate(prompt_optimizer.specificity_checker, prompt)).final_output
+    assert expected.has_issues  # 누락을 "문제 없음"으로 바꾸면 드러나는 입력
+    runner = LLMRunner(_simulating_backend(edit_output=drop_specificity))
+    set_default_llm_runner(runner)
+    try:
+        result = asyncio.run(prompt_optimizer.optimize_prompt_comprehensive(prompt, coalesce=False, fused_checkers=True))
+    finally:
+        set_default_llm_runner(None)
+    assert runner.stats["fused_prompt_checker"].calls == 1
+    # 빠진 섹션의 검사기만 다시 실행
+    checkers = {checker.name for checker in prompt_optimizer.FUSED_CHECKERS.values()}
+    assert checkers & set(runner.stats) == {"specificity_checker"} and runner.stats["specificity_checker"].calls == 1
+    specificity = next(issues for issues in result["analysis_results"] if issues["category"] == "specificity")
+    assert specificity == expected.model_dump()
+
+@pytest.mark.parametrize("reply", ["matching", "missing_message", "swapped_roles"])
+def test_partial_fewshot_rewrite_merges_only_a_matching_reply(reply, monkeypatch):
+    import json
+
+    import main
+    from llm_runner import RunResult
+
+    messages = [
+        main.ChatMessage(role=role, content=content)
+        for role, content in [("user", "q1"), ("assistant", "a1"), ("user", "q2"), ("assistant", "a2")]
+    ]
+    sent = []
+
+    async def fake_run(agent, input_data):
+        original = json.loads(input_data)["ORIGINAL_MESSAGES"]
+        sent.append(len(original))
+        if len(sent) == 1 and reply == "missing_message":
+            original = original[-1:]
+        elif len(sent) == 1 and reply == "swapped_roles":
+            original = original[::-1]
+        rewritten = [main.ChatMessage(role=m["role"], content=f"fixed {m['content']}") for m in original]
+        return RunResult(main.MessagesOutput(messages=rewritten))
+
+    monkeypatch.setattr(main.Runner, "run", fake_run)
+    result = asyncio.run(main._rewrite_fewshot_messages("dev", messages, main.FewShotIssues.no_issues(), failing_positions=[3]))
+    if reply == "matching":
+        # 위반한 예제(a2)와 직전 user 메시지만 보내 제자리에 병합
+        assert sent == [2] and [m.content for m in result] == ["q1", "a1", "fixed q2", "fixed a2"]
+    else:
+        # 개수/역할이 다르면 병합 위치를 알 수 없으므로 전체 재작성
+        assert sent == [2, 4] and [m.content for m in result] == ["fixed q1", "fixed a1", "fixed q2", "fixed a2"]
+    assert [m.role for m in result] == [m.role for m in messages]
+
+def _mcp_tool_server():
+    from artifact_store import ArtifactStore
+    from mcp_server import PromptOptimizerMCPServer
+
+    # 설치된 mcp 버전에서는 Server를 만들 수 없으므로 도구 처리 메서드만 사용
+    server = PromptOptimizerMCPServer.__new__(PromptOptimizerMCPServer)
+    server.artifacts = ArtifactStore()
+    server.shards = None
+    return server
+
+def test_analyze_prompt_tool_runs_only_the_requested_checkers():
+    import json
+
+    from llm_runner import LLMRunner, set_default_llm_runner
+
+    server = _mcp_tool_server()
+    runner = LLMRunner(_simulating_backend())
+    set_default_llm_runner(runner)
+    try:
+        response = asyncio.run(server._handle_analyze_prompt({
+            "prompt": "Maybe write something good about our product. Make it nice.",
+            "analysis_types": ["clarity", "specificity"],
+            "response_format": "json",
+        }))
+    finally:
+        set_default_llm_runner(None)
+    # 최적화/few-shot 단계 없이 요청한 검사기만 한 번씩 실행
+    assert set(runner.stats) == {"clarity_checker", "specificity_checker"}
+    assert all(stats.calls == 1 for stats in runner.stats.values())
+    result = json.loads(response[0].text)["result"]
+    assert [issues["category"] for issues in result["analysis_results"]] == ["clarity", "specificity"]
+
+def test_structured_result_selects_fields_and_sends_only_unknown_blobs():
+    import json
+
+    from structured_results import blob_ref, known_refs, resolve_refs, structured_json, to_structured
+
+    prompt = "You are a careful analyst. " * 20
+    revised = "You are a careful analyst who cites sources. " * 20
+    earlier = "An explanation the client received in an earlier response. " * 10
+    result = {
+        "original_prompt": prompt,
+        "optimized_prompt": revised,
+        "reasoning": earlier,
+        "issues": [{"issue": "short", "detail": revised}],
+        "total_issues_found": 1,
+    }
+    assert to_structured(result, ["total_issues_found"])["result"] == {"total_issues_found": 1}
+    assert set(to_structured(result, None, ("optimized_prompt", "missing"))["result"]) == {"optimized_prompt"}
+    with pytest.raises(ValueError, match="unknown fields"):
+        to_structured(result, ["optimized_prompt", "missing"])
+
+    structured = json.loads(structured_json(to_structured(
+        result, ["*"], known_texts=[prompt], known_ref_ids=[blob_ref(earlier)]
+    )))
+    # 클라이언트가 보낸 프롬프트와 이미 받은 본문은 참조만, 새 본문은 반복되어도 blobs에 한 번만
+    assert structured["result"]["original_prompt"] == {"$ref": blob_ref(prompt)}
+    assert structured["result"]["reasoning"] == {"$ref": blob_ref(earlier)}
+    assert structured["result"]["issues"][0] == {"issue": "short", "detail": {"$ref": blob_ref(revised)}}
+    assert structured["blobs"] == {blob_ref(revised): revised}
+
+    unresolved = resolve_refs(structured["result"], structured["blobs"])
+    assert unresolved["original_prompt"] == {"$ref": blob_ref(prompt)}
+    assert resolve_refs(structured["result"], structured["blobs"], known_refs([prompt, earlier])) == result
+
+def test_artifact_store_chains_revisions_and_prunes_them_with_their_prompts(tmp_path, monkeypatch):
+    import json
+    import time
+
+    from artifact_store import REVISION, ArtifactStore, artifact_uri
+    from structured_results import blob_ref
+
+    store = ArtifactStore(str(tmp_path / "artifacts.db"), max_entries=4)
+    clock = iter(range(1, 100))
+    monkeypatch.setattr(time, "time", lambda: float(next(clock)))
+    original = store.put_text("v0")
+    assert original == blob_ref("v0") and store.get_text(original) == "v0"
+    assert store.get_text(blob_ref("never stored")) is None
+
+    first = store.add_revision("v0", "shorter", "v1")
+    second = store.add_revision("v1", "add examples", "v2")
+    assert first != second
+    expected = [
+        {"prompt": {"$ref": blob_ref("v0")}, "feedback": None},
+        {"prompt": {"$ref": blob_ref("v1")}, "feedback": "shorter"},
+        {"prompt": {"$ref": blob_ref("v2")}, "feedback": "add examples"},
+    ]
+    assert store.revision_chain(second) == expected
+    assert store.revision_chain(first) == expected[:2]
+    assert json.loads(store.read(artifact_uri(REVISION, second))[1]) == expected
+
+    store.put_text("a")
+    store.put_text("b")  # v0 제거 - 단계의 결과 프롬프트는 남아 있으므로 체인은 그대로
+    assert store.get_text(original) is None and store.revision_chain(second) == expected
+    store.put_text("c")  # v1 제거 - v1을 결과로 낸 첫 단계도 함께 제거
+    assert store.revision_chain(first) == []
+    # 남은 단계의 체인은 그 단계의 입력(v1)을 시작 프롬프트로 삼음
+    assert store.revision_chain(second) == [{"prompt": {"$ref": blob_ref("v1")}, "feedback": None}, expected[2]]
+    store.put_text("d")  # v2 제거 - 남은 단계도 제거
+    assert store.revision_chain(second) == [] and store.read(artifact_uri(REVISION, second)) is None
+    assert all(entry["kind"] != REVISION for entry in store.entries())
+    store.close()
+
+@pytest.mark.parametrize("mode", ["multi_item", "missing_ids", "batch_file"])
+def test_micro_batcher_splits_batched_replies_back_to_each_caller(mode, tmp_path):
+    from llm_runner import StubModelBackend
+    from micro_batcher import MicroBatcher, batch_responder, is_batch_request
+
+    checker = prompt_optimizer.clarity_checker
+    prompts = ["Write something nice.", "You are a support agent. Answer in two sentences.", "Maybe do the thing, etc."]
+    sent = []
+
+    async def respond_item(request):
+        return (await prompt_optimizer.Runner.simulate(checker, request.input)).final_output
+
+    batched = batch_responder(respond_item)
+
+    async def respond(request):
+        sent.append(request.agent)
+        output = await batched(request)
+        if mode == "missing_ids" and is_batch_request(request):
+            # 모델이 두 번째 항목의 결과를 빠뜨림
+            output["results"] = [entry for entry in output["results"] if entry["id"] != 1]
+        return output
+
+    backend = StubModelBackend(respond, round_trip_ms=1.0, ms_per_input_token=0.0, ms_per_output_token=0.0, cache_min_tokens=None)
+    batch_dir = str(tmp_path / "batches") if mode == "batch_file" else None
+    batcher = MicroBatcher(backend, max_wait_ms=50.0, max_items=len(prompts), batch_dir=batch_dir)
+
+    async def run_all():
+        return await asyncio.gather(*(batcher.run(checker, prompt) for prompt in prompts))
+
+    results = asyncio.run(run_all())
+    expected = [asyncio.run(prompt_optimizer.Runner.simulate(checker, prompt)).final_output for prompt in prompts]
+    assert [result.final_output for result in results] == expected
+    assert batcher.batcher_stats.batches == 1 and batcher.batcher_stats.batched_items == len(prompts)
+    if mode == "multi_item":
+        assert sent == ["clarity_checker__batch"] and batcher.batcher_stats.fallbacks == 0
+    elif mode == "missing_ids":
+        # 빠진 항목만 개별 호출로 다시 실행
+        assert sent == ["clarity_checker__batch", "clarity_checker"] and batcher.batcher_stats.fallbacks == 1
+    else:
+        # 항목별 요청을 배치 작업 파일 한 개에 저장하고 파일 실행기로 실행
+        files = list((tmp_path / "batches").iterdir())
+        assert len(files) == 1 and files[0].name.startswith("clarity_checker-")
+        assert len(files[0].read_text(encoding="utf-8").splitlines()) == len(prompts)
+        assert sent == ["clarity_checker"] * len(prompts)
+
+def test_request_bodies_for_one_agent_share_a_byte_identical_prefix():
+    import os.path
+
+    from request_builder import RequestBuilder, chat_completion_body, serialize_payload
+    from schema_catalog import SchemaCatalog, serialize_body
+
+    agent = prompt_optimizer.prompt_optimizer
+    prompt = "You are a helpful analyst. Summarize reports briefly."
+    payloads = [
+        {"all_issues": [{"category": "clarity", "issues": ["vague"]}], "original_prompt": prompt},
+        {"original_prompt": prompt, "all_issues": [{"category": "specificity", "issues": ["no format", "no length"]}]},
+    ]
+    catalog = SchemaCatalog(RequestBuilder())
+    rebuilt = SchemaCatalog(RequestBuilder())  # 다른 프로세스/재시작에 해당
+    bodies = []
+    for payload in payloads:
+        request = catalog.compile(agent).build_request(serialize_payload(payload))
+        body = catalog.body_json(request)
+        # 본문 조각에 끼워 넣은 결과는 전체 직렬화와 같은 바이트열이고 다시 컴파일해도 바뀌지 않음
+        assert body == serialize_body(chat_completion_body(request)) == rebuilt.body_json(request)
+        bodies.append(body.encode("utf-8"))
+    shared = os.path.commonprefix(bodies)
+    head = catalog.compile(agent).body_head.encode("utf-8")
+    assert bodies[0].startswith(head) and bodies[1].startswith(head)
+    # 반복되는 키(original_prompt)가 가변 입력의 맨 앞이라 공유 prefix가 정적 부분을 넘어 원본 프롬프트까지 이어짐
+    assert shared.startswith(head) and prompt.encode("utf-8") in shared[len(head):]
+
+@pytest.mark.parametrize("agent_name, valid, invalid", [
+    ("clarity_checker", {"has_issues": True, "issues": ["vague"], "confidence": 0.5}, {"has_issues": True, "issues": "vague"}),
+    ("prompt_optimizer", {
+        "original_prompt": "a", "optimized_prompt": "b", "changes_made": ["c"],
+        "improvement_explanation": "d", "estimated_improvement": 10.0,
+    }, {"original_prompt": "a", "optimized_prompt": "b"}),
+    ("prompt_reviser", {
+        "original_optimized_prompt": "a", "user_feedback": "b", "revised_prompt": "c",
+        "changes_made": [], "feedback_addressed": [], "improvement_explanation": "d",
+    }, {"revised_prompt": ["c"]}),
+    ("few_shot_optimizer", {"messages": [{"role": "user", "content": "q"}]}, ["not", "an", "object"]),
+])
+def test_schema_catalog_precompiles_each_agents_schema_and_validator(agent_name, valid, invalid):
+    import json
+
+    from pydantic import BaseModel, ValidationError
+    from request_builder import RequestBuilder, output_schema_for
+    from schema_catalog import SchemaCatalog, default_catalog
+
+    agent = getattr(prompt_optimizer, agent_name)
+    # 모듈 로드 시 등록되어 있어 첫 호출에서 다시 컴파일하지 않음
+    assert agent_name in default_catalog.agents() and default_catalog.compile(agent) is default_catalog.compile(agent)
+    builder = RequestBuilder()
+    catalog = SchemaCatalog(builder)
+    catalog.register([agent])
+    spec = catalog.compile(agent)
+    assert builder.compilations == 1
+    assert spec.prefix.output_schema == output_schema_for(agent.output_type)
+    assert json.loads(spec.body_json("x"))["response_format"]["json_schema"]["schema"] == spec.prefix.output_schema
+
+    parsed = spec.parse(json.dumps(valid))
+    if isinstance(agent.output_type, type) and issubclass(agent.output_type, BaseModel):
+        assert parsed == agent.output_type.model_validate(valid)
+    else:
+        assert parsed == valid
+    with pytest.raises(ValidationError):
+        spec.parse(json.dumps(invalid))
+
+@pytest.mark.parametrize("threshold, escalated", [
+    (0.7, set()),
+    (0.8, {"clarity"}),  # 로컬 clarity 확신도 0.75, 나머지 0.95
+    (1.0, set(prompt_optimizer.FUSED_CHECKERS)),
+])
+def test_cascade_escalates_only_low_confidence_sections_to_the_llm(threshold, escalated):
+    from llm_runner import LLMRunner, set_default_llm_runner
+
+    def mark_llm(agent, output):
+        return output.model_copy(update={"issues": ["llm"], "confidence": 1.0}) if agent.endswith("_checker") else output
+
+    prompt = "Maybe write something good about our product. Make it nice."
+    runner = LLMRunner(_simulating_backend(edit_output=mark_llm))
+    set_default_llm_runner(runner)
+    try:
+        result = asyncio.run(prompt_optimizer.optimize_prompt_comprehensive(
+            prompt, coalesce=False, cascade=True, cascade_confidence_threshold=threshold
+        ))
+    finally:
+        set_default_llm_runner(None)
+    checkers = {checker.name: section for section, checker in prompt_optimizer.FUSED_CHECKERS.items()}
+    # 확신도가 기준보다 낮은 섹션의 검사기만 한 번씩 LLM으로 호출
+    assert {checkers[name] for name in set(runner.stats) & set(checkers)} == escalated
+    assert all(runner.stats[name].calls == 1 for name in set(runner.stats) & set(checkers))
+    decisions = {decision["category"]: decision for decision in result["cascade"]["decisions"]}
+    assert {section for section, decision in decisions.items() if decision["escalated"]} == escalated
+    assert all(decisions[section]["reason"] == "low_confidence" for section in escalated)
+    for issues in result["analysis_results"]:
+        assert (issues["issues"] == ["llm"]) == (issues["category"] in escalated)
+
+def test_tight_deadline_skips_optional_stages_and_is_not_cached(monkeypatch):
+    from cache_backend import MemoryCacheBackend, ResultCache, set_default_result_cache
+    from deadline_planner import StageCostModel
+    from llm_runner import LLMRunner, set_default_llm_runner
+
+    costs = {"analysis:llm": 10.0, "analysis:local": 1.0, "optimize:llm": 10.0, "optimize:local": 1.0,
+             "few_shot:llm": 10000.0, "few_shot:local": 10000.0, "compress:local": 10000.0, "fewshot_index:local": 1.0}
+    monkeypatch.setattr(prompt_optimizer, "default_stage_costs", StageCostModel(costs))
+    backend = MemoryCacheBackend()
+    cache = ResultCache(backend)
+    runner = LLMRunner(_simulating_backend())
+    messages = [
+        prompt_optimizer.ChatMessage(role="user", content="Summarize: sales rose 5%."),
+        prompt_optimizer.ChatMessage(role="assistant", content="Sales rose 5%."),
+    ]
+
+    def optimize(deadline_ms):
+        return asyncio.run(prompt_optimizer.optimize_prompt_comprehensive(
+            "You are a helpful analyst. Summarize reports briefly.", messages,
+            coalesce=False, compress=True, deadline_ms=deadline_ms
+        ))
+
+    def optimization_entries():
+        return [key for key in backend._entries if prompt_optimizer.OPTIMIZATION_CACHE_NAMESPACE in key]
+
+    set_default_llm_runner(runner)
+    set_default_result_cache(cache)
+    try:
+        partial = optimize(500)
+        # 예산에 맞지 않는 선택 단계(압축, few-shot)는 건너뛰고 원본 예제를 그대로 돌려줌
+        stages = {stage["stage"]: stage for stage in partial["deadline"]["stages"]}
+        assert partial["degraded"] and partial["deadline"]["degraded"]
+        assert stages["compress"]["status"] == "skipped" and stages["few_shot"]["status"] == "skipped"
+        assert partial["compression"] is None
+        assert partial["optimized_messages"] == [message.model_dump(mode="json") for message in messages]
+        assert "few_shot_optimizer" not in runner.stats
+        assert not optimization_entries()  # 부분 결과는 공유 캐시에 저장하지 않음
+
+        full = optimize(None)
+        assert not full["degraded"] and full["deadline"] is None
+        assert runner.stats["few_shot_optimizer"].calls == 1
+        assert len(optimization_entries()) == 1
+        assert optimize(None) == full and runner.stats["few_shot_optimizer"].calls == 1  # 마감 없는 결과는 캐시에서 재사용
+    finally:
+        set_default_llm_runner(None)
+        set_default_result_cache(None)
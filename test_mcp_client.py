@@ -3,20 +3,39 @@
 MCP 클라이언트 테스트
 
 프롬프트 최적화 MCP 서버의 기능을 테스트하는 클라이언트입니다.
+서버 프로세스를 요청마다 띄우지 않고 mcp_client_pool의 세션 풀로 모든 테스트를 동시에 보냅니다.
+--stub 옵션을 주면 mcp_server.py 대신 로컬 스텁 서버(mcp_stub_server.py)에 연결합니다.
 """
 
 import asyncio
 import json
+import os
 import subprocess
 import sys
 from typing import Any, Dict
 
-async def test_mcp_server():
+from mcp_client_pool import MCPClientError, MCPClientPool, MCPConnectionError, optimizer_server_pool, tool_text
+
+def create_pool(use_stub: bool = False) -> MCPClientPool:
+    """테스트에 사용할 세션 풀 (스텁 서버는 optimize_prompt / analyze_prompt만 제공)"""
+    if use_stub:
+        directory = os.path.dirname(os.path.abspath(__file__))
+        return MCPClientPool.stdio(sys.executable, [os.path.join(directory, "mcp_stub_server.py")], cwd=directory, size=2)
+    return optimizer_server_pool(size=2)
+
+async def test_mcp_server(use_stub: bool = False):
     """MCP 서버 기능을 테스트합니다"""
     
     print("🚀 MCP 프롬프트 최적화 서버 테스트")
     print("=" * 60)
     
+    pool = create_pool(use_stub)
+    try:
+        await pool.start()
+    except MCPConnectionError as e:
+        print(f"⚠️ MCP 서버에 연결할 수 없습니다: {e}")
+        pool = None
+    
     # 테스트할 프롬프트들
     test_cases = [
         {
@@ -67,23 +86,20 @@ async def test_mcp_server():
         }
     ]
     
-    for i, test_case in enumerate(test_cases, 1):
+    # 모든 테스트를 풀의 세션들로 동시에 보냄 (실패한 테스트는 예외를 결과로 받음)
+    if pool is not None:
+        results = await asyncio.gather(
+            *(pool.call_tool(test_case["tool"], test_case["arguments"]) for test_case in test_cases),
+            return_exceptions=True
+        )
+    else:
+        results = [None] * len(test_cases)
+    
+    for i, (test_case, result) in enumerate(zip(test_cases, results), 1):
         print(f"\n📝 테스트 {i}: {test_case['name']}")
         print("-" * 40)
         
         try:
-            # MCP 메시지 구성
-            mcp_request = {
-                "jsonrpc": "2.0",
-                "id": i,
-                "method": "tools/call",
-                "params": {
-                    "name": test_case["tool"],
-                    "arguments": test_case["arguments"]
-                }
-            }
-            
-            # MCP 서버와 통신 시뮬레이션
             print(f"🔧 도구: {test_case['tool']}")
             print(f"📊 입력 인수:")
             for key, value in test_case["arguments"].items():
@@ -92,11 +108,23 @@ async def test_mcp_server():
                 else:
                     print(f"  {key}: {value}")
             
-            print("\n✅ 테스트 완료 (실제 MCP 서버 연결이 필요함)")
+            if result is None:
+                print("\n✅ 테스트 완료 (실제 MCP 서버 연결이 필요함)")
+                continue
+            if isinstance(result, Exception):
+                raise result
+            text = tool_text(result)
+            print(f"\n📄 결과 ({len(text)}자):")
+            print(f"  {text[:300]}{'...' if len(text) > 300 else ''}")
+            print("\n✅ 테스트 완료")
             
-        except Exception as e:
+        except (MCPClientError, MCPConnectionError) as e:
             print(f"❌ 테스트 실패: {e}")
     
+    if pool is not None:
+        print(f"\n📈 클라이언트 풀 통계: {json.dumps(pool.metrics(), ensure_ascii=False)}")
+        await pool.close()
+    
     print(f"\n🎉 모든 MCP 테스트 완료!")
     print("\n💡 실제 사용법:")
     print("   1. MCP 서버 실행: python mcp_server.py")
@@ -238,7 +266,7 @@ def show_mcp_architecture():
 
 async def main():
     """메인 실행 함수"""
-    await test_mcp_server()
+    await test_mcp_server(use_stub="--stub" in sys.argv[1:])
     await demonstrate_mcp_usage()
     show_mcp_architecture()
 